@@ -3,9 +3,14 @@ Flask app chính cho Bookstore API
 """
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 from config import Config
 from models import db
+from utils.codes import sync_code_sequences
+from utils.schema import ensure_extensions, ensure_schema
+from utils.customer_stats import ensure_customer_stats
+from utils.book_search import ensure_book_search_text
 from routes.auth import auth_bp
 from routes.books import books_bp
 from routes.cart import cart_bp
@@ -15,6 +20,7 @@ from routes.chatbot import chatbot_bp
 from routes.upload import upload_bp
 from routes.banners import banners_bp
 from routes.categories import categories_bp
+from routes.media import media_bp
 
 def create_app():
     """Tạo và cấu hình Flask app"""
@@ -25,6 +31,10 @@ def create_app():
     app = Flask(__name__, static_folder=static_path, static_url_path='')
     app.config.from_object(Config)
     
+    # Backend chạy sau nginx (TRUSTED_PROXY_COUNT=1): lấy IP client từ X-Forwarded-For thay vì IP của nginx
+    if Config.TRUSTED_PROXY_COUNT > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_COUNT)
+    
     # Setup logging để logs hiển thị trong Docker
     log_level = getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO)
     logging.basicConfig(
@@ -55,6 +65,7 @@ def create_app():
     app.register_blueprint(upload_bp, url_prefix='/api')
     app.register_blueprint(banners_bp, url_prefix='/api')
     app.register_blueprint(categories_bp, url_prefix='/api')
+    app.register_blueprint(media_bp, url_prefix='/api')
     
     # Route để serve frontend (phải đặt sau API routes)
     @app.route('/', defaults={'path': ''})
@@ -86,7 +97,15 @@ def create_app():
     
     # Tạo database tables
     with app.app_context():
+        # Extension PostgreSQL (pg_trgm) phải có trước khi tạo index dùng đến nó
+        ensure_extensions()
         db.create_all()
+        # Tạo cột/index mới khai báo trong models cho các bảng đã tồn tại
+        ensure_schema()
+        # Backfill search_text (tìm kiếm gần đúng) cho sách tạo trước khi có cột
+        ensure_book_search_text()
+        # Tạo/đồng bộ sequences cấp mã (MS/DM/BN/KH) với dữ liệu hiện có
+        sync_code_sequences()
     
     return app
 
@@ -97,6 +116,12 @@ app = create_app()
 from seed_data import seed_database
 with app.app_context():
     seed_database()
+    # Seed có thể tạo mã cố định (KH001, ...) nên đồng bộ lại sequences sau khi seed
+    sync_code_sequences()
+    # Backfill projection customer_stats cho database đã có đơn hàng từ trước
+    ensure_customer_stats()
+    # Đóng connection đã mở trong master (preload_app) để worker sau khi fork không dùng chung socket
+    db.engine.dispose()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
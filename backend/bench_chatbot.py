@@ -0,0 +1,189 @@
+"""
+Benchmark: chatbot pipeline (/api/chatbot) under concurrent load, with a fake LLM backend
+
+Chạy N client song song gửi câu hỏi tới /api/chatbot (hỗn hợp câu hỏi FAQ, câu hỏi về sách
+cụ thể và câu hỏi chung), LLM được thay bằng FakeLLMBackend (utils.llm) nên không tốn API
+quota. Báo cáo:
+- p50/p95/p99 latency của mỗi tin nhắn
+- Số query database trung bình mỗi tin nhắn
+- Kích thước prompt trung bình gửi inline tới LLM (câu hỏi + context theo câu hỏi + system prompt
+  chưa cache) và phần system prompt đã cache (context caching)
+- Phân bố nguồn câu trả lời (fake, cache, coalesced - dùng chung câu trả lời của request giống hệt
+  đang chạy, busy - đã đủ số lời gọi LLM đồng thời, faq...)
+
+Các client là thread trong cùng process (giống gunicorn gthread worker), dùng Flask
+test client nên không đo network. Cần database đã seed:
+    python bench_chatbot.py
+    python bench_chatbot.py --clients 8 --messages 400 --latency 0.8 --tps 40 --failure-rate 0.1
+    python bench_chatbot.py --no-cache --llm-concurrency 8
+    python bench_chatbot.py --no-cache --no-context-cache
+    python bench_chatbot.py --no-cache --same-question            # Nhiều khách hỏi cùng một câu (banner)
+    python bench_chatbot.py --no-cache --same-question --no-coalesce
+"""
+import argparse
+import itertools
+import statistics
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+from config import Config
+from utils.llm import configure_llm_backend
+from utils.answer_cache import get_answer_cache
+from utils.llm_guard import LLM_GUARD
+from utils.single_flight import CHATBOT_FLIGHTS
+
+QUESTIONS = [
+    'Phí ship bao nhiêu?',
+    'giao hang mat bao lau',
+    'Chính sách đổi trả thế nào?',
+    'Sách Đắc Nhân Tâm có hay không?',
+    'Nhà Giả Kim giá bao nhiêu',
+    'Naruto còn hàng không shop',
+    'Sách nào bán chạy nhất?',
+    'Gợi ý cho mình vài cuốn truyện tranh',
+    'Có sách về kỹ năng sống không?',
+    'Shop có bán bút bi không?',
+]
+
+def percentile(values, pct):
+    """Percentile theo nearest-rank (values đã sort)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+def run(app, args):
+    """Chạy benchmark, trả về dict kết quả"""
+    from models import db
+
+    llm = configure_llm_backend(
+        'fake',
+        latency=args.latency,
+        tokens_per_second=args.tps,
+        answer_tokens=args.tokens,
+        failure_rate=args.failure_rate,
+        context_cache=not args.no_context_cache,
+        seed=42
+    )
+    LLM_GUARD.breaker.reset()
+    if args.llm_concurrency:
+        LLM_GUARD.set_max_concurrent(args.llm_concurrency)
+    if args.llm_acquire_timeout is not None:
+        LLM_GUARD.acquire_timeout = args.llm_acquire_timeout
+
+    answer_cache = get_answer_cache()
+    answer_cache.clear()
+    if args.no_cache:
+        answer_cache.max_entries = 0
+    Config.CHATBOT_COALESCE = not args.no_coalesce
+    CHATBOT_FLIGHTS.reset_stats()
+
+    counter = itertools.count()
+
+    def next_question():
+        index = next(counter)
+        question = QUESTIONS[3] if args.same_question else QUESTIONS[index % len(QUESTIONS)]
+        # --unique: thêm số thứ tự để câu hỏi không bao giờ trùng answer cache
+        return f"{question} {index}" if args.unique else question
+
+    latencies = []
+    sources = Counter()
+    queries = [0]
+    remaining = [args.messages]
+    lock = threading.Lock()
+
+    def count_query(*_):
+        with lock:
+            queries[0] += 1
+
+    def client_loop():
+        client = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                question = next_question()
+            started = time.perf_counter()
+            response = client.post('/api/chatbot', json={'question': question})
+            elapsed = (time.perf_counter() - started) * 1000
+            data = response.get_json() or {}
+            source = data.get('source', str(response.status_code))
+            with lock:
+                latencies.append(elapsed)
+                if data.get('cached'):
+                    source = 'cache'
+                elif data.get('coalesced'):
+                    source = 'coalesced'
+                sources[source] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_query)
+    started = time.perf_counter()
+    try:
+        threads = [threading.Thread(target=client_loop) for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    duration = time.perf_counter() - started
+
+    llm_stats = llm.stats()
+    latencies.sort()
+    return {
+        'messages': len(latencies),
+        'duration': duration,
+        'throughput': len(latencies) / duration if duration else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+        'queries_per_message': queries[0] / len(latencies) if latencies else 0.0,
+        'llm_calls': llm_stats['calls'],
+        'llm_failures': llm_stats['failures'],
+        'prompt_chars': llm_stats['prompt_chars'] / llm_stats['calls'] if llm_stats['calls'] else 0.0,
+        'cached_chars': llm_stats['cached_chars'] / llm_stats['calls'] if llm_stats['calls'] else 0.0,
+        'sources': dict(sources),
+        'flights': CHATBOT_FLIGHTS.stats()
+    }
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark /api/chatbot with a fake LLM backend')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=200, help='Total messages')
+    parser.add_argument('--latency', type=float, default=0.5, help='Fake LLM seconds to first token')
+    parser.add_argument('--tps', type=float, default=50, help='Fake LLM tokens per second')
+    parser.add_argument('--tokens', type=int, default=80, help='Fake LLM tokens per answer')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fake LLM failure probability')
+    parser.add_argument('--llm-concurrency', type=int, default=0,
+                        help='Override CHATBOT_LLM_MAX_CONCURRENT (0 = keep config)')
+    parser.add_argument('--llm-acquire-timeout', type=float, default=None,
+                        help='Override CHATBOT_LLM_ACQUIRE_TIMEOUT in seconds (0 = reject at once when busy)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the chatbot answer cache')
+    parser.add_argument('--unique', action='store_true', help='Make every question unique')
+    parser.add_argument('--same-question', action='store_true',
+                        help='Every client asks the same question (e.g. a book promoted by a banner)')
+    parser.add_argument('--no-coalesce', action='store_true',
+                        help='Do not coalesce identical concurrent questions')
+    parser.add_argument('--no-context-cache', action='store_true',
+                        help='Send the system prompt inline on every call (no context caching)')
+    args = parser.parse_args()
+
+    from app import app
+
+    result = run(app, args)
+
+    print(f"{args.clients} clients, {result['messages']} messages in {result['duration']:.1f}s "
+          f"({result['throughput']:.1f} msg/s), fake LLM {args.latency}s + {args.tokens} tokens @ {args.tps}/s")
+    print(f"latency ms    p50 {result['p50']:.1f}  p95 {result['p95']:.1f}  "
+          f"p99 {result['p99']:.1f}  mean {result['mean']:.1f}")
+    print(f"db queries/message  {result['queries_per_message']:.2f}")
+    print(f"llm calls {result['llm_calls']} (failures {result['llm_failures']}), "
+          f"avg prompt {result['prompt_chars']:.0f} chars inline + {result['cached_chars']:.0f} cached")
+    print(f"sources  {result['sources']}")
+    print(f"single-flight  {result['flights']}")
@@ -0,0 +1,82 @@
+"""
+Benchmark: chatbot system prompt latency, rebuilding store context vs shared snapshot
+
+Đo thời gian build_system_prompt() (phần việc phía server của mỗi tin nhắn /api/chatbot
+trước khi gọi Gemini) và số query database mỗi tin nhắn, ở hai chế độ:
+- rebuild: context cửa hàng được query lại cho mỗi tin nhắn (hành vi trước đây)
+- snapshot: context lấy từ snapshot dùng chung (utils.chatbot_context), chỉ build lại khi
+  catalog thay đổi hoặc hết CHATBOT_CONTEXT_TTL
+
+Không gọi Gemini (thời gian gọi API không phụ thuộc context được cache hay không).
+Cần database đã seed:
+    python bench_chatbot_context.py
+    python bench_chatbot_context.py --messages 2000
+"""
+import argparse
+import time
+from sqlalchemy import event
+from utils.chatbot_context import CONTEXT_SNAPSHOT, _local
+
+def percentile(values, pct):
+    """Percentile theo nearest-rank (values đã sort)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+def reset_snapshot():
+    """Xóa snapshot dùng chung và bản copy local (lần đọc tiếp theo sẽ build lại)"""
+    CONTEXT_SNAPSHOT.clear()
+    _local['snapshot'] = None
+
+def run_mode(app, mode, args):
+    """Chạy một lượt benchmark, trả về dict kết quả"""
+    from models import db
+    from routes.chatbot import build_system_prompt
+
+    latencies = []
+    queries = [0]
+
+    with app.app_context():
+        def count_query(*_):
+            queries[0] += 1
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+        try:
+            reset_snapshot()
+            build_system_prompt()  # Warm-up (snapshot mode: build snapshot lần đầu)
+            queries[0] = 0
+
+            for _ in range(args.messages):
+                if mode == 'rebuild':
+                    reset_snapshot()
+                started = time.perf_counter()
+                build_system_prompt()
+                latencies.append((time.perf_counter() - started) * 1000)
+                db.session.remove()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_query)
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'queries_per_message': queries[0] / args.messages
+    }
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark chatbot store context snapshot')
+    parser.add_argument('--messages', type=int, default=500, help='Messages per mode')
+    args = parser.parse_args()
+
+    from app import app
+
+    results = [run_mode(app, mode, args) for mode in ('rebuild', 'snapshot')]
+
+    print(f"{args.messages} messages per mode (system prompt only, no Gemini call)")
+    print(f"{'mode':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries/msg':>12}")
+    for result in results:
+        print(f"{result['mode']:<9} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+              f"{result['p99']:>8.3f} {result['queries_per_message']:>12.2f}")
@@ -0,0 +1,141 @@
+"""
+Benchmark: browse latency under a login burst, with and without the host-wide bcrypt limit
+
+Khởi động gunicorn thật (gunicorn.conf.py, N worker process, preload_app) cho từng chế độ,
+rồi chạy song song N client đăng nhập liên tục (bcrypt verify) và M client duyệt catalog
+(GET /api/books) qua HTTP, so sánh p50/p95/p99 của request catalog:
+- inline: bcrypt không giới hạn (BCRYPT_MAX_WORKERS=0), mọi worker cùng chạy bcrypt
+- limited: tối đa --bcrypt-slots bcrypt đồng thời trên toàn host (utils.passwords)
+
+Cần database đã seed (user1 / pass123), cấu hình qua DATABASE_URL như khi chạy app.
+Giới hạn đăng nhập (utils.rate_limit) được nới ra để không chặn client benchmark:
+    python bench_password_offload.py
+    python bench_password_offload.py --login-clients 16 --browse-clients 4 --duration 20 --gunicorn-workers 3
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+def percentile(values, pct):
+    """Percentile theo nearest-rank (values đã sort)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+def start_gunicorn(mode, args):
+    """Khởi động gunicorn cho một chế độ, chờ đến khi nhận request"""
+    env = dict(os.environ)
+    env.update({
+        'BCRYPT_MAX_WORKERS': '0' if mode == 'inline' else str(args.bcrypt_slots),
+        'BCRYPT_MAX_QUEUE': str(args.queue),
+        'LOGIN_MAX_ATTEMPTS_PER_IP': '1000000',
+        'LOGIN_MAX_ATTEMPTS_PER_USERNAME': '1000000',
+        'LOG_LEVEL': 'warning'
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{args.port}',
+         '--workers', str(args.gunicorn_workers), '--access-logfile', '/dev/null', 'app:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', args.port, timeout=5)
+            connection.request('GET', '/api/books?page=1&per_page=1')
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit('gunicorn không khởi động được')
+
+def run_mode(mode, args):
+    """Chạy một lượt benchmark, trả về dict kết quả"""
+    process = start_gunicorn(mode, args)
+    stop = threading.Event()
+    browse_latencies = []
+    login_stats = {'ok': 0, 'busy': 0, 'other': 0}
+    lock = threading.Lock()
+    body = json.dumps({'username': args.username, 'password': args.password})
+
+    def login_client():
+        while not stop.is_set():
+            connection = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+            connection.request('POST', '/api/login', body=body, headers={'Content-Type': 'application/json'})
+            status = connection.getresponse().status
+            connection.close()
+            with lock:
+                if status == 200:
+                    login_stats['ok'] += 1
+                elif status == 503:
+                    login_stats['busy'] += 1
+                else:
+                    login_stats['other'] += 1
+
+    def browse_client():
+        while not stop.is_set():
+            started = time.perf_counter()
+            connection = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+            connection.request('GET', '/api/books?page=1&per_page=12')
+            connection.getresponse().read()
+            connection.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                browse_latencies.append(elapsed)
+
+    try:
+        threads = [threading.Thread(target=login_client) for _ in range(args.login_clients)]
+        threads += [threading.Thread(target=browse_client) for _ in range(args.browse_clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = sorted(browse_latencies)
+    return {
+        'mode': mode,
+        'browse_requests': len(latencies),
+        'browse_p50': percentile(latencies, 50),
+        'browse_p95': percentile(latencies, 95),
+        'browse_p99': percentile(latencies, 99),
+        'browse_mean': statistics.mean(latencies) if latencies else 0.0,
+        'logins_ok': login_stats['ok'],
+        'logins_busy': login_stats['busy'],
+        'logins_other': login_stats['other']
+    }
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark host-wide bcrypt limit under mixed traffic')
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--browse-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per mode')
+    parser.add_argument('--gunicorn-workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--bcrypt-slots', type=int, default=2, help='Host-wide concurrent bcrypt in limited mode')
+    parser.add_argument('--queue', type=int, default=16, help='Host-wide bcrypt queue depth in limited mode')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--username', default='user1')
+    parser.add_argument('--password', default='pass123')
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in ('inline', 'limited')]
+
+    print(f"{args.gunicorn_workers} gunicorn workers, {args.login_clients} login clients + "
+          f"{args.browse_clients} browse clients, {args.duration}s per mode")
+    print(f"{'mode':<8} {'browse':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'logins':>7} {'503':>5}")
+    for result in results:
+        print(f"{result['mode']:<8} {result['browse_requests']:>7} {result['browse_p50']:>8.1f} "
+              f"{result['browse_p95']:>8.1f} {result['browse_p99']:>8.1f} "
+              f"{result['logins_ok']:>7} {result['logins_busy']:>5}")
@@ -0,0 +1,137 @@
+"""
+Benchmark: image upload throughput (POST /api/admin/upload)
+
+Chạy song song N client upload ảnh JPEG tổng hợp qua Flask test client (không đo network tới
+client) và đo số upload/giây, p50/p95 latency. Mỗi upload gồm resize + encode các bản
+thumbnail/card/detail (utils.images, process pool) và ghi ảnh gốc + các bản resize lên storage.
+
+Storage backend chọn bằng --backend (mặc định 'local', không cần network):
+- local: ghi vào --local-dir (mặc định thư mục tạm, xóa sau khi chạy)
+- s3: endpoint S3-compatible cấu hình qua S3_* trong .env (ví dụ MinIO local)
+- r2: Cloudflare R2 (R2_* trong .env)
+
+Cần database đã seed (có tài khoản admin):
+    python bench_upload.py
+    python bench_upload.py --clients 8 --uploads 64 --image-workers 4
+    python bench_upload.py --backend s3 --create-bucket
+"""
+import argparse
+import io
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from PIL import Image
+from utils.images import configure_image_processor
+from utils.storage_backends import configure_storage_backend
+
+def percentile(values, pct):
+    """Percentile theo nearest-rank (values đã sort)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+def make_image(width, height, seed):
+    """Ảnh JPEG tổng hợp có chi tiết (gradient + nhiễu) để encode không quá dễ"""
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+    overlay = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.blend(image, overlay, 0.5 + (seed % 5) / 20)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+def run(app, args):
+    """Chạy benchmark, trả về dict kết quả"""
+    from models import User
+
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        if admin is None:
+            raise SystemExit('Không có tài khoản admin, hãy seed database trước')
+        admin_id = admin.id
+
+    images = [make_image(args.width, args.height, seed) for seed in range(4)]
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = [args.uploads]
+
+    def client_loop():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = admin_id
+            session['user_role'] = 'admin'
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                number = remaining[0]
+            started = time.perf_counter()
+            response = client.post(
+                f'/api/admin/upload?folder={args.folder}',
+                data={'file': (io.BytesIO(images[number % len(images)]), f'bench-{number}.jpg')},
+                content_type='multipart/form-data'
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'uploads': len(latencies),
+        'duration': duration,
+        'throughput': len(latencies) / duration if duration else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+        'statuses': statuses,
+        'source_bytes': sum(len(image) for image in images) // len(images)
+    }
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark image upload throughput')
+    parser.add_argument('--backend', choices=('local', 's3', 'r2'), default='local')
+    parser.add_argument('--local-dir', default=None, help='Thư mục của backend local (mặc định: thư mục tạm)')
+    parser.add_argument('--create-bucket', action='store_true', help='Tạo bucket nếu chưa có (s3/r2)')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--uploads', type=int, default=32)
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--image-workers', type=int, default=2, help='Process resize ảnh (0 = inline)')
+    parser.add_argument('--folder', default='books', choices=('books', 'banners'))
+    args = parser.parse_args()
+
+    local_dir = args.local_dir or tempfile.mkdtemp(prefix='bookstore-bench-media-')
+    options = {'root': local_dir} if args.backend == 'local' else {}
+    backend = configure_storage_backend(args.backend, **options)
+    health = backend.health_check(create_bucket=args.create_bucket or args.backend == 'local')
+    if not health['ok']:
+        raise SystemExit(f"Storage backend không sẵn sàng: {health.get('error')}")
+    configure_image_processor(max_workers=args.image_workers, max_queue=args.clients)
+
+    from app import app
+
+    try:
+        result = run(app, args)
+    finally:
+        if args.backend == 'local' and not args.local_dir:
+            shutil.rmtree(local_dir, ignore_errors=True)
+
+    print(f"backend={args.backend} clients={args.clients} image_workers={args.image_workers} "
+          f"image={args.width}x{args.height} (~{result['source_bytes'] // 1024} KB)")
+    print(f"{result['uploads']} uploads in {result['duration']:.2f}s -> {result['throughput']:.1f} uploads/s")
+    print(f"latency p50 {result['p50']:.0f} ms, p95 {result['p95']:.0f} ms, mean {result['mean']:.0f} ms")
+    print(f"status codes: {result['statuses']}")
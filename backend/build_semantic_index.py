@@ -0,0 +1,44 @@
+"""
+Script to rebuild the semantic search index (batch job)
+
+Workers cập nhật index tăng dần khi sách thay đổi nhưng giữ nguyên idf. Chạy định kỳ
+(ví dụ: cron mỗi đêm) để build lại toàn bộ và tính lại idf theo catalog hiện tại:
+    python build_semantic_index.py
+    python build_semantic_index.py --query "sách về tuổi thơ buồn"   # Build rồi thử tìm
+    python build_semantic_index.py --interval 86400                   # Chạy lặp trong một process riêng
+"""
+import argparse
+import time
+from config import Config
+from utils.semantic_search import build_semantic_index, semantic_search
+
+def run_once(query=None):
+    started = time.perf_counter()
+    index = build_semantic_index()
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"Built semantic index for {index.rows} books ({index.dimensions} dimensions) "
+          f"at {Config.SEMANTIC_INDEX_PATH} in {elapsed:.1f} ms")
+    if query:
+        started = time.perf_counter()
+        matches = semantic_search(query, limit=5)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Top {len(matches)} for {query!r} ({elapsed:.2f} ms):")
+        for book, score in matches:
+            print(f"  {score:.3f}  {book.title} - {book.author}")
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the semantic search index')
+    parser.add_argument('--query', default='', help='Run a search after building')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Repeat every N seconds (0 = run once)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        while True:
+            run_once(args.query)
+            if args.interval <= 0:
+                break
+            time.sleep(args.interval)
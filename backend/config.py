@@ -8,6 +8,7 @@ Tất cả environment variables được đọc từ .env file hoặc system en
 và được định nghĩa ở đây để dễ quản lý và maintain.
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -35,6 +36,50 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Số reverse proxy tin cậy đứng trước backend. IP client (request.remote_addr, dùng cho giới hạn
+    # đăng nhập theo IP) lấy từ X-Forwarded-For do các proxy này thêm vào.
+    # Mặc định 0 (docker-compose dev publish port 5000, client gọi thẳng backend nên X-Forwarded-For
+    # do client tự đặt, không tin được). Chỉ đặt 1 khi backend chạy sau nginx (frontend/nginx.conf)
+    # và port 5000 không publish ra ngoài
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+    
+    # ==================== Storage Backend Configuration ====================
+    # Nơi lưu ảnh upload: 'r2' (Cloudflare R2, mặc định), 's3' (S3-compatible, ví dụ MinIO)
+    # hoặc 'local' (thư mục LOCAL_STORAGE_DIR, serve qua /api/media - dev/test offline/benchmark)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'r2')
+    
+    # Backend 'local': thư mục lưu file và prefix của public URL
+    LOCAL_STORAGE_DIR = os.getenv(
+        'LOCAL_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media')
+    )
+    LOCAL_STORAGE_PUBLIC_URL = os.getenv('LOCAL_STORAGE_PUBLIC_URL', '/api/media')
+    
+    # Backend 's3': endpoint S3-compatible (ví dụ MinIO: http://localhost:9000, bỏ trống = AWS S3)
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+    S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY')
+    S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
+    S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+    
+    # Prefix của public URL (mặc định: <S3_ENDPOINT_URL>/<S3_BUCKET_NAME>, bucket cần cho phép đọc public)
+    S3_PUBLIC_BASE_URL = os.getenv('S3_PUBLIC_BASE_URL')
+    
+    # Kiểu địa chỉ bucket: 'path' (MinIO) hoặc 'virtual'
+    S3_ADDRESSING_STYLE = os.getenv('S3_ADDRESSING_STYLE', 'path')
+    
+    # Upload trực tiếp từ browser lên bucket (presigned): kích thước tối đa (byte), thời hạn URL (giây)
+    # và kiểu presign: 'put' (R2, S3, MinIO) hoặc 'post' (form policy, chỉ S3/MinIO)
+    # Bucket cần cấu hình CORS cho phép PUT/POST từ domain của frontend.
+    UPLOAD_DIRECT_MAX_SIZE = int(os.getenv('UPLOAD_DIRECT_MAX_SIZE', str(20 * 1024 * 1024)))
+    UPLOAD_PRESIGN_EXPIRES = int(os.getenv('UPLOAD_PRESIGN_EXPIRES', '600'))
+    UPLOAD_PRESIGN_METHOD = os.getenv('UPLOAD_PRESIGN_METHOD', 'put')
+    
+    # Job tạo bản resize sau upload trực tiếp (chạy nền, không chặn request complete): số job chạy
+    # đồng thời và số job tối đa chưa xong trong mỗi worker (mỗi job giữ ảnh gốc trong RAM khi chạy,
+    # quá giới hạn thì complete trả 503)
+    UPLOAD_COMPLETE_WORKERS = int(os.getenv('UPLOAD_COMPLETE_WORKERS', '1'))
+    UPLOAD_COMPLETE_MAX_PENDING = int(os.getenv('UPLOAD_COMPLETE_MAX_PENDING', '4'))
+    
     # ==================== Cloudflare R2 Storage Configuration ====================
     # R2 Account ID (Cloudflare Account ID)
     R2_ACCOUNT_ID = os.getenv('R2_ACCOUNT_ID')
@@ -51,6 +96,17 @@ class Config:
     # R2 Public Domain (Custom domain cho public URLs, ví dụ: cdn.duyne.me)
     R2_PUBLIC_DOMAIN = os.getenv('R2_PUBLIC_DOMAIN')
     
+    # Số connection tối đa tới R2 của mỗi worker (dùng chung cho mọi thread, upload_image mở
+    # song song một connection cho mỗi file ảnh gốc/resize). Các tuning R2_* dưới đây áp dụng cho cả backend 's3'.
+    R2_MAX_POOL_CONNECTIONS = int(os.getenv('R2_MAX_POOL_CONNECTIONS', '32'))
+    
+    # Số lần thử tối đa (gồm lần đầu) khi R2 lỗi tạm thời/throttle, retry mode "standard"
+    R2_MAX_ATTEMPTS = int(os.getenv('R2_MAX_ATTEMPTS', '3'))
+    
+    # Timeout kết nối và đọc response (giây)
+    R2_CONNECT_TIMEOUT = float(os.getenv('R2_CONNECT_TIMEOUT', '5'))
+    R2_READ_TIMEOUT = float(os.getenv('R2_READ_TIMEOUT', '30'))
+    
     # ==================== Logging Configuration ====================
     # Log level cho ứng dụng (debug, info, warning, error, critical)
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')
@@ -58,4 +114,158 @@ class Config:
     # ==================== Gemini AI Configuration ====================
     # Google Gemini Pro API Key (để tích hợp chatbot thông minh)
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    
+    # Model Gemini cho chatbot
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+    
+    # Cache phần system prompt cố định của chatbot bằng Gemini context caching (true/false)
+    # Prompt ngắn hơn mức tối thiểu của model sẽ bị Gemini từ chối cache -> tự gửi inline như bình thường
+    GEMINI_CONTEXT_CACHE = os.getenv('GEMINI_CONTEXT_CACHE', 'true').lower() == 'true'
+    
+    # Thời gian sống của cached content trên Gemini (giây), được tạo lại trước khi hết hạn
+    GEMINI_CONTEXT_CACHE_TTL = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', '3600'))
+    
+    # ==================== Admin Dashboard Configuration ====================
+    # Thời gian cache payload dashboard (giây), 0 để tắt cache
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '30'))
+    
+    # Số thread chạy song song các query của dashboard (mỗi thread dùng connection riêng)
+    DASHBOARD_MAX_WORKERS = int(os.getenv('DASHBOARD_MAX_WORKERS', '4'))
+    
+    # Ngưỡng tồn kho thấp hiển thị trên dashboard
+    DASHBOARD_LOW_STOCK_THRESHOLD = int(os.getenv('DASHBOARD_LOW_STOCK_THRESHOLD', '5'))
+    
+    # ==================== Password Hashing Configuration ====================
+    # bcrypt cost factor (log2 số vòng). Đổi giá trị này thì password cũ được rehash khi user đăng nhập
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    
+    # Số bcrypt chạy đồng thời trên toàn host, dùng chung cho mọi gunicorn worker (0 = không giới hạn)
+    BCRYPT_MAX_WORKERS = int(os.getenv('BCRYPT_MAX_WORKERS', '2'))
+    
+    # Số tác vụ bcrypt tối đa được xếp hàng chờ trên toàn host (ngoài các tác vụ đang chạy)
+    BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', '16'))
+    
+    # Thời gian tối đa chờ đến lượt chạy bcrypt (giây) trước khi trả lỗi "hệ thống bận"
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', '2'))
+    
+    # ==================== Image Derivatives Configuration ====================
+    # Các kích thước ảnh tạo ra khi upload (tên:chiều rộng tối đa px), mỗi kích thước có bản WebP và JPEG
+    IMAGE_DERIVATIVES = os.getenv('IMAGE_DERIVATIVES', 'thumbnail:160,card:360,detail:800')
+    
+    # Chất lượng encode (0-100)
+    IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '80'))
+    IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '82'))
+    
+    # Số pixel tối đa của ảnh upload (ảnh lớn hơn bị từ chối trước khi decode)
+    IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', '40000000'))
+    
+    # Số ảnh resize đồng thời trên toàn host, dùng chung cho mọi gunicorn worker (0 = chạy inline trên thread của request)
+    IMAGE_MAX_WORKERS = int(os.getenv('IMAGE_MAX_WORKERS', '2'))
+    
+    # Số ảnh tối đa được xếp hàng chờ trên toàn host, và thời gian chờ đến lượt resize (giây) trước khi trả 503
+    IMAGE_MAX_QUEUE = int(os.getenv('IMAGE_MAX_QUEUE', '8'))
+    IMAGE_QUEUE_TIMEOUT = float(os.getenv('IMAGE_QUEUE_TIMEOUT', '5'))
+    
+    # ==================== Login Rate Limit Configuration ====================
+    # Sliding window (giây) dùng để đếm số lần đăng nhập
+    LOGIN_RATE_LIMIT_WINDOW = int(os.getenv('LOGIN_RATE_LIMIT_WINDOW', '300'))
+    
+    # Số lần thử đăng nhập tối đa trong một window cho mỗi username / mỗi IP
+    LOGIN_MAX_ATTEMPTS_PER_USERNAME = int(os.getenv('LOGIN_MAX_ATTEMPTS_PER_USERNAME', '10'))
+    LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv('LOGIN_MAX_ATTEMPTS_PER_IP', '50'))
+    
+    # Số key (username/IP) tối đa được theo dõi cùng lúc (mỗi key 32 bytes shared memory)
+    LOGIN_RATE_LIMIT_SLOTS = int(os.getenv('LOGIN_RATE_LIMIT_SLOTS', '65536'))
+    
+    # ==================== User Cache Configuration ====================
+    # Thời gian cache thông tin user cho /api/me và kiểm tra quyền (giây)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+    
+    # Số user tối đa được cache trong mỗi worker process
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))
+    
+    # Số slot version dùng chung giữa các workers (mỗi slot 8 bytes shared memory)
+    USER_CACHE_VERSION_SLOTS = int(os.getenv('USER_CACHE_VERSION_SLOTS', '65536'))
+    
+    # ==================== Chatbot Configuration ====================
+    # Thời gian tối đa dùng lại snapshot context cửa hàng (giây). Snapshot cũng được build lại ngay khi catalog thay đổi
+    CHATBOT_CONTEXT_TTL = int(os.getenv('CHATBOT_CONTEXT_TTL', '300'))
+    
+    # Kích thước tối đa của snapshot context trong shared memory (bytes)
+    CHATBOT_CONTEXT_MAX_BYTES = int(os.getenv('CHATBOT_CONTEXT_MAX_BYTES', '262144'))
+    
+    # Ngân sách token (ước lượng) cho phần context gửi kèm mỗi câu hỏi: bestsellers, sách theo danh mục
+    # và thông tin sách cụ thể. Phần vượt ngân sách bị bỏ, ưu tiên giữ phần liên quan tới câu hỏi
+    CHATBOT_PROMPT_CONTEXT_TOKENS = int(os.getenv('CHATBOT_PROMPT_CONTEXT_TOKENS', '1000'))
+    
+    # Khi index title local không chắc chắn (chỉ khớp 1 từ hoặc tên tác giả), hỏi Gemini tên sách
+    CHATBOT_TITLE_LLM_FALLBACK = os.getenv('CHATBOT_TITLE_LLM_FALLBACK', 'true').lower() == 'true'
+    
+    # Thời gian sống của câu trả lời chatbot đã cache (giây). Cache bị xóa ngay khi catalog thay đổi
+    CHATBOT_ANSWER_CACHE_TTL = int(os.getenv('CHATBOT_ANSWER_CACHE_TTL', '3600'))
+    
+    # Số câu hỏi (đã chuẩn hóa) tối đa trong answer cache của mỗi worker (LRU)
+    CHATBOT_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('CHATBOT_ANSWER_CACHE_MAX_ENTRIES', '1000'))
+    
+    # File FAQ JSON cho chatbot (để trống = dùng FAQ built-in). File được tự reload khi thay đổi
+    CHATBOT_FAQ_FILE = os.getenv('CHATBOT_FAQ_FILE', '')
+    
+    # Chu kỳ kiểm tra file FAQ có thay đổi không (giây)
+    CHATBOT_FAQ_RELOAD_INTERVAL = float(os.getenv('CHATBOT_FAQ_RELOAD_INTERVAL', '5'))
+    
+    # Deadline của lời gọi Gemini trả lời câu hỏi / extract tên sách (giây)
+    CHATBOT_LLM_TIMEOUT = float(os.getenv('CHATBOT_LLM_TIMEOUT', '15'))
+    CHATBOT_TITLE_LLM_TIMEOUT = float(os.getenv('CHATBOT_TITLE_LLM_TIMEOUT', '3'))
+    
+    # Số lời gọi Gemini đồng thời tối đa mỗi worker (nhỏ hơn GUNICORN_THREADS để chatbot không chiếm hết worker)
+    CHATBOT_LLM_MAX_CONCURRENT = int(os.getenv('CHATBOT_LLM_MAX_CONCURRENT', '2'))
+    
+    # Thời gian chờ đến lượt gọi Gemini khi đã đủ CHATBOT_LLM_MAX_CONCURRENT (giây), quá hạn thì trả lời "đang bận"
+    CHATBOT_LLM_ACQUIRE_TIMEOUT = float(os.getenv('CHATBOT_LLM_ACQUIRE_TIMEOUT', '3'))
+    
+    # Circuit breaker: số lỗi Gemini liên tiếp để chuyển sang FAQ, và thời gian (giây) trước khi thử lại
+    CHATBOT_BREAKER_FAILURES = int(os.getenv('CHATBOT_BREAKER_FAILURES', '5'))
+    CHATBOT_BREAKER_RESET = float(os.getenv('CHATBOT_BREAKER_RESET', '30'))
+    
+    # Gộp các câu hỏi giống nhau (sau chuẩn hóa) đến cùng lúc: chỉ một request gọi Gemini, các request còn lại
+    # chờ (tối đa CHATBOT_COALESCE_TIMEOUT giây) và dùng chung câu trả lời
+    CHATBOT_COALESCE = os.getenv('CHATBOT_COALESCE', 'true').lower() == 'true'
+    CHATBOT_COALESCE_TIMEOUT = float(os.getenv('CHATBOT_COALESCE_TIMEOUT', '20'))
+    
+    # Gộp cả giữa các worker processes (flock + file kết quả trong CHATBOT_COALESCE_DIR, cần cùng máy)
+    CHATBOT_COALESCE_SHARED = os.getenv('CHATBOT_COALESCE_SHARED', 'false').lower() == 'true'
+    CHATBOT_COALESCE_DIR = os.getenv(
+        'CHATBOT_COALESCE_DIR', os.path.join(tempfile.gettempdir(), 'bookstore-chatbot-flights')
+    )
+    
+    # ==================== LLM Backend Configuration ====================
+    # Backend cho chatbot: 'gemini' (cần GEMINI_API_KEY) hoặc 'fake' (giả lập, không gọi network - dùng cho load test)
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+    
+    # Backend giả lập: độ trễ trước token đầu tiên (giây), tốc độ sinh token, số token mỗi câu trả lời, tỉ lệ lỗi (0..1)
+    LLM_FAKE_LATENCY = float(os.getenv('LLM_FAKE_LATENCY', '0.5'))
+    LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv('LLM_FAKE_TOKENS_PER_SECOND', '50'))
+    LLM_FAKE_ANSWER_TOKENS = int(os.getenv('LLM_FAKE_ANSWER_TOKENS', '80'))
+    LLM_FAKE_FAILURE_RATE = float(os.getenv('LLM_FAKE_FAILURE_RATE', '0'))
+    
+    # ==================== Recommendation Configuration ====================
+    # Số sách "thường được mua cùng" lưu cho mỗi sách (batch job refresh_related_books.py)
+    RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', '10'))
+    
+    # Số đơn hàng tối thiểu có cả hai sách để tính là "mua cùng" (tăng lên khi có nhiều đơn để lọc nhiễu)
+    RECOMMENDATIONS_MIN_CO_ORDERS = int(os.getenv('RECOMMENDATIONS_MIN_CO_ORDERS', '1'))
+    
+    # ==================== Book Search Configuration ====================
+    # Độ giống tối thiểu (word similarity 0..1, pg_trgm) để sách xuất hiện trong kết quả tìm kiếm gần đúng
+    BOOK_SEARCH_MIN_SIMILARITY = float(os.getenv('BOOK_SEARCH_MIN_SIMILARITY', '0.5'))
+    
+    # ==================== Semantic Search Configuration ====================
+    # File index vector của sách (mmap, dùng chung giữa các workers). Build lại định kỳ bằng build_semantic_index.py
+    SEMANTIC_INDEX_PATH = os.getenv('SEMANTIC_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'bookstore-semantic-index.bin'))
+    
+    # Số chiều vector (hashing trick). Mỗi sách tốn 4 bytes x số chiều
+    SEMANTIC_SEARCH_DIMENSIONS = int(os.getenv('SEMANTIC_SEARCH_DIMENSIONS', '2048'))
+    
+    # Cosine similarity tối thiểu để sách xuất hiện trong kết quả tìm theo mô tả
+    SEMANTIC_SEARCH_MIN_SCORE = float(os.getenv('SEMANTIC_SEARCH_MIN_SCORE', '0.1'))
 
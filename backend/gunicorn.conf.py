@@ -28,7 +28,10 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# gthread: mỗi worker xử lý nhiều request bằng thread, nên một stream chatbot (SSE)
+# đang mở không giữ cả worker như worker "sync"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
 worker_connections = 1000
 timeout = 120
 keepalive = 5
@@ -56,3 +59,6 @@ graceful_timeout = 30
 # Enable preload app for better performance
 preload_app = True
 
+# Gửi file (ảnh của storage backend 'local', /api/media) bằng sendfile() thay vì đọc vào worker
+sendfile = True
+
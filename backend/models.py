@@ -13,6 +13,7 @@ Các models trong file này:
 - Order: Quản lý đơn hàng
 - OrderItem: Quản lý chi tiết từng item trong đơn hàng
 - Banner: Quản lý banner quảng cáo
+- CustomerStats: Projection thống kê theo khách hàng (số đơn, doanh thu, đơn gần nhất)
 
 Dependencies:
 - flask_sqlalchemy: ORM framework để tương tác với database
@@ -20,12 +21,22 @@ Dependencies:
 - datetime: Quản lý timestamp (created_at, updated_at)
 """
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, event, inspect, text
 from datetime import datetime
 
 # Khởi tạo SQLAlchemy instance để sử dụng trong toàn bộ ứng dụng
 db = SQLAlchemy()
 
+# Ngưỡng tồn kho của partial index ix_books_low_stock. Query low-stock chỉ dùng được
+# index khi threshold <= giá trị này (xem GET /api/admin/inventory/low-stock)
+LOW_STOCK_INDEX_MAX = 50
+
+def _has_pg_trgm(ddl, target, bind, **kw):
+    """Chỉ tạo trigram index khi extension pg_trgm đã được cài (xem utils.schema.ensure_extensions)"""
+    return bind is not None and bind.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).first() is not None
+
 class User(db.Model):
     """
     Model cho bảng Users
@@ -101,30 +112,15 @@ class User(db.Model):
         """
         Tạo mã khách hàng mới theo format KH001, KH002, KH003, ...
         
-        Flow:
-        1. Query user có customer_code lớn nhất
-        2. Lấy số cuối cùng từ customer_code (ví dụ: KH001 -> 1)
-        3. Tăng lên 1 và format lại thành KH002, KH003, ...
-        4. Nếu chưa có customer nào, bắt đầu từ KH001
+        Mã được cấp từ sequence customer_code_seq (xem utils/codes.py):
+        một round trip, không bị trùng khi nhiều khách đăng ký đồng thời.
         
         Returns:
             str: Mã khách hàng mới (ví dụ: "KH001", "KH002")
         """
-        # Bước 1: Tìm customer có mã lớn nhất
-        last_customer = User.query.filter(
-            User.customer_code.isnot(None)
-        ).order_by(User.customer_code.desc()).first()
-        
-        # Bước 2-3: Tăng số lên 1
-        if last_customer and last_customer.customer_code:
-            last_num = int(last_customer.customer_code[2:])  # Lấy số từ "KH001" -> 1
-            new_num = last_num + 1
-        else:
-            # Bước 4: Nếu chưa có, bắt đầu từ 1
-            new_num = 1
-        
-        # Format: KH001, KH002, ...
-        return f'KH{new_num:03d}'
+        # Import here to avoid circular dependency (utils.codes import db từ models)
+        from utils.codes import CUSTOMER_CODES
+        return CUSTOMER_CODES.next()
     
 
 class Book(db.Model):
@@ -144,12 +140,18 @@ class Book(db.Model):
     - price: Giá bán
     - stock: Số lượng tồn kho
     - image_url: URL hình ảnh sách
+    - image_srcset: Các bản resize của ảnh {tên: {'width', 'height', 'webp', 'jpeg'}, 'original': {...}}
     - publisher: Nhà xuất bản
     - publish_date: Ngày xuất bản
     - distributor: Nhà phát hành
     - dimensions: Kích thước (cm)
     - pages: Số trang
     - weight: Trọng lượng (gram)
+    - sales_velocity: Số lượng bán trung bình mỗi ngày (30 ngày gần nhất), tính bởi batch job
+    - sales_velocity_updated_at: Thời điểm batch job tính sales_velocity lần cuối
+    - related_books: Top-K sách thường được mua cùng [{'id', 'co_orders', 'score'}], tính bởi batch job
+    - related_books_updated_at: Thời điểm batch job tính related_books lần cuối
+    - search_text: Title + author đã chuẩn hóa (không dấu) cho tìm kiếm gần đúng, tự cập nhật khi lưu sách
     - created_at, updated_at: Timestamps
     
     Relationships:
@@ -158,9 +160,26 @@ class Book(db.Model):
     
     Methods:
     - get_sold_count(): Tính số lượng đã bán từ OrderItem (chỉ tính order completed)
-    - to_dict(): Chuyển đổi model thành dictionary (bao gồm sold count)
+    - get_sold_counts(book_ids): Số lượng đã bán của nhiều sách trong một query (dùng cho danh sách)
+    - to_dict(sold=None): Chuyển đổi model thành dictionary (bao gồm sold count)
     """
     __tablename__ = 'books'
+    __table_args__ = (
+        # Prefix index cho LIKE 'base-%' khi resolve slug unique (xem resolve_unique_values)
+        db.Index('ix_books_slug_prefix', 'slug', postgresql_ops={'slug': 'varchar_pattern_ops'}),
+        # Partial index chỉ chứa sách tồn kho thấp (nhỏ, rẻ để maintain) cho báo cáo low-stock
+        db.Index(
+            'ix_books_low_stock', 'stock',
+            postgresql_where=db.text(f'stock <= {LOW_STOCK_INDEX_MAX}'),
+            sqlite_where=db.text(f'stock <= {LOW_STOCK_INDEX_MAX}')
+        ),
+        # Trigram GIN index cho tìm kiếm gần đúng (PostgreSQL + pg_trgm, xem utils.book_search)
+        db.Index(
+            'ix_books_search_trgm', 'search_text',
+            postgresql_using='gin',
+            postgresql_ops={'search_text': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql', callable_=_has_pg_trgm),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
@@ -177,6 +196,7 @@ class Book(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False)
     stock = db.Column(db.Integer, default=0, nullable=False)
     image_url = db.Column(db.String(500), nullable=True)
+    image_srcset = db.Column(db.JSON, nullable=True)  # Bản resize WebP/JPEG tạo khi upload (utils.images)
     
     # Thông tin chi tiết
     publisher = db.Column(db.String(200), nullable=True)  # Nhà xuất bản
@@ -186,6 +206,17 @@ class Book(db.Model):
     pages = db.Column(db.Integer, nullable=True)  # Số trang
     weight = db.Column(db.Integer, nullable=True)  # Trọng lượng (gram)
     
+    # Thống kê tồn kho (cập nhật định kỳ bởi utils.inventory.refresh_sales_velocity)
+    sales_velocity = db.Column(db.Float, default=0, server_default='0', nullable=False)  # Số lượng bán/ngày
+    sales_velocity_updated_at = db.Column(db.DateTime, nullable=True)
+    
+    # Gợi ý mua cùng (cập nhật định kỳ bởi utils.recommendations.refresh_related_books)
+    related_books = db.Column(db.JSON, nullable=True)  # [{'id', 'co_orders', 'score'}] sắp xếp theo score giảm dần
+    related_books_updated_at = db.Column(db.DateTime, nullable=True)
+    
+    # Title + author đã chuẩn hóa cho tìm kiếm gần đúng (cập nhật bởi _set_book_search_text)
+    search_text = db.Column(db.Text, nullable=True)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -221,17 +252,46 @@ class Book(db.Model):
         # Bước 4: Trả về số lượng (0 nếu None)
         return int(total) if total else 0
     
-    def to_dict(self):
+    @staticmethod
+    def get_sold_counts(book_ids):
+        """
+        Tính số lượng đã bán của nhiều sách bằng một query GROUP BY (thay vì get_sold_count() từng sách)
+        
+        Args:
+            book_ids (iterable): Danh sách book id
+        
+        Returns:
+            dict: book_id -> số lượng đã bán (0 với sách chưa bán được)
+        """
+        from models import OrderItem, Order
+        
+        book_ids = set(book_ids)
+        if not book_ids:
+            return {}
+        rows = db.session.query(OrderItem.book_id, func.sum(OrderItem.quantity)).join(
+            Order, OrderItem.order_id == Order.id
+        ).filter(
+            OrderItem.book_id.in_(book_ids),
+            Order.status == 'completed'
+        ).group_by(OrderItem.book_id).all()
+        sold_counts = dict.fromkeys(book_ids, 0)
+        sold_counts.update({book_id: int(total or 0) for book_id, total in rows})
+        return sold_counts
+    
+    def to_dict(self, sold=None):
         """
         Chuyển đổi model thành dictionary để trả về JSON response
         
         Flow:
         1. Tạo dictionary với tất cả fields
         2. Convert price từ Decimal sang float
-        3. Tính số lượng đã bán bằng get_sold_count()
+        3. Tính số lượng đã bán bằng get_sold_count() (nếu caller chưa tính sẵn)
         4. Convert datetime sang ISO format string
         5. Trả về dictionary
         
+        Args:
+            sold (int): Số lượng đã bán đã tính sẵn (get_sold_counts), None để tự query
+        
         Returns:
             dict: Dictionary chứa thông tin sách (bao gồm sold count)
         """
@@ -246,17 +306,30 @@ class Book(db.Model):
             'price': float(self.price),  # Convert Decimal sang float
             'stock': self.stock,
             'image_url': self.image_url,
+            'image_srcset': self.image_srcset,
             'publisher': self.publisher,
             'publish_date': self.publish_date,
             'distributor': self.distributor,
             'dimensions': self.dimensions,
             'pages': self.pages,
             'weight': self.weight,
-            'sold': self.get_sold_count(),  # Tính số lượng đã bán
+            'sold': self.get_sold_count() if sold is None else sold,  # Tính số lượng đã bán
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+@event.listens_for(Book, 'before_insert')
+@event.listens_for(Book, 'before_update')
+def _set_book_search_text(mapper, connection, target):
+    """Cập nhật search_text khi thêm sách hoặc sửa title/author"""
+    state = inspect(target)
+    if (target.search_text is None
+            or state.attrs.title.history.has_changes()
+            or state.attrs.author.history.has_changes()):
+        # Import here to avoid circular dependency (utils.book_search import models)
+        from utils.book_search import normalize_search_text
+        target.search_text = normalize_search_text(f"{target.title} {target.author}")
+
 class Category(db.Model):
     """
     Model cho bảng Categories
@@ -277,6 +350,11 @@ class Category(db.Model):
     - to_dict(): Chuyển đổi model thành dictionary
     """
     __tablename__ = 'categories'
+    __table_args__ = (
+        # Prefix index cho LIKE 'base-%' / 'BASE\_%' khi resolve slug/key unique
+        db.Index('ix_categories_slug_prefix', 'slug', postgresql_ops={'slug': 'varchar_pattern_ops'}),
+        db.Index('ix_categories_key_prefix', 'key', postgresql_ops={'key': 'varchar_pattern_ops'}),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
@@ -516,6 +594,7 @@ class Banner(db.Model):
     - title: Tiêu đề banner
     - description: Mô tả banner
     - image_url: URL hình ảnh banner
+    - image_srcset: Các bản resize của ảnh (giống Book.image_srcset)
     - link: Link khi click vào banner (optional, có thể là internal route hoặc external URL)
     - bg_color: Màu nền (hex color, default: #6366f1 - primary color)
     - text_color: Màu chữ (hex color, default: #ffffff - white)
@@ -539,6 +618,7 @@ class Banner(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     image_url = db.Column(db.String(500), nullable=True)  # Optional - can be empty for text-only banners
+    image_srcset = db.Column(db.JSON, nullable=True)  # Bản resize WebP/JPEG tạo khi upload (utils.images)
     link = db.Column(db.String(500))  # Optional link khi click vào banner (internal route hoặc external URL)
     
     # Styling
@@ -572,6 +652,7 @@ class Banner(db.Model):
             'title': self.title,
             'description': self.description,
             'image_url': self.image_url,
+            'image_srcset': self.image_srcset,
             'link': self.link,
             'bg_color': self.bg_color,
             'text_color': self.text_color,
@@ -582,3 +663,53 @@ class Banner(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
 
+class CustomerStats(db.Model):
+    """
+    Model cho bảng customer_stats (projection)
+    
+    Mục đích:
+    Lưu sẵn các chỉ số theo khách hàng để trang quản lý khách hàng không phải
+    aggregate bảng orders cho từng dòng. Được cập nhật khi có sự kiện đơn hàng
+    (tạo đơn, đổi trạng thái) - xem utils/customer_stats.py.
+    
+    Fields:
+    - user_id: Primary key, Foreign key đến User
+    - order_count: Tổng số đơn hàng đã đặt
+    - completed_revenue: Tổng tiền các đơn đã hoàn thành (completed)
+    - last_order_at: Thời gian đặt đơn gần nhất
+    - updated_at: Thời gian cập nhật projection
+    
+    Methods:
+    - to_dict(): Chuyển đổi model thành dictionary
+    """
+    __tablename__ = 'customer_stats'
+    __table_args__ = (
+        # Index cho sort/filter trong danh sách khách hàng
+        db.Index('ix_customer_stats_order_count', 'order_count'),
+        db.Index('ix_customer_stats_completed_revenue', 'completed_revenue'),
+        db.Index('ix_customer_stats_last_order_at', 'last_order_at'),
+    )
+    
+    # Primary key (1-1 với users)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    
+    # Các chỉ số
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    last_order_at = db.Column(db.DateTime, nullable=True)
+    
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """
+        Chuyển đổi model thành dictionary để trả về JSON response
+        
+        Returns:
+            dict: Dictionary chứa các chỉ số của khách hàng
+        """
+        return {
+            'order_count': self.order_count,
+            'completed_revenue': float(self.completed_revenue or 0),  # Convert Decimal sang float
+            'last_order_at': self.last_order_at.isoformat() if self.last_order_at else None
+        }
@@ -0,0 +1,39 @@
+"""
+Script to refresh books.related_books (batch job)
+
+Chạy định kỳ (ví dụ: cron mỗi đêm) để tính lại gợi ý "thường được mua cùng" từ order_items,
+dùng cho GET /api/books/<id>/related và chatbot:
+    python refresh_related_books.py
+    python refresh_related_books.py --top-k 20 --min-co-orders 2
+    python refresh_related_books.py --interval 86400   # Chạy lặp trong một process riêng
+"""
+import argparse
+import time
+from config import Config
+from utils.recommendations import refresh_related_books
+
+def run_once(top_k, min_co_orders):
+    started = time.perf_counter()
+    updated = refresh_related_books(top_k=top_k, min_co_orders=min_co_orders)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"Refreshed related_books for {updated} books (top {top_k}, >= {min_co_orders} co-orders) in {elapsed:.1f} ms")
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh books.related_books')
+    parser.add_argument('--top-k', type=int, default=Config.RECOMMENDATIONS_TOP_K,
+                        help='Number of related books to keep per book')
+    parser.add_argument('--min-co-orders', type=int, default=Config.RECOMMENDATIONS_MIN_CO_ORDERS,
+                        help='Minimum number of orders containing both books')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Repeat every N seconds (0 = run once)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        while True:
+            run_once(args.top_k, args.min_co_orders)
+            if args.interval <= 0:
+                break
+            time.sleep(args.interval)
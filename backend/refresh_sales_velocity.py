@@ -0,0 +1,35 @@
+"""
+Script to refresh books.sales_velocity (batch job)
+
+Chạy định kỳ (ví dụ: cron mỗi giờ) để cập nhật số lượng bán trung bình/ngày
+dùng cho báo cáo GET /api/admin/inventory/low-stock:
+    python refresh_sales_velocity.py
+    python refresh_sales_velocity.py --interval 3600   # Chạy lặp trong một process riêng
+"""
+import argparse
+import time
+from utils.inventory import refresh_sales_velocity, SALES_VELOCITY_WINDOW_DAYS
+
+def run_once(window_days):
+    started = time.perf_counter()
+    updated = refresh_sales_velocity(window_days=window_days)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"Refreshed sales_velocity for {updated} books ({window_days}-day window) in {elapsed:.1f} ms")
+
+# For standalone execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh books.sales_velocity')
+    parser.add_argument('--window-days', type=int, default=SALES_VELOCITY_WINDOW_DAYS,
+                        help='Number of days to average sales over')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Repeat every N seconds (0 = run once)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        while True:
+            run_once(args.window_days)
+            if args.interval <= 0:
+                break
+            time.sleep(args.interval)
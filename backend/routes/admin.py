@@ -17,24 +17,46 @@ Các endpoint trong file này:
 - GET /api/admin/orders: Lấy tất cả đơn hàng (chỉ admin, không cho editor)
 - PUT /api/admin/orders/<id>/status: Cập nhật trạng thái đơn hàng
 - GET /api/admin/statistics: Lấy thống kê (chỉ admin)
+- GET /api/admin/dashboard: Lấy toàn bộ dữ liệu trang Dashboard trong một request (chỉ admin)
+- GET /api/admin/inventory/low-stock: Báo cáo sách sắp hết hàng kèm số ngày còn đủ hàng (chỉ admin)
+- GET /api/admin/chatbot/cache-stats: Metrics answer cache của chatbot, theo từng worker (chỉ admin)
+- DELETE /api/admin/chatbot/cache: Xóa answer cache của chatbot ở mọi worker (chỉ admin)
 
 Dependencies:
 - models.User: Model cho bảng users
 - models.Order: Model cho bảng orders
 - models.OrderItem: Model cho bảng order_items
 - models.Book: Model cho bảng books
-- utils.helpers: admin_required, moderator_required, super_admin_required decorators, check_password, hash_password, validate_email
+- models.CustomerStats: Projection thống kê theo khách hàng (sort/filter danh sách khách hàng)
+- utils.helpers: admin_required, moderator_required, super_admin_required decorators, check_password, hash_password, password_needs_rehash, validate_email
+- utils.passwords: PasswordHasherBusy khi hàng đợi bcrypt đầy (trả 503)
+- utils.rate_limit: Giới hạn số lần đăng nhập theo username/IP (trả 429)
+- utils.user_cache: Invalidate cache user khi cập nhật thông tin/trạng thái
+- utils.customer_stats: Cập nhật projection khi đổi trạng thái đơn hàng
+- utils.dashboard: Gom dữ liệu dashboard (query song song + cache TTL)
+- utils.inventory: Ước tính số ngày còn đủ hàng từ sales_velocity
+- utils.answer_cache: Metrics answer cache của chatbot
 - sqlalchemy: Để query và aggregate
 """
 from flask import Blueprint, request, jsonify, session
-from models import User, Order, OrderItem, Book, db
-from utils.helpers import admin_required, super_admin_required, moderator_required, check_password, hash_password, validate_email
+from models import User, Order, OrderItem, Book, CustomerStats, db, LOW_STOCK_INDEX_MAX
+from utils.helpers import admin_required, super_admin_required, moderator_required, check_password, hash_password, password_needs_rehash, validate_email
+from utils.passwords import PasswordHasherBusy
+from utils.rate_limit import login_rate_limit
+from utils.user_cache import invalidate_user
+from utils.customer_stats import record_order_status_change
+from utils.dashboard import get_dashboard
+from utils.inventory import days_of_cover
+from utils.answer_cache import get_answer_cache
+from config import Config
 from sqlalchemy import func, desc
 from sqlalchemy.orm import joinedload
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/admin/login', methods=['POST'])
+@login_rate_limit
 def admin_login():
     """
     Đăng nhập admin (chỉ cho phép tài khoản có role='admin')
@@ -46,13 +68,16 @@ def admin_login():
     4. Kiểm tra user có role='admin' không
     5. Kiểm tra password có khớp không
     6. Kiểm tra tài khoản có bị khóa không (is_active)
-    7. Tạo session để lưu thông tin đăng nhập
-    8. Trả về thông tin user
+    7. Rehash password nếu cost factor bcrypt đã thay đổi
+    8. Tạo session để lưu thông tin đăng nhập
+    9. Trả về thông tin user
     
     Returns:
         - 200: Đăng nhập thành công
         - 400: Thiếu thông tin
         - 401: Username/password không đúng, không phải admin, hoặc tài khoản bị khóa
+        - 429: Quá nhiều lần đăng nhập (theo username hoặc IP)
+        - 503: Hệ thống đang bận (hàng đợi bcrypt đầy)
         - 500: Lỗi server
     """
     try:
@@ -90,18 +115,27 @@ def admin_login():
         if not user.is_active:
             return jsonify({'error': 'Tài khoản đã bị khóa'}), 401
         
-        # Bước 7: Tạo session để lưu thông tin đăng nhập
+        # Bước 7: Rehash password với cost factor hiện tại (chỉ khi Config.BCRYPT_ROUNDS thay đổi)
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        
+        # Bước 8: Tạo session để lưu thông tin đăng nhập
         session['user_id'] = user.id
         session['username'] = user.username
         session['user_role'] = user.role
         
-        # Bước 8: Trả về thông tin user
+        # Bước 9: Trả về thông tin user
         return jsonify({
             'message': 'Đăng nhập thành công',
             'user': user.to_dict()
         }), 200
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Lỗi đăng nhập: {str(e)}'}), 500
 
 @admin_bp.route('/admin/users', methods=['GET'])
@@ -114,16 +148,22 @@ def get_users():
                           Nếu không có, mặc định trả về admin (chỉ super admin)
         - page (int): Số trang (default: 1)
         - per_page (int): Số items mỗi trang (default: 20)
+        Chỉ áp dụng khi role=customer (dựa trên projection customer_stats):
+        - sort_by (str): created_at|order_count|completed_revenue|last_order_at (default: created_at)
+        - order (str): asc|desc (default: desc)
+        - min_orders (int): Lọc khách có số đơn >= min_orders
+        - min_revenue (float): Lọc khách có doanh thu completed >= min_revenue
+        - last_order_from (str): Lọc khách có đơn gần nhất từ ngày này (YYYY-MM-DD)
     
     Flow:
     1. Lấy query parameters (role, page, per_page)
     2. Kiểm tra quyền truy cập:
        - Nếu role=customer: chỉ admin được phép
        - Nếu không có role: chỉ super admin được phép (super_admin_required)
-    3. Query users theo role filter
-    4. Sắp xếp theo created_at giảm dần (mới nhất trước)
+    3. Query users theo role filter (customer: join customer_stats để sort/filter theo chỉ số)
+    4. Sắp xếp theo sort_by (mặc định created_at giảm dần)
     5. Thực hiện pagination
-    6. Trả về danh sách users với thông tin pagination
+    6. Trả về danh sách users với thông tin pagination (customer có thêm 'stats')
     
     Returns:
         - 200: Danh sách users với pagination info
@@ -144,8 +184,57 @@ def get_users():
             user_role = session.get('user_role')
             if user_role not in ['admin', 'moderator']:
                 return jsonify({'error': 'Chỉ Admin và Moderator mới có quyền quản lý khách hàng'}), 403
-            # Query customers
-            query = User.query.filter_by(role='customer').order_by(User.created_at.desc())
+            # Query customers kèm projection customer_stats (không aggregate orders theo từng dòng)
+            # Mọi khách hàng đều có dòng customer_stats (tạo lúc đăng ký/backfill) nên inner join
+            # và filter/sort thẳng trên cột có index ix_customer_stats_*
+            query = db.session.query(User, CustomerStats).join(
+                CustomerStats, CustomerStats.user_id == User.id
+            ).filter(User.role == 'customer')
+            order_count = CustomerStats.order_count
+            completed_revenue = CustomerStats.completed_revenue
+            
+            # Filter theo chỉ số
+            min_orders = request.args.get('min_orders', type=int)
+            if min_orders is not None:
+                query = query.filter(order_count >= min_orders)
+            min_revenue = request.args.get('min_revenue', type=float)
+            if min_revenue is not None:
+                query = query.filter(completed_revenue >= min_revenue)
+            last_order_from = request.args.get('last_order_from', '').strip()
+            if last_order_from:
+                try:
+                    query = query.filter(CustomerStats.last_order_at >= datetime.strptime(last_order_from, '%Y-%m-%d'))
+                except ValueError:
+                    return jsonify({'error': 'last_order_from phải có định dạng YYYY-MM-DD'}), 400
+            
+            # Sắp xếp theo chỉ số
+            sort_columns = {
+                'created_at': User.created_at,
+                'order_count': order_count,
+                'completed_revenue': completed_revenue,
+                'last_order_at': CustomerStats.last_order_at
+            }
+            sort_column = sort_columns.get(request.args.get('sort_by', 'created_at'), User.created_at)
+            if request.args.get('order', 'desc') == 'asc':
+                query = query.order_by(sort_column.asc().nullsfirst(), User.id.asc())
+            else:
+                query = query.order_by(sort_column.desc().nullslast(), User.id.desc())
+            
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            
+            users = []
+            for user, stats in pagination.items:
+                user_dict = user.to_dict()
+                user_dict['stats'] = stats.to_dict()
+                users.append(user_dict)
+            
+            return jsonify({
+                'users': users,
+                'total': pagination.total,
+                'page': page,
+                'per_page': per_page,
+                'pages': pagination.pages
+            }), 200
         else:
             # Mặc định: chỉ trả về admin (chỉ super admin)
             if 'user_id' not in session:
@@ -307,6 +396,8 @@ def update_admin_user(user_id):
             user.password_hash = hash_password(password)
         
         db.session.commit()
+        # Invalidate cache user trên tất cả workers
+        invalidate_user(user.id)
         
         # Bước 7: Trả về thông tin user đã cập nhật
         return jsonify({
@@ -389,6 +480,8 @@ def update_user_status(user_id):
         # Bước 8-9: Cập nhật và lưu
         user.is_active = bool(is_active)
         db.session.commit()
+        # Bump version để user bị khóa bị chặn ngay trên tất cả workers
+        invalidate_user(user.id)
         
         # Bước 8: Trả về thông tin user
         return jsonify({
@@ -492,9 +585,11 @@ def update_order_status(order_id):
         if not order:
             return jsonify({'error': 'Đơn hàng không tồn tại'}), 404
         
-        # Bước 6-7: Cập nhật và lưu
+        # Bước 6-7: Cập nhật và lưu (cập nhật customer_stats trong cùng transaction)
+        old_status = order.status
         if status:
             order.status = status
+            record_order_status_change(order, old_status)
         if payment_status:
             order.payment_status = payment_status
         db.session.commit()
@@ -601,3 +696,160 @@ def get_statistics():
         
     except Exception as e:
         return jsonify({'error': f'Lỗi lấy thống kê: {str(e)}'}), 500
+
+@admin_bp.route('/admin/dashboard', methods=['GET'])
+@moderator_required
+def get_admin_dashboard():
+    """
+    Lấy toàn bộ dữ liệu trang Dashboard admin trong một request
+    
+    Thay cho việc frontend gọi riêng statistics, orders và books: các query đọc độc lập
+    được chạy song song (mỗi query một connection) và kết quả được cache ngắn hạn.
+    
+    Query Parameters:
+        - refresh (bool): 'true' để bỏ qua cache (default: false)
+    
+    Flow:
+    1. Đọc query param refresh
+    2. Lấy payload từ utils.dashboard (cache hoặc chạy song song các sections)
+    3. Trả về payload kèm cờ cached
+    
+    Returns:
+        - 200: Object dashboard với các thông tin:
+            - kpis: Doanh thu, số đơn theo trạng thái, số khách hàng, số sách
+            - recent_orders: Các đơn hàng mới nhất (kèm thông tin khách hàng)
+            - low_stock: Sách sắp hết hàng
+            - top_sellers: Top sách bán chạy
+            - timings_ms: Thời gian chạy của từng section và tổng
+            - generated_at: Thời điểm tính payload
+            - cached: True nếu lấy từ cache
+        - 403: Không có quyền truy cập
+        - 500: Lỗi server
+    """
+    try:
+        # Bước 1: Đọc query param
+        force_refresh = request.args.get('refresh', 'false').lower() == 'true'
+        
+        # Bước 2: Lấy payload
+        payload, cached = get_dashboard(force_refresh=force_refresh)
+        
+        # Bước 3: Trả về payload
+        return jsonify({**payload, 'cached': cached}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi lấy dữ liệu dashboard: {str(e)}'}), 500
+
+@admin_bp.route('/admin/inventory/low-stock', methods=['GET'])
+@moderator_required
+def get_low_stock_report():
+    """
+    Báo cáo sách sắp hết hàng (stock <= threshold)
+    
+    Query dùng partial index ix_books_low_stock (chỉ chứa sách có stock <= LOW_STOCK_INDEX_MAX)
+    nên không phải scan toàn bộ bảng books. sales_velocity được tính sẵn bởi batch job
+    (refresh_sales_velocity.py), endpoint chỉ đọc cột có sẵn.
+    
+    Query Parameters:
+        - threshold (int): Ngưỡng tồn kho (default: DASHBOARD_LOW_STOCK_THRESHOLD, tối đa LOW_STOCK_INDEX_MAX)
+        - page (int): Số trang (default: 1)
+        - per_page (int): Số items mỗi trang (default: 20)
+    
+    Flow:
+    1. Lấy và validate query parameters
+    2. Query sách có stock <= threshold, ít hàng nhất trước
+    3. Tính days_of_cover (stock / sales_velocity) cho từng sách
+    4. Trả về danh sách kèm pagination info
+    
+    Returns:
+        - 200: Danh sách sách với stock, sales_velocity, days_of_cover
+        - 400: threshold không hợp lệ
+        - 403: Không có quyền truy cập
+        - 500: Lỗi server
+    """
+    try:
+        # Bước 1: Lấy và validate query parameters
+        threshold = request.args.get('threshold', Config.DASHBOARD_LOW_STOCK_THRESHOLD, type=int)
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        
+        if threshold is None or threshold < 0 or threshold > LOW_STOCK_INDEX_MAX:
+            return jsonify({'error': f'threshold phải là số nguyên từ 0 đến {LOW_STOCK_INDEX_MAX}'}), 400
+        
+        # Bước 2: Query sách tồn kho thấp
+        query = Book.query.filter(Book.stock <= threshold).order_by(Book.stock.asc(), Book.id.asc())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        # Bước 3: Tính days_of_cover
+        books = [
+            {
+                'id': book.id,
+                'book_code': book.book_code,
+                'title': book.title,
+                'author': book.author,
+                'category': book.category,
+                'image_url': book.image_url,
+                'stock': book.stock,
+                'sales_velocity': book.sales_velocity,
+                'days_of_cover': days_of_cover(book.stock, book.sales_velocity),
+                'sales_velocity_updated_at': book.sales_velocity_updated_at.isoformat() if book.sales_velocity_updated_at else None
+            }
+            for book in pagination.items
+        ]
+        
+        # Bước 4: Trả về danh sách kèm pagination info
+        return jsonify({
+            'books': books,
+            'threshold': threshold,
+            'total': pagination.total,
+            'page': page,
+            'per_page': per_page,
+            'pages': pagination.pages
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi lấy báo cáo tồn kho: {str(e)}'}), 500
+
+@admin_bp.route('/admin/chatbot/cache-stats', methods=['GET'])
+@moderator_required
+def get_chatbot_cache_stats():
+    """
+    Lấy metrics answer cache của chatbot
+    
+    Metrics là của worker process xử lý request (mỗi gunicorn worker có cache riêng),
+    response có scope='worker' và pid của worker đó.
+    Chỉ đọc, không thay đổi cache (xóa cache dùng DELETE /api/admin/chatbot/cache).
+    
+    Returns:
+        - 200: hits, misses, expired, evictions, purges, hit_rate, size, max_entries, ttl, scope, pid, generation
+        - 403: Không có quyền truy cập
+        - 500: Lỗi server
+    """
+    try:
+        return jsonify(get_answer_cache().stats()), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi lấy thống kê cache chatbot: {str(e)}'}), 500
+
+@admin_bp.route('/admin/chatbot/cache', methods=['DELETE'])
+@moderator_required
+def clear_chatbot_cache():
+    """
+    Xóa answer cache của chatbot
+    
+    Tăng cache generation dùng chung: worker xử lý request xóa ngay, các worker khác
+    tự xóa cache riêng của mình ở lần truy cập tiếp theo.
+    
+    Returns:
+        - 200: Metrics (của worker xử lý request) trước khi xóa
+        - 403: Không có quyền truy cập
+        - 500: Lỗi server
+    """
+    try:
+        answer_cache = get_answer_cache()
+        stats = answer_cache.stats()
+        answer_cache.clear()
+        
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi xóa cache chatbot: {str(e)}'}), 500
@@ -13,12 +13,23 @@ Các endpoint trong file này:
 
 Dependencies:
 - models.User: Model cho bảng users
-- utils.helpers: Các hàm helper (hash_password, check_password, validate_email, validate_password)
+- utils.helpers: Các hàm helper (hash_password, check_password, password_needs_rehash, validate_email, validate_password, unique_violation_column)
+- utils.codes: CUSTOMER_CODES (mã khách hàng cấp từ sequence ngay trong câu INSERT)
+- utils.passwords: PasswordHasherBusy khi hàng đợi bcrypt đầy (trả 503)
+- utils.rate_limit: Giới hạn số lần đăng nhập theo username/IP (trả 429)
+- utils.user_cache: Cache thông tin user cho /me (invalidate khi cập nhật profile)
 - flask.session: Quản lý session
 """
 from flask import Blueprint, request, jsonify, session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from models import User, db
-from utils.helpers import hash_password, check_password, validate_email, validate_password, login_required
+from utils.helpers import hash_password, check_password, password_needs_rehash, validate_email, validate_password, login_required, unique_violation_column
+from utils.codes import CUSTOMER_CODES
+from utils.customer_stats import record_customer_registered
+from utils.passwords import PasswordHasherBusy
+from utils.rate_limit import login_rate_limit
+from utils.user_cache import get_cached_user, invalidate_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -30,15 +41,18 @@ def register():
     Flow:
     1. Nhận dữ liệu từ request (username, email, password, full_name)
     2. Validate dữ liệu (kiểm tra đầy đủ, email hợp lệ, password >= 6 ký tự)
-    3. Kiểm tra username và email đã tồn tại chưa
-    4. Hash password bằng bcrypt
-    5. Tạo user mới trong database
+    3. Hash password bằng bcrypt
+    4. INSERT ... RETURNING trong một câu lệnh (mã khách hàng lấy từ sequence ngay trong câu INSERT).
+       Không SELECT kiểm tra trước: username/email trùng được phát hiện qua unique constraint
+       (không bị race khi nhiều người đăng ký cùng lúc)
+    5. Map lỗi unique violation trên username/email thành lỗi 400
     6. Tự động đăng nhập (tạo session)
     7. Trả về thông tin user (không có password)
     
     Returns:
         - 201: Đăng ký thành công
         - 400: Dữ liệu không hợp lệ hoặc username/email đã tồn tại
+        - 503: Hệ thống đang bận (hàng đợi bcrypt đầy)
         - 500: Lỗi server
     """
     try:
@@ -60,45 +74,57 @@ def register():
         if not password_valid:
             return jsonify({'error': password_error}), 400
         
-        # Bước 3: Kiểm tra username và email đã tồn tại chưa
-        if User.query.filter_by(username=username).first():
-            return jsonify({'error': 'Username đã tồn tại'}), 400
-        
-        if User.query.filter_by(email=email).first():
-            return jsonify({'error': 'Email đã tồn tại'}), 400
-        
-        # Bước 4: Hash password trước khi lưu vào database
+        # Bước 3: Hash password trước khi lưu vào database
         password_hash = hash_password(password)
         
-        # Bước 5: Tạo user mới
-        new_user = User(
-            username=username,
-            email=email,
-            password_hash=password_hash,
-            full_name=full_name or username,
-            role='customer',
-            is_active=True,
-            customer_code=User.generate_customer_code()
-        )
-        db.session.add(new_user)
-        db.session.commit()
+        # Bước 4: Insert optimistic, lấy lại toàn bộ row bằng RETURNING
+        try:
+            new_user = db.session.execute(
+                insert(User).values(
+                    username=username,
+                    email=email,
+                    password_hash=password_hash,
+                    full_name=full_name or username,
+                    role='customer',
+                    is_active=True,
+                    customer_code=CUSTOMER_CODES.next_value_expression()
+                ).returning(User)
+            ).scalar_one()
+            # Serialize trước khi commit (sau commit instance bị expire, to_dict sẽ query lại)
+            user_data = new_user.to_dict()
+            # Dòng customer_stats 0 đơn tạo cùng transaction để danh sách khách hàng inner join được
+            record_customer_registered(user_data['id'])
+            db.session.commit()
+        except IntegrityError as e:
+            # Bước 5: Map unique violation thành lỗi 400
+            db.session.rollback()
+            violated = unique_violation_column(e, ('username', 'email'))
+            if violated == 'username':
+                return jsonify({'error': 'Username đã tồn tại'}), 400
+            if violated == 'email':
+                return jsonify({'error': 'Email đã tồn tại'}), 400
+            raise
         
         # Bước 6: Tự động đăng nhập (tạo session)
-        session['user_id'] = new_user.id
-        session['username'] = new_user.username
-        session['user_role'] = new_user.role
+        session['user_id'] = user_data['id']
+        session['username'] = user_data['username']
+        session['user_role'] = user_data['role']
         
         # Bước 7: Trả về thông tin user (không có password_hash)
         return jsonify({
             'message': 'Đăng ký thành công',
-            'user': new_user.to_dict()
+            'user': user_data
         }), 201
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Lỗi đăng ký: {str(e)}'}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@login_rate_limit
 def login():
     """
     Đăng nhập vào hệ thống (chỉ cho phép customer, không cho phép admin)
@@ -110,13 +136,16 @@ def login():
     4. Kiểm tra user có phải admin không (nếu là admin thì từ chối)
     5. Kiểm tra password có khớp không
     6. Kiểm tra tài khoản có bị khóa không (is_active)
-    7. Tạo session để lưu thông tin đăng nhập
-    8. Trả về thông tin user
+    7. Rehash password nếu cost factor bcrypt đã thay đổi
+    8. Tạo session để lưu thông tin đăng nhập
+    9. Trả về thông tin user
     
     Returns:
         - 200: Đăng nhập thành công
         - 400: Thiếu thông tin
         - 401: Username/password không đúng, là admin, hoặc tài khoản bị khóa
+        - 429: Quá nhiều lần đăng nhập (theo username hoặc IP)
+        - 503: Hệ thống đang bận (hàng đợi bcrypt đầy)
         - 500: Lỗi server
     """
     try:
@@ -144,18 +173,27 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Tài khoản đã bị khóa'}), 401
         
-        # Bước 7: Tạo session để lưu thông tin đăng nhập
+        # Bước 7: Rehash password với cost factor hiện tại (chỉ khi Config.BCRYPT_ROUNDS thay đổi)
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        
+        # Bước 8: Tạo session để lưu thông tin đăng nhập
         session['user_id'] = user.id
         session['username'] = user.username
         session['user_role'] = user.role
         
-        # Bước 8: Trả về thông tin user
+        # Bước 9: Trả về thông tin user
         return jsonify({
             'message': 'Đăng nhập thành công',
             'user': user.to_dict()
         }), 200
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Lỗi đăng nhập: {str(e)}'}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -181,13 +219,13 @@ def get_current_user():
     
     Flow:
     1. Kiểm tra user đã đăng nhập chưa (có session['user_id'] không)
-    2. Lấy user từ database theo user_id trong session
-    3. Kiểm tra user có tồn tại không
+    2. Lấy user từ cache (chỉ query database khi cache hết hạn hoặc user vừa được cập nhật)
+    3. Kiểm tra user có tồn tại và chưa bị khóa không
     4. Trả về thông tin user
     
     Returns:
         - 200: Lấy thông tin thành công
-        - 401: Chưa đăng nhập
+        - 401: Chưa đăng nhập hoặc tài khoản đã bị khóa
         - 404: User không tồn tại
         - 500: Lỗi server
     """
@@ -196,16 +234,20 @@ def get_current_user():
         return jsonify({'error': 'Chưa đăng nhập'}), 401
     
     try:
-        # Bước 2: Lấy user từ database
-        user = User.query.get(session['user_id'])
+        # Bước 2: Lấy user từ cache
+        user = get_cached_user(session['user_id'])
         
-        # Bước 3: Kiểm tra user có tồn tại không
+        # Bước 3: Kiểm tra user có tồn tại và chưa bị khóa không
         if not user:
             session.clear()
             return jsonify({'error': 'User không tồn tại'}), 404
         
+        if not user['is_active']:
+            session.clear()
+            return jsonify({'error': 'Tài khoản đã bị khóa'}), 401
+        
         # Bước 4: Trả về thông tin user
-        return jsonify({'user': user.to_dict()}), 200
+        return jsonify({'user': user}), 200
         
     except Exception as e:
         return jsonify({'error': f'Lỗi lấy thông tin user: {str(e)}'}), 500
@@ -262,6 +304,7 @@ def update_profile():
         user.full_name = full_name
         user.email = email
         db.session.commit()
+        invalidate_user(user.id)
         
         # Bước 6: Trả về thông tin user đã cập nhật
         return jsonify({
@@ -155,6 +155,7 @@ def create_banner():
             title=data['title'],
             description=data.get('description'),
             image_url=data.get('image_url', ''),
+            image_srcset=data['image_srcset'] if isinstance(data.get('image_srcset'), dict) else None,
             link=data.get('link'),
             bg_color=data.get('bg_color', '#6366f1'),
             text_color=data.get('text_color', '#ffffff'),
@@ -205,7 +206,12 @@ def update_banner(banner_id):
             banner.title = data['title']
         if 'description' in data:
             banner.description = data['description']
+        if 'image_srcset' in data:
+            banner.image_srcset = data['image_srcset'] if isinstance(data['image_srcset'], dict) else None
         if 'image_url' in data:
+            # Đổi ảnh mà không gửi srcset mới -> các bản resize cũ không còn đúng
+            if data['image_url'] != banner.image_url and 'image_srcset' not in data:
+                banner.image_srcset = None
             banner.image_url = data['image_url']
         if 'link' in data:
             banner.link = data['link']
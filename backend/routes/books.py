@@ -10,16 +10,24 @@ Các endpoint trong file này:
 - PUT /api/books/<id>: Cập nhật thông tin sách (admin only)
 - DELETE /api/books/<id>: Xóa sách (admin only)
 - GET /api/books/bestsellers: Lấy danh sách sách bán chạy nhất
+- GET /api/books/<id>/related: Lấy sách thường được mua cùng
+- GET /api/books/semantic-search: Tìm sách theo mô tả (vector TF-IDF)
 
 Dependencies:
 - models.Book: Model cho bảng books
 - models.OrderItem: Model cho bảng order_items (để tính bestsellers)
 - utils.helpers: admin_required decorator
+- utils.book_search: Tìm kiếm gần đúng (pg_trgm, fallback Python)
+- utils.semantic_search: Index vector của sách (mmap dùng chung giữa các workers)
+- utils.recommendations: Sách liên quan (tính sẵn bởi batch job refresh_related_books.py)
 - sqlalchemy: Để query và aggregate
 """
 from flask import Blueprint, request, jsonify
 from models import Book, OrderItem, db
-from utils.helpers import admin_required
+from utils.helpers import admin_required, generate_book_code, generate_slug, generate_unique_book_slug, commit_with_unique_retry
+from utils.recommendations import get_related_books
+from utils.book_search import apply_fuzzy_search
+from utils.semantic_search import semantic_search
 from sqlalchemy import func, desc
 
 books_bp = Blueprint('books', __name__)
@@ -32,7 +40,7 @@ def get_books():
     Flow:
     1. Lấy các query parameters (page, per_page, search, category, author)
     2. Tạo query cơ bản từ Book model
-    3. Áp dụng filter search (tìm trong title)
+    3. Áp dụng filter search (tìm gần đúng trong title/author, không dấu, chịu lỗi chính tả)
     4. Áp dụng filter category (lọc theo category)
     5. Áp dụng filter author (lọc theo author)
     6. Thực hiện pagination
@@ -41,7 +49,7 @@ def get_books():
     Query Parameters:
     - page (int): Số trang (default: 1)
     - per_page (int): Số items mỗi trang (default: 12)
-    - search (string): Từ khóa tìm kiếm trong title
+    - search (string): Từ khóa tìm kiếm trong title/author (kết quả sắp xếp theo độ giống)
     - category (string): Lọc theo category
     - author (string): Lọc theo author
     
@@ -60,9 +68,9 @@ def get_books():
         # Bước 2: Tạo query cơ bản
         query = Book.query
         
-        # Bước 3: Áp dụng filter search (tìm trong title)
+        # Bước 3: Áp dụng filter search (tìm gần đúng trong title/author, sắp xếp theo độ giống)
         if search:
-            query = query.filter(Book.title.ilike(f'%{search}%'))
+            query = apply_fuzzy_search(query, search)
         
         # Bước 4: Áp dụng filter category
         if category:
@@ -99,7 +107,7 @@ def create_book():
     1. Lấy dữ liệu từ request body
     2. Validate các trường bắt buộc (title, author, category, price, stock)
     3. Validate định dạng dữ liệu (price >= 0, stock >= 0, độ dài các trường)
-    4. Tạo Book mới trong database
+    4. Tạo Book mới trong database (slug unique từ title, retry nếu slug vừa bị chiếm)
     5. Trả về thông tin sách đã tạo
     
     Returns:
@@ -149,15 +157,22 @@ def create_book():
         except (ValueError, TypeError):
             return jsonify({'error': 'Số lượng tồn kho không hợp lệ'}), 400
         
-        # Bước 4: Tạo Book mới
+        base_slug = generate_slug(title)
+        if not base_slug:
+            return jsonify({'error': 'Không thể tạo slug từ tiêu đề sách'}), 400
+        
+        # Bước 4: Tạo Book mới (mã sách cấp từ sequence)
         new_book = Book(
+            book_code=generate_book_code(Book),
             title=title,
+            slug=generate_unique_book_slug(base_slug, Book),
             author=author,
             category=category,
             description=data.get('description', '').strip() if data.get('description') else None,
             price=price,
             stock=stock,
             image_url=data.get('image_url', '').strip() if data.get('image_url') else None,
+            image_srcset=data['image_srcset'] if isinstance(data.get('image_srcset'), dict) else None,
             publisher=data.get('publisher', '').strip() if data.get('publisher') else None,
             publish_date=data.get('publish_date', '').strip() if data.get('publish_date') else None,
             distributor=data.get('distributor', '').strip() if data.get('distributor') else None,
@@ -165,8 +180,11 @@ def create_book():
             pages=int(data['pages']) if data.get('pages') else None,
             weight=int(data['weight']) if data.get('weight') else None
         )
-        db.session.add(new_book)
-        db.session.commit()
+        
+        def regenerate_slug(book):
+            book.slug = generate_unique_book_slug(base_slug, Book)
+        
+        commit_with_unique_retry(new_book, regenerate_slug, columns=('slug',))
         
         # Bước 5: Trả về thông tin sách đã tạo
         return jsonify({
@@ -247,8 +265,15 @@ def update_book(book_id):
             except (ValueError, TypeError):
                 return jsonify({'error': 'Số lượng tồn kho không hợp lệ'}), 400
         
+        if 'image_srcset' in data:
+            book.image_srcset = data['image_srcset'] if isinstance(data['image_srcset'], dict) else None
+        
         if 'image_url' in data:
-            book.image_url = data['image_url'].strip() if data['image_url'] else None
+            image_url = data['image_url'].strip() if data['image_url'] else None
+            # Đổi ảnh mà không gửi srcset mới -> các bản resize cũ không còn đúng
+            if image_url != book.image_url and 'image_srcset' not in data:
+                book.image_srcset = None
+            book.image_url = image_url
         
         if 'publisher' in data:
             book.publisher = data['publisher'].strip() if data['publisher'] else None
@@ -367,4 +392,89 @@ def get_bestsellers():
         }), 200
         
     except Exception as e:
-        return jsonify({'error': f'Lỗi lấy sách bán chạy: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Lỗi lấy sách bán chạy: {str(e)}'}), 500
+
+@books_bp.route('/books/<int:book_id>/related', methods=['GET'])
+def get_book_related(book_id):
+    """
+    Lấy sách thường được mua cùng với một sách
+    
+    Flow:
+    1. Lấy limit từ query parameter (default: 5, tối đa 20)
+    2. Kiểm tra sách có tồn tại không
+    3. Đọc top-K sách mua cùng đã tính sẵn (books.related_books), bổ sung sách cùng tác giả/danh mục nếu chưa đủ
+    4. Trả về danh sách sách kèm số đơn mua cùng (null với sách bổ sung),
+       số lượng đã bán của cả danh sách lấy bằng một query
+    
+    Query Parameters:
+    - limit (int): Số lượng sách cần lấy (default: 5)
+    
+    Returns:
+        - 200: Danh sách sách liên quan
+        - 404: Sách không tồn tại
+        - 500: Lỗi server
+    """
+    try:
+        # Bước 1: Lấy limit từ query parameter
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 20)
+        
+        # Bước 2: Kiểm tra sách có tồn tại không
+        book = db.session.get(Book, book_id)
+        if not book:
+            return jsonify({'error': 'Sách không tồn tại'}), 404
+        
+        # Bước 3: Sách liên quan
+        related = get_related_books(book, limit=limit)
+        
+        # Bước 4: Trả về danh sách
+        sold_counts = Book.get_sold_counts(item['book'].id for item in related)
+        return jsonify({
+            'books': [
+                dict(item['book'].to_dict(sold=sold_counts[item['book'].id]), co_orders=item['co_orders'])
+                for item in related
+            ],
+            'count': len(related),
+            'updated_at': book.related_books_updated_at.isoformat() if book.related_books_updated_at else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi lấy sách liên quan: {str(e)}'}), 500
+
+@books_bp.route('/books/semantic-search', methods=['GET'])
+def semantic_search_books():
+    """
+    Tìm sách theo mô tả (ví dụ: "sách về tuổi thơ buồn") thay vì theo tên sách
+    
+    Flow:
+    1. Lấy q và limit từ query parameters (default: 10, tối đa 50)
+    2. Tìm top sách có vector TF-IDF (title, author, danh mục, mô tả) gần với q nhất
+    3. Trả về danh sách sách kèm điểm (cosine similarity), số lượng đã bán lấy bằng một query
+    
+    Query Parameters:
+    - q (string): Mô tả sách cần tìm
+    - limit (int): Số lượng sách cần lấy (default: 10)
+    
+    Returns:
+        - 200: Danh sách sách theo điểm giảm dần
+        - 400: Thiếu q
+        - 500: Lỗi server
+    """
+    try:
+        # Bước 1: Lấy query parameters
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Vui lòng nhập mô tả sách cần tìm'}), 400
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        
+        # Bước 2: Tìm kiếm
+        matches = semantic_search(query, limit=limit)
+        
+        # Bước 3: Trả về danh sách
+        sold_counts = Book.get_sold_counts(book.id for book, _ in matches)
+        return jsonify({
+            'books': [dict(book.to_dict(sold=sold_counts[book.id]), score=score) for book, score in matches],
+            'count': len(matches)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Lỗi tìm kiếm sách: {str(e)}'}), 500
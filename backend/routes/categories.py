@@ -16,11 +16,11 @@ Các endpoint trong file này:
 Dependencies:
 - models.Category: Model cho bảng categories
 - models.Book: Model cho bảng books
-- utils.helpers: admin_required decorator, generate_slug, generate_unique_slug, generate_category_key, generate_unique_category_key, generate_category_code
+- utils.helpers: admin_required decorator, generate_slug, generate_unique_slug, generate_category_key, generate_unique_category_key, generate_category_code, commit_with_unique_retry
 """
 from flask import Blueprint, request, jsonify
 from models import Category, Book, db
-from utils.helpers import admin_required, generate_slug, generate_unique_slug, generate_category_key, generate_unique_category_key, generate_category_code
+from utils.helpers import admin_required, generate_slug, generate_unique_slug, generate_category_key, generate_unique_category_key, generate_category_code, commit_with_unique_retry
 
 categories_bp = Blueprint('categories', __name__)
 
@@ -223,7 +223,7 @@ def create_category():
     2. Validate các trường bắt buộc (name)
     3. Tự động generate key và slug từ name
     4. Đảm bảo slug unique (auto-append số nếu trùng)
-    5. Tạo category mới trong database
+    5. Tạo category mới trong database (retry nếu key/slug vừa bị request khác chiếm)
     6. Trả về thông tin category đã tạo
     
     Returns:
@@ -280,8 +280,13 @@ def create_category():
             display_order=data.get('display_order', 0),
             is_active=data.get('is_active', True)
         )
-        db.session.add(new_category)
-        db.session.commit()
+        
+        def regenerate_key_and_slug(category):
+            category.key = generate_unique_category_key(base_key, Category)
+            category.slug = generate_unique_slug(base_slug, Category)
+        
+        # Dựa vào unique constraint: nếu key/slug bị chiếm giữa lúc resolve và insert thì tính lại
+        commit_with_unique_retry(new_category, regenerate_key_and_slug)
         
         # Bước 5: Trả về thông tin category
         return jsonify({
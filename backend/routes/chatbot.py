@@ -6,56 +6,52 @@ Xử lý chatbot thông minh với Google Gemini Pro API, kết hợp với FAQ
 Chatbot có thể hiểu context về bookstore và trả lời khách hàng một cách tự nhiên.
 
 Các endpoint trong file này:
-- POST /api/chatbot: Xử lý câu hỏi từ chatbot và trả về câu trả lời (FAQ + Gemini)
+- POST /api/chatbot: Xử lý câu hỏi từ chatbot và trả về câu trả lời (FAQ + LLM)
+- POST /api/chatbot/stream: Như /api/chatbot nhưng trả câu trả lời dạng Server-Sent Events (stream từng đoạn)
 
 Dependencies:
-- google.genai: Google Gen AI SDK
+- utils.llm: LLM backend (Google Gemini, hoặc backend giả lập khi benchmark - Config.LLM_BACKEND)
 - models.Book, models.Category: Để lấy thông tin từ database
-- config.Config: Để lấy GEMINI_API_KEY
+- config.Config: Cấu hình chatbot (timeout, cache, FAQ)
+- utils.chatbot_context: Snapshot context cửa hàng dùng chung giữa các workers
+- utils.prompt_budget: Ngân sách token cho phần context gửi kèm mỗi câu hỏi
+- utils.book_matcher: Index title/author để tìm sách trong câu hỏi (không cần gọi Gemini)
+- utils.book_search: Tìm sách gần đúng theo tên LLM trả về (pg_trgm, fallback Python)
+- utils.semantic_search: Tìm sách theo mô tả khi câu hỏi không nhắc tên sách
+- utils.answer_cache: Cache câu trả lời LLM theo câu hỏi đã chuẩn hóa
+- utils.single_flight: Gộp các câu hỏi giống nhau đến cùng lúc thành một lời gọi LLM
+- utils.faq_matcher: Automaton Aho–Corasick cho FAQ (không phân biệt dấu, hot reload file FAQ)
+- utils.llm_guard: Circuit breaker + giới hạn số lời gọi LLM đồng thời
+- utils.recommendations: Sách thường được mua cùng (tính sẵn bởi batch job)
 """
-from flask import Blueprint, request, jsonify
-from google import genai
-from google.genai import types
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from google.genai import errors
+import json
 import logging
-from sqlalchemy import func, desc, case
-from models import Book, Category, OrderItem, Order, db
+import time
+from contextlib import nullcontext
+from models import Book, Category, db
 from config import Config
+from utils.chatbot_context import get_bookstore_context, format_store_overview, format_catalog_context
+from utils.prompt_budget import estimate_tokens, truncate_to_tokens
+from utils.book_matcher import get_book_index, MATCH_FOUND, MATCH_NONE
+from utils.answer_cache import get_answer_cache, normalize_question
+from utils.single_flight import CHATBOT_FLIGHTS, Flight
+from utils.catalog import catalog_version
+from utils.faq_matcher import get_faq_matcher
+from utils.llm_guard import LLM_GUARD, LLMUnavailable, BulkheadFull
+from utils.llm import get_llm_backend
+from utils.recommendations import get_related_books
+from utils.book_search import search_books
+from utils.semantic_search import semantic_search
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
 # Setup logger cho chatbot
 logger = logging.getLogger(__name__)
 
-# Module-level client (lazy initialization)
-_genai_client = None
-
-def get_genai_client():
-    """
-    Lazy initialization của Gemini client
-    Tái sử dụng client across requests để tối ưu performance
-    
-    Returns:
-        genai.Client: Gemini client instance, hoặc None nếu không có API key
-    """
-    global _genai_client
-    
-    if _genai_client is None:
-        api_key = Config.GEMINI_API_KEY
-        if api_key:
-            try:
-                _genai_client = genai.Client(api_key=api_key)
-                logger.info("[CHATBOT] Gemini client initialized")
-            except Exception as e:
-                logger.error(f"[CHATBOT] Failed to initialize Gemini client: {str(e)}")
-                return None
-        else:
-            logger.warning("[CHATBOT] No API key, cannot initialize Gemini client")
-            return None
-    
-    return _genai_client
-
 # FAQ database đơn giản - lưu các câu hỏi và câu trả lời (ưu tiên xử lý nhanh)
+# FAQ built-in, dùng khi không cấu hình CHATBOT_FAQ_FILE (xem utils.faq_matcher)
 FAQ_DATABASE = {
     'chào': 'Xin chào! Tôi có thể giúp gì cho bạn?',
     'hello': 'Xin chào! Tôi có thể giúp gì cho bạn?',
@@ -70,114 +66,133 @@ FAQ_DATABASE = {
     'mặc định': 'Xin lỗi, tôi chưa hiểu câu hỏi của bạn. Bạn có thể hỏi về: giá, thanh toán, giao hàng, đổi trả, đăng ký, đăng nhập, giỏ hàng, đơn hàng.'
 }
 
-def get_bookstore_context():
+# Câu trả lời khi đã đủ số lời gọi LLM đồng thời (bulkhead) - LLM vẫn khỏe, chỉ đang bận
+BUSY_ANSWER = 'Trợ lý AI đang trả lời nhiều câu hỏi cùng lúc. Bạn vui lòng thử lại sau vài giây nhé.'
+
+def match_faq(question):
     """
-    Lấy thông tin context về bookstore từ database (bao gồm bestsellers và sách theo category)
+    Tìm câu trả lời FAQ phù hợp nhất cho câu hỏi
     
-    Flow:
-    1. Query danh sách categories (chỉ active)
-    2. Đếm tổng số sách
-    3. Query top 10 bestseller books (dựa trên số lượng đã bán)
-    4. Query sample books từ mỗi category (top 3-5 sách với số lượng đã bán)
-    5. Tạo context string với tất cả thông tin
+    Dùng automaton compile sẵn (utils.faq_matcher): khớp không phân biệt dấu, theo nguyên từ,
+    chọn intent điểm cao nhất. FAQ lấy từ CHATBOT_FAQ_FILE nếu có cấu hình, ngược lại từ FAQ_DATABASE.
+    
+    Parameters:
+        question (str): Câu hỏi của người dùng
+    
+    Returns:
+        tuple: (answer, source) - source là 'faq', hoặc 'faq_default' nếu không khớp keyword nào
+    """
+    matcher = get_faq_matcher(FAQ_DATABASE)
+    intent = matcher.match(question)
+    if intent:
+        return intent['answer'], 'faq'
+    
+    return matcher.default_answer or FAQ_DATABASE.get('mặc định'), 'faq_default'
+
+def extract_book_title_with_llm(question):
+    """
+    Dùng LLM để extract tên sách từ câu hỏi (chỉ dùng khi index local không chắc chắn)
+    
+    Parameters:
+        question (str): Câu hỏi của người dùng
     
     Returns:
-        str: Context string mô tả về bookstore với bestsellers và sách theo category
+        str: Tên sách, hoặc None nếu không có tên sách / LLM không khả dụng
     """
+    llm = get_llm_backend()
+    if not llm:
+        logger.warning("[CHATBOT] Cannot detect book - LLM backend not available")
+        return None
+    
+    # Prompt để extract tên sách
+    extract_prompt = f"""Bạn là một hệ thống extract thông tin. Nhiệm vụ của bạn là tìm tên sách trong câu hỏi sau đây.
+
+Câu hỏi: "{question}"
+
+Hãy trả lời CHỈ tên sách (nếu có), không thêm gì khác. Nếu không có tên sách cụ thể, trả lời "KHONG".
+
+Ví dụ:
+- "Sách Harry Potter có hay không?" -> "Harry Potter"
+- "Giới thiệu về Đắc Nhân Tâm" -> "Đắc Nhân Tâm"
+- "Sách nào bán chạy nhất?" -> "KHONG"
+"""
+    
     try:
-        # Bước 1: Lấy danh sách categories (chỉ active)
-        categories = Category.query.filter_by(is_active=True).order_by(Category.display_order.asc()).all()
-        category_names = [cat.name for cat in categories]
+        with LLM_GUARD.call():
+            response_text = llm.generate(extract_prompt, timeout=Config.CHATBOT_TITLE_LLM_TIMEOUT)
         
-        # Bước 2: Đếm tổng số sách
-        total_books = Book.query.count()
+        if not response_text:
+            return None
         
-        # Bước 3: Query top 10 bestseller books (dựa trên số lượng đã bán từ orders completed)
-        bestsellers_text = ""
-        try:
-            bestsellers = db.session.query(
-                Book,
-                func.sum(OrderItem.quantity).label('total_sold')
-            ).join(OrderItem).join(Order).filter(
-                Order.status == 'completed'
-            ).group_by(Book.id).order_by(desc('total_sold')).limit(10).all()
-            
-            if bestsellers:
-                bestsellers_list = []
-                for idx, (book, total_sold) in enumerate(bestsellers, 1):
-                    sold_count = int(total_sold) if total_sold else 0
-                    bestsellers_list.append(f"{idx}. {book.title} - {book.author} (Đã bán: {sold_count})")
-                
-                bestsellers_text = "\n\nTop 10 sách bán chạy nhất:\n" + "\n".join(bestsellers_list)
-        except Exception as e:
-            logger.warning(f"[CHATBOT] Failed to query bestsellers: {str(e)}")
-            # Continue without bestsellers if query fails
+        book_title = response_text.strip()
+        # Loại bỏ dấu ngoặc kép nếu có
+        book_title = book_title.strip('"').strip("'").strip()
         
-        # Bước 4: Query sample books từ mỗi category (top 3-5 sách với số lượng đã bán)
-        category_books_text = ""
-        try:
-            category_sections = []
-            for category in categories:
-                # Query top 5 books trong category này (có sold count)
-                # Sử dụng outerjoin để lấy cả sách chưa có order
-                # Chỉ tính sold count từ orders completed
-                category_books = db.session.query(
-                    Book,
-                    func.sum(
-                        case(
-                            (Order.status == 'completed', OrderItem.quantity),
-                            else_=0
-                        )
-                    ).label('total_sold')
-                ).outerjoin(OrderItem, Book.id == OrderItem.book_id).outerjoin(
-                    Order, OrderItem.order_id == Order.id
-                ).filter(
-                    Book.category == category.key
-                ).group_by(Book.id).order_by(
-                    desc('total_sold'), Book.id.asc()
-                ).limit(5).all()
-                
-                if category_books:
-                    book_list = []
-                    for book, total_sold in category_books:
-                        sold_count = int(total_sold) if total_sold else 0
-                        if sold_count > 0:
-                            book_list.append(f"{book.title} - {book.author} (Đã bán: {sold_count})")
-                        else:
-                            book_list.append(f"{book.title} - {book.author}")
-                    
-                    if book_list:
-                        category_sections.append(f"- {category.name}: {', '.join(book_list[:3])}")  # Chỉ lấy top 3 để không quá dài
-            
-            if category_sections:
-                category_books_text = "\n\nSách theo danh mục:\n" + "\n".join(category_sections)
-        except Exception as e:
-            logger.warning(f"[CHATBOT] Failed to query category books: {str(e)}")
-            # Continue without category books if query fails
+        if book_title.upper() == "KHONG" or not book_title:
+            logger.info("[CHATBOT] No book title detected in question")
+            return None
         
-        # Bước 5: Tạo context string với tất cả thông tin
-        context = f"""
-Cửa hàng có {total_books} cuốn sách trong các danh mục sau:
-- {', '.join(category_names) if category_names else 'Chưa có danh mục'}{bestsellers_text}{category_books_text}
-"""
-        return context
+        logger.info(f"[CHATBOT] Detected book title: {book_title}")
+        return book_title
+    except LLMUnavailable as e:
+        logger.warning(f"[CHATBOT] Skipping book title extraction: {str(e)}")
+        return None
     except Exception as e:
-        # Nếu có lỗi khi query database, trả về context mặc định
-        logger.error(f"[CHATBOT] Error in get_bookstore_context: {str(e)}")
-        return "\nCửa hàng sách trực tuyến với nhiều danh mục sách đa dạng."
+        logger.warning(f"[CHATBOT] Failed to extract book title: {str(e)}")
+        return None
+
+def find_mentioned_book(question):
+    """
+    Tìm sách được nhắc đến trong câu hỏi
+    
+    Flow:
+    1. Match câu hỏi với index title/author local (utils.book_matcher, không gọi network)
+    2. Khớp chắc chắn -> load sách theo id
+    3. Không nhắc đến sách -> None (không gọi Gemini)
+    4. Không chắc chắn -> hỏi LLM tên sách (nếu CHATBOT_TITLE_LLM_FALLBACK bật),
+       rồi tìm lại bằng index, cuối cùng tìm gần đúng (utils.book_search, chịu lỗi chính tả)
+    
+    Parameters:
+        question (str): Câu hỏi của người dùng
+    
+    Returns:
+        Book: Sách được nhắc đến, hoặc None
+    """
+    # Bước 1: Index local
+    index = get_book_index()
+    match = index.match(question)
+    
+    # Bước 2: Khớp chắc chắn
+    if match.status == MATCH_FOUND:
+        return db.session.get(Book, match.book_id)
+    
+    # Bước 3: Không nhắc đến sách
+    if match.status == MATCH_NONE or not Config.CHATBOT_TITLE_LLM_FALLBACK:
+        logger.info("[CHATBOT] No book title detected in question")
+        return None
+    
+    # Bước 4: Hỏi LLM
+    book_title = extract_book_title_with_llm(question)
+    if not book_title:
+        return None
+    
+    match = index.match(book_title)
+    if match.status == MATCH_FOUND:
+        return db.session.get(Book, match.book_id)
+    books = search_books(book_title, limit=1)
+    return books[0] if books else None
 
 def detect_and_get_book_info(question):
     """
     Detect tên sách từ câu hỏi và query thông tin chi tiết sách
     
     Flow:
-    1. Sử dụng Gemini để extract tên sách từ question (nếu có)
-    2. Search trong database (fuzzy match với title)
-    3. Nếu tìm thấy:
+    1. Tìm sách được nhắc đến (index local, Gemini chỉ khi không chắc chắn)
+    2. Nếu tìm thấy:
        - Query thông tin chi tiết sách
-       - Query sách tương tự (same author, same category, top 3-5)
+       - Lấy sách thường được mua cùng (tính sẵn bởi batch job, bổ sung cùng tác giả/danh mục)
        - Return book info dict
-    4. Nếu không tìm thấy: return None
+    3. Nếu không tìm thấy: return None
     
     Parameters:
         question (str): Câu hỏi của người dùng
@@ -186,92 +201,23 @@ def detect_and_get_book_info(question):
         dict: Thông tin sách và sách tương tự, hoặc None nếu không tìm thấy
     """
     try:
-        # Bước 1: Sử dụng Gemini để extract tên sách từ question
-        client = get_genai_client()
-        if not client:
-            logger.warning("[CHATBOT] Cannot detect book - Gemini client not available")
-            return None
+        # Bước 1: Tìm sách được nhắc đến
+        book = find_mentioned_book(question)
         
-        # Prompt để extract tên sách
-        extract_prompt = f"""Bạn là một hệ thống extract thông tin. Nhiệm vụ của bạn là tìm tên sách trong câu hỏi sau đây.
-
-Câu hỏi: "{question}"
-
-Hãy trả lời CHỈ tên sách (nếu có), không thêm gì khác. Nếu không có tên sách cụ thể, trả lời "KHONG".
-
-Ví dụ:
-- "Sách Harry Potter có hay không?" -> "Harry Potter"
-- "Giới thiệu về Đắc Nhân Tâm" -> "Đắc Nhân Tâm"
-- "Sách nào bán chạy nhất?" -> "KHONG"
-"""
-        
-        try:
-            response = client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=extract_prompt
-            )
-            
-            if response and response.text:
-                book_title = response.text.strip()
-                # Loại bỏ dấu ngoặc kép nếu có
-                book_title = book_title.strip('"').strip("'").strip()
-                
-                if book_title.upper() == "KHONG" or not book_title:
-                    logger.info("[CHATBOT] No book title detected in question")
-                    return None
-                
-                logger.info(f"[CHATBOT] Detected book title: {book_title}")
-            else:
-                return None
-        except Exception as e:
-            logger.warning(f"[CHATBOT] Failed to extract book title: {str(e)}")
-            return None
-        
-        # Bước 2: Search trong database (fuzzy match với title)
-        # Tìm sách có title chứa book_title
-        books = Book.query.filter(
-            Book.title.ilike(f'%{book_title}%')
-        ).all()
-        
-        if not books:
-            logger.info(f"[CHATBOT] No book found matching: {book_title}")
+        if not book:
             return None
         
-        # Lấy sách đầu tiên (có thể cải thiện bằng cách tính điểm khớp)
-        book = books[0]
         logger.info(f"[CHATBOT] Found book: {book.title} (ID: {book.id})")
         
-        # Bước 3: Query thông tin chi tiết sách
+        # Bước 2: Query thông tin chi tiết sách
         sold_count = book.get_sold_count()
         category = Category.query.filter_by(key=book.category).first()
         category_name = category.name if category else book.category
         
-        # Query sách tương tự (same author hoặc same category, top 5, loại trừ sách hiện tại)
+        # Sách liên quan (top 5, loại trừ sách hiện tại)
         similar_books = []
         try:
-            # Sách cùng tác giả
-            same_author_books = Book.query.filter(
-                Book.author == book.author,
-                Book.id != book.id
-            ).limit(3).all()
-            
-            # Sách cùng category (loại trừ sách đã có trong same_author_books)
-            same_author_ids = [b.id for b in same_author_books]
-            same_category_query = Book.query.filter(
-                Book.category == book.category,
-                Book.id != book.id
-            )
-            if same_author_ids:
-                same_category_query = same_category_query.filter(~Book.id.in_(same_author_ids))
-            same_category_books = same_category_query.limit(2).all()
-            
-            # Kết hợp và tính sold count
-            for similar_book in same_author_books + same_category_books:
-                similar_sold = similar_book.get_sold_count()
-                similar_books.append({
-                    'book': similar_book,
-                    'sold': similar_sold
-                })
+            similar_books = get_related_books(book, limit=5)
         except Exception as e:
             logger.warning(f"[CHATBOT] Failed to query similar books: {str(e)}")
         
@@ -318,36 +264,63 @@ Sách: {book.title}
 - Danh mục: {category_name}
 """
     
-    # Format sách tương tự
+    # Format sách tương tự (ưu tiên sách khách hàng thường mua cùng)
     if similar_books:
-        similar_text = "\nSách tương tự:\n"
+        similar_text = "\nSách tương tự / thường được mua cùng:\n"
         for idx, item in enumerate(similar_books[:5], 1):
             similar_book = item['book']
-            similar_sold = item['sold']
-            similar_text += f"- {similar_book.title} - {similar_book.author} (Đã bán: {similar_sold})\n"
+            similar_text += f"- {similar_book.title} - {similar_book.author}"
+            if item['co_orders']:
+                similar_text += f" ({item['co_orders']} đơn hàng mua cùng)"
+            similar_text += "\n"
         context += similar_text
     
     return context
 
+def format_semantic_context(matches):
+    """
+    Format các sách phù hợp với mô tả của khách hàng thành text cho AI
+    
+    Parameters:
+        matches (list): [(Book, score)] từ semantic_search()
+    
+    Returns:
+        str: Formatted text, hoặc "" nếu không có sách phù hợp
+    """
+    if not matches:
+        return ""
+    
+    context = "\n[Sách có thể phù hợp với mô tả của khách hàng:]\n"
+    for book, score in matches:
+        description = (book.description or '')[:200]
+        context += f"- {book.title} - {book.author} ({float(book.price):,.0f} VNĐ): {description}\n"
+    return context
+
 def build_system_prompt(question=None):
     """
-    Tạo system prompt cho Gemini với context về bookstore và thông tin sách cụ thể (nếu có)
+    Tạo prompt cho Gemini: system prompt cố định + context theo câu hỏi
+    
+    System prompt (instructions, chính sách, danh sách danh mục) giống nhau giữa các câu hỏi nên
+    được cache bằng Gemini context caching (utils.llm). Context theo câu hỏi (thông tin sách cụ thể,
+    bestsellers, sách theo danh mục) bị giới hạn trong CHATBOT_PROMPT_CONTEXT_TOKENS.
     
     Flow:
-    1. Lấy bookstore context từ database
+    1. Lấy bookstore context từ snapshot dùng chung (utils.chatbot_context)
     2. Nếu có question, detect và lấy thông tin sách cụ thể
-    3. Format thông tin sách (nếu có)
-    4. Tạo system prompt với instructions cải thiện về đánh giá sách
-    5. Trả về system prompt hoàn chỉnh
+       (không nhắc tên sách -> tìm sách phù hợp với mô tả bằng semantic search)
+    3. Format thông tin sách (nếu có), cắt cho vừa ngân sách token
+    4. Phần ngân sách còn lại: bestsellers + sách theo danh mục liên quan nhất tới câu hỏi
+    5. Tạo system prompt cố định với instructions cải thiện về đánh giá sách
     
     Parameters:
         question (str, optional): Câu hỏi của người dùng để detect sách
     
     Returns:
-        str: System prompt cho Gemini
+        tuple: (system_prompt, context) - context gửi kèm câu hỏi
     """
-    # Bước 1: Lấy context từ database
+    # Bước 1: Lấy context từ snapshot (chỉ query database khi catalog thay đổi hoặc hết TTL)
     bookstore_context = get_bookstore_context()
+    budget = Config.CHATBOT_PROMPT_CONTEXT_TOKENS
     
     # Bước 2: Detect và lấy thông tin sách cụ thể (nếu có question)
     book_context = ""
@@ -356,8 +329,23 @@ def build_system_prompt(question=None):
         if book_info:
             book_context = format_book_context(book_info)
             logger.info(f"[CHATBOT] Book context added for: {book_info['book'].title}")
+        else:
+            try:
+                book_context = format_semantic_context(semantic_search(question, limit=3))
+            except Exception as e:
+                logger.warning(f"[CHATBOT] Semantic search failed: {str(e)}")
     
-    # Bước 3-4: Tạo system prompt với instructions cải thiện
+    # Bước 3: Thông tin sách cụ thể được ưu tiên trong ngân sách (sau phần tiêu đề luôn có của context)
+    header_tokens = estimate_tokens(format_catalog_context(bookstore_context, max_tokens=0))
+    book_context = truncate_to_tokens(book_context.strip(), max(0, budget - header_tokens))
+    
+    # Bước 4: Bestsellers + sách theo danh mục trong phần ngân sách còn lại
+    catalog_context = format_catalog_context(
+        bookstore_context, question, max_tokens=max(0, budget - estimate_tokens(book_context))
+    )
+    context = f"{catalog_context}\n\n{book_context}" if book_context else catalog_context
+    
+    # Bước 5: System prompt cố định (không phụ thuộc câu hỏi để cache được)
     system_prompt = f"""Bạn là trợ lý AI thân thiện của một cửa hàng sách trực tuyến. Nhiệm vụ của bạn là:
 
 1. Trả lời câu hỏi về sách, danh mục, giá cả, tác giả
@@ -367,8 +355,9 @@ def build_system_prompt(question=None):
 5. Đánh giá và tư vấn về chất lượng sách dựa trên thông tin có sẵn
 
 Thông tin về cửa hàng:
-{bookstore_context}
-{book_context}
+{format_store_overview(bookstore_context)}
+
+Mỗi câu hỏi của khách hàng được gửi kèm thông tin tham khảo (sách bán chạy, sách theo danh mục, thông tin sách cụ thể nếu có). Hãy ưu tiên dùng thông tin đó khi trả lời.
 
 Khi khách hàng hỏi về chất lượng sách, bạn có thể đánh giá dựa trên:
 1. Mô tả sách (description) - phân tích nội dung, thể loại, đối tượng độc giả phù hợp
@@ -388,54 +377,57 @@ Chính sách và dịch vụ:
 
 Hãy trả lời một cách thân thiện, chuyên nghiệp và hữu ích. Nếu không chắc chắn về thông tin, hãy hướng dẫn khách hàng tìm kiếm trên website hoặc liên hệ hỗ trợ."""
     
-    return system_prompt
+    return system_prompt, context
 
-def query_gemini(question, system_prompt):
+def query_llm(question, system_prompt, context=None):
     """
-    Gọi Gemini API để lấy câu trả lời (sử dụng new google-genai library)
+    Gọi LLM backend (Gemini, hoặc backend giả lập khi benchmark) để lấy câu trả lời
     
     Flow:
-    1. Lấy Gemini client (lazy initialization)
-    2. Gọi generate_content với model gemini-2.5-flash và system instruction
+    1. Lấy LLM backend (lazy initialization, theo Config.LLM_BACKEND)
+    2. Gọi generate với system instruction (cache được), context theo câu hỏi và deadline CHATBOT_LLM_TIMEOUT
     3. Trả về text response
     
     Parameters:
         question (str): Câu hỏi của người dùng
-        system_prompt (str): System prompt với context về bookstore
+        system_prompt (str): System prompt cố định
+        context (str): Context theo câu hỏi (thông tin cửa hàng, sách cụ thể)
     
     Returns:
-        str: Câu trả lời từ Gemini, hoặc None nếu có lỗi
+        str: Câu trả lời từ LLM, hoặc None nếu có lỗi
+    
+    Raises:
+        BulkheadFull: Đã đủ số lời gọi LLM đồng thời (route trả lời "đang bận" thay vì FAQ)
     """
     try:
-        # Bước 1: Lấy Gemini client
-        client = get_genai_client()
-        if not client:
-            logger.warning("[CHATBOT]  Gemini client not available")
+        # Bước 1: Lấy LLM backend
+        llm = get_llm_backend()
+        if not llm:
+            logger.warning("[CHATBOT]  LLM backend not available")
             return None
         
-        api_key = Config.GEMINI_API_KEY
-        logger.info(f"[CHATBOT] ✓ API Key exists: {api_key[:10]}...{api_key[-5:] if len(api_key) > 15 else '***'}")
-        logger.info(f"[CHATBOT]  Calling Gemini API with question: {question[:50]}...")
+        logger.info(f"[CHATBOT]  Calling {llm.name} with question: {question[:50]}...")
         
-        # Bước 2: Gọi API với new library structure
-        # Sử dụng gemini-2.5-flash (latest model, nhanh, phù hợp cho chatbot)
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=question,
-            config=types.GenerateContentConfig(
-                system_instruction=system_prompt
+        # Bước 2: Gọi LLM (qua circuit breaker + bulkhead)
+        with LLM_GUARD.call():
+            answer_text = llm.generate(
+                question, system_instruction=system_prompt, timeout=Config.CHATBOT_LLM_TIMEOUT, context=context
             )
-        )
         
         # Bước 3: Trả về text response
-        if response and response.text:
-            answer_text = response.text
-            logger.info(f"[CHATBOT]  Gemini response received: {answer_text[:100]}...")
+        if answer_text:
+            logger.info(f"[CHATBOT]  {llm.name} response received: {answer_text[:100]}...")
             return answer_text
         else:
-            logger.warning("[CHATBOT]  Gemini response is empty")
+            logger.warning(f"[CHATBOT]  {llm.name} response is empty")
             return None
         
+    except BulkheadFull:
+        raise
+    except LLMUnavailable as e:
+        # Circuit breaker đang mở -> FAQ
+        logger.warning(f"[CHATBOT]  Skipping LLM: {str(e)}")
+        return None
     except errors.APIError as e:
         # Log API error chi tiết
         logger.error(f"[CHATBOT]  Gemini API Error: {e.code} - {e.message}")
@@ -444,28 +436,110 @@ def query_gemini(question, system_prompt):
         return None
     except Exception as e:
         # Log generic error chi tiết
-        logger.error(f"[CHATBOT]  Error querying Gemini: {str(e)}")
+        logger.error(f"[CHATBOT]  Error querying LLM: {str(e)}")
         logger.error(f"[CHATBOT] Error type: {type(e).__name__}")
         import traceback
         logger.error(f"[CHATBOT] Traceback: {traceback.format_exc()}")
         return None
 
+def stream_llm(llm, question, system_prompt, context=None):
+    """
+    Gọi LLM backend ở chế độ streaming, yield từng đoạn text ngay khi nhận được
+    
+    Parameters:
+        llm (LLMBackend): LLM backend
+        question (str): Câu hỏi của người dùng
+        system_prompt (str): System prompt cố định
+        context (str): Context theo câu hỏi (thông tin cửa hàng, sách cụ thể)
+    
+    Yields:
+        str: Từng đoạn text của câu trả lời
+    
+    Raises:
+        LLMUnavailable: Circuit breaker đang mở hoặc đã đủ số lời gọi đồng thời
+        TimeoutError: Stream chạy quá CHATBOT_LLM_TIMEOUT
+        errors.APIError: Lỗi từ Gemini API
+    """
+    logger.info(f"[CHATBOT]  Streaming {llm.name} with question: {question[:50]}...")
+    with LLM_GUARD.call():
+        yield from llm.stream(
+            question, system_instruction=system_prompt, timeout=Config.CHATBOT_LLM_TIMEOUT, context=context
+        )
+
+def coalesce(question):
+    """
+    Single-flight cho câu hỏi: request giống hệt đang chạy thì chờ và dùng chung kết quả
+    
+    Parameters:
+        question (str): Câu hỏi của người dùng
+    
+    Returns:
+        Context manager yield Flight (CHATBOT_COALESCE tắt -> request luôn là leader)
+    """
+    if not Config.CHATBOT_COALESCE:
+        return nullcontext(Flight(leader=True))
+    return CHATBOT_FLIGHTS.flight(normalize_question(question) or question)
+
+def answer_with_llm(llm, question):
+    """
+    Build prompt, gọi LLM và lưu câu trả lời vào answer cache
+    
+    Parameters:
+        llm (LLMBackend): LLM backend
+        question (str): Câu hỏi của người dùng
+    
+    Returns:
+        dict: {'answer', 'source'}, hoặc None nếu LLM lỗi / trả về rỗng
+    """
+    # Version trước khi build prompt: catalog đổi trong lúc gọi LLM thì không cache
+    version = catalog_version()
+    
+    # Build system prompt với context về bookstore và thông tin sách (nếu có)
+    system_prompt, context = build_system_prompt(question=question)
+    logger.info(f"[CHATBOT]  Prompt built (system: {len(system_prompt)} chars, "
+                f"context: ~{estimate_tokens(context)} tokens)")
+    
+    # Gọi LLM
+    llm_answer = query_llm(question, system_prompt, context)
+    if not llm_answer:
+        return None
+    get_answer_cache().set(question, llm_answer, llm.name, version=version)
+    return {'answer': llm_answer, 'source': llm.name}
+
+def sse_event(event, data):
+    """
+    Format một Server-Sent Event
+    
+    Parameters:
+        event (str): Tên event (meta, token, done)
+        data (dict): Payload (được encode JSON trên một dòng)
+    
+    Returns:
+        str: Event theo format SSE
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @chatbot_bp.route('/chatbot', methods=['POST'])
 def chatbot():
     """
-    Xử lý câu hỏi từ chatbot và trả về câu trả lời (luôn gọi Gemini API trước)
+    Xử lý câu hỏi từ chatbot và trả về câu trả lời (luôn gọi LLM trước)
     
     Flow:
     1. Lấy question từ request body
     2. Validate question không rỗng
-    3. Kiểm tra GEMINI_API_KEY có tồn tại không
-    4. Nếu có API key:
+    3. Lấy LLM backend (Gemini nếu có GEMINI_API_KEY, hoặc backend giả lập khi LLM_BACKEND=fake)
+    4. Nếu có LLM backend:
+       - Câu hỏi (đã chuẩn hóa) đã có trong answer cache -> trả về ngay
+       - Câu hỏi giống hệt đang được xử lý (cùng worker, hoặc worker khác nếu CHATBOT_COALESCE_SHARED)
+         -> chờ và dùng chung câu trả lời (coalesced: True)
        - Lấy bookstore context từ database
-       - Build system prompt với context
-       - Gọi Gemini API với system prompt + user question
-       - Nếu thành công: trả về response từ Gemini
-       - Nếu fail: fallback về FAQ
-    5. Nếu không có API key: dùng FAQ matching
+       - Build system prompt (cố định, cache được) + context theo câu hỏi (trong ngân sách token)
+       - Gọi LLM với system prompt + user question
+       - Nếu thành công: lưu vào answer cache, trả về response từ LLM
+       - Nếu đã đủ số lời gọi LLM đồng thời (chờ quá CHATBOT_LLM_ACQUIRE_TIMEOUT): trả lời "đang bận,
+         vui lòng thử lại" (source: 'busy', không cache)
+       - Nếu fail: fallback về FAQ (không cache)
+    5. Nếu không có LLM backend, hoặc circuit breaker đang mở (LLM lỗi liên tiếp): dùng FAQ matching
     6. Trả về câu trả lời
     
     Request Body:
@@ -474,7 +548,8 @@ def chatbot():
         }
     
     Returns:
-        - 200: Câu trả lời từ Gemini hoặc FAQ
+        - 200: Câu trả lời từ LLM hoặc FAQ (cached: True nếu lấy từ answer cache,
+          coalesced: True nếu dùng chung câu trả lời của request giống hệt đang chạy)
         - 400: Thiếu question
         - 500: Lỗi server
     """
@@ -490,58 +565,57 @@ def chatbot():
         if not question:
             return jsonify({'error': 'Vui lòng nhập câu hỏi'}), 400
         
-        # Bước 3: Kiểm tra API key
-        api_key = Config.GEMINI_API_KEY
-        logger.info(f"[CHATBOT]  Checking API key... (exists: {api_key is not None})")
-        if api_key:
-            logger.info(f"[CHATBOT]  API Key found: {api_key[:10]}...{api_key[-5:] if len(api_key) > 15 else '***'}")
-        else:
-            logger.warning("[CHATBOT]  API Key is None or empty")
+        # Bước 3: Lấy LLM backend
+        llm = get_llm_backend()
+        logger.info(f"[CHATBOT]  LLM backend: {llm.name if llm else 'none'}")
         
         answer = None
         source = None
+        cached = False
+        coalesced = False
         
-        if api_key:
-            # Bước 4: Có API key - luôn gọi Gemini trước
-            logger.info("[CHATBOT]  API Key found, calling Gemini...")
-            
-            # Build system prompt với context về bookstore và thông tin sách (nếu có)
-            system_prompt = build_system_prompt(question=question)
-            logger.info(f"[CHATBOT]  System prompt built (length: {len(system_prompt)} chars)")
-            
-            # Gọi Gemini API
-            gemini_answer = query_gemini(question, system_prompt)
+        answer_cache = get_answer_cache()
+        cached_answer = answer_cache.get(question) if llm else None
+        
+        if cached_answer:
+            # Bước 4a: Câu hỏi đã được trả lời trước đó (cùng catalog version, chưa hết TTL)
+            answer = cached_answer['answer']
+            source = cached_answer['source']
+            cached = True
+            logger.info("[CHATBOT]  Using cached answer")
+        elif llm and LLM_GUARD.available():
+            # Bước 4: Có LLM backend - luôn gọi LLM trước
+            logger.info(f"[CHATBOT]  Calling {llm.name}...")
+            result = None
+            busy = False
+            try:
+                with coalesce(question) as flight:
+                    if flight.leader:
+                        flight.result = answer_with_llm(llm, question)
+                    result = flight.result
+                    coalesced = flight.shared
+            except TimeoutError as e:
+                logger.warning(f"[CHATBOT]  {str(e)}")
+            except BulkheadFull as e:
+                logger.warning(f"[CHATBOT]  {str(e)}, asking user to retry")
+                busy = True
             
-            if gemini_answer:
-                answer = gemini_answer
-                source = 'gemini'
-                logger.info("[CHATBOT]  Using Gemini response")
+            if busy:
+                answer, source = BUSY_ANSWER, 'busy'
+            elif result:
+                answer = result['answer']
+                source = result['source']
+                if coalesced:
+                    answer_cache.set(question, answer, source)
+                logger.info(f"[CHATBOT]  Using {llm.name} response (coalesced: {coalesced})")
             else:
-                # Fallback về FAQ nếu Gemini fail
-                logger.warning("[CHATBOT]  Gemini failed, falling back to FAQ")
-                question_lower = question.lower()
-                for keyword, response in FAQ_DATABASE.items():
-                    if keyword != 'mặc định' and keyword in question_lower:
-                        answer = response
-                        source = 'faq'
-                        break
-                
-                if not answer:
-                    answer = FAQ_DATABASE.get('mặc định')
-                    source = 'faq_default'
+                # Fallback về FAQ nếu LLM fail
+                logger.warning("[CHATBOT]  LLM failed, falling back to FAQ")
+                answer, source = match_faq(question)
         else:
-            # Bước 5: Không có API key - dùng FAQ
-            logger.warning("[CHATBOT]  No API Key, using FAQ matching")
-            question_lower = question.lower()
-            for keyword, response in FAQ_DATABASE.items():
-                if keyword != 'mặc định' and keyword in question_lower:
-                    answer = response
-                    source = 'faq'
-                    break
-            
-            if not answer:
-                answer = FAQ_DATABASE.get('mặc định')
-                source = 'faq_default'
+            # Bước 5: Không có LLM backend hoặc LLM đang tạm ngưng - dùng FAQ
+            logger.warning("[CHATBOT]  No LLM backend or LLM circuit open, using FAQ matching")
+            answer, source = match_faq(question)
         
         logger.info(f"[CHATBOT]  Response source: {source}")
         logger.info("=" * 50)
@@ -549,7 +623,9 @@ def chatbot():
         # Bước 6: Trả về câu trả lời
         return jsonify({
             'answer': answer,
-            'source': source  # Thêm source để debug
+            'source': source,  # Thêm source để debug
+            'cached': cached,
+            'coalesced': coalesced
         }), 200
         
     except Exception as e:
@@ -563,3 +639,136 @@ def chatbot():
             'source': 'error'
         }), 200
 
+@chatbot_bp.route('/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """
+    Xử lý câu hỏi từ chatbot, trả về câu trả lời dạng Server-Sent Events
+    
+    Cùng logic với /api/chatbot, nhưng câu trả lời của LLM được gửi từng đoạn ngay khi
+    nhận được (LLMBackend.stream) thay vì chờ cả câu trả lời.
+    
+    Flow:
+    1. Lấy và validate question (lỗi validate trả JSON 400 như /api/chatbot)
+    2. Câu trả lời có sẵn (answer cache, hoặc FAQ khi không có LLM backend / circuit breaker đang mở)
+       -> gửi ngay một token event
+    3. Câu hỏi giống hệt đang được xử lý (coalesce) -> chờ và gửi câu trả lời dùng chung một lần
+       (coalesced: True), không có câu trả lời -> FAQ
+    4. Ngược lại build system prompt, stream LLM và forward từng đoạn
+       - Đã đủ số lời gọi LLM đồng thời -> trả lời "đang bận, vui lòng thử lại" (source: 'busy')
+       - LLM lỗi trước khi có đoạn đầu tiên -> fallback về FAQ
+       - Stream xong -> lưu câu trả lời vào answer cache, chia sẻ cho các request đang chờ
+    5. Kết thúc bằng done event kèm time-to-first-token (ttft_ms) và tổng thời gian (total_ms)
+    
+    Request Body:
+        {
+            "question": "Câu hỏi của người dùng"
+        }
+    
+    Events:
+        - meta: {"source", "cached", "coalesced"} - nguồn câu trả lời (gửi đầu tiên)
+        - token: {"text"} - một đoạn câu trả lời
+        - done: {"source", "cached", "ttft_ms", "total_ms"} - kết thúc
+        - error: {"error"} - LLM lỗi giữa chừng (các đoạn đã gửi vẫn giữ nguyên)
+    
+    Returns:
+        - 200: text/event-stream
+        - 400: Thiếu question
+    """
+    # Bước 1: Lấy và validate question
+    data = request.get_json(silent=True) or {}
+    question = str(data.get('question', '')).strip()
+    if not question:
+        return jsonify({'error': 'Vui lòng nhập câu hỏi'}), 400
+    
+    started = time.perf_counter()
+    
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    def answer_once(answer, source, cached=False, coalesced=False):
+        """Gửi câu trả lời có sẵn dưới dạng một token event"""
+        yield sse_event('meta', {'source': source, 'cached': cached, 'coalesced': coalesced})
+        yield sse_event('token', {'text': answer})
+        ttft_ms = elapsed_ms()
+        logger.info(f"[CHATBOT]  Stream answered from {source} (cached: {cached}, coalesced: {coalesced}) ttft_ms={ttft_ms}")
+        yield sse_event('done', {'source': source, 'cached': cached, 'ttft_ms': ttft_ms, 'total_ms': ttft_ms})
+    
+    def generate():
+        answer_cache = get_answer_cache()
+        llm = get_llm_backend()
+        
+        # Bước 2: Câu trả lời có sẵn
+        cached_answer = answer_cache.get(question) if llm else None
+        if cached_answer:
+            yield from answer_once(cached_answer['answer'], cached_answer['source'], cached=True)
+            return
+        if not llm or not LLM_GUARD.available():
+            yield from answer_once(*match_faq(question))
+            return
+        
+        # Bước 3: Câu hỏi giống hệt đang được xử lý
+        result = None
+        try:
+            with coalesce(question) as flight:
+                if flight.leader:
+                    yield from stream_answer(llm, flight)
+                    return
+                result = flight.result
+        except TimeoutError as e:
+            logger.warning(f"[CHATBOT]  {str(e)}")
+        
+        if result:
+            answer_cache.set(question, result['answer'], result['source'])
+            yield from answer_once(result['answer'], result['source'], coalesced=True)
+        else:
+            yield from answer_once(*match_faq(question))
+    
+    def stream_answer(llm, flight):
+        """Stream câu trả lời của LLM (request là leader), gán flight.result khi stream xong"""
+        answer_cache = get_answer_cache()
+        
+        # Bước 4: Stream LLM
+        version = catalog_version()
+        parts = []
+        ttft_ms = None
+        try:
+            system_prompt, context = build_system_prompt(question=question)
+            for text in stream_llm(llm, question, system_prompt, context):
+                if ttft_ms is None:
+                    ttft_ms = elapsed_ms()
+                    yield sse_event('meta', {'source': llm.name, 'cached': False, 'coalesced': False})
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+        except BulkheadFull as e:
+            logger.warning(f"[CHATBOT]  {str(e)}, asking user to retry")
+            yield from answer_once(BUSY_ANSWER, 'busy')
+            return
+        except Exception as e:
+            logger.error(f"[CHATBOT]  LLM stream failed after {len(parts)} chunks: {str(e)}")
+            if parts:
+                yield sse_event('error', {'error': 'Kết nối tới trợ lý AI bị gián đoạn, vui lòng thử lại.'})
+                yield sse_event('done', {'source': llm.name, 'cached': False, 'ttft_ms': ttft_ms, 'total_ms': elapsed_ms()})
+                return
+        
+        if not parts:
+            # LLM lỗi hoặc trả về rỗng trước đoạn đầu tiên -> FAQ
+            logger.warning("[CHATBOT]  LLM stream empty, falling back to FAQ")
+            yield from answer_once(*match_faq(question))
+            return
+        
+        # Bước 5: Lưu cache, chia sẻ cho các request đang chờ và kết thúc
+        answer = ''.join(parts)
+        answer_cache.set(question, answer, llm.name, version=version)
+        flight.result = {'answer': answer, 'source': llm.name}
+        total_ms = elapsed_ms()
+        logger.info(f"[CHATBOT]  Stream answered from {llm.name} ttft_ms={ttft_ms} total_ms={total_ms} chunks={len(parts)}")
+        yield sse_event('done', {'source': llm.name, 'cached': False, 'ttft_ms': ttft_ms, 'total_ms': total_ms})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Tắt buffering của nginx để token tới client ngay
+        }
+    )
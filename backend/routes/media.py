@@ -0,0 +1,108 @@
+"""
+File: routes/media.py
+
+Mục đích:
+Serve ảnh đã upload khi dùng storage backend 'local' (Config.STORAGE_BACKEND='local')
+
+Các endpoint trong file này:
+- GET /api/media/<path:key>: Trả về file ảnh trong LOCAL_STORAGE_DIR
+- PUT /api/media/<path:key>?token=...: Nhận upload trực tiếp (presigned) của backend local
+
+Cách hoạt động:
+- send_from_directory trả file qua wsgi.file_wrapper, gunicorn gửi bằng sendfile() (kernel copy
+  thẳng từ page cache ra socket, worker không đọc file vào Python).
+- Tên file là uuid không bao giờ bị ghi đè nên cache vĩnh viễn (immutable), có ETag/Last-Modified
+  và hỗ trợ Range/304.
+- Backend khác 'local' -> 404 (ảnh nằm trên R2/S3, không đi qua backend).
+- PUT đóng vai presigned URL của R2/S3 cho backend local (dev/test offline): upload token đã ký
+  thay cho chữ ký S3, file vẫn đi qua worker nên không dùng cho production.
+
+Dependencies:
+- utils.storage_backends: get_storage_backend, LocalStorageBackend
+- utils.storage: load_upload_token để kiểm tra upload token
+"""
+from flask import Blueprint, request, jsonify, send_from_directory
+from utils.storage import load_upload_token
+from utils.storage_backends import IMMUTABLE_CACHE_CONTROL, LocalStorageBackend, get_storage_backend
+
+media_bp = Blueprint('media', __name__)
+
+# Giống Cache-Control khi upload lên R2/S3 (utils.storage_backends.IMMUTABLE_CACHE_CONTROL)
+MEDIA_MAX_AGE = 31536000
+
+@media_bp.route('/media/<path:key>', methods=['GET'])
+def serve_media(key):
+    """
+    Trả về file ảnh của storage backend local
+
+    Flow:
+    1. Kiểm tra backend là 'local'
+    2. send_from_directory (chặn path thoát khỏi thư mục gốc, 404 nếu không có file)
+    3. Thêm Cache-Control immutable
+
+    Parameters:
+    - key (string): Tên object, ví dụ 'books/<uuid>-card.webp'
+
+    Returns:
+        - 200/206/304: Nội dung file
+        - 404: Không dùng backend local hoặc file không tồn tại
+    """
+    # Bước 1: Chỉ backend local
+    backend = get_storage_backend()
+    if not isinstance(backend, LocalStorageBackend):
+        return jsonify({'error': 'Not Found'}), 404
+
+    # Bước 2: Gửi file (sendfile qua wsgi.file_wrapper)
+    response = send_from_directory(backend.root, key, max_age=MEDIA_MAX_AGE, conditional=True)
+
+    # Bước 3: Cache vĩnh viễn
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
+
+@media_bp.route('/media/<path:key>', methods=['PUT'])
+def receive_media(key):
+    """
+    Nhận upload trực tiếp của backend local (thay cho presigned PUT URL của R2/S3)
+
+    Flow:
+    1. Kiểm tra backend là 'local'
+    2. Kiểm tra upload token (chữ ký, hạn dùng) và key khớp token
+    3. Content-Type và Content-Length phải đúng như đã ký (giống chữ ký S3)
+    4. Ghi file
+
+    Parameters:
+    - key (string): Tên object đã cấp bởi /api/admin/upload/presign
+    - token (query string): upload_token
+
+    Returns:
+        - 200: Upload thành công
+        - 400: Content-Type/kích thước không khớp, hoặc tên object không hợp lệ
+        - 403: Token không hợp lệ, hết hạn hoặc không dành cho key này
+        - 404: Không dùng backend local
+    """
+    # Bước 1: Chỉ backend local
+    backend = get_storage_backend()
+    if not isinstance(backend, LocalStorageBackend):
+        return jsonify({'error': 'Not Found'}), 404
+
+    # Bước 2: Upload token
+    try:
+        upload = load_upload_token(request.args.get('token'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 403
+    if upload['key'] != key:
+        return jsonify({'error': 'Upload token không dành cho file này'}), 403
+
+    # Bước 3: Điều kiện đã ký
+    if request.mimetype != upload['content_type']:
+        return jsonify({'error': 'Content-Type không khớp'}), 400
+    if request.content_length != upload['size']:
+        return jsonify({'error': 'Kích thước file không khớp'}), 400
+
+    # Bước 4: Ghi file (key thoát khỏi thư mục gốc -> ValueError)
+    try:
+        backend.put_object(key, request.get_data(cache=False), upload['content_type'], IMMUTABLE_CACHE_CONTROL)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Upload thành công'}), 200
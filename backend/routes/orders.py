@@ -15,10 +15,12 @@ Dependencies:
 - models.Cart: Model cho bảng cart
 - models.Book: Model cho bảng books (để validate stock)
 - utils.helpers: login_required decorator
+- utils.customer_stats: Cập nhật projection customer_stats khi tạo đơn
 """
 from flask import Blueprint, request, jsonify, session
 from models import Order, OrderItem, Cart, Book, db
 from utils.helpers import login_required
+from utils.customer_stats import record_order_created
 from decimal import Decimal
 
 orders_bp = Blueprint('orders', __name__)
@@ -81,7 +83,7 @@ def create_order():
     9. Với mỗi item trong giỏ:
        - Tạo OrderItem (lưu giá tại thời điểm mua)
        - Giảm stock của sách (stock = stock - quantity)
-    10. Xóa tất cả items trong giỏ hàng
+    10. Xóa tất cả items trong giỏ hàng và cập nhật customer_stats
     11. COMMIT TRANSACTION (lưu tất cả thay đổi)
     12. Trả về thông tin đơn hàng
     
@@ -176,6 +178,9 @@ def create_order():
         # Bước 10: Xóa tất cả items trong giỏ hàng
         Cart.query.filter_by(user_id=user_id).delete()
         
+        # Cập nhật projection customer_stats trong cùng transaction
+        record_order_created(new_order)
+        
         # Bước 11: COMMIT TRANSACTION (lưu tất cả thay đổi)
         db.session.commit()
         
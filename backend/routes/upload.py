@@ -2,17 +2,24 @@
 File: routes/upload.py
 
 Mục đích:
-Xử lý upload ảnh lên Cloudflare R2 storage
+Xử lý upload ảnh lên storage (Cloudflare R2, S3-compatible hoặc local - Config.STORAGE_BACKEND)
 
 Các endpoint trong file này:
-- POST /api/admin/upload: Upload ảnh lên Cloudflare R2 (admin only)
+- POST /api/admin/upload: Upload ảnh lên storage kèm các bản resize (admin only)
+- POST /api/admin/upload/presign: Cấp URL upload trực tiếp lên bucket (admin only)
+- POST /api/admin/upload/complete: Hoàn tất upload trực tiếp, xếp job tạo các bản resize (admin only)
+- GET /api/admin/upload/status: Kết quả job resize của upload trực tiếp (URL + srcset) (admin only)
+- GET /api/admin/storage/health: Kiểm tra kết nối tới storage và bucket (admin only)
+- POST /api/admin/storage/bucket: Tạo bucket/thư mục nếu chưa có, dùng khi setup lần đầu (admin only)
 
 Dependencies:
-- utils.storage: storage_service để upload file lên R2
+- utils.storage: storage_service để upload file lên storage
+- utils.images: ImageProcessorBusy khi hàng đợi resize ảnh đầy
 - utils.helpers: admin_required decorator
 """
 from flask import Blueprint, request, jsonify
 from utils.helpers import admin_required
+from utils.images import ImageProcessorBusy
 from utils.storage import storage_service
 
 upload_bp = Blueprint('upload', __name__)
@@ -21,23 +28,24 @@ upload_bp = Blueprint('upload', __name__)
 @admin_required
 def upload_image():
     """
-    Upload ảnh lên Cloudflare R2 (admin only)
+    Upload ảnh lên storage (admin only)
     
     Flow:
     1. Kiểm tra có file trong request không
     2. Kiểm tra file có tên không (không rỗng)
     3. Validate kích thước file (tối đa 5MB)
     4. Lấy folder từ query parameter (default: 'books')
-    5. Upload file lên Cloudflare R2
-    6. Trả về URL của file đã upload
+    5. Resize ảnh (thumbnail, card, detail - WebP + JPEG) và upload cùng ảnh gốc lên storage
+    6. Trả về URL ảnh gốc và srcset
     
     Query Parameters:
-    - folder (string): Thư mục lưu file trên R2 (default: 'books')
+    - folder (string): Thư mục lưu file trên storage: 'books' hoặc 'banners' (default: 'books')
     
     Returns:
-        - 200: Upload thành công, trả về URL
-        - 400: Không có file, file rỗng, hoặc file quá lớn
+        - 200: Upload thành công, trả về URL và srcset (lưu vào image_srcset của sách/banner)
+        - 400: Không có file, file rỗng, file quá lớn hoặc không phải ảnh hợp lệ
         - 500: Lỗi server
+        - 503: Hàng đợi xử lý ảnh đầy
     """
     try:
         # Bước 1: Kiểm tra có file không
@@ -62,17 +70,181 @@ def upload_image():
         # Bước 4: Lấy folder từ query parameter
         folder = request.args.get('folder', 'books')
         
-        # Bước 5: Upload lên Cloudflare R2
-        url = storage_service.upload_file(file, folder=folder)
+        # Bước 5: Resize + upload lên storage
+        result = storage_service.upload_image(file, folder=folder)
         
-        # Bước 6: Trả về URL
+        # Bước 6: Trả về URL + srcset
         return jsonify({
             'message': 'Upload thành công',
-            'url': url
+            'url': result['url'],
+            'srcset': result['srcset']
         }), 200
         
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except ImageProcessorBusy:
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503
     except Exception as e:
         return jsonify({'error': f'Lỗi khi upload: {str(e)}'}), 500
 
+@upload_bp.route('/admin/upload/presign', methods=['POST'])
+@admin_required
+def presign_upload():
+    """
+    Cấp URL để browser upload ảnh thẳng lên bucket (admin only)
+    
+    File (ví dụ banner lớn) không đi qua API worker: browser PUT/POST lên URL được ký, bucket
+    kiểm tra Content-Type và kích thước, sau đó gọi /api/admin/upload/complete rồi poll
+    /api/admin/upload/status để lấy srcset.
+    
+    Flow:
+    1. Lấy filename, content_type, size, folder từ request body
+    2. Validate và ký presigned URL (storage_service.create_direct_upload)
+    3. Trả về thông tin upload
+    
+    Request Body:
+    - filename (string): Tên file (lấy extension)
+    - content_type (string): MIME type của file
+    - size (int): Kích thước file (byte)
+    - folder (string): Thư mục lưu file: 'books' hoặc 'banners' (default: 'books')
+    
+    Returns:
+        - 200: {'key', 'upload_token', 'expires_in', 'upload': {'method', 'url', 'headers' | 'fields'}}
+        - 400: Thiếu thông tin, định dạng không hỗ trợ hoặc file quá lớn
+        - 500: Lỗi server
+    """
+    try:
+        # Bước 1: Lấy dữ liệu
+        data = request.get_json() or {}
+        if not data.get('filename') or not data.get('content_type') or data.get('size') is None:
+            return jsonify({'error': 'Thiếu thông tin file (filename, content_type, size)'}), 400
+        
+        # Bước 2-3: Ký presigned URL
+        result = storage_service.create_direct_upload(
+            data['filename'],
+            data['content_type'],
+            data['size'],
+            folder=data.get('folder', 'books')
+        )
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Lỗi khi tạo URL upload: {str(e)}'}), 500
+
+@upload_bp.route('/admin/upload/complete', methods=['POST'])
+@admin_required
+def complete_upload():
+    """
+    Hoàn tất upload trực tiếp: kiểm tra file trên bucket và xếp job tạo các bản resize (admin only)
+    
+    Flow:
+    1. Lấy upload_token từ request body
+    2. Kiểm tra object và xếp job resize chạy nền (storage_service.complete_direct_upload)
+    3. Trả về 202 ngay, client poll GET /api/admin/upload/status để lấy srcset
+    
+    Request Body:
+    - upload_token (string): Token từ /api/admin/upload/presign
+    
+    Returns:
+        - 202: {'message', 'key', 'url', 'status': 'processing'}
+        - 400: Token không hợp lệ/hết hạn, file chưa upload hoặc không khớp thông tin đã đăng ký
+        - 500: Lỗi server
+        - 503: Hàng đợi xử lý ảnh đầy (file vẫn trên bucket, gọi lại complete sau)
+    """
+    try:
+        # Bước 1: Lấy token
+        data = request.get_json() or {}
+        
+        # Bước 2: Kiểm tra + xếp job resize
+        result = storage_service.complete_direct_upload(data.get('upload_token'))
+        
+        # Bước 3: Trả về ngay
+        return jsonify(dict(result, message='Đang xử lý ảnh')), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ImageProcessorBusy:
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503
+    except Exception as e:
+        return jsonify({'error': f'Lỗi khi xử lý ảnh: {str(e)}'}), 500
+
+@upload_bp.route('/admin/upload/status', methods=['GET'])
+@admin_required
+def get_upload_status():
+    """
+    Kết quả job resize của upload trực tiếp (admin only)
+    
+    Flow:
+    1. Lấy upload_token từ query parameter
+    2. Đọc manifest kết quả trên storage (storage_service.direct_upload_status)
+    3. Trả về trạng thái: đang xử lý, xong (URL + srcset) hoặc lỗi
+    
+    Query Parameters:
+    - upload_token (string): Token từ /api/admin/upload/presign
+    
+    Returns:
+        - 200: {'message', 'url', 'srcset'} (giống POST /api/admin/upload)
+        - 202: {'status': 'processing'} - job chưa xong, poll lại sau
+        - 400: Token không hợp lệ/hết hạn, hoặc file không phải ảnh hợp lệ (đã bị xóa)
+        - 500: Lỗi server
+        - 503: Hàng đợi xử lý ảnh đầy (file vẫn trên bucket, gọi lại complete sau)
+    """
+    try:
+        # Bước 1-2: Đọc kết quả
+        result = storage_service.direct_upload_status(request.args.get('upload_token'))
+        
+        # Bước 3: Trả về theo trạng thái
+        if result['status'] == 'processing':
+            return jsonify(result), 202
+        if result['status'] == 'ready':
+            return jsonify({
+                'message': 'Upload thành công',
+                'url': result['url'],
+                'srcset': result['srcset']
+            }), 200
+        status_codes = {'invalid': 400, 'busy': 503}
+        return jsonify({'error': result['error']}), status_codes.get(result.get('reason'), 500)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Lỗi khi lấy trạng thái upload: {str(e)}'}), 500
+
+@upload_bp.route('/admin/storage/health', methods=['GET'])
+@admin_required
+def storage_health():
+    """
+    Kiểm tra kết nối tới storage và bucket (admin only)
+    
+    Thay cho việc kiểm tra bucket lúc import (mỗi worker gọi mạng khi boot).
+    Chỉ đọc, không tạo bucket (tạo bucket dùng POST /api/admin/storage/bucket).
+    
+    Flow:
+    1. HEAD bucket qua storage_service.health_check()
+    2. Trả về trạng thái
+    
+    Returns:
+        - 200: Storage hoạt động, {'ok': true, 'backend', 'bucket', 'latency_ms'}
+        - 503: Không kết nối được, thiếu cấu hình hoặc bucket không tồn tại (kèm 'error')
+    """
+    status = storage_service.health_check()
+    return jsonify(status), 200 if status['ok'] else 503
+
+@upload_bp.route('/admin/storage/bucket', methods=['POST'])
+@admin_required
+def create_storage_bucket():
+    """
+    Tạo bucket (hoặc thư mục của backend local) nếu chưa có, dùng khi setup lần đầu (admin only)
+    
+    Flow:
+    1. HEAD bucket, chưa có thì tạo (storage_service.health_check(create_bucket=True))
+    2. Trả về trạng thái
+    
+    Returns:
+        - 200: Storage hoạt động, {'ok': true, 'backend', 'bucket', 'latency_ms', 'created' (nếu vừa tạo)}
+        - 503: Không kết nối được, thiếu cấu hình hoặc không tạo được bucket (kèm 'error')
+    """
+    status = storage_service.health_check(create_bucket=True)
+    return jsonify(status), 200 if status['ok'] else 503
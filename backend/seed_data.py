@@ -3,7 +3,7 @@ Database seed script with sample data for Bookstore
 Includes admin user, test customers, sample books, categories, banners, and orders
 """
 from models import db, User, Book, Banner, Category, Order, OrderItem
-from utils.helpers import hash_password, generate_slug, generate_unique_book_slug, generate_book_code, generate_category_code, generate_banner_code
+from utils.helpers import hash_password, generate_slug, reserve_unique_book_slugs, generate_book_code, generate_category_code, generate_banner_codes
 from datetime import datetime, timedelta
 from decimal import Decimal
 from sqlalchemy import text, inspect
@@ -203,18 +203,6 @@ def seed_database():
     created_count = 0
     skipped_count = 0
     
-    # Query max category_code once before the loop to avoid duplicate codes
-    # Track next number in memory to ensure uniqueness within the batch
-    if has_slug_column:
-        from sqlalchemy import func
-        max_code = db.session.query(func.max(Category.category_code)).scalar()
-        if max_code:
-            next_category_number = int(max_code[2:]) + 1
-        else:
-            next_category_number = 1
-    else:
-        next_category_number = 1
-    
     # Only create categories if they don't exist (check by slug if available, else by key)
     for category_data in sample_categories:
         try:
@@ -243,9 +231,8 @@ def seed_database():
                 try:
                     if has_slug_column:
                         # Table has slug column, use ORM and generate category_code
-                        # Generate category_code from memory counter to ensure uniqueness within batch
-                        category_code = f'DM{next_category_number:06d}'
-                        next_category_number += 1
+                        # category_code comes from the category_code_seq sequence (unique across workers)
+                        category_code = generate_category_code(Category)
                         
                         # Use no_autoflush to prevent premature flush during category creation
                         with db.session.no_autoflush:
@@ -570,7 +557,14 @@ def seed_database():
         created_books_count = 0
         skipped_books_count = 0
         
-        for book_data in sample_books:
+        # Resolve unique slugs for the whole batch with a single prefix query
+        batch_slugs = {}
+        if has_book_slug_column:
+            base_slugs = {index: generate_slug(book_data.get('title', '')) for index, book_data in enumerate(sample_books)}
+            base_slugs = {index: base_slug for index, base_slug in base_slugs.items() if base_slug}
+            batch_slugs = dict(zip(base_slugs, reserve_unique_book_slugs(list(base_slugs.values()), Book)))
+        
+        for index, book_data in enumerate(sample_books):
             try:
                 title = book_data.get('title', '')
                 if not title:
@@ -599,23 +593,7 @@ def seed_database():
                         print(f"  Book with base_slug '{base_slug}' already exists, skipping")
                         continue
                     
-                    # Generate unique slug using raw SQL query to ensure we see existing books in database
-                    # This avoids SQLAlchemy session issues
-                    slug = base_slug
-                    counter = 1
-                    while True:
-                        # Use raw SQL to check if slug exists in database (not just in session)
-                        slug_check = db.session.execute(
-                            text("SELECT id FROM books WHERE slug = :slug LIMIT 1"),
-                            {'slug': slug}
-                        ).fetchone()
-                        
-                        if not slug_check:
-                            break  # Slug is unique, use it
-                        
-                        # Slug exists, try next number
-                        slug = f"{base_slug}-{counter}"
-                        counter += 1
+                    slug = batch_slugs[index]
                 else:
                     # Fallback: check by title using raw SQL if slug column doesn't exist
                     # (to avoid SQLAlchemy trying to query slug column)
@@ -750,9 +728,9 @@ def seed_database():
             }
         ]
         
-        for banner_data in sample_banners:
-            # Generate banner_code
-            banner_code = generate_banner_code(Banner)
+        # Allocate all banner codes in one call
+        banner_codes = generate_banner_codes(Banner, len(sample_banners))
+        for banner_data, banner_code in zip(sample_banners, banner_codes):
             banner_data['banner_code'] = banner_code
             
             banner = Banner(**banner_data)
@@ -1480,7 +1458,14 @@ if __name__ == '__main__':
     created_books_count = 0
     skipped_books_count = 0
     
-    for book_data in sample_books:
+    # Resolve unique slugs for the whole batch with a single prefix query
+    batch_slugs = {}
+    if has_book_slug_column:
+        base_slugs = {index: generate_slug(book_data.get('title', '')) for index, book_data in enumerate(sample_books)}
+        base_slugs = {index: base_slug for index, base_slug in base_slugs.items() if base_slug}
+        batch_slugs = dict(zip(base_slugs, reserve_unique_book_slugs(list(base_slugs.values()), Book)))
+    
+    for index, book_data in enumerate(sample_books):
         try:
             title = book_data.get('title', '')
             if not title:
@@ -1497,7 +1482,7 @@ if __name__ == '__main__':
                     print(f"Cannot generate slug for book '{title}', skipping")
                     continue
                 
-                slug = generate_unique_book_slug(base_slug, Book)
+                slug = batch_slugs[index]
                 existing_book = Book.query.filter_by(slug=slug).first()
             else:
                 # Fallback: check by title using raw SQL if slug column doesn't exist
@@ -1637,9 +1622,9 @@ if __name__ == '__main__':
             }
         ]
         
-        for banner_data in sample_banners:
-            # Generate banner_code
-            banner_code = generate_banner_code(Banner)
+        # Allocate all banner codes in one call
+        banner_codes = generate_banner_codes(Banner, len(sample_banners))
+        for banner_data, banner_code in zip(sample_banners, banner_codes):
             banner_data['banner_code'] = banner_code
             
             banner = Banner(**banner_data)
@@ -40,6 +40,8 @@ def seed_orders(force_reseed=False):
             Order.query.delete()
             db.session.commit()
             print("Deleted existing orders")
+            from utils.customer_stats import rebuild_customer_stats
+            rebuild_customer_stats()
         else:
             print("Orders already exist, skipping order seeding")
             return True
@@ -347,6 +349,15 @@ def seed_orders(force_reseed=False):
         print(f"   - Cancelled: {cancelled_count}")
         print(f"   - Distributed across {len(customers)} customers")
         print("   - Books from multiple categories: Sach Tieng Viet, Truyen Tranh, Do Trang Tri, Van Phong Pham")
+        
+        # Seeded orders bypass the order routes, so rebuild the customer_stats projection
+        from utils.customer_stats import rebuild_customer_stats
+        rebuilt = rebuild_customer_stats()
+        print(f"   - Rebuilt customer_stats for {rebuilt} customers")
+        
+        from utils.inventory import refresh_sales_velocity
+        refreshed = refresh_sales_velocity()
+        print(f"   - Refreshed sales_velocity for {refreshed} books")
         return True
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,51 @@
+"""
+Test tìm sách trong câu hỏi chatbot (utils/book_matcher.py)
+
+- Câu hỏi nhắc cả title hoặc đủ từ chính của title -> MATCH_FOUND
+- Câu hỏi chỉ trùng vài từ thông thường của title ("tôi thấy", "đáng giá bao nhiêu") -> không
+  được coi là khớp chắc chắn (MATCH_AMBIGUOUS để route hỏi lại Gemini)
+"""
+import pytest
+from utils.book_matcher import BookTitleIndex, MATCH_FOUND, MATCH_AMBIGUOUS, MATCH_NONE
+
+BOOKS = [
+    (1, 'Đắc Nhân Tâm', 'Dale Carnegie'),
+    (2, 'Nhà Giả Kim', 'Paulo Coelho'),
+    (3, 'Sapiens: Lược Sử Loài Người', 'Yuval Noah Harari'),
+    (4, 'Tôi Thấy Hoa Vàng Trên Cỏ Xanh', 'Nguyễn Nhật Ánh'),
+    (5, 'Cho Tôi Xin Một Vé Đi Tuổi Thơ', 'Nguyễn Nhật Ánh'),
+    (6, 'Tuổi Trẻ Đáng Giá Bao Nhiêu', 'Rosie Nguyễn'),
+    (7, 'Cây Cam Ngọt Của Tôi', 'José Mauro de Vasconcelos'),
+    (8, 'Naruto - Tập 1', 'Masashi Kishimoto'),
+    (9, 'One Piece - Tập 1', 'Eiichiro Oda'),
+    (10, 'Số Đỏ', 'Vũ Trọng Phụng'),
+]
+
+@pytest.fixture(scope='module')
+def index():
+    return BookTitleIndex(BOOKS)
+
+@pytest.mark.parametrize('question, book_id', [
+    ('Sách Đắc Nhân Tâm giá bao nhiêu?', 1),
+    ('nha gia kim con hang khong', 2),
+    ('Có cuốn Tôi thấy hoa vàng trên cỏ xanh không?', 4),
+    ('cho toi xin mot ve di tuoi tho con khong', 5),
+    ('Tuổi trẻ đáng giá bao nhiêu có bìa cứng không', 6),
+    ('Naruto tập 1 còn không', 8),
+    ('shop có one piece không', 9),
+    ('Số Đỏ của Vũ Trọng Phụng', 10),
+])
+def test_title_mentions_are_found(index, question, book_id):
+    assert index.match(question) == (MATCH_FOUND, book_id)
+
+@pytest.mark.parametrize('question', [
+    'tôi thấy sách hay',
+    'sách này đáng giá bao nhiêu',
+    'cho tôi xin một cuốn',
+    'sách dành cho tuổi trẻ',
+])
+def test_common_phrases_from_titles_are_not_found(index, question):
+    assert index.match(question).status == MATCH_AMBIGUOUS
+
+def test_question_without_book(index):
+    assert index.match('shop giao hàng mất mấy ngày?').status == MATCH_NONE
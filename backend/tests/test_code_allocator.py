@@ -0,0 +1,69 @@
+"""
+Test cấp phát mã (utils/codes.py)
+
+- PostgreSQL: nhiều thread (mỗi thread một session/connection riêng) cấp mã đồng thời
+  qua generate_*_codes, mọi mã phải khác nhau
+- SQLite: nhiều lần gọi trong cùng một transaction chưa commit không được cấp trùng mã
+"""
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Book, Category, Banner
+from utils.codes import ALL_ALLOCATORS, sync_code_sequences
+from utils.helpers import (
+    generate_book_code, generate_book_codes, generate_category_codes, generate_banner_codes
+)
+
+THREADS = 8
+CALLS_PER_THREAD = 25
+
+def _allocate_concurrently(app, generate, model):
+    """Mỗi thread gọi generate(model, n) nhiều lần trong app context riêng, trả về tất cả mã"""
+    def worker(thread_index):
+        codes = []
+        with app.app_context():
+            for call in range(CALLS_PER_THREAD):
+                codes.extend(generate(model, 1 + (thread_index + call) % 4))
+                # Commit/rollback xen kẽ: nextval() không bị rollback nên vẫn không trùng
+                if call % 2:
+                    db.session.commit()
+                else:
+                    db.session.rollback()
+            db.session.remove()
+        return codes
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return [code for codes in executor.map(worker, range(THREADS)) for code in codes]
+
+def test_concurrent_allocation_is_unique_on_postgres(postgres_app):
+    with postgres_app.app_context():
+        sync_code_sequences()
+
+    for generate, model, prefix in (
+        (generate_book_codes, Book, 'MS'),
+        (generate_category_codes, Category, 'DM'),
+        (generate_banner_codes, Banner, 'BN'),
+    ):
+        codes = _allocate_concurrently(postgres_app, generate, model)
+        expected = sum(1 + (t + c) % 4 for t in range(THREADS) for c in range(CALLS_PER_THREAD))
+        assert len(codes) == expected
+        assert len(set(codes)) == len(codes), f'{prefix}: trùng mã khi cấp đồng thời'
+        assert all(code.startswith(prefix) for code in codes)
+
+    with postgres_app.app_context():
+        for allocator in ALL_ALLOCATORS:
+            db.session.execute(db.text(f'DROP SEQUENCE IF EXISTS {allocator.sequence_name}'))
+        db.session.commit()
+
+def test_sqlite_allocation_is_unique_within_uncommitted_batch(sqlite_app):
+    with sqlite_app.app_context():
+        codes = [generate_book_code(Book) for _ in range(3)]
+        codes += generate_book_codes(Book, 5)
+        codes.append(generate_book_code(Book))
+        assert len(set(codes)) == len(codes) == 9
+        assert codes[0] == 'MS000001' and codes[-1] == 'MS000009'
+
+        # Sau khi commit các sách, mã tiếp theo nối tiếp mã lớn nhất đã cấp
+        for index, code in enumerate(codes):
+            db.session.add(Book(title=f'Book {index}', author='A', category='test', price=1, book_code=code,
+                                slug=f'book-{index}'))
+        db.session.commit()
+        assert generate_book_code(Book) == 'MS000010'
@@ -0,0 +1,186 @@
+"""
+File: utils/answer_cache.py
+
+Mục đích:
+Cache câu trả lời của chatbot cho các câu hỏi lặp lại ("phí ship", "đổi trả", "sách bán chạy"...)
+để không phải build system prompt và gọi Gemini cho mỗi lần hỏi.
+
+Cách hoạt động:
+- Key = câu hỏi đã chuẩn hóa (chữ thường, bỏ dấu tiếng Việt, bỏ dấu câu - xem
+  utils.book_matcher.fold_text) + catalog version. "Phí ship?" và "phi ship" dùng chung một entry.
+- Mỗi worker process có một cache LRU (giới hạn CHATBOT_ANSWER_CACHE_MAX_ENTRIES) với TTL
+  (CHATBOT_ANSWER_CACHE_TTL).
+- Khi catalog version thay đổi (sách/danh mục được sửa, đơn hàng completed), toàn bộ cache
+  bị xóa ở lần truy cập tiếp theo vì câu trả lời có thể nhắc đến giá, tồn kho, bestsellers cũ.
+- Xóa cache thủ công (admin) tăng cache generation - counter uint64 trong shared memory (mmap tạo
+  lúc import, trước khi gunicorn fork, giống utils.catalog). Cache của mọi worker so generation ở
+  lần truy cập tiếp theo và tự xóa, không chỉ worker nhận request xóa.
+- Đếm hits/misses/expired/evictions/purges để theo dõi hit rate (metrics là của từng worker).
+
+Các hàm/class trong file này:
+- normalize_question(question): Chuẩn hóa câu hỏi thành cache key
+- cache_generation(): Đọc generation hiện tại (dùng chung giữa các worker)
+- AnswerCache: Cache LRU + TTL có metrics
+- get_answer_cache(): Lấy instance dùng chung của process
+"""
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from utils.book_matcher import fold_text
+from utils.catalog import catalog_version
+
+_COUNTER = struct.Struct('<Q')
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung
+_generation_buffer = mmap.mmap(-1, _COUNTER.size)
+_generation_lock = multiprocessing.Lock()
+
+
+def cache_generation():
+    """Đọc cache generation hiện tại (đọc 8 bytes aligned, không cần lock)"""
+    return _COUNTER.unpack_from(_generation_buffer, 0)[0]
+
+
+def _bump_cache_generation():
+    """Tăng cache generation (cache của mọi worker bị xóa ở lần truy cập tiếp theo)"""
+    with _generation_lock:
+        _COUNTER.pack_into(_generation_buffer, 0, _COUNTER.unpack_from(_generation_buffer, 0)[0] + 1)
+
+
+def normalize_question(question):
+    """
+    Chuẩn hóa câu hỏi thành cache key
+
+    Args:
+        question (str): Câu hỏi gốc
+
+    Returns:
+        str: Câu hỏi chữ thường, không dấu, không dấu câu, ví dụ "Phí ship bao nhiêu?" -> "phi ship bao nhieu"
+    """
+    return ' '.join(fold_text(question).split())
+
+
+class AnswerCache:
+    """
+    Cache câu trả lời chatbot (LRU + TTL), tự xóa khi catalog thay đổi hoặc generation tăng
+
+    Attributes:
+    - max_entries: Số entry tối đa
+    - ttl: Thời gian sống của entry (giây)
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'purges': 0}
+
+    def _sync_version(self, version):
+        """
+        Xóa toàn bộ cache nếu catalog version hoặc cache generation khác lần truy cập trước
+        (gọi khi đang giữ lock)
+        """
+        version = (version, cache_generation())
+        if self._version != version:
+            if self._entries:
+                self._counters['purges'] += 1
+                self._entries.clear()
+            self._version = version
+
+    def get(self, question):
+        """
+        Lấy câu trả lời đã cache
+
+        Args:
+            question (str): Câu hỏi gốc
+
+        Returns:
+            dict | None: {'answer', 'source'} hoặc None nếu chưa có/hết hạn
+        """
+        key = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(catalog_version())
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def set(self, question, answer, source, version=None):
+        """
+        Lưu câu trả lời
+
+        Args:
+            question (str): Câu hỏi gốc
+            answer (str): Câu trả lời
+            source (str): Nguồn câu trả lời (gemini, faq...)
+            version (int): Catalog version lúc bắt đầu tạo câu trả lời. Nếu catalog đã đổi
+                trong lúc gọi Gemini thì không lưu (câu trả lời dựa trên dữ liệu cũ)
+        """
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            current = catalog_version()
+            self._sync_version(current)
+            if version is not None and version != current:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, {'answer': answer, 'source': source})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        """
+        Xóa toàn bộ cache của mọi worker (giữ metrics)
+
+        Worker hiện tại xóa ngay, các worker khác xóa ở lần truy cập tiếp theo (generation mới).
+        """
+        _bump_cache_generation()
+        with self._lock:
+            self._entries.clear()
+            self._version = (catalog_version(), cache_generation())
+
+    def stats(self):
+        """
+        Metrics của cache (của worker process hiện tại, không cộng dồn các worker)
+
+        Returns:
+            dict: hits, misses, expired, evictions, purges, hit_rate, size, max_entries, ttl,
+                scope ('worker'), pid, generation
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            size = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['size'] = size
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['scope'] = 'worker'
+        stats['pid'] = os.getpid()
+        stats['generation'] = cache_generation()
+        return stats
+
+
+_cache = AnswerCache(Config.CHATBOT_ANSWER_CACHE_MAX_ENTRIES, Config.CHATBOT_ANSWER_CACHE_TTL)
+
+
+def get_answer_cache():
+    """Lấy AnswerCache dùng chung của process"""
+    return _cache
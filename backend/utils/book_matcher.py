@@ -0,0 +1,226 @@
+"""
+File: utils/book_matcher.py
+
+Mục đích:
+Tìm sách được nhắc đến trong câu hỏi của khách hàng (chatbot) ngay trong process, không cần
+gọi Gemini để extract tên sách.
+
+Cách hoạt động:
+- Title và author được chuẩn hóa (fold_text): chữ thường, bỏ dấu tiếng Việt, bỏ dấu câu.
+  "Đắc Nhân Tâm" -> "dac nhan tam", nên khách gõ không dấu vẫn khớp.
+- Index lưu mọi n-gram token liên tiếp của title/author -> danh sách book id. Khi match,
+  các n-gram liên tiếp của câu hỏi được tra trong dict (O(số token câu hỏi x độ dài title)),
+  mỗi sách lấy đoạn khớp dài nhất.
+- Kết quả có 3 trạng thái:
+  - MATCH_FOUND: khớp chắc chắn (cả title, đủ các từ chính của title như "Naruto" trong
+    "Naruto - Tập 1", hoặc đoạn >= 2 token chứa phần lớn từ chính của title, tính theo IDF)
+  - MATCH_AMBIGUOUS: chỉ khớp yếu (một phần title như "tôi thấy" trong "Tôi Thấy Hoa Vàng...",
+    1 từ lẻ hiếm gặp, hoặc chỉ khớp tên tác giả) -> route có thể hỏi lại Gemini
+  - MATCH_NONE: câu hỏi không nhắc đến sách nào
+- Index được build lại khi catalog version thay đổi (utils.catalog), mỗi process một bản.
+
+Các hàm/class trong file này:
+- fold_text(text): Chuẩn hóa text (chữ thường, không dấu, không dấu câu)
+- BookTitleIndex: Index n-gram của title/author
+- get_book_index(): Lấy index của process (build lại khi catalog thay đổi)
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+from models import db, Book
+from utils.catalog import catalog_version
+
+MATCH_FOUND = 'found'
+MATCH_AMBIGUOUS = 'ambiguous'
+MATCH_NONE = 'none'
+
+BookMatch = namedtuple('BookMatch', ['status', 'book_id'])
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# Từ phổ biến trong câu hỏi (đã bỏ dấu) - đoạn khớp chỉ gồm các từ này không đủ để xác định sách
+_STOPWORDS = {
+    'sach', 'cuon', 'quyen', 'bo', 'tap', 'cua', 'va', 'voi', 'la', 'co', 'khong', 'nao', 'nay',
+    'do', 'cho', 'toi', 'minh', 'ban', 'shop', 'hay', 've', 'mot', 'nhung', 'cac', 'nhat', 'gi',
+    'the', 'nhu', 'trong', 'tren', 'duoc', 'con', 'hang', 'gia', 'bao', 'nhieu', 'mua', 'tim',
+    'of', 'and', 'a', 'an', 'to', 'in'
+}
+
+# Tỷ lệ (theo IDF) từ chính của title phải có trong đoạn khớp để coi là khớp chắc chắn
+_STRONG_CORE_SHARE = 0.75
+
+
+def fold_text(text):
+    """
+    Chuẩn hóa text để so khớp: chữ thường, bỏ dấu tiếng Việt, thay dấu câu bằng khoảng trắng
+
+    Args:
+        text (str): Text gốc
+
+    Returns:
+        str: Text đã chuẩn hóa, ví dụ "Đắc Nhân Tâm!" -> "dac nhan tam"
+    """
+    text = (text or '').lower().replace('đ', 'd')
+    text = ''.join(ch for ch in unicodedata.normalize('NFD', text) if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', text).strip()
+
+
+def _ngrams(tokens):
+    """Tất cả n-gram token liên tiếp (dạng tuple)"""
+    for start in range(len(tokens)):
+        for end in range(start + 1, len(tokens) + 1):
+            yield tuple(tokens[start:end])
+
+
+class BookTitleIndex:
+    """
+    Index n-gram (đã bỏ dấu) của title và author
+
+    Attributes:
+    - size: Số sách trong index
+    """
+
+    def __init__(self, books):
+        """
+        Args:
+            books (iterable): Các tuple (id, title, author)
+        """
+        self._titles = {}
+        self._core_tokens = {}
+        self._title_ngrams = {}
+        self._author_ngrams = {}
+        self._token_counts = Counter()
+
+        for book_id, title, author in books:
+            title_tokens = fold_text(title).split()
+            if not title_tokens:
+                continue
+            self._titles[book_id] = len(title_tokens)
+            # Từ chính của title: bỏ stopword và số ("naruto tap 1" -> {"naruto"})
+            self._core_tokens[book_id] = {
+                token for token in title_tokens if token not in _STOPWORDS and not token.isdigit()
+            }
+            self._token_counts.update(set(title_tokens))
+            for gram in set(_ngrams(title_tokens)):
+                self._title_ngrams.setdefault(gram, []).append(book_id)
+            for gram in set(_ngrams(fold_text(author).split())):
+                self._author_ngrams.setdefault(gram, []).append(book_id)
+
+        self.size = len(self._titles)
+
+    @staticmethod
+    def _longest_spans(tokens, ngrams):
+        """
+        Đoạn khớp dài nhất (số token) của mỗi book id trong câu hỏi
+
+        Nếu tokens[i:j] không có trong index thì tokens[i:j+1] cũng không có
+        (mọi tiền tố của một n-gram cũng là n-gram), nên dừng sớm.
+        """
+        spans = {}
+        for start in range(len(tokens)):
+            for end in range(start + 1, len(tokens) + 1):
+                book_ids = ngrams.get(tuple(tokens[start:end]))
+                if not book_ids:
+                    break
+                for book_id in book_ids:
+                    if spans.get(book_id, (0,))[0] < end - start:
+                        spans[book_id] = (end - start, start)
+        return spans
+
+    def _idf(self, token):
+        """Độ hiếm của token trong các title (token có trong ít title thì trọng số cao)"""
+        return math.log(1 + self.size / max(self._token_counts[token], 1))
+
+    def _is_strong(self, book_id, span, start, tokens):
+        """
+        Đoạn khớp đủ để xác định sách (không cần hỏi lại Gemini)
+
+        Một vài từ liền nhau của title ("tôi thấy", "đáng giá bao nhiêu", "tuổi trẻ") thường chỉ
+        là cách nói thông thường, nên đoạn khớp một phần title phải chứa phần lớn từ chính
+        của title (theo IDF) mới được tính.
+        """
+        matched = tokens[start:start + span]
+        if span >= 2 and span == self._titles[book_id]:
+            return True
+        core = self._core_tokens[book_id]
+        matched_core = core.intersection(matched)
+        if not matched_core:
+            return False
+        if span == 1:
+            # Khớp 1 từ: phải là tất cả từ chính của title, đủ dài để không trùng âm tiết thông thường
+            return matched_core == core and len(matched[0]) >= 4
+        if matched_core == core:
+            return True
+        core_weight = sum(self._idf(token) for token in core)
+        return sum(self._idf(token) for token in matched_core) / core_weight >= _STRONG_CORE_SHARE
+
+    def match(self, question):
+        """
+        Tìm sách được nhắc đến trong câu hỏi
+
+        Flow:
+        1. Chuẩn hóa câu hỏi, tìm đoạn khớp dài nhất với title và author của từng sách
+        2. Có sách khớp mạnh -> chọn sách có đoạn khớp dài nhất
+           (hòa thì ưu tiên: khớp nhiều phần title hơn, có nhắc tác giả, id nhỏ hơn)
+        3. Chỉ có khớp yếu (một phần title có từ không phải stopword, 1 từ lẻ hiếm gặp,
+           hoặc chỉ tên tác giả) -> MATCH_AMBIGUOUS
+        4. Không khớp -> MATCH_NONE
+
+        Args:
+            question (str): Câu hỏi của người dùng
+
+        Returns:
+            BookMatch: (status, book_id) - book_id chỉ có khi status là MATCH_FOUND
+        """
+        # Bước 1: Đoạn khớp của title và author
+        tokens = fold_text(question).split()
+        title_spans = self._longest_spans(tokens, self._title_ngrams)
+        author_spans = self._longest_spans(tokens, self._author_ngrams)
+
+        # Bước 2: Khớp mạnh
+        strong = [
+            (span, span / self._titles[book_id], author_spans.get(book_id, (0,))[0], -book_id)
+            for book_id, (span, start) in title_spans.items()
+            if self._is_strong(book_id, span, start, tokens)
+        ]
+        if strong:
+            return BookMatch(MATCH_FOUND, -max(strong)[3])
+
+        # Bước 3: Khớp yếu
+        for book_id, (span, start) in title_spans.items():
+            distinctive = [token for token in tokens[start:start + span] if token not in _STOPWORDS]
+            if span >= 2 and distinctive:
+                return BookMatch(MATCH_AMBIGUOUS, None)
+            token = tokens[start]
+            if token not in _STOPWORDS and len(token) >= 4 and self._token_counts[token] <= 3:
+                return BookMatch(MATCH_AMBIGUOUS, None)
+        if any(span >= 2 for span, _ in author_spans.values()):
+            return BookMatch(MATCH_AMBIGUOUS, None)
+
+        # Bước 4: Không nhắc đến sách
+        return BookMatch(MATCH_NONE, None)
+
+
+_index = {'version': None, 'index': None}
+_index_lock = threading.Lock()
+
+
+def get_book_index():
+    """
+    Lấy BookTitleIndex của process, build lại (1 query) khi catalog version thay đổi
+
+    Returns:
+        BookTitleIndex: Index hiện tại
+    """
+    version = catalog_version()
+    if _index['index'] is not None and _index['version'] == version:
+        return _index['index']
+
+    with _index_lock:
+        if _index['index'] is None or _index['version'] != version:
+            rows = db.session.query(Book.id, Book.title, Book.author).all()
+            _index['index'] = BookTitleIndex(rows)
+            _index['version'] = version
+    return _index['index']
@@ -0,0 +1,196 @@
+"""
+File: utils/book_search.py
+
+Mục đích:
+Tìm sách gần đúng theo title/author: không phân biệt dấu, chịu được lỗi chính tả ("harry poter"),
+sắp xếp theo độ giống và LIMIT/pagination chạy trong SQL thay vì ilike('%x%') rồi load hết kết quả.
+
+Cách hoạt động:
+- books.search_text = title + author đã chuẩn hóa bằng fold_text ("Đắc Nhân Tâm Dale Carnegie" ->
+  "dac nhan tam dale carnegie"), tự cập nhật khi lưu sách (models._set_book_search_text).
+- PostgreSQL có extension pg_trgm: GIN index gin_trgm_ops trên search_text (ix_books_search_trgm).
+  Query lọc search_text LIKE '%từ khóa%' hoặc word similarity >= BOOK_SEARCH_MIN_SIMILARITY
+  (toán tử %>, dùng được index), ORDER BY word_similarity DESC.
+- PostgreSQL chưa cài pg_trgm (role không có quyền CREATE EXTENSION): search_text ILIKE '%từ khóa%'
+  trong SQL (không dấu, nhưng không chịu lỗi chính tả), không load bảng books vào Python.
+- SQLite (dev/test): tính word similarity bằng Python trên search_text của tất cả sách (cùng cách
+  tách trigram với pg_trgm), rồi lọc/sắp xếp query theo danh sách id. Chỉ phù hợp với catalog nhỏ.
+- Từ khóa được escape khi dùng trong LIKE: '%' và '_' người dùng nhập là ký tự thường, không phải wildcard.
+
+Các hàm trong file này:
+- normalize_search_text(text): Chuẩn hóa text giống search_text
+- trigrams(text): Tập trigram của text (giống pg_trgm)
+- word_similarity(term, text): Độ giống của từ khóa với đoạn giống nhất trong text (0..1)
+- trigram_search_enabled(): Database có hỗ trợ tìm kiếm bằng pg_trgm không
+- apply_fuzzy_search(query, term): Lọc + sắp xếp Book query theo độ giống
+- search_books(term, limit): Top sách giống từ khóa nhất
+- ensure_book_search_text(): Backfill search_text cho sách đã có trước khi thêm cột
+"""
+import logging
+from sqlalchemy import bindparam, case, false, func, or_, text, update
+from config import Config
+from models import db, Book
+from utils.book_matcher import fold_text
+
+logger = logging.getLogger(__name__)
+
+_state = {'trigram_enabled': None}
+
+
+def normalize_search_text(value):
+    """Chuẩn hóa text giống search_text: fold_text + gộp khoảng trắng"""
+    return ' '.join(fold_text(value).split())
+
+
+def trigrams(value):
+    """
+    Tập trigram của text (mỗi từ được đệm 2 khoảng trắng phía trước, 1 phía sau như pg_trgm)
+
+    Args:
+        value (str): Text đã chuẩn hóa
+
+    Returns:
+        set: Trigram, ví dụ "tam" -> {'  t', ' ta', 'tam', 'am '}
+    """
+    grams = set()
+    for word in value.split():
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def word_similarity(term, value):
+    """
+    Độ giống (Jaccard trên trigram) giữa từ khóa và đoạn từ liên tiếp giống nhất trong text
+
+    Args:
+        term (str): Từ khóa đã chuẩn hóa
+        value (str): Text đã chuẩn hóa
+
+    Returns:
+        float: 0..1 (1 = text chứa nguyên từ khóa)
+    """
+    term_grams = trigrams(term)
+    if not term_grams:
+        return 0.0
+    words = value.split()
+    size = len(term.split())
+    best = 0.0
+    for start in range(len(words)):
+        for end in range(start + 1, min(len(words), start + size) + 1):
+            grams = trigrams(' '.join(words[start:end]))
+            best = max(best, len(term_grams & grams) / len(term_grams | grams))
+    return best
+
+
+def trigram_search_enabled():
+    """Database là PostgreSQL và đã cài pg_trgm (kiểm tra một lần mỗi process)"""
+    if _state['trigram_enabled'] is None:
+        enabled = False
+        if db.engine.dialect.name == 'postgresql':
+            try:
+                enabled = db.session.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first() is not None
+            except Exception as e:
+                logger.warning(f"[SEARCH] Cannot check pg_trgm extension: {str(e)}")
+        if not enabled:
+            logger.info("[SEARCH] pg_trgm not available, using "
+                        f"{'Python fuzzy' if db.engine.dialect.name == 'sqlite' else 'ILIKE'} search")
+        _state['trigram_enabled'] = enabled
+    return _state['trigram_enabled']
+
+
+def _rank_books_in_python(term):
+    """Fallback: tính word similarity cho tất cả sách, trả về danh sách id theo độ giống giảm dần"""
+    threshold = Config.BOOK_SEARCH_MIN_SIMILARITY
+    scored = []
+    for book_id, search_text, title, author in db.session.query(
+        Book.id, Book.search_text, Book.title, Book.author
+    ).all():
+        value = search_text or normalize_search_text(f"{title} {author}")
+        score = word_similarity(term, value)
+        if term in value or score >= threshold:
+            scored.append((-score, book_id))
+    scored.sort()
+    return [book_id for _, book_id in scored]
+
+
+def apply_fuzzy_search(query, term):
+    """
+    Lọc và sắp xếp Book query theo độ giống với từ khóa (title + author)
+
+    Flow:
+    1. Chuẩn hóa từ khóa (từ khóa chỉ có dấu câu -> ilike trên title như trước)
+    2. Có pg_trgm: filter LIKE/%> trên search_text, ORDER BY word_similarity DESC (chạy trong SQL)
+    3. Database khác SQLite nhưng không có pg_trgm: filter search_text ILIKE trong SQL
+    4. SQLite: xếp hạng bằng Python, filter theo id và giữ thứ tự
+
+    Args:
+        query: Book query (có thể đã có filter khác)
+        term (str): Từ khóa người dùng nhập
+
+    Returns:
+        Query: Query đã lọc và sắp xếp (caller tự limit/paginate)
+    """
+    # Bước 1: Chuẩn hóa từ khóa
+    folded = normalize_search_text(term)
+    if not folded:
+        return query.filter(Book.title.icontains(term, autoescape=True))
+
+    # Bước 2: pg_trgm
+    if trigram_search_enabled():
+        db.session.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {'threshold': str(Config.BOOK_SEARCH_MIN_SIMILARITY)}
+        )
+        return query.filter(or_(
+            Book.search_text.contains(folded, autoescape=True),
+            Book.search_text.op('%>')(folded)
+        )).order_by(func.word_similarity(folded, Book.search_text).desc(), Book.id)
+
+    # Bước 3: PostgreSQL không có pg_trgm - ILIKE trong SQL (không load cả bảng books)
+    if db.engine.dialect.name != 'sqlite':
+        return query.filter(Book.search_text.icontains(folded, autoescape=True)).order_by(Book.id)
+
+    # Bước 4: Fallback Python (SQLite)
+    book_ids = _rank_books_in_python(folded)
+    if not book_ids:
+        return query.filter(false())
+    return query.filter(Book.id.in_(book_ids)).order_by(
+        case({book_id: position for position, book_id in enumerate(book_ids)}, value=Book.id)
+    )
+
+
+def search_books(term, limit=10):
+    """
+    Top sách giống từ khóa nhất
+
+    Args:
+        term (str): Từ khóa
+        limit (int): Số sách tối đa
+
+    Returns:
+        list: Danh sách Book theo độ giống giảm dần
+    """
+    return apply_fuzzy_search(Book.query, term).limit(limit).all()
+
+
+def ensure_book_search_text():
+    """Backfill search_text cho các sách chưa có (database tạo trước khi thêm cột)"""
+    rows = db.session.query(Book.id, Book.title, Book.author).filter(Book.search_text.is_(None)).all()
+    if not rows:
+        return
+    # Giữ nguyên updated_at vì đây không phải thay đổi của admin
+    table = Book.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('b_id'))
+        .values(search_text=bindparam('b_search_text'), updated_at=table.c.updated_at),
+        [
+            {'b_id': book_id, 'b_search_text': normalize_search_text(f"{title} {author}")}
+            for book_id, title, author in rows
+        ]
+    )
+    db.session.commit()
+    logger.info(f"[SEARCH] Backfilled search_text for {len(rows)} books")
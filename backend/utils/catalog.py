@@ -0,0 +1,95 @@
+"""
+File: utils/catalog.py
+
+Mục đích:
+Theo dõi "phiên bản" của catalog (sách, danh mục, số lượng đã bán) để các cache dẫn xuất
+từ catalog (context chatbot, ...) biết khi nào cần tính lại.
+
+Cách hoạt động:
+- Catalog version là một counter uint64 trong shared memory (mmap tạo lúc import, trước khi
+  gunicorn fork) nên mọi worker thấy cùng một giá trị.
+- Version được tăng tự động qua SQLAlchemy session events: before_flush đánh dấu session
+  nếu có Book/Category được thêm/sửa/xóa hoặc Order completed/đổi status (ảnh hưởng số lượng đã bán),
+  after_commit tăng version. Nhờ vậy mọi route/script sửa catalog qua ORM đều được bắt,
+  không cần gọi thủ công ở từng route.
+
+Các hàm trong file này:
+- catalog_version(): Đọc version hiện tại
+- bump_catalog_version(): Tăng version (dùng cho thay đổi không đi qua ORM flush, ví dụ bulk update)
+"""
+import mmap
+import multiprocessing
+import struct
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Book, Category, Order
+
+_COUNTER = struct.Struct('<Q')
+_buffer = mmap.mmap(-1, _COUNTER.size)
+_lock = multiprocessing.Lock()
+
+_CATALOG_MODELS = (Book, Category)
+_SESSION_FLAG = 'catalog_changed'
+
+# Các cột thay đổi thường xuyên (mỗi đơn hàng, batch job) nhưng không xuất hiện trong dữ liệu catalog
+# dẫn xuất, nên không làm tăng version
+_IGNORED_ATTRIBUTES = {
+    'stock', 'updated_at', 'sales_velocity', 'sales_velocity_updated_at',
+    'related_books', 'related_books_updated_at'
+}
+
+
+def catalog_version():
+    """Đọc catalog version hiện tại (đọc 8 bytes aligned, không cần lock)"""
+    return _COUNTER.unpack_from(_buffer, 0)[0]
+
+
+def bump_catalog_version():
+    """Tăng catalog version (các cache dẫn xuất từ catalog sẽ tính lại ở lần đọc tiếp theo)"""
+    with _lock:
+        _COUNTER.pack_into(_buffer, 0, _COUNTER.unpack_from(_buffer, 0)[0] + 1)
+
+
+def _has_catalog_changes(instance):
+    """Kiểm tra instance có thay đổi ở cột nào khác các cột bị bỏ qua không"""
+    state = inspect(instance)
+    return any(
+        state.attrs[column.key].history.has_changes()
+        for column in state.mapper.column_attrs
+        if column.key not in _IGNORED_ATTRIBUTES
+    )
+
+
+def _touches_catalog(session):
+    """Kiểm tra các thay đổi đang chờ flush có ảnh hưởng catalog không"""
+    for instance in session.new:
+        if isinstance(instance, _CATALOG_MODELS):
+            return True
+        if isinstance(instance, Order) and instance.status == 'completed':
+            return True
+    for instance in session.deleted:
+        if isinstance(instance, _CATALOG_MODELS + (Order,)):
+            return True
+    for instance in session.dirty:
+        if isinstance(instance, _CATALOG_MODELS) and _has_catalog_changes(instance):
+            return True
+        if isinstance(instance, Order) and inspect(instance).attrs.status.history.has_changes():
+            return True
+    return False
+
+
+@event.listens_for(Session, 'before_flush')
+def _mark_catalog_changes(session, flush_context, instances):
+    if not session.info.get(_SESSION_FLAG) and _touches_catalog(session):
+        session.info[_SESSION_FLAG] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop(_SESSION_FLAG, False):
+        bump_catalog_version()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _clear_after_rollback(session, previous_transaction):
+    session.info.pop(_SESSION_FLAG, None)
@@ -0,0 +1,285 @@
+"""
+File: utils/chatbot_context.py
+
+Mục đích:
+Cung cấp context về cửa hàng (danh mục, tổng số sách, bestsellers, sách theo danh mục) cho
+system prompt của chatbot dưới dạng snapshot dùng chung, thay vì query lại cho mỗi tin nhắn.
+
+Cách hoạt động:
+- build_bookstore_context() tính context từ database bằng 2 query (danh mục active +
+  một aggregate số lượng đã bán cho tất cả sách), phần còn lại xử lý trong Python.
+- Snapshot (catalog version, thời điểm tạo, context dạng JSON) nằm trong shared memory (mmap
+  tạo lúc import, trước khi gunicorn fork) nên một worker build thì các worker khác dùng lại.
+- Snapshot được coi là cũ khi catalog version thay đổi (xem utils.catalog) hoặc quá
+  CHATBOT_CONTEXT_TTL giây (số lượng đã bán thay đổi theo đơn hàng).
+- Mỗi process giữ thêm một bản copy local để lần đọc tiếp theo không phải decode lại.
+- Context được chia làm hai phần:
+  - format_store_overview(): danh sách danh mục, ít thay đổi, nằm trong phần system prompt được
+    cache (Gemini context caching).
+  - format_catalog_context(): bestsellers + sách theo danh mục, cắt theo ngân sách token và độ
+    liên quan tới câu hỏi (utils.prompt_budget), gửi kèm từng câu hỏi.
+
+Các hàm/class trong file này:
+- SharedSnapshot: Vùng shared memory lưu một snapshot text kèm version
+- build_bookstore_context(): Tính context từ database (không cache)
+- get_bookstore_context(): Lấy context từ snapshot (build lại khi cần)
+- format_store_overview(context): Phần context ổn định (danh mục)
+- format_catalog_context(context, question, max_tokens): Phần context theo câu hỏi, trong ngân sách token
+"""
+import json
+import logging
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from sqlalchemy import func, case
+from models import db, Book, Category, OrderItem, Order
+from config import Config
+from utils.catalog import catalog_version
+from utils.prompt_budget import estimate_tokens, select_by_relevance
+
+logger = logging.getLogger(__name__)
+
+# version (uint64), built_at (epoch float64), length (uint32)
+_HEADER = struct.Struct('<QdI')
+
+DEFAULT_CONTEXT = {'total_books': None, 'categories': [], 'bestsellers': [], 'category_books': []}
+
+# Số sách ứng viên mỗi danh mục (format_catalog_context chỉ giữ những sách vừa ngân sách token)
+_BOOKS_PER_CATEGORY = 5
+
+
+class SharedSnapshot:
+    """
+    Snapshot text dùng chung giữa các process (shared memory + lock)
+
+    Attributes:
+    - capacity: Số bytes tối đa của text (UTF-8)
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buffer = mmap.mmap(-1, _HEADER.size + capacity)
+        self._lock = multiprocessing.Lock()
+
+    def read(self):
+        """
+        Đọc snapshot hiện tại
+
+        Returns:
+            tuple | None: (version, built_at, text) hoặc None nếu chưa có snapshot
+        """
+        with self._lock:
+            version, built_at, length = _HEADER.unpack_from(self._buffer, 0)
+            if length == 0:
+                return None
+            data = self._buffer[_HEADER.size:_HEADER.size + length]
+        return version, built_at, data.decode('utf-8')
+
+    def write(self, version, built_at, text):
+        """
+        Ghi snapshot mới
+
+        Returns:
+            bool: False nếu text vượt quá capacity (không ghi)
+        """
+        data = text.encode('utf-8')
+        if not data or len(data) > self.capacity:
+            return False
+        with self._lock:
+            self._buffer[_HEADER.size:_HEADER.size + len(data)] = data
+            _HEADER.pack_into(self._buffer, 0, version, built_at, len(data))
+        return True
+
+    def clear(self):
+        """Xóa snapshot (lần đọc tiếp theo sẽ build lại)"""
+        with self._lock:
+            _HEADER.pack_into(self._buffer, 0, 0, 0.0, 0)
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung
+CONTEXT_SNAPSHOT = SharedSnapshot(Config.CHATBOT_CONTEXT_MAX_BYTES)
+
+_local = {'snapshot': None}
+_local_lock = threading.Lock()
+
+
+def build_bookstore_context():
+    """
+    Tính context về bookstore từ database (bao gồm bestsellers và sách theo category)
+
+    Flow:
+    1. Query danh sách categories (chỉ active)
+    2. Một aggregate query: số lượng đã bán (đơn completed) của tất cả sách
+    3. Từ kết quả aggregate: tổng số sách, top 10 bestsellers, top sách mỗi category
+    4. Trả về context dạng dict (lưu được dưới dạng JSON trong snapshot)
+
+    Returns:
+        dict: {'total_books', 'categories': [tên], 'bestsellers': [sách],
+               'category_books': [{'category', 'books': [sách]}]}, mỗi sách là
+               {'title', 'author', 'sold'}; None nếu lỗi database
+    """
+    try:
+        # Bước 1: Lấy danh sách categories (chỉ active)
+        categories = Category.query.filter_by(is_active=True).order_by(Category.display_order.asc()).all()
+
+        # Bước 2: Số lượng đã bán của tất cả sách (outer join để lấy cả sách chưa có order)
+        total_sold = func.coalesce(func.sum(
+            case((Order.status == 'completed', OrderItem.quantity), else_=0)
+        ), 0).label('total_sold')
+        rows = db.session.query(
+            Book.id, Book.title, Book.author, Book.category, total_sold
+        ).outerjoin(OrderItem, Book.id == OrderItem.book_id).outerjoin(
+            Order, OrderItem.order_id == Order.id
+        ).group_by(Book.id, Book.title, Book.author, Book.category).all()
+
+        # Bước 3: Tổng số sách, bestsellers, sách theo category
+        ranked = sorted(rows, key=lambda row: (-int(row.total_sold), row.id))
+
+        def book_entry(row):
+            return {'title': row.title, 'author': row.author, 'sold': int(row.total_sold)}
+
+        books_by_category = {}
+        for row in ranked:
+            books_by_category.setdefault(row.category, []).append(row)
+
+        category_books = []
+        for category in categories:
+            books = books_by_category.get(category.key, [])[:_BOOKS_PER_CATEGORY]
+            if books:
+                category_books.append({'category': category.name, 'books': [book_entry(row) for row in books]})
+
+        # Bước 4: Context dạng dict
+        return {
+            'total_books': len(rows),
+            'categories': [category.name for category in categories],
+            'bestsellers': [book_entry(row) for row in ranked if int(row.total_sold) > 0][:10],
+            'category_books': category_books
+        }
+    except Exception as e:
+        # Nếu có lỗi khi query database, trả về context mặc định
+        logger.error(f"[CHATBOT] Error in build_bookstore_context: {str(e)}")
+        return None
+
+
+def _is_fresh(snapshot, version, now):
+    return snapshot is not None and snapshot[0] == version and now - snapshot[1] < Config.CHATBOT_CONTEXT_TTL
+
+
+def get_bookstore_context():
+    """
+    Lấy context về bookstore từ snapshot dùng chung
+
+    Flow:
+    1. Đọc catalog version hiện tại
+    2. Bản copy local của process còn mới -> trả về (không chạm shared memory)
+    3. Snapshot trong shared memory còn mới (worker khác vừa build) -> decode, copy về local, trả về
+    4. Ngược lại build lại từ database, ghi vào shared memory và local
+
+    Returns:
+        dict: Context (xem build_bookstore_context), DEFAULT_CONTEXT nếu lỗi database
+    """
+    # Bước 1: Catalog version hiện tại (đọc trước khi build để thay đổi trong lúc build làm snapshot cũ)
+    version = catalog_version()
+    now = time.time()
+
+    # Bước 2: Bản copy local
+    snapshot = _local['snapshot']
+    if _is_fresh(snapshot, version, now):
+        return snapshot[2]
+
+    # Bước 3: Snapshot dùng chung
+    shared = CONTEXT_SNAPSHOT.read()
+    if _is_fresh(shared, version, now):
+        snapshot = (shared[0], shared[1], json.loads(shared[2]))
+        with _local_lock:
+            _local['snapshot'] = snapshot
+        return snapshot[2]
+
+    # Bước 4: Build lại
+    context = build_bookstore_context()
+    if context is None:
+        return DEFAULT_CONTEXT
+
+    data = json.dumps(context, ensure_ascii=False)
+    if not CONTEXT_SNAPSHOT.write(version, now, data):
+        logger.warning("[CHATBOT] Context snapshot exceeds CHATBOT_CONTEXT_MAX_BYTES, caching per process only")
+    with _local_lock:
+        _local['snapshot'] = (version, now, context)
+    logger.info(f"[CHATBOT] Bookstore context rebuilt (catalog version {version}, {len(data)} bytes)")
+    return context
+
+
+def format_store_overview(context):
+    """
+    Phần context ổn định: danh sách danh mục (chỉ đổi khi danh mục thay đổi, nên cache được)
+
+    Args:
+        context (dict): Context từ get_bookstore_context()
+
+    Returns:
+        str: Text cho system prompt
+    """
+    if not context['categories']:
+        return "Cửa hàng sách trực tuyến với nhiều danh mục sách đa dạng."
+    return f"Cửa hàng có các danh mục sách sau:\n- {', '.join(context['categories'])}"
+
+
+def _book_line(book):
+    if book['sold'] > 0:
+        return f"{book['title']} - {book['author']} (Đã bán: {book['sold']})"
+    return f"{book['title']} - {book['author']}"
+
+
+def format_catalog_context(context, question=None, max_tokens=None):
+    """
+    Phần context theo câu hỏi: tổng số sách, bestsellers và sách theo danh mục trong ngân sách token
+
+    Flow:
+    1. Tạo entry cho từng bestseller và từng sách trong mỗi danh mục (thứ tự ưu tiên mặc định:
+       bestsellers theo thứ hạng, rồi sách theo danh mục)
+    2. Chọn entry liên quan nhất tới câu hỏi trong ngân sách (utils.prompt_budget)
+    3. Format lại theo từng phần (giữ thứ hạng và nhóm theo danh mục)
+
+    Args:
+        context (dict): Context từ get_bookstore_context()
+        question (str): Câu hỏi của người dùng (optional)
+        max_tokens (int): Ngân sách token (default: Config.CHATBOT_PROMPT_CONTEXT_TOKENS)
+
+    Returns:
+        str: Text context
+    """
+    max_tokens = Config.CHATBOT_PROMPT_CONTEXT_TOKENS if max_tokens is None else max_tokens
+
+    # Bước 1: Entry (text, keywords)
+    entries = []
+    for rank, book in enumerate(context['bestsellers'], 1):
+        entries.append((f"{rank}. {_book_line(book)}", f"{book['title']} {book['author']} ban chay"))
+    for section in context['category_books']:
+        for book in section['books']:
+            entries.append((_book_line(book), f"{section['category']} {book['title']} {book['author']}"))
+
+    # Bước 2: Chọn trong ngân sách (trừ phần tiêu đề luôn có)
+    text = "[Thông tin cửa hàng:]"
+    if context['total_books'] is not None:
+        text += f"\nCửa hàng có {context['total_books']} cuốn sách."
+    selected = set(select_by_relevance(question, entries, max_tokens - estimate_tokens(text)))
+
+    # Bước 3: Format theo từng phần
+    bestseller_count = len(context['bestsellers'])
+    bestsellers = [entries[index][0] for index in range(bestseller_count) if index in selected]
+    if bestsellers:
+        text += "\n\nSách bán chạy nhất:\n" + "\n".join(bestsellers)
+
+    category_sections = []
+    index = bestseller_count
+    for section in context['category_books']:
+        books = [entries[index + offset][0] for offset in range(len(section['books'])) if index + offset in selected]
+        index += len(section['books'])
+        if books:
+            category_sections.append(f"- {section['category']}: {', '.join(books)}")
+    if category_sections:
+        text += "\n\nSách theo danh mục:\n" + "\n".join(category_sections)
+
+    return text
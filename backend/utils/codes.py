@@ -0,0 +1,157 @@
+"""
+File: utils/codes.py
+
+Mục đích:
+Cấp phát mã định danh (MS000001, DM000001, BN000001, KH001) dựa trên database sequence.
+
+Trước đây mỗi lần tạo mã phải SELECT max(code) rồi probe từng mã trong vòng lặp,
+tốn nhiều query và dễ trùng mã khi có nhiều request đồng thời (duplicate key).
+Với PostgreSQL, nextval() là atomic và không phụ thuộc transaction nên các worker
+có thể cấp mã song song mà không bao giờ trùng. Có thể lấy N mã trong một query
+(generate_series) cho các luồng bulk như seed/import.
+
+Với database không hỗ trợ sequence (SQLite khi chạy local/test), fallback về
+max(code) + 1 (SQLite chỉ cho phép một writer tại một thời điểm). Các mã đã cấp nhưng chưa
+flush/commit (ví dụ seed tạo nhiều sách trong một transaction) được nhớ trong session.info,
+nên các lần gọi liên tiếp trong cùng session không cấp trùng mã.
+
+Các allocator trong file này:
+- BOOK_CODES: Mã sách (MS + 6 số), sequence book_code_seq
+- CATEGORY_CODES: Mã danh mục (DM + 6 số), sequence category_code_seq
+- BANNER_CODES: Mã banner (BN + 6 số), sequence banner_code_seq
+- CUSTOMER_CODES: Mã khách hàng (KH + 3 số), sequence customer_code_seq
+"""
+from sqlalchemy import text
+from models import db
+
+
+class CodeAllocator:
+    """
+    Cấp phát mã dạng PREFIX + số (zero-padded) từ một database sequence
+
+    Attributes:
+    - prefix: Tiền tố của mã (ví dụ: 'MS')
+    - width: Số chữ số tối thiểu (zero-padded)
+    - sequence_name: Tên sequence trong PostgreSQL
+    - table_name, column_name: Bảng và cột chứa mã (dùng để đồng bộ sequence)
+    """
+
+    def __init__(self, prefix, width, sequence_name, table_name, column_name):
+        self.prefix = prefix
+        self.width = width
+        self.sequence_name = sequence_name
+        self.table_name = table_name
+        self.column_name = column_name
+
+    def format(self, number):
+        """Format số thành mã (ví dụ: 1 -> 'MS000001')"""
+        return f'{self.prefix}{number:0{self.width}d}'
+
+    def _max_existing_sql(self):
+        """SQL lấy số lớn nhất đang có trong bảng (bỏ qua mã sai định dạng)"""
+        start = len(self.prefix) + 1
+        return (
+            f"SELECT COALESCE(MAX(CAST(SUBSTRING({self.column_name} FROM {start}) AS INTEGER)), 0) "
+            f"FROM {self.table_name} "
+            f"WHERE {self.column_name} ~ '^{self.prefix}[0-9]+$'"
+        )
+
+    def ensure_sequence(self):
+        """
+        Tạo sequence (nếu chưa có) và đồng bộ với dữ liệu hiện có
+
+        Flow:
+        1. CREATE SEQUENCE IF NOT EXISTS
+        2. setval về max(số lớn nhất trong bảng, giá trị sequence đã cấp) + 1
+           (không bao giờ lùi sequence, nên gọi lại nhiều lần vẫn an toàn)
+        """
+        if not _supports_sequences():
+            return
+
+        db.session.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {self.sequence_name}"))
+        db.session.execute(text(
+            f"SELECT setval('{self.sequence_name}', GREATEST(({self._max_existing_sql()}), "
+            f"(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {self.sequence_name})) + 1, false)"
+        ))
+        db.session.commit()
+
+    def allocate(self, count=1):
+        """
+        Cấp phát `count` mã mới trong một lần gọi
+
+        Args:
+            count (int): Số lượng mã cần cấp (default: 1)
+
+        Returns:
+            list[str]: Danh sách mã theo thứ tự tăng dần
+        """
+        if count < 1:
+            return []
+
+        if _supports_sequences():
+            # Một round trip cho cả batch, nextval() không bị rollback nên không bao giờ trùng
+            rows = db.session.execute(
+                text(f"SELECT nextval('{self.sequence_name}') FROM generate_series(1, :count)"),
+                {'count': count}
+            ).fetchall()
+            numbers = sorted(row[0] for row in rows)
+        else:
+            # Fallback cho SQLite: max + 1 (SQLite serialize writers)
+            codes = db.session.execute(
+                text(f"SELECT {self.column_name} FROM {self.table_name} "
+                     f"WHERE {self.column_name} LIKE :prefix"),
+                {'prefix': f'{self.prefix}%'}
+            ).scalars().all()
+            last = max((int(code[len(self.prefix):]) for code in codes
+                        if code[len(self.prefix):].isdigit()), default=0)
+
+            # Mã đã cấp trong session này nhưng chưa có trong bảng (object chưa flush):
+            # giữ cả block trong một lần gọi, lần gọi sau tiếp tục sau block này
+            reserved = db.session.info.setdefault('reserved_codes', {})
+            last = max(last, reserved.get(self.sequence_name, 0))
+            reserved[self.sequence_name] = last + count
+            numbers = range(last + 1, last + 1 + count)
+
+        return [self.format(number) for number in numbers]
+
+    def next(self):
+        """Cấp phát một mã mới"""
+        return self.allocate(1)[0]
+
+    def next_value_expression(self):
+        """
+        Giá trị mã mới để gán trực tiếp vào câu INSERT
+
+        Với PostgreSQL trả về SQL expression (nextval + format) để mã được cấp ngay trong
+        câu INSERT, không tốn thêm round trip. Với SQLite trả về mã đã cấp sẵn (str).
+        """
+        if not _supports_sequences():
+            return self.next()
+
+        return text(
+            f"(SELECT '{self.prefix}' || lpad(v, greatest({self.width}, length(v)), '0') "
+            f"FROM (SELECT nextval('{self.sequence_name}')::text AS v) AS next_code)"
+        )
+
+
+def _supports_sequences():
+    """Kiểm tra database hiện tại có hỗ trợ sequence không (PostgreSQL)"""
+    return db.engine.dialect.name == 'postgresql'
+
+
+BOOK_CODES = CodeAllocator('MS', 6, 'book_code_seq', 'books', 'book_code')
+CATEGORY_CODES = CodeAllocator('DM', 6, 'category_code_seq', 'categories', 'category_code')
+BANNER_CODES = CodeAllocator('BN', 6, 'banner_code_seq', 'banners', 'banner_code')
+CUSTOMER_CODES = CodeAllocator('KH', 3, 'customer_code_seq', 'users', 'customer_code')
+
+ALL_ALLOCATORS = (BOOK_CODES, CATEGORY_CODES, BANNER_CODES, CUSTOMER_CODES)
+
+
+def sync_code_sequences():
+    """
+    Tạo và đồng bộ tất cả sequences cấp mã với dữ liệu hiện có
+
+    Gọi khi khởi động app (sau db.create_all() và sau khi seed dữ liệu có mã cố định).
+    """
+    for allocator in ALL_ALLOCATORS:
+        allocator.ensure_sequence()
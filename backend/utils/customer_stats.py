@@ -0,0 +1,170 @@
+"""
+File: utils/customer_stats.py
+
+Mục đích:
+Cập nhật projection customer_stats (số đơn, doanh thu completed, đơn gần nhất) theo sự kiện đơn hàng.
+
+Các hàm trong file này:
+- record_customer_registered(user_id): Gọi khi khách hàng đăng ký (tạo dòng 0 đơn/0 doanh thu)
+- record_order_created(order): Gọi khi tạo đơn mới (cùng transaction với đơn hàng)
+- record_order_status_change(order, old_status): Gọi khi đổi trạng thái đơn hàng
+- rebuild_customer_stats(): Tính lại toàn bộ projection từ bảng orders (backfill/seed)
+- ensure_customer_stats(): Backfill lúc khởi động (projection trống hoặc khách hàng chưa có dòng)
+
+Mỗi khách hàng luôn có đúng một dòng customer_stats (kể cả khi chưa đặt đơn) để trang quản lý
+khách hàng inner join và filter/sort thẳng trên các cột có index, không cần coalesce.
+
+Các hàm record_* dùng upsert (INSERT ... ON CONFLICT DO UPDATE) với phép cộng dồn
+trong SQL nên an toàn khi nhiều worker cập nhật cùng một khách hàng đồng thời.
+Hàm không commit - caller commit cùng với thay đổi của đơn hàng.
+"""
+from datetime import datetime
+from sqlalchemy import text, func, case, bindparam
+from models import db, User, Order, CustomerStats
+
+_UPSERT_SQL = text("""
+    INSERT INTO customer_stats (user_id, order_count, completed_revenue, last_order_at, updated_at)
+    VALUES (:user_id, :order_delta, :revenue_delta, :last_order_at, :now)
+    ON CONFLICT (user_id) DO UPDATE SET
+        order_count = customer_stats.order_count + excluded.order_count,
+        completed_revenue = customer_stats.completed_revenue + excluded.completed_revenue,
+        last_order_at = CASE
+            WHEN customer_stats.last_order_at IS NULL THEN excluded.last_order_at
+            WHEN excluded.last_order_at IS NULL THEN customer_stats.last_order_at
+            WHEN excluded.last_order_at > customer_stats.last_order_at THEN excluded.last_order_at
+            ELSE customer_stats.last_order_at
+        END,
+        updated_at = excluded.updated_at
+""").bindparams(
+    # Khai báo type để Decimal/datetime được bind đúng trên mọi dialect (PostgreSQL, SQLite)
+    bindparam('revenue_delta', type_=db.Numeric(12, 2)),
+    bindparam('last_order_at', type_=db.DateTime),
+    bindparam('now', type_=db.DateTime)
+)
+
+
+def _apply_delta(user_id, order_delta=0, revenue_delta=0, last_order_at=None):
+    """Cộng dồn thay đổi vào projection của một khách hàng (tạo dòng nếu chưa có)"""
+    db.session.execute(_UPSERT_SQL, {
+        'user_id': user_id,
+        'order_delta': order_delta,
+        'revenue_delta': revenue_delta,
+        'last_order_at': last_order_at,
+        'now': datetime.utcnow()
+    })
+
+
+def record_customer_registered(user_id):
+    """
+    Tạo dòng projection 0 đơn/0 doanh thu cho khách hàng mới đăng ký
+
+    Args:
+        user_id (int): ID khách hàng vừa tạo (cùng transaction với INSERT users)
+    """
+    _apply_delta(user_id)
+
+
+def record_order_created(order):
+    """
+    Cập nhật projection khi khách hàng đặt đơn mới
+
+    Args:
+        order (Order): Đơn hàng vừa tạo (đã flush để có created_at)
+    """
+    revenue_delta = order.total_amount if order.status == 'completed' else 0
+    _apply_delta(
+        order.user_id,
+        order_delta=1,
+        revenue_delta=revenue_delta,
+        last_order_at=order.created_at or datetime.utcnow()
+    )
+
+
+def record_order_status_change(order, old_status):
+    """
+    Cập nhật doanh thu completed khi đơn hàng đổi trạng thái
+
+    Args:
+        order (Order): Đơn hàng sau khi đổi trạng thái
+        old_status (str): Trạng thái trước khi đổi
+    """
+    was_completed = old_status == 'completed'
+    is_completed = order.status == 'completed'
+    if was_completed == is_completed:
+        return
+
+    revenue_delta = order.total_amount if is_completed else -order.total_amount
+    _apply_delta(order.user_id, revenue_delta=revenue_delta)
+
+
+def rebuild_customer_stats():
+    """
+    Tính lại toàn bộ projection từ bảng orders (một aggregate query)
+
+    Flow:
+    1. Xóa dữ liệu projection cũ
+    2. Aggregate orders theo user_id (count, sum completed, max created_at)
+    3. Insert lại cho tất cả khách hàng (khách chưa có đơn có giá trị 0)
+    4. Commit
+    """
+    # Bước 1: Xóa projection cũ
+    CustomerStats.query.delete()
+
+    # Bước 2: Aggregate theo user
+    aggregates = db.session.query(
+        Order.user_id,
+        func.count(Order.id),
+        func.coalesce(func.sum(case((Order.status == 'completed', Order.total_amount), else_=0)), 0),
+        func.max(Order.created_at)
+    ).group_by(Order.user_id).all()
+    by_user = {user_id: (count, revenue, last) for user_id, count, revenue, last in aggregates}
+
+    # Bước 3: Insert cho tất cả khách hàng
+    customer_ids = [row[0] for row in db.session.query(User.id).filter(User.role == 'customer').all()]
+    now = datetime.utcnow()
+    rows = []
+    for user_id in set(customer_ids) | set(by_user):
+        count, revenue, last = by_user.get(user_id, (0, 0, None))
+        rows.append({
+            'user_id': user_id,
+            'order_count': count,
+            'completed_revenue': revenue,
+            'last_order_at': last,
+            'updated_at': now
+        })
+    if rows:
+        db.session.execute(CustomerStats.__table__.insert(), rows)
+
+    # Bước 4: Commit
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_customer_stats():
+    """
+    Backfill projection lúc khởi động
+
+    Flow:
+    1. Bảng customer_stats còn trống nhưng đã có đơn hàng (lần đầu deploy): rebuild toàn bộ
+    2. Ngược lại: tạo dòng 0 đơn/0 doanh thu cho khách hàng chưa có dòng (tạo trước khi có
+       record_customer_registered, hoặc tạo bằng seed)
+    """
+    # Bước 1: Lần đầu deploy
+    if CustomerStats.query.first() is None and Order.query.first() is not None:
+        rebuild_customer_stats()
+        return
+
+    # Bước 2: Khách hàng chưa có dòng projection (chưa có đơn nên giá trị 0)
+    missing = db.session.query(User.id).outerjoin(
+        CustomerStats, CustomerStats.user_id == User.id
+    ).filter(User.role == 'customer', CustomerStats.user_id.is_(None)).all()
+    if missing:
+        now = datetime.utcnow()
+        db.session.execute(CustomerStats.__table__.insert(), [{
+            'user_id': user_id,
+            'order_count': 0,
+            'completed_revenue': 0,
+            'last_order_at': None,
+            'updated_at': now
+        } for user_id, in missing])
+        db.session.commit()
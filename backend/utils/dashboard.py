@@ -0,0 +1,251 @@
+"""
+File: utils/dashboard.py
+
+Mục đích:
+Gom dữ liệu cho trang Dashboard admin (KPIs, đơn gần đây, sách sắp hết hàng, sách bán chạy)
+trong một request duy nhất.
+
+Mỗi section là một query đọc độc lập nên được chạy song song trên một thread pool nhỏ,
+mỗi thread checkout connection riêng từ engine (Session của Flask-SQLAlchemy không
+thread-safe nên không dùng chung db.session). Kết quả được cache ngắn hạn (TTL) trong
+process để nhiều tab/admin mở dashboard cùng lúc không chạy lại các aggregate query.
+
+Các hàm trong file này:
+- get_dashboard(force_refresh): Lấy payload dashboard (từ cache nếu còn hạn)
+- invalidate_dashboard_cache(): Xóa cache (khi cần dữ liệu mới ngay)
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import select, func, case, desc
+from models import db, User, Order, OrderItem, Book
+from utils.inventory import days_of_cover
+from config import Config
+
+RECENT_ORDERS_LIMIT = 10
+LOW_STOCK_LIMIT = 10
+TOP_SELLERS_LIMIT = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_cache = {'payload': None, 'expires_at': 0.0}
+_cache_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Lazy khởi tạo thread pool
+
+    Tạo khi có request đầu tiên (sau khi gunicorn fork worker) thay vì lúc import,
+    vì thread không được kế thừa qua fork khi dùng preload_app.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.DASHBOARD_MAX_WORKERS,
+                    thread_name_prefix='dashboard'
+                )
+    return _executor
+
+
+def _query_kpis(conn):
+    """KPIs: doanh thu, số đơn theo trạng thái, số khách hàng, số đầu sách"""
+    revenue = conn.execute(
+        select(func.coalesce(func.sum(Order.total_amount), 0)).where(
+            Order.status == 'completed',
+            Order.payment_status == 'paid'
+        )
+    ).scalar()
+
+    orders_by_status = {
+        status: count for status, count in conn.execute(
+            select(Order.status, func.count(Order.id)).group_by(Order.status)
+        )
+    }
+
+    total_customers = conn.execute(
+        select(func.count(User.id)).where(User.role == 'customer')
+    ).scalar()
+
+    total_books, out_of_stock = conn.execute(
+        select(func.count(Book.id), func.coalesce(func.sum(case((Book.stock <= 0, 1), else_=0)), 0))
+    ).one()
+
+    return {
+        'total_revenue': float(revenue or 0),
+        'total_orders': sum(orders_by_status.values()),
+        'pending_orders': orders_by_status.get('pending', 0),
+        'confirmed_orders': orders_by_status.get('confirmed', 0),
+        'completed_orders': orders_by_status.get('completed', 0),
+        'cancelled_orders': orders_by_status.get('cancelled', 0),
+        'orders_by_status': orders_by_status,
+        'total_customers': total_customers,
+        'total_books': total_books,
+        'out_of_stock_books': int(out_of_stock)
+    }
+
+
+def _query_recent_orders(conn):
+    """Các đơn hàng mới nhất kèm thông tin khách hàng (không load order_items)"""
+    rows = conn.execute(
+        select(
+            Order.id, Order.total_amount, Order.status, Order.payment_status, Order.created_at,
+            User.id, User.username, User.full_name, User.customer_code
+        ).join(User, Order.user_id == User.id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(RECENT_ORDERS_LIMIT)
+    ).all()
+
+    return [
+        {
+            'id': order_id,
+            'total_amount': float(total_amount),
+            'status': status,
+            'payment_status': payment_status,
+            'created_at': created_at.isoformat() if created_at else None,
+            'user': {
+                'id': user_id,
+                'username': username,
+                'full_name': full_name,
+                'customer_code': customer_code
+            }
+        }
+        for (order_id, total_amount, status, payment_status, created_at,
+             user_id, username, full_name, customer_code) in rows
+    ]
+
+
+def _query_low_stock(conn):
+    """Sách có tồn kho thấp (stock <= ngưỡng), ít hàng nhất trước"""
+    rows = conn.execute(
+        select(Book.id, Book.book_code, Book.title, Book.author, Book.image_url, Book.stock,
+               Book.sales_velocity)
+        .where(Book.stock <= Config.DASHBOARD_LOW_STOCK_THRESHOLD)
+        .order_by(Book.stock.asc(), Book.id.asc())
+        .limit(LOW_STOCK_LIMIT)
+    ).all()
+
+    return [
+        {
+            'id': book_id,
+            'book_code': book_code,
+            'title': title,
+            'author': author,
+            'image_url': image_url,
+            'stock': stock,
+            'days_of_cover': days_of_cover(stock, sales_velocity)
+        }
+        for book_id, book_code, title, author, image_url, stock, sales_velocity in rows
+    ]
+
+
+def _query_top_sellers(conn):
+    """Top sách bán chạy (theo số lượng trong các đơn đã hoàn thành)"""
+    total_sold = func.sum(OrderItem.quantity).label('total_sold')
+    rows = conn.execute(
+        select(Book.id, Book.title, Book.author, Book.image_url, total_sold)
+        .join(OrderItem, OrderItem.book_id == Book.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(Order.status == 'completed')
+        .group_by(Book.id, Book.title, Book.author, Book.image_url)
+        .order_by(desc('total_sold'))
+        .limit(TOP_SELLERS_LIMIT)
+    ).all()
+
+    return [
+        {
+            'id': book_id,
+            'title': title,
+            'author': author,
+            'image_url': image_url,
+            'total_sold': int(sold)
+        }
+        for book_id, title, author, image_url, sold in rows
+    ]
+
+
+SECTIONS = {
+    'kpis': _query_kpis,
+    'recent_orders': _query_recent_orders,
+    'low_stock': _query_low_stock,
+    'top_sellers': _query_top_sellers
+}
+
+
+def _run_section(engine, query_func):
+    """Chạy một section trên connection riêng, trả về (kết quả, thời gian ms)"""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        result = query_func(conn)
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def _build_dashboard():
+    """
+    Chạy song song tất cả sections và gom thành một payload
+
+    Flow:
+    1. Lấy engine trong app context hiện tại (thread con không có app context)
+    2. Submit từng section vào thread pool
+    3. Chờ kết quả, ghi lại thời gian của từng section
+    4. Trả về payload kèm timings
+    """
+    # Bước 1: Lấy engine (db.engine cần app context)
+    engine = db.engine
+    started = time.perf_counter()
+
+    # Bước 2: Submit các sections
+    executor = _get_executor()
+    futures = {name: executor.submit(_run_section, engine, query_func)
+               for name, query_func in SECTIONS.items()}
+
+    # Bước 3: Gom kết quả
+    payload = {}
+    timings = {}
+    for name, future in futures.items():
+        payload[name], timings[name] = future.result()
+
+    # Bước 4: Trả về payload kèm timings
+    timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+    payload['timings_ms'] = timings
+    payload['generated_at'] = datetime.utcnow().isoformat()
+    return payload
+
+
+def get_dashboard(force_refresh=False):
+    """
+    Lấy payload dashboard, dùng cache nếu còn hạn
+
+    Args:
+        force_refresh (bool): Bỏ qua cache và tính lại (default: False)
+
+    Returns:
+        tuple: (payload dict, cached bool)
+    """
+    ttl = Config.DASHBOARD_CACHE_TTL
+    now = time.monotonic()
+
+    if not force_refresh and ttl > 0:
+        with _cache_lock:
+            if _cache['payload'] is not None and now < _cache['expires_at']:
+                return _cache['payload'], True
+
+    payload = _build_dashboard()
+
+    if ttl > 0:
+        with _cache_lock:
+            _cache['payload'] = payload
+            _cache['expires_at'] = time.monotonic() + ttl
+
+    return payload, False
+
+
+def invalidate_dashboard_cache():
+    """Xóa cache dashboard trong process hiện tại"""
+    with _cache_lock:
+        _cache['payload'] = None
+        _cache['expires_at'] = 0.0
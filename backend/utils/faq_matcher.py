@@ -0,0 +1,222 @@
+"""
+File: utils/faq_matcher.py
+
+Mục đích:
+Tìm câu trả lời FAQ phù hợp nhất cho câu hỏi của chatbot bằng một automaton Aho–Corasick
+được compile một lần từ các keyword, thay vì duyệt tuần tự từng keyword với `in`.
+
+Cách hoạt động:
+- Keyword và câu hỏi được chuẩn hóa bằng fold_text (chữ thường, bỏ dấu, bỏ dấu câu) nên
+  "giao hang" khớp "giao hàng". Automaton chạy trên token (từ) thay vì ký tự, nên keyword chỉ
+  khớp nguyên từ ("giá" -> "gia" không khớp bên trong "giao").
+- Mỗi intent (một câu trả lời) có nhiều keyword, mỗi keyword có weight (mặc định = số từ của
+  keyword, keyword dài cụ thể hơn). Một lần duyệt câu hỏi cộng weight của các keyword khớp
+  (mỗi keyword tính một lần) cho từng intent, trả về intent điểm cao nhất. Hòa điểm thì intent
+  khai báo trước thắng.
+- FAQ có thể đọc từ file JSON (CHATBOT_FAQ_FILE). File được kiểm tra mtime tối đa mỗi
+  CHATBOT_FAQ_RELOAD_INTERVAL giây và compile lại khi thay đổi, không cần restart workers.
+  File lỗi thì giữ FAQ đang dùng.
+
+Format file FAQ:
+    {
+        "default": "Câu trả lời khi không khớp intent nào",
+        "intents": [
+            {"keywords": ["giao hàng", "ship"], "answer": "...", "weight": 2}
+        ]
+    }
+
+Các hàm/class trong file này:
+- FaqMatcher: Automaton Aho–Corasick của các keyword FAQ
+- load_faq_file(path): Đọc file FAQ thành FaqMatcher
+- get_faq_matcher(builtin): Lấy FaqMatcher hiện tại (file FAQ nếu có cấu hình, tự reload)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from config import Config
+from utils.book_matcher import fold_text
+
+logger = logging.getLogger(__name__)
+
+
+class FaqMatcher:
+    """
+    Automaton Aho–Corasick (trên token) của các keyword FAQ
+
+    Attributes:
+    - intents: Danh sách intent {'keywords', 'answer', 'weight'}
+    - default_answer: Câu trả lời khi không khớp intent nào
+    """
+
+    def __init__(self, intents, default_answer):
+        self.intents = intents
+        self.default_answer = default_answer
+
+        # Mỗi node: transitions (token -> node), fail link, outputs [(keyword_id, intent_index, weight)]
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+
+        keyword_id = 0
+        for intent_index, intent in enumerate(intents):
+            for keyword in intent['keywords']:
+                tokens = fold_text(keyword).split()
+                if not tokens:
+                    continue
+                weight = intent.get('weight') or len(tokens)
+                self._outputs[self._insert(tokens)].append((keyword_id, intent_index, weight))
+                keyword_id += 1
+
+        self._build_fail_links()
+
+    def _insert(self, tokens):
+        """Thêm keyword vào trie, trả về node cuối"""
+        node = 0
+        for token in tokens:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        return node
+
+    def _build_fail_links(self):
+        """BFS tính fail link, gộp outputs của fail node (keyword là hậu tố của keyword khác)"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def match(self, question):
+        """
+        Tìm intent điểm cao nhất trong một lần duyệt câu hỏi
+
+        Args:
+            question (str): Câu hỏi của người dùng
+
+        Returns:
+            dict | None: Intent khớp tốt nhất, hoặc None nếu không khớp keyword nào
+        """
+        scores = {}
+        seen = set()
+        node = 0
+        for token in fold_text(question).split():
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for keyword_id, intent_index, weight in self._outputs[node]:
+                if keyword_id not in seen:
+                    seen.add(keyword_id)
+                    scores[intent_index] = scores.get(intent_index, 0) + weight
+
+        if not scores:
+            return None
+        best = max(scores, key=lambda index: (scores[index], -index))
+        return self.intents[best]
+
+    @classmethod
+    def from_mapping(cls, mapping, default_key='mặc định'):
+        """
+        Tạo FaqMatcher từ dict keyword -> answer (các keyword cùng answer gộp thành một intent)
+
+        Args:
+            mapping (dict): Keyword -> câu trả lời
+            default_key (str): Key của câu trả lời mặc định
+
+        Returns:
+            FaqMatcher: Matcher đã compile
+        """
+        intents = {}
+        for keyword, answer in mapping.items():
+            if keyword == default_key:
+                continue
+            intents.setdefault(answer, {'keywords': [], 'answer': answer})['keywords'].append(keyword)
+        return cls(list(intents.values()), mapping.get(default_key))
+
+
+def load_faq_file(path):
+    """
+    Đọc file FAQ JSON và compile thành FaqMatcher
+
+    Args:
+        path (str): Đường dẫn file FAQ
+
+    Returns:
+        FaqMatcher: Matcher đã compile
+
+    Raises:
+        ValueError: File sai format
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    intents = []
+    for intent in data.get('intents', []):
+        if not intent.get('answer') or not isinstance(intent.get('keywords'), list):
+            raise ValueError(f'FAQ intent must have "answer" and a "keywords" list: {intent}')
+        intents.append({
+            'keywords': intent['keywords'],
+            'answer': intent['answer'],
+            'weight': float(intent['weight']) if intent.get('weight') else None
+        })
+    return FaqMatcher(intents, data.get('default'))
+
+
+_state = {'matcher': None, 'builtin': None, 'mtime': None, 'checked_at': 0.0}
+_state_lock = threading.Lock()
+
+
+def get_faq_matcher(builtin):
+    """
+    Lấy FaqMatcher hiện tại
+
+    Flow:
+    1. Không cấu hình CHATBOT_FAQ_FILE -> matcher compile từ FAQ built-in (compile một lần)
+    2. Có file -> tối đa mỗi CHATBOT_FAQ_RELOAD_INTERVAL giây kiểm tra mtime, compile lại nếu thay đổi
+    3. File không đọc được / sai format -> giữ matcher đang dùng (hoặc built-in nếu chưa có)
+
+    Args:
+        builtin (dict): FAQ built-in dạng keyword -> answer (dùng khi không có file)
+
+    Returns:
+        FaqMatcher: Matcher hiện tại
+    """
+    path = Config.CHATBOT_FAQ_FILE
+    now = time.monotonic()
+
+    # Bước 1: FAQ built-in
+    if not path:
+        if _state['builtin'] is None:
+            _state['builtin'] = FaqMatcher.from_mapping(builtin)
+        return _state['builtin']
+
+    # Bước 2: Kiểm tra file theo chu kỳ
+    if _state['matcher'] is not None and now - _state['checked_at'] < Config.CHATBOT_FAQ_RELOAD_INTERVAL:
+        return _state['matcher']
+
+    with _state_lock:
+        _state['checked_at'] = now
+        try:
+            mtime = os.path.getmtime(path)
+            if _state['matcher'] is None or mtime != _state['mtime']:
+                _state['matcher'] = load_faq_file(path)
+                _state['mtime'] = mtime
+                logger.info(f"[CHATBOT] FAQ loaded from {path} ({len(_state['matcher'].intents)} intents)")
+        except (OSError, ValueError) as e:
+            # Bước 3: Giữ FAQ đang dùng
+            logger.error(f"[CHATBOT] Failed to load FAQ file {path}: {str(e)}")
+            if _state['matcher'] is None:
+                _state['matcher'] = FaqMatcher.from_mapping(builtin)
+        return _state['matcher']
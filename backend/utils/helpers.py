@@ -1,23 +1,36 @@
 """
 Các hàm tiện ích cho ứng dụng
 """
-import bcrypt
 import re
 import unicodedata
 from functools import wraps
 from flask import session, jsonify
+from utils.passwords import get_password_hasher
+from utils.user_cache import get_cached_user
 
 def hash_password(password):
     """
-    Hash password bằng bcrypt
+    Hash password bằng bcrypt (giới hạn số bcrypt đồng thời trên toàn host, xem utils.passwords)
+    
+    Raises:
+        PasswordHasherBusy: Hàng đợi bcrypt đã đầy
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return get_password_hasher().hash(password)
 
 def check_password(password, password_hash):
     """
-    Kiểm tra password có khớp với hash không
+    Kiểm tra password có khớp với hash không (giới hạn số bcrypt đồng thời trên toàn host, xem utils.passwords)
+    
+    Raises:
+        PasswordHasherBusy: Hàng đợi bcrypt đã đầy
+    """
+    return get_password_hasher().verify(password, password_hash)
+
+def password_needs_rehash(password_hash):
+    """
+    Kiểm tra hash có cần tạo lại với cost factor hiện tại (Config.BCRYPT_ROUNDS) không
     """
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    return get_password_hasher().needs_rehash(password_hash)
 
 def validate_email(email):
     """
@@ -54,6 +67,19 @@ def validate_password(password):
     
     return True, None
 
+def inactive_session_response():
+    """
+    Kiểm tra user trong session còn tồn tại và chưa bị khóa (qua cache user, xem utils.user_cache)
+    
+    Returns:
+        tuple | None: Response 401 (và xóa session) nếu user bị khóa/không tồn tại, None nếu hợp lệ
+    """
+    user = get_cached_user(session['user_id'])
+    if user is None or not user['is_active']:
+        session.clear()
+        return jsonify({'error': 'Tài khoản đã bị khóa hoặc không tồn tại'}), 401
+    return None
+
 def login_required(f):
     """
     Decorator để yêu cầu đăng nhập
@@ -62,6 +88,9 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Yêu cầu đăng nhập'}), 401
+        rejected = inactive_session_response()
+        if rejected:
+            return rejected
         return f(*args, **kwargs)
     return decorated_function
 
@@ -77,6 +106,9 @@ def admin_required(f):
         user_role = session.get('user_role')
         if user_role != 'admin':
             return jsonify({'error': 'Yêu cầu quyền admin'}), 403
+        rejected = inactive_session_response()
+        if rejected:
+            return rejected
         return f(*args, **kwargs)
     return decorated_function
 
@@ -91,6 +123,9 @@ def super_admin_required(f):
             return jsonify({'error': 'Yêu cầu đăng nhập'}), 401
         if session.get('user_role') != 'admin':
             return jsonify({'error': 'Yêu cầu quyền super admin'}), 403
+        rejected = inactive_session_response()
+        if rejected:
+            return rejected
         return f(*args, **kwargs)
     return decorated_function
 
@@ -106,6 +141,9 @@ def moderator_required(f):
         user_role = session.get('user_role')
         if user_role not in ['admin', 'moderator']:
             return jsonify({'error': 'Yêu cầu quyền moderator trở lên'}), 403
+        rejected = inactive_session_response()
+        if rejected:
+            return rejected
         return f(*args, **kwargs)
     return decorated_function
 
@@ -127,6 +165,117 @@ def generate_slug(text):
     text = re.sub(r'[-\s]+', '-', text)
     return text.strip('-')
 
+def resolve_unique_values(model_class, column_name, base_values, separator='-', first_suffix=1, exclude_id=None):
+    """
+    Tạo nhiều giá trị unique (slug, key, ...) cho một batch chỉ với MỘT query
+    
+    Flow:
+    1. Query tất cả giá trị đang có dạng base hoặc base<separator>% (một prefix query cho cả batch)
+    2. Với mỗi base (theo thứ tự), chọn suffix nhỏ nhất còn trống trong memory
+    3. Đánh dấu giá trị vừa chọn là đã dùng để các phần tử sau trong batch không bị trùng
+    
+    Lưu ý: Kết quả chỉ là "ứng viên" tại thời điểm query. Khi insert vẫn phải dựa vào
+    unique constraint (xem commit_with_unique_retry) vì request khác có thể chèn trước.
+    
+    Args:
+        model_class: Model class để check unique (ví dụ: Book, Category)
+        column_name (str): Tên cột unique ('slug' hoặc 'key')
+        base_values (list[str]): Danh sách giá trị cơ bản
+        separator (str): Ký tự nối suffix ('-' cho slug, '_' cho key)
+        first_suffix (int): Suffix đầu tiên khi base bị trùng (1 cho slug, 2 cho key)
+        exclude_id (int): ID để exclude khi check (dùng khi update)
+        
+    Returns:
+        list[str]: Giá trị unique tương ứng với từng phần tử trong base_values
+    """
+    from sqlalchemy import or_
+    
+    if not base_values:
+        return []
+    
+    column = getattr(model_class, column_name)
+    
+    # Bước 1: Một query cho tất cả base (escape %, _ vì category key chứa '_')
+    conditions = []
+    for base in set(base_values):
+        escaped = base.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append(column == base)
+        conditions.append(column.like(f'{escaped}{separator}%', escape='\\'))
+    
+    query = model_class.query.with_entities(column).filter(or_(*conditions))
+    if exclude_id:
+        query = query.filter(model_class.id != exclude_id)
+    taken = {row[0] for row in query.all()}
+    
+    # Bước 2-3: Chọn suffix còn trống trong memory
+    results = []
+    for base in base_values:
+        value = base
+        counter = first_suffix
+        while value in taken:
+            value = f"{base}{separator}{counter}"
+            counter += 1
+        taken.add(value)
+        results.append(value)
+    
+    return results
+
+def unique_violation_column(error, columns):
+    """
+    Xác định cột unique bị vi phạm từ IntegrityError
+    
+    PostgreSQL: "... DETAIL: Key (email)=(a@b.c) already exists."
+    SQLite: "UNIQUE constraint failed: users.email"
+    
+    Args:
+        error (IntegrityError): Exception từ SQLAlchemy
+        columns (iterable): Các cột cần kiểm tra (theo thứ tự ưu tiên)
+    
+    Returns:
+        str | None: Tên cột bị vi phạm, None nếu không thuộc columns
+    """
+    message = str(getattr(error, 'orig', error)).lower().strip()
+    for column in columns:
+        if f'key ({column})=' in message:
+            return column
+        if message.startswith('unique constraint failed') and message.endswith(f'.{column}'):
+            return column
+    return None
+
+def commit_with_unique_retry(instance, regenerate, max_attempts=3, columns=('slug', 'key')):
+    """
+    Insert/commit dựa vào unique constraint thay vì check-then-insert
+    
+    Chỉ dùng cho instance mới (chưa persist): sau rollback, các thay đổi trên
+    instance đã persist sẽ bị expire nên không thể retry an toàn.
+    
+    Flow:
+    1. add + commit
+    2. Nếu bị IntegrityError trên cột slug/key (request khác vừa chiếm giá trị):
+       rollback, gọi regenerate(instance) để tính lại giá trị, thử lại
+    3. Hết số lần thử hoặc lỗi trên cột khác thì raise
+    
+    Args:
+        instance: Model instance cần lưu
+        regenerate (callable): Hàm nhận instance và gán lại các giá trị unique
+        max_attempts (int): Số lần thử tối đa (default: 3)
+        columns (tuple): Các cột unique được phép retry
+    """
+    from sqlalchemy.exc import IntegrityError
+    from models import db
+    
+    for attempt in range(1, max_attempts + 1):
+        try:
+            db.session.add(instance)
+            db.session.commit()
+            return instance
+        except IntegrityError as e:
+            db.session.rollback()
+            violated = unique_violation_column(e, columns)
+            if attempt == max_attempts or not violated:
+                raise
+            regenerate(instance)
+
 def generate_unique_slug(base_slug, model_class, exclude_id=None):
     """
     Tạo slug unique bằng cách append số nếu trùng
@@ -139,19 +288,7 @@ def generate_unique_slug(base_slug, model_class, exclude_id=None):
     Returns:
         str: Slug unique (có thể là base_slug hoặc base_slug-1, base_slug-2, ...)
     """
-    slug = base_slug
-    counter = 1
-    
-    while True:
-        query = model_class.query.filter_by(slug=slug)
-        if exclude_id:
-            query = query.filter(model_class.id != exclude_id)
-        
-        if not query.first():
-            return slug
-        
-        slug = f"{base_slug}-{counter}"
-        counter += 1
+    return resolve_unique_values(model_class, 'slug', [base_slug], '-', 1, exclude_id)[0]
 
 def generate_category_key(name):
     """
@@ -191,22 +328,8 @@ def generate_unique_category_key(base_key, model_class, exclude_id=None):
         base_key = "SACH_THIEU_NHI"
         Nếu trùng, trả về "SACH_THIEU_NHI_2", "SACH_THIEU_NHI_3", ...
     """
-    key = base_key
-    counter = 2  # Start from 2 (base key is version 1)
-    
-    while True:
-        # Query để check xem key đã tồn tại chưa
-        query = model_class.query.filter_by(key=key)
-        if exclude_id:
-            query = query.filter(model_class.id != exclude_id)
-        
-        # Nếu key chưa tồn tại, return ngay
-        if not query.first():
-            return key
-        
-        # Nếu trùng, append số và thử lại
-        key = f"{base_key}_{counter}"
-        counter += 1
+    # Base key là version 1 nên suffix bắt đầu từ 2
+    return resolve_unique_values(model_class, 'key', [base_key], '_', 2, exclude_id)[0]
 
 def generate_unique_book_slug(base_slug, model_class, exclude_id=None):
     """
@@ -220,121 +343,101 @@ def generate_unique_book_slug(base_slug, model_class, exclude_id=None):
     Returns:
         str: Slug unique (có thể là base_slug hoặc base_slug-1, base_slug-2, ...)
     """
-    slug = base_slug
-    counter = 1
+    return resolve_unique_values(model_class, 'slug', [base_slug], '-', 1, exclude_id)[0]
+
+def reserve_unique_book_slugs(base_slugs, model_class):
+    """
+    Tạo slug unique cho nhiều sách cùng lúc (seed/import) với một query
     
-    while True:
-        query = model_class.query.filter_by(slug=slug)
-        if exclude_id:
-            query = query.filter(model_class.id != exclude_id)
-        
-        if not query.first():
-            return slug
+    Args:
+        base_slugs (list[str]): Danh sách slug cơ bản (có thể trùng nhau)
+        model_class: Model class để check unique (Book)
         
-        slug = f"{base_slug}-{counter}"
-        counter += 1
+    Returns:
+        list[str]: Slug unique tương ứng, không trùng với database và không trùng nhau
+    """
+    return resolve_unique_values(model_class, 'slug', base_slugs, '-', 1)
 
 def generate_book_code(Book):
     """
     Tạo mã sách tự động (MS000001, MS000002, ...)
     
-    Flow:
-    1. Query book code lớn nhất hiện tại (MS000001 → 1)
-    2. Tăng lên 1
-    3. Format thành MS + 6 số (zero-padded)
-    4. Kiểm tra unique và retry nếu trùng
+    Mã được cấp từ sequence book_code_seq (xem utils/codes.py) nên không cần
+    query max(book_code) và không bị trùng khi nhiều request tạo sách đồng thời.
     
     Args:
-        Book: Book model class
+        Book: Book model class (giữ lại để tương thích với code cũ)
     
     Returns:
         str: Mã sách unique (VD: MS000001)
     """
-    from app import db
-    from sqlalchemy import func
-    
-    max_code = db.session.query(func.max(Book.book_code)).scalar()
-    
-    if max_code:
-        # Extract number from MS000001 → 1
-        number = int(max_code[2:]) + 1
-    else:
-        number = 1
-    
-    # Format: MS + 6 digits
-    book_code = f'MS{number:06d}'
+    from utils.codes import BOOK_CODES
+    return BOOK_CODES.next()
+
+def generate_book_codes(Book, count):
+    """
+    Tạo nhiều mã sách trong một lần gọi (dùng cho seed/import hàng loạt)
     
-    # Kiểm tra unique (trong trường hợp race condition)
-    while Book.query.filter_by(book_code=book_code).first():
-        number += 1
-        book_code = f'MS{number:06d}'
+    Args:
+        Book: Book model class
+        count (int): Số lượng mã cần tạo
     
-    return book_code
+    Returns:
+        list[str]: Danh sách mã sách unique
+    """
+    from utils.codes import BOOK_CODES
+    return BOOK_CODES.allocate(count)
 
 def generate_category_code(Category):
     """
-    Tạo mã danh mục (DM000001, DM000002, ...)
-    
-    Flow:
-    1. Query category code lớn nhất hiện tại
-    2. Tăng lên 1
-    3. Format thành DM + 6 số (zero-padded)
-    4. Kiểm tra unique và retry nếu trùng
+    Tạo mã danh mục (DM000001, DM000002, ...) từ sequence category_code_seq
     
     Args:
-        Category: Category model class
+        Category: Category model class (giữ lại để tương thích với code cũ)
     
     Returns:
         str: Mã danh mục unique (VD: DM000001)
     """
-    from app import db
-    from sqlalchemy import func
-    
-    max_code = db.session.query(func.max(Category.category_code)).scalar()
-    
-    if max_code:
-        number = int(max_code[2:]) + 1
-    else:
-        number = 1
-    
-    category_code = f'DM{number:06d}'
+    from utils.codes import CATEGORY_CODES
+    return CATEGORY_CODES.next()
+
+def generate_category_codes(Category, count):
+    """
+    Tạo nhiều mã danh mục trong một lần gọi
     
-    while Category.query.filter_by(category_code=category_code).first():
-        number += 1
-        category_code = f'DM{number:06d}'
+    Args:
+        Category: Category model class
+        count (int): Số lượng mã cần tạo
     
-    return category_code
+    Returns:
+        list[str]: Danh sách mã danh mục unique
+    """
+    from utils.codes import CATEGORY_CODES
+    return CATEGORY_CODES.allocate(count)
 
 def generate_banner_code(Banner):
     """
-    Tạo mã banner (BN000001, BN000002, ...)
-    
-    Flow:
-    1. Query banner code lớn nhất hiện tại
-    2. Tăng lên 1
-    3. Format thành BN + 6 số (zero-padded)
-    4. Kiểm tra unique và retry nếu trùng
+    Tạo mã banner (BN000001, BN000002, ...) từ sequence banner_code_seq
     
     Args:
-        Banner: Banner model class
+        Banner: Banner model class (giữ lại để tương thích với code cũ)
     
     Returns:
         str: Mã banner unique (VD: BN000001)
     """
-    from app import db
-    from sqlalchemy import func
-    
-    max_code = db.session.query(func.max(Banner.banner_code)).scalar()
-    
-    if max_code:
-        number = int(max_code[2:]) + 1
-    else:
-        number = 1
-    
-    banner_code = f'BN{number:06d}'
+    from utils.codes import BANNER_CODES
+    return BANNER_CODES.next()
+
+def generate_banner_codes(Banner, count):
+    """
+    Tạo nhiều mã banner trong một lần gọi
     
-    while Banner.query.filter_by(banner_code=banner_code).first():
-        number += 1
-        banner_code = f'BN{number:06d}'
+    Args:
+        Banner: Banner model class
+        count (int): Số lượng mã cần tạo
     
-    return banner_code
+    Returns:
+        list[str]: Danh sách mã banner unique
+    """
+    from utils.codes import BANNER_CODES
+    return BANNER_CODES.allocate(count)
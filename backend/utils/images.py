@@ -0,0 +1,315 @@
+"""
+File: utils/images.py
+
+Mục đích:
+Tạo các bản ảnh đã resize (thumbnail, card, detail) từ ảnh upload để trang web không phải tải
+ảnh gốc (tới 5MB) cho mỗi ô sách trong lưới.
+
+Cách hoạt động:
+- Mỗi kích thước trong IMAGE_DERIVATIVES (tên:chiều rộng tối đa) được encode thành WebP và JPEG
+  (JPEG cho trình duyệt cũ). Ảnh không bị phóng to: ảnh gốc nhỏ hơn thì dùng chiều rộng gốc.
+- Xoay ảnh theo EXIF orientation rồi bỏ toàn bộ metadata EXIF (vị trí GPS, thiết bị chụp...).
+  Ảnh có nền trong suốt được đặt lên nền trắng khi encode JPEG.
+- Ảnh quá IMAGE_MAX_PIXELS bị từ chối trước khi decode (chống decompression bomb).
+- Resize/encode tốn CPU và giữ GIL, nên chạy trên process pool riêng thay vì thread của request.
+- Giới hạn trên toàn host (giống utils.passwords): tối đa IMAGE_MAX_WORKERS ảnh được render cùng lúc
+  và IMAGE_MAX_QUEUE ảnh chờ, dùng chung cho mọi gunicorn worker (multiprocessing.BoundedSemaphore
+  tạo lúc import, trước khi fork). Hàng đợi đầy hoặc chờ quá IMAGE_QUEUE_TIMEOUT thì raise
+  ImageProcessorBusy để route trả 503. Mỗi worker vẫn có process pool riêng (spawn lazy, tạo
+  process khi cần), nhưng tổng số ảnh render đồng thời không vượt IMAGE_MAX_WORKERS.
+- Process con chết giữa chừng (ví dụ bị OOM killer khi decode ảnh lớn) làm hỏng cả pool
+  (BrokenProcessPool): pool được tạo lại và ảnh được render lại một lần, lỗi lần nữa thì
+  ảnh bị từ chối (ValueError).
+
+Các hàm/class trong file này:
+- parse_derivatives(spec): Đọc cấu hình IMAGE_DERIVATIVES
+- render_derivatives(data, derivatives, ...): Resize + encode (chạy trong process con)
+- ImageProcessor: Process pool có giới hạn để render ảnh
+- ImageProcessorBusy: Exception khi hàng đợi đầy
+- create_limits(max_workers, max_queue): Semaphore giới hạn render dùng chung giữa các process
+- get_image_processor(): Lấy instance dùng chung của process (lazy, tạo sau khi fork)
+- configure_image_processor(**overrides): Tạo lại instance với cấu hình khác (benchmark)
+"""
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import ExifTags, Image, ImageOps
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Định dạng encode cho mỗi kích thước: (key trong srcset, định dạng Pillow)
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+
+class ImageProcessorBusy(Exception):
+    """Hàng đợi xử lý ảnh đã đầy (quá IMAGE_MAX_QUEUE tác vụ đang chờ, hoặc chờ quá lâu)"""
+
+
+def parse_derivatives(spec):
+    """
+    Đọc cấu hình kích thước ảnh
+
+    Args:
+        spec (str): "tên:chiều rộng,..." ví dụ "thumbnail:160,card:360,detail:800"
+
+    Returns:
+        list: [(tên, chiều rộng)] sắp xếp theo chiều rộng tăng dần
+    """
+    derivatives = []
+    for item in spec.split(','):
+        name, _, width = item.strip().partition(':')
+        if name and width.strip().isdigit():
+            derivatives.append((name.strip(), int(width)))
+    return sorted(derivatives, key=lambda item: item[1])
+
+
+def _encode(image, image_format, quality):
+    """Encode ảnh (không kèm EXIF), trả về bytes"""
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_derivatives(data, derivatives, webp_quality=80, jpeg_quality=82, max_pixels=40_000_000):
+    """
+    Resize ảnh thành các kích thước và encode WebP + JPEG (top-level function để chạy trong process pool)
+
+    Flow:
+    1. Đọc kích thước từ header, từ chối ảnh quá max_pixels (chưa decode)
+    2. JPEG: decode ở tỉ lệ nhỏ hơn nếu đủ lớn cho kích thước lớn nhất (draft, nhanh hơn nhiều)
+    3. Xoay theo EXIF orientation, chuyển về RGB/RGBA (GIF: frame đầu tiên)
+    4. Với mỗi kích thước (không phóng to, bỏ kích thước trùng): resize LANCZOS, encode WebP + JPEG
+
+    Args:
+        data (bytes): Nội dung file ảnh gốc
+        derivatives (list): [(tên, chiều rộng tối đa)] tăng dần (xem parse_derivatives)
+        webp_quality (int): Chất lượng WebP (0-100)
+        jpeg_quality (int): Chất lượng JPEG (0-100)
+        max_pixels (int): Số pixel tối đa của ảnh gốc
+
+    Returns:
+        dict: {'width', 'height', 'derivatives': [{'name', 'width', 'height', 'webp': bytes, 'jpeg': bytes}]}
+              (width/height của ảnh gốc sau khi xoay)
+
+    Raises:
+        ValueError: Không phải ảnh hợp lệ hoặc ảnh quá lớn
+    """
+    # Bước 1: Kích thước từ header
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception:
+        raise ValueError('File không phải ảnh hợp lệ')
+    if image.width * image.height > max_pixels:
+        raise ValueError(f'Ảnh quá lớn ({image.width}x{image.height} pixel)')
+    # Kích thước gốc sau khi xoay (EXIF orientation 5-8 đổi chiều rộng/cao), trước khi draft thu nhỏ
+    width, height = image.size
+    if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+        width, height = height, width
+
+    # Bước 2: Decode JPEG ở tỉ lệ nhỏ hơn (cả hai chiều vẫn >= chiều rộng lớn nhất, đúng cả khi ảnh bị xoay)
+    if image.format == 'JPEG' and derivatives:
+        largest = derivatives[-1][1]
+        image.draft('RGB', (largest, largest))
+
+    # Bước 3: Xoay theo EXIF (bản sao mới không còn EXIF), chuẩn hóa mode
+    try:
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ValueError(f'Không đọc được ảnh: {str(e)}')
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Bước 4: Resize + encode
+    rendered = []
+    previous_width = 0
+    for name, max_width in derivatives:
+        target_width = min(max_width, width)
+        if target_width == previous_width:
+            continue
+        previous_width = target_width
+        target_height = max(1, round(height * target_width / width))
+        resized = image if image.size == (target_width, target_height) else image.resize(
+            (target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        qualities = {'webp': webp_quality, 'jpeg': jpeg_quality}
+        derivative = {'name': name, 'width': target_width, 'height': target_height}
+        for key, image_format in FORMATS:
+            derivative[key] = _encode(resized, image_format, qualities[key])
+        rendered.append(derivative)
+
+    return {'width': width, 'height': height, 'derivatives': rendered}
+
+
+class ImageProcessor:
+    """
+    Render ảnh trên process pool, giới hạn số ảnh render đồng thời trên toàn host
+
+    Attributes:
+    - derivatives: [(tên, chiều rộng tối đa)]
+    - max_workers: Số ảnh render đồng thời (0 = chạy inline, không offload)
+    - max_queue: Số tác vụ tối đa được chờ ngoài các tác vụ đang chạy
+    - queue_timeout: Thời gian chờ đến lượt render (giây)
+    """
+
+    def __init__(self, derivatives, max_workers, max_queue, queue_timeout,
+                 webp_quality=80, jpeg_quality=82, max_pixels=40_000_000, limits=None):
+        self.derivatives = derivatives
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.webp_quality = webp_quality
+        self.jpeg_quality = jpeg_quality
+        self.max_pixels = max_pixels
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        self._running = None
+        if max_workers > 0:
+            self._executor = self._create_executor()
+            # limits: semaphore dùng chung giữa các process (tạo trước khi fork), không có thì tạo riêng
+            self._slots, self._running = limits or create_limits(max_workers, max_queue)
+
+    def _create_executor(self):
+        # spawn: không fork từ worker đang có nhiều thread (gthread)
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def _replace_broken_executor(self, broken):
+        """Tạo pool mới thay cho pool bị hỏng (chỉ một thread tạo, các thread khác dùng lại)"""
+        with self._executor_lock:
+            if self._executor is broken:
+                logger.warning("[IMAGES] Image process pool broken (child process died), recreating")
+                self._executor = self._create_executor()
+                broken.shutdown(wait=False, cancel_futures=True)
+
+    def _render_in_pool(self, args):
+        """Render trên process pool, tạo lại pool và thử lại một lần nếu process con chết"""
+        for attempt in range(2):
+            executor = self._executor
+            try:
+                return executor.submit(render_derivatives, *args).result()
+            except BrokenProcessPool:
+                self._replace_broken_executor(executor)
+                if attempt:
+                    raise ValueError('Không xử lý được ảnh (ảnh quá lớn hoặc bị lỗi)')
+
+    def render(self, data):
+        """
+        Resize + encode ảnh (xem render_derivatives)
+
+        Args:
+            data (bytes): Nội dung file ảnh gốc
+
+        Returns:
+            dict: Kết quả của render_derivatives
+
+        Raises:
+            ValueError: Ảnh không hợp lệ (hoặc process con chết cả hai lần render)
+            ImageProcessorBusy: Hàng đợi đầy hoặc chờ quá queue_timeout
+        """
+        args = (data, self.derivatives, self.webp_quality, self.jpeg_quality, self.max_pixels)
+        if self._executor is None:
+            return render_derivatives(*args)
+
+        # Mỗi tác vụ (đang chạy hoặc đang chờ) giữ một slot, tác vụ đang render giữ thêm một running
+        if not self._slots.acquire(block=False):
+            raise ImageProcessorBusy('Image processing queue is full')
+        try:
+            if not self._running.acquire(timeout=self.queue_timeout):
+                raise ImageProcessorBusy('Timed out waiting for image processing')
+            try:
+                return self._render_in_pool(args)
+            finally:
+                self._running.release()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        """Dừng process pool (chờ các tác vụ đang chạy)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def create_limits(max_workers, max_queue):
+    """
+    Semaphore giới hạn render ảnh, dùng chung được giữa các process nếu tạo trước khi fork
+
+    Returns:
+        tuple: (slots - tác vụ đang chạy hoặc chờ, running - tác vụ đang render), (None, None) nếu không offload
+    """
+    if max_workers <= 0:
+        return None, None
+    return multiprocessing.BoundedSemaphore(max_workers + max_queue), multiprocessing.BoundedSemaphore(max_workers)
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung giới hạn
+_HOST_LIMITS = create_limits(Config.IMAGE_MAX_WORKERS, Config.IMAGE_MAX_QUEUE)
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def _settings():
+    return {
+        'derivatives': parse_derivatives(Config.IMAGE_DERIVATIVES),
+        'max_workers': Config.IMAGE_MAX_WORKERS,
+        'max_queue': Config.IMAGE_MAX_QUEUE,
+        'queue_timeout': Config.IMAGE_QUEUE_TIMEOUT,
+        'webp_quality': Config.IMAGE_WEBP_QUALITY,
+        'jpeg_quality': Config.IMAGE_JPEG_QUALITY,
+        'max_pixels': Config.IMAGE_MAX_PIXELS
+    }
+
+
+def get_image_processor():
+    """
+    Lấy ImageProcessor dùng chung của process
+
+    Tạo lazy ở lần dùng đầu tiên (sau khi gunicorn fork worker với preload_app),
+    vì process pool không được kế thừa qua fork. Giới hạn render (semaphore) thì tạo
+    lúc import để dùng chung giữa các worker.
+    """
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ImageProcessor(**_settings(), limits=_HOST_LIMITS)
+    return _processor
+
+
+def configure_image_processor(**overrides):
+    """
+    Tạo lại ImageProcessor dùng chung với cấu hình khác (dùng cho benchmark/script)
+
+    Args:
+        **overrides: Tham số của ImageProcessor (mặc định lấy từ Config)
+
+    Returns:
+        ImageProcessor: Instance mới
+    """
+    global _processor
+    settings = _settings()
+    settings.update(overrides)
+    with _processor_lock:
+        old_processor = _processor
+        _processor = ImageProcessor(**settings)
+    if old_processor is not None:
+        old_processor.shutdown()
+    return _processor
@@ -0,0 +1,89 @@
+"""
+File: utils/inventory.py
+
+Mục đích:
+Tính toán các chỉ số tồn kho (sales velocity, số ngày còn đủ hàng) cho báo cáo low-stock.
+
+sales_velocity được tính theo batch (script refresh_sales_velocity.py chạy định kỳ bằng cron)
+và lưu vào cột books.sales_velocity, nên endpoint báo cáo chỉ đọc cột có sẵn thay vì
+aggregate order_items cho mỗi request.
+
+Các hàm trong file này:
+- refresh_sales_velocity(window_days): Tính lại sales_velocity cho tất cả sách
+- days_of_cover(stock, velocity): Ước tính số ngày còn đủ hàng
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, update, bindparam
+from models import db, Book, Order, OrderItem
+
+SALES_VELOCITY_WINDOW_DAYS = 30
+
+
+def refresh_sales_velocity(window_days=SALES_VELOCITY_WINDOW_DAYS):
+    """
+    Tính lại sales_velocity (số lượng bán trung bình/ngày) cho tất cả sách
+
+    Flow:
+    1. Aggregate số lượng bán theo book_id trong window (bỏ qua đơn đã hủy)
+    2. Bulk update sales_velocity cho tất cả sách (sách không bán được = 0)
+    3. Commit
+
+    Args:
+        window_days (int): Số ngày tính trung bình (default: 30)
+
+    Returns:
+        int: Số sách đã cập nhật
+    """
+    now = datetime.utcnow()
+    since = now - timedelta(days=window_days)
+
+    # Bước 1: Aggregate số lượng bán trong window
+    sold_by_book = dict(
+        db.session.query(OrderItem.book_id, func.sum(OrderItem.quantity))
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(Order.status != 'cancelled', Order.created_at >= since)
+        .group_by(OrderItem.book_id)
+        .all()
+    )
+
+    # Bước 2: Bulk update (giữ nguyên updated_at vì đây không phải thay đổi của admin)
+    book_ids = [row[0] for row in db.session.query(Book.id).all()]
+    rows = [
+        {
+            'b_id': book_id,
+            'b_velocity': round(int(sold_by_book.get(book_id) or 0) / window_days, 4)
+        }
+        for book_id in book_ids
+    ]
+    if rows:
+        table = Book.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('b_id'))
+            .values(
+                sales_velocity=bindparam('b_velocity'),
+                sales_velocity_updated_at=now,
+                updated_at=table.c.updated_at
+            ),
+            rows
+        )
+
+    # Bước 3: Commit
+    db.session.commit()
+    return len(rows)
+
+
+def days_of_cover(stock, velocity):
+    """
+    Ước tính số ngày còn đủ hàng với tốc độ bán hiện tại
+
+    Args:
+        stock (int): Số lượng tồn kho
+        velocity (float): Số lượng bán trung bình/ngày
+
+    Returns:
+        float | None: Số ngày (None nếu không bán được trong window)
+    """
+    if not velocity or velocity <= 0:
+        return None
+    return round(max(stock, 0) / velocity, 1)
@@ -0,0 +1,390 @@
+"""
+File: utils/llm.py
+
+Mục đích:
+Tách chatbot khỏi Google Gemini SDK bằng một interface LLM backend, để có thể thay Gemini bằng
+backend giả lập (không tốn API quota) khi load test / benchmark.
+
+Cách hoạt động:
+- Config.LLM_BACKEND chọn backend: 'gemini' (mặc định) hoặc 'fake'.
+- GeminiBackend: gọi Gemini qua google-genai (client tạo lazy, tái sử dụng across requests).
+- Mỗi lời gọi gồm system instruction (phần cố định, giống nhau giữa các câu hỏi), context (phần
+  thay đổi theo câu hỏi) và câu hỏi. GeminiBackend đưa system instruction vào cached content
+  (context caching, GEMINI_CONTEXT_CACHE) nên mỗi tin nhắn chỉ gửi context + câu hỏi;
+  Gemini từ chối cache (prompt quá ngắn...) thì gửi system instruction inline như bình thường.
+- FakeLLMBackend: không gọi network, giả lập độ trễ trước token đầu tiên (LLM_FAKE_LATENCY),
+  tốc độ sinh token (LLM_FAKE_TOKENS_PER_SECOND) và lỗi ngẫu nhiên (LLM_FAKE_FAILURE_RATE).
+  Ghi lại số lời gọi và kích thước prompt (phần gửi inline và phần đã cache) để benchmark đọc.
+- Deadline của từng lời gọi (timeout) được truyền vào generate/stream; circuit breaker và
+  bulkhead nằm ở utils.llm_guard, bao quanh lời gọi ở routes/chatbot.py.
+
+Các hàm/class trong file này:
+- LLMBackend: Interface (generate, stream)
+- GeminiBackend: Backend Google Gemini
+- FakeLLMBackend, FakeLLMError: Backend giả lập và lỗi giả lập
+- get_llm_backend(): Lấy backend của process (None nếu backend chưa cấu hình, ví dụ thiếu API key)
+- configure_llm_backend(name, **options): Tạo lại backend (dùng cho benchmark/script)
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from google import genai
+from google.genai import errors, types
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """
+    Interface của LLM backend
+
+    Attributes:
+    - name: Tên backend (dùng làm source của câu trả lời chatbot)
+    """
+
+    name = 'llm'
+
+    def generate(self, prompt, system_instruction=None, timeout=None, context=None):
+        """
+        Sinh câu trả lời đầy đủ
+
+        Args:
+            prompt (str): Nội dung gửi cho model (câu hỏi của người dùng)
+            system_instruction (str): System prompt cố định, cache được (optional)
+            timeout (float): Deadline của lời gọi (giây)
+            context (str): Context thay đổi theo câu hỏi, gửi kèm prompt (optional)
+
+        Returns:
+            str: Câu trả lời (có thể rỗng)
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt, system_instruction=None, timeout=None, context=None):
+        """
+        Sinh câu trả lời dạng stream
+
+        Yields:
+            str: Từng đoạn text ngay khi có
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def user_content(prompt, context=None):
+        """Nội dung user gửi cho model: context theo câu hỏi (nếu có) rồi tới câu hỏi"""
+        if not context:
+            return prompt
+        return f"{context}\n\nCâu hỏi của khách hàng: {prompt}"
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Backend Google Gemini (google-genai SDK)
+
+    Attributes:
+    - model: Tên model Gemini
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Cached content của system instruction hiện tại: {'key', 'name', 'expires_at'}
+        self._context_cache = None
+        # Key của system instruction đang được tạo cached content (None = không có)
+        self._context_cache_creating = None
+        self._context_cache_lock = threading.Lock()
+
+    def _get_client(self):
+        """Lazy initialization của Gemini client (tái sử dụng across requests)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai.Client(api_key=self.api_key)
+                    logger.info("[LLM] Gemini client initialized")
+        return self._client
+
+    @staticmethod
+    def _http_options(timeout):
+        """Deadline của HTTP request (SDK dùng millisecond)"""
+        return types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None
+
+    @staticmethod
+    def _remaining(deadline, timeout):
+        """Thời gian còn lại tới deadline của lời gọi (giây), None nếu không có deadline"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f'Gemini call exceeded {timeout}s')
+        return remaining
+
+    @staticmethod
+    def _is_cached_content_error(error):
+        """Lỗi do cached content không còn (bị xóa/hết hạn: 404/403), gửi lại inline sẽ thành công"""
+        return isinstance(error, errors.ClientError) and error.code in (403, 404)
+
+    def _cached_content(self, system_instruction, timeout):
+        """
+        Tên cached content chứa system instruction (Gemini context caching)
+
+        Flow:
+        1. Cached content hiện tại có cùng system instruction và còn hạn -> dùng lại
+        2. Thread khác đang tạo cached content -> gửi system instruction inline, không chờ
+        3. Ngược lại đánh dấu đang tạo rồi tạo cached content mới ngoài lock (lời gọi mạng chậm
+           không chặn các thread khác), TTL GEMINI_CONTEXT_CACHE_TTL. Cached content cũ không bị xóa
+           vì request khác có thể đang dùng, Gemini tự xóa khi hết TTL
+        4. Gemini từ chối (prompt ngắn hơn mức tối thiểu của model...) -> ghi nhớ, không thử lại
+           với system instruction này cho tới hết TTL
+
+        Args:
+            system_instruction (str): System prompt cố định
+            timeout (float): Deadline của lời gọi tạo cache (giây)
+
+        Returns:
+            str | None: Tên cached content, hoặc None nếu gửi system instruction inline
+        """
+        if not Config.GEMINI_CONTEXT_CACHE or not system_instruction:
+            return None
+
+        # Bước 1: Cached content hiện tại
+        key = hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._context_cache_lock:
+            current = self._context_cache
+            if current and current['key'] == key and now < current['expires_at']:
+                return current['name']
+
+            # Bước 2: Đang được tạo bởi thread khác
+            if self._context_cache_creating == key:
+                return None
+            self._context_cache_creating = key
+
+        # Bước 3 & 4: Tạo mới (ngoài lock)
+        ttl = Config.GEMINI_CONTEXT_CACHE_TTL
+        name = None
+        try:
+            cached = self._get_client().caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    ttl=f'{ttl}s',
+                    display_name='bookstore-chatbot',
+                    http_options=self._http_options(timeout)
+                )
+            )
+            name = cached.name
+            logger.info(f"[LLM] Gemini context cache created: {name} (ttl {ttl}s)")
+        except Exception as e:
+            logger.warning(f"[LLM] Gemini context cache unavailable, sending system instruction inline: {str(e)}")
+        finally:
+            with self._context_cache_lock:
+                self._context_cache_creating = None
+                # Tạo lại sớm hơn hạn thật một chút để request đang chạy không dùng cache vừa hết hạn
+                self._context_cache = {'key': key, 'name': name, 'expires_at': now + ttl * 0.9}
+        return name
+
+    def _drop_cached_content(self, name):
+        """Bỏ cached content (bị xóa/hết hạn phía Gemini), lời gọi sau sẽ tạo lại"""
+        with self._context_cache_lock:
+            if self._context_cache and self._context_cache['name'] == name:
+                self._context_cache = None
+
+    def _config(self, system_instruction, timeout, cached_content=None):
+        """GenerateContentConfig với system instruction (hoặc cached content) và deadline"""
+        return types.GenerateContentConfig(
+            system_instruction=None if cached_content else system_instruction,
+            cached_content=cached_content,
+            http_options=self._http_options(timeout)
+        )
+
+    def generate(self, prompt, system_instruction=None, timeout=None, context=None):
+        # Deadline chung cho tạo cached content, lời gọi chính và lần gửi lại inline
+        deadline = time.monotonic() + timeout if timeout else None
+        contents = self.user_content(prompt, context)
+        cached_content = self._cached_content(system_instruction, timeout)
+        try:
+            response = self._get_client().models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=self._config(system_instruction, self._remaining(deadline, timeout), cached_content)
+            )
+        except errors.ClientError as e:
+            if not cached_content or not self._is_cached_content_error(e):
+                raise
+            # Cached content không còn dùng được -> gửi lại với system instruction inline
+            self._drop_cached_content(cached_content)
+            response = self._get_client().models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=self._config(system_instruction, self._remaining(deadline, timeout))
+            )
+        return response.text if response and response.text else ''
+
+    def _stream_chunks(self, contents, system_instruction, cached_content, deadline, timeout):
+        # http_options.timeout giới hạn từng lần chờ của HTTP request, deadline giới hạn cả stream
+        config = self._config(system_instruction, self._remaining(deadline, timeout), cached_content)
+        for chunk in self._get_client().models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=config
+        ):
+            if chunk.text:
+                yield chunk.text
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f'Gemini stream exceeded {timeout}s')
+
+    def stream(self, prompt, system_instruction=None, timeout=None, context=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        contents = self.user_content(prompt, context)
+        cached_content = self._cached_content(system_instruction, timeout)
+        started = False
+        try:
+            for text in self._stream_chunks(contents, system_instruction, cached_content, deadline, timeout):
+                started = True
+                yield text
+        except errors.ClientError as e:
+            if started or not cached_content or not self._is_cached_content_error(e):
+                raise
+            # Cached content không còn dùng được (trước đoạn đầu tiên) -> gửi lại inline
+            self._drop_cached_content(cached_content)
+            yield from self._stream_chunks(contents, system_instruction, None, deadline, timeout)
+
+
+class FakeLLMError(Exception):
+    """Lỗi giả lập của FakeLLMBackend"""
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Backend giả lập cho load test (không gọi network)
+
+    Attributes:
+    - latency: Độ trễ trước token đầu tiên (giây)
+    - tokens_per_second: Tốc độ sinh token sau token đầu tiên (0 = không giới hạn)
+    - answer_tokens: Số token của mỗi câu trả lời
+    - failure_rate: Xác suất một lời gọi bị lỗi (0..1)
+    - context_cache: Giả lập context caching (system instruction giống lần gọi trước tính là đã cache)
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.5, tokens_per_second=50, answer_tokens=80, failure_rate=0.0,
+                 context_cache=True, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.failure_rate = failure_rate
+        self.context_cache = context_cache
+        self._cached_instruction = None
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'prompt_chars': 0, 'cached_chars': 0}
+
+    def _start_call(self, prompt, system_instruction, context, timeout, generation_time=0.0):
+        """Ghi nhận lời gọi, giả lập độ trễ (lỗi timeout nếu vượt deadline) và lỗi ngẫu nhiên"""
+        with self._stats_lock:
+            self._stats['calls'] += 1
+            instruction_chars = len(system_instruction or '')
+            if self.context_cache and system_instruction and system_instruction == self._cached_instruction:
+                self._stats['cached_chars'] += instruction_chars
+                instruction_chars = 0
+            elif self.context_cache:
+                self._cached_instruction = system_instruction
+            self._stats['prompt_chars'] += len(self.user_content(prompt or '', context)) + instruction_chars
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self._stats['failures'] += 1
+
+        if timeout is not None and self.latency + generation_time > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f'Fake LLM call exceeded timeout {timeout}s')
+        time.sleep(self.latency)
+        if failed:
+            raise FakeLLMError('Injected fake LLM failure')
+
+    def _tokens(self, prompt):
+        words = ['Trả', 'lời', 'thử', 'nghiệm', 'cho', 'câu', 'hỏi:'] + (prompt or '').split()[:10]
+        return [f"{words[index % len(words)]} " for index in range(self.answer_tokens)]
+
+    def generate(self, prompt, system_instruction=None, timeout=None, context=None):
+        tokens = self._tokens(prompt)
+        generation_time = len(tokens) / self.tokens_per_second if self.tokens_per_second else 0.0
+        self._start_call(prompt, system_instruction, context, timeout, generation_time)
+        time.sleep(generation_time)
+        return ''.join(tokens).strip()
+
+    def stream(self, prompt, system_instruction=None, timeout=None, context=None):
+        self._start_call(prompt, system_instruction, context, timeout)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for index, token in enumerate(self._tokens(prompt)):
+            if index and delay:
+                time.sleep(delay)
+            yield token
+
+    def stats(self):
+        """Số lời gọi, số lỗi giả lập, tổng số ký tự gửi inline (prompt + context + system instruction
+        chưa cache) và tổng số ký tự system instruction đã cache"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+def _create_backend(name, **options):
+    """Tạo backend theo tên, trả về None nếu backend chưa đủ cấu hình"""
+    if name == 'fake':
+        settings = {
+            'latency': Config.LLM_FAKE_LATENCY,
+            'tokens_per_second': Config.LLM_FAKE_TOKENS_PER_SECOND,
+            'answer_tokens': Config.LLM_FAKE_ANSWER_TOKENS,
+            'failure_rate': Config.LLM_FAKE_FAILURE_RATE,
+            'context_cache': Config.GEMINI_CONTEXT_CACHE
+        }
+        settings.update(options)
+        return FakeLLMBackend(**settings)
+    if name == 'gemini':
+        if not Config.GEMINI_API_KEY:
+            logger.warning("[LLM] No GEMINI_API_KEY, LLM backend disabled")
+            return None
+        return GeminiBackend(Config.GEMINI_API_KEY, options.get('model', Config.GEMINI_MODEL))
+    raise ValueError(f'Unknown LLM backend: {name}')
+
+
+_backend = {'instance': None, 'initialized': False}
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    """
+    Lấy LLM backend của process (tạo lazy theo Config.LLM_BACKEND)
+
+    Returns:
+        LLMBackend | None: Backend, hoặc None nếu chưa cấu hình (chatbot dùng FAQ)
+    """
+    if not _backend['initialized']:
+        with _backend_lock:
+            if not _backend['initialized']:
+                _backend['instance'] = _create_backend(Config.LLM_BACKEND)
+                _backend['initialized'] = True
+    return _backend['instance']
+
+
+def configure_llm_backend(name, **options):
+    """
+    Tạo lại LLM backend của process (dùng cho benchmark/script)
+
+    Args:
+        name (str): 'gemini' hoặc 'fake'
+        **options: Tham số của backend (mặc định lấy từ Config)
+
+    Returns:
+        LLMBackend | None: Backend mới
+    """
+    with _backend_lock:
+        _backend['instance'] = _create_backend(name, **options)
+        _backend['initialized'] = True
+    return _backend['instance']
@@ -0,0 +1,210 @@
+"""
+File: utils/llm_guard.py
+
+Mục đích:
+Bảo vệ workers khỏi LLM (Gemini) chậm/lỗi: circuit breaker (bỏ qua LLM sau nhiều lỗi liên tiếp)
+và bulkhead (giới hạn số lời gọi LLM đồng thời). Deadline của từng lời gọi được truyền vào
+LLM backend (utils.llm, với Gemini là http_options.timeout của SDK).
+
+Cách hoạt động:
+- Circuit breaker: trạng thái (closed/open/half-open, số lỗi liên tiếp, thời điểm) nằm trong
+  shared memory (mmap tạo lúc import, trước khi gunicorn fork) nên khi một worker thấy LLM
+  lỗi CHATBOT_BREAKER_FAILURES lần liên tiếp, mọi worker cùng chuyển thẳng sang FAQ.
+  Sau CHATBOT_BREAKER_RESET giây, một lời gọi thử (half-open) được cho qua: thành công thì
+  đóng lại, lỗi thì mở tiếp.
+- Bulkhead: mỗi worker chỉ cho tối đa CHATBOT_LLM_MAX_CONCURRENT lời gọi LLM cùng lúc
+  (với gthread, phần còn lại của thread pool luôn dành cho các request khác). Hết chỗ thì
+  chờ tối đa CHATBOT_LLM_ACQUIRE_TIMEOUT giây (lời gọi đang chạy thường xong trong thời gian
+  này), quá hạn thì raise BulkheadFull và route trả lời "đang bận, vui lòng thử lại".
+
+Các hàm/class trong file này:
+- CircuitBreaker: Circuit breaker dùng chung giữa các process
+- LLMGuard: Kết hợp circuit breaker + bulkhead quanh một lời gọi
+- LLMUnavailable, CircuitOpen, BulkheadFull: Exception khi lời gọi bị chặn
+- LLM_GUARD: Instance dùng cho các lời gọi LLM của chatbot
+"""
+import logging
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 0
+OPEN = 1
+HALF_OPEN = 2
+
+_STATE_NAMES = {CLOSED: 'closed', OPEN: 'open', HALF_OPEN: 'half_open'}
+
+# state (uint32), consecutive failures (uint32), thời điểm mở / bắt đầu gọi thử (epoch float64)
+_STATE = struct.Struct('<IId')
+
+
+class LLMUnavailable(Exception):
+    """Lời gọi LLM bị chặn trước khi gửi đi"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """Circuit breaker đang mở (LLM lỗi liên tiếp gần đây)"""
+
+
+class BulkheadFull(LLMUnavailable):
+    """Đã đủ số lời gọi LLM đồng thời cho phép trong worker"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker dùng chung giữa các process (shared memory + lock)
+
+    Attributes:
+    - failure_threshold: Số lỗi liên tiếp để mở circuit
+    - reset_timeout: Thời gian mở (giây) trước khi cho một lời gọi thử
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._buffer = mmap.mmap(-1, _STATE.size)
+        self._lock = multiprocessing.Lock()
+
+    def _read(self):
+        return _STATE.unpack_from(self._buffer, 0)
+
+    def _write(self, state, failures, since):
+        _STATE.pack_into(self._buffer, 0, state, failures, since)
+
+    def allow(self, now=None):
+        """
+        Kiểm tra có được gọi LLM không (có thể chuyển open -> half-open)
+
+        Returns:
+            bool: True nếu được gọi
+        """
+        now = time.time() if now is None else now
+        state, failures, since = self._read()
+        if state == CLOSED:
+            return True
+
+        with self._lock:
+            state, failures, since = self._read()
+            if state == CLOSED:
+                return True
+            # Hết thời gian mở (hoặc lời gọi thử trước đó không báo kết quả) -> cho một lời gọi thử
+            if now - since >= self.reset_timeout:
+                self._write(HALF_OPEN, failures, now)
+                logger.info("[LLM] Circuit half-open, sending probe request")
+                return True
+            return False
+
+    def is_open(self, now=None):
+        """Circuit đang chặn lời gọi (không thay đổi trạng thái)"""
+        now = time.time() if now is None else now
+        state, _, since = self._read()
+        return state != CLOSED and now - since < self.reset_timeout
+
+    def record_success(self):
+        """Ghi nhận lời gọi thành công (đóng circuit)"""
+        if self._read()[:2] == (CLOSED, 0):
+            return
+        with self._lock:
+            if self._read()[0] != CLOSED:
+                logger.info("[LLM] Circuit closed")
+            self._write(CLOSED, 0, 0.0)
+
+    def record_failure(self, now=None):
+        """Ghi nhận lời gọi lỗi (mở circuit khi đủ số lỗi liên tiếp, hoặc lời gọi thử lỗi)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            state, failures, since = self._read()
+            failures += 1
+            if state == HALF_OPEN or failures >= self.failure_threshold:
+                if state != OPEN:
+                    logger.warning(f"[LLM] Circuit opened after {failures} consecutive failures")
+                self._write(OPEN, failures, now)
+            else:
+                self._write(state, failures, since)
+
+    def stats(self):
+        """Trạng thái hiện tại"""
+        state, failures, since = self._read()
+        return {'state': _STATE_NAMES[state], 'consecutive_failures': failures}
+
+    def reset(self):
+        """Đóng circuit, xóa số lỗi"""
+        with self._lock:
+            self._write(CLOSED, 0, 0.0)
+
+
+class LLMGuard:
+    """
+    Circuit breaker + bulkhead quanh lời gọi LLM
+
+    Attributes:
+    - breaker: CircuitBreaker dùng chung
+    - max_concurrent: Số lời gọi đồng thời tối đa trong process
+    - acquire_timeout: Thời gian chờ chỗ khi đã đủ số lời gọi đồng thời (giây)
+    """
+
+    def __init__(self, breaker, max_concurrent, acquire_timeout=0, is_failure=None):
+        self.breaker = breaker
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._is_failure = is_failure or (lambda error: True)
+
+    def set_max_concurrent(self, max_concurrent):
+        """Đổi số lời gọi đồng thời tối đa (dùng cho benchmark, gọi khi không có lời gọi đang chạy)"""
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def available(self):
+        """Có nên thử gọi LLM không (dùng để bỏ qua việc build prompt khi circuit đang mở)"""
+        return not self.breaker.is_open()
+
+    @contextmanager
+    def call(self):
+        """
+        Context manager cho một lời gọi LLM
+
+        Lỗi trong block (trừ lỗi không do LLM, xem is_failure) được tính vào circuit breaker,
+        block chạy xong thì tính là thành công.
+
+        Raises:
+            CircuitOpen: Circuit đang mở
+            BulkheadFull: Đã đủ số lời gọi đồng thời và không có chỗ trong acquire_timeout
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen('LLM circuit is open')
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise BulkheadFull('Too many concurrent LLM calls')
+        try:
+            yield
+        except Exception as e:
+            if self._is_failure(e):
+                self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+
+
+def _is_llm_failure(error):
+    """Lỗi 4xx do request (trừ 429) không phải do LLM quá tải, không mở circuit"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and 400 <= code < 500 and code != 429:
+        return False
+    return True
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung trạng thái circuit
+LLM_GUARD = LLMGuard(
+    CircuitBreaker(Config.CHATBOT_BREAKER_FAILURES, Config.CHATBOT_BREAKER_RESET),
+    max_concurrent=Config.CHATBOT_LLM_MAX_CONCURRENT,
+    acquire_timeout=Config.CHATBOT_LLM_ACQUIRE_TIMEOUT,
+    is_failure=_is_llm_failure
+)
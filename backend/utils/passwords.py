@@ -0,0 +1,157 @@
+"""
+File: utils/passwords.py
+
+Mục đích:
+Giới hạn số bcrypt (hash/verify password) chạy đồng thời trên toàn host, thay vì để mỗi request
+đăng nhập/đăng ký chạy bcrypt không giới hạn.
+
+bcrypt tốn ~100-300ms CPU mỗi lần (tùy cost factor). Khi có một đợt đăng nhập/đăng ký dồn dập,
+bcrypt không giới hạn sẽ chiếm hết CPU của host và làm chậm các request catalog của mọi worker.
+PasswordHasher giới hạn:
+- Số bcrypt chạy đồng thời trên toàn host (BCRYPT_MAX_WORKERS) - không bao giờ quá N core bị
+  bcrypt chiếm, dù gunicorn chạy bao nhiêu worker process
+- Số request đăng nhập được xếp hàng chờ trên toàn host (BCRYPT_MAX_QUEUE) - quá giới hạn hoặc
+  chờ quá BCRYPT_QUEUE_TIMEOUT thì raise PasswordHasherBusy để route trả 503 ngay
+
+Cách hoạt động:
+- Giới hạn là hai multiprocessing.BoundedSemaphore tạo lúc import module. Với preload_app=True,
+  module được import trong gunicorn master trước khi fork nên mọi worker dùng chung một bộ đếm
+  (giống bảng counter của utils.rate_limit).
+- bcrypt chạy trên chính thread của request sau khi lấy được slot. bcrypt nhả GIL nên với worker
+  gthread các thread khác của worker (request catalog) vẫn chạy trong lúc thread này hash/chờ slot.
+- Worker bị kill (SIGKILL) đúng lúc đang giữ slot sẽ làm mất slot đó đến khi restart gunicorn
+  (giới hạn chung của semaphore dùng chung giữa các process).
+
+Các hàm/class trong file này:
+- PasswordHasher: Giới hạn bcrypt dùng chung giữa các process (hash, verify, needs_rehash)
+- PasswordHasherBusy: Exception khi hàng đợi bcrypt đầy
+- get_password_hasher(): Lấy instance dùng chung (tạo lúc import, trước khi fork)
+- configure_password_hasher(**overrides): Tạo lại instance với cấu hình khác (benchmark/script)
+"""
+import multiprocessing
+import threading
+import bcrypt
+from config import Config
+
+
+class PasswordHasherBusy(Exception):
+    """Hàng đợi bcrypt đã đầy (quá BCRYPT_MAX_QUEUE tác vụ đang chờ, hoặc chờ quá lâu)"""
+
+
+class PasswordHasher:
+    """
+    Hash/verify password bằng bcrypt, giới hạn số bcrypt đồng thời trên toàn host
+
+    Attributes:
+    - rounds: bcrypt cost factor dùng khi hash password mới
+    - max_workers: Số bcrypt chạy đồng thời trên toàn host (0 = không giới hạn)
+    - max_queue: Số tác vụ tối đa được chờ ngoài các tác vụ đang chạy
+    - queue_timeout: Thời gian chờ đến lượt chạy (giây)
+    """
+
+    def __init__(self, rounds, max_workers, max_queue, queue_timeout):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._slots = None
+        self._running = None
+        if max_workers > 0:
+            # Mỗi tác vụ (đang chạy hoặc đang chờ) giữ một slot, tác vụ đang chạy giữ thêm một running
+            self._slots = multiprocessing.BoundedSemaphore(max_workers + max_queue)
+            self._running = multiprocessing.BoundedSemaphore(max_workers)
+
+    def _run(self, func, *args):
+        """Chờ đến lượt (nếu có giới hạn) rồi chạy func trên thread hiện tại"""
+        if self._running is None:
+            return func(*args)
+
+        if not self._slots.acquire(block=False):
+            raise PasswordHasherBusy('Password hashing queue is full')
+        try:
+            if not self._running.acquire(timeout=self.queue_timeout):
+                raise PasswordHasherBusy('Timed out waiting for password hashing')
+            try:
+                return func(*args)
+            finally:
+                self._running.release()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """
+        Hash password với cost factor hiện tại
+
+        Args:
+            password (str): Password dạng plain text
+
+        Returns:
+            str: bcrypt hash
+        """
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, password_hash):
+        """
+        Kiểm tra password có khớp với hash không
+
+        Args:
+            password (str): Password dạng plain text
+            password_hash (str): bcrypt hash đã lưu
+
+        Returns:
+            bool: True nếu khớp
+        """
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """
+        Kiểm tra hash có được tạo với cost factor khác cấu hình hiện tại không
+
+        Hash bcrypt có dạng $2b$<cost>$<salt+hash>, nên chỉ cần đọc phần cost.
+        """
+        parts = password_hash.split('$')
+        if len(parts) < 4 or not parts[2].isdigit():
+            return True
+        return int(parts[2]) != self.rounds
+
+
+def _hasher_settings(**overrides):
+    """Cấu hình PasswordHasher từ Config, ghi đè bằng overrides"""
+    settings = {
+        'rounds': Config.BCRYPT_ROUNDS,
+        'max_workers': Config.BCRYPT_MAX_WORKERS,
+        'max_queue': Config.BCRYPT_MAX_QUEUE,
+        'queue_timeout': Config.BCRYPT_QUEUE_TIMEOUT
+    }
+    settings.update(overrides)
+    return settings
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung giới hạn
+_hasher = PasswordHasher(**_hasher_settings())
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Lấy PasswordHasher dùng chung của tất cả worker process"""
+    return _hasher
+
+
+def configure_password_hasher(**overrides):
+    """
+    Tạo lại PasswordHasher dùng chung với cấu hình khác (dùng cho benchmark/script)
+
+    Chỉ dùng chung được giữa các process nếu gọi trước khi fork.
+
+    Args:
+        **overrides: rounds, max_workers, max_queue, queue_timeout (mặc định lấy từ Config)
+
+    Returns:
+        PasswordHasher: Instance mới
+    """
+    global _hasher
+    with _hasher_lock:
+        _hasher = PasswordHasher(**_hasher_settings(**overrides))
+    return _hasher
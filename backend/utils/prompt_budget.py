@@ -0,0 +1,88 @@
+"""
+File: utils/prompt_budget.py
+
+Mục đích:
+Giới hạn kích thước phần context gửi kèm mỗi câu hỏi chatbot (danh sách bestsellers, sách theo
+danh mục, thông tin sách cụ thể) theo một ngân sách token, giữ lại phần liên quan nhất tới câu hỏi.
+Nhờ vậy số input token mỗi tin nhắn không tăng theo kích thước catalog.
+
+Cách hoạt động:
+- Số token được ước lượng theo số ký tự (CHARS_PER_TOKEN, tiếng Việt có dấu thường ~3 ký tự/token),
+  không gọi API count_tokens cho mỗi tin nhắn.
+- Mỗi entry (một dòng context) có text và keywords. Độ liên quan = số term chung giữa câu hỏi và
+  keywords (unigram + bigram không dấu, bỏ stopword - xem utils.semantic_search.tokenize).
+- Chọn greedy theo (độ liên quan giảm dần, thứ tự ưu tiên mặc định), bỏ qua entry không còn vừa
+  ngân sách, rồi trả về theo thứ tự ban đầu để context vẫn dễ đọc.
+
+Các hàm trong file này:
+- estimate_tokens(text): Ước lượng số token của text
+- truncate_to_tokens(text, max_tokens): Cắt text cho vừa ngân sách (theo từ)
+- select_by_relevance(question, entries, max_tokens): Chọn các entry liên quan nhất trong ngân sách
+"""
+import math
+from utils.semantic_search import tokenize
+
+# Ước lượng thô (tokenizer của Gemini tách tiếng Việt có dấu thành nhiều token hơn tiếng Anh)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    """Ước lượng số token của text (0 nếu rỗng)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cắt text cho vừa ngân sách token (cắt ở ranh giới từ, thêm "...")
+
+    Args:
+        text (str): Text gốc
+        max_tokens (int): Số token tối đa
+
+    Returns:
+        str: Text nguyên vẹn nếu đã vừa, ngược lại phần đầu của text
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - 3)
+    return text[:max_chars].rsplit(' ', 1)[0] + '...'
+
+
+def select_by_relevance(question, entries, max_tokens):
+    """
+    Chọn các entry liên quan nhất tới câu hỏi sao cho tổng số token không vượt ngân sách
+
+    Flow:
+    1. Tách term của câu hỏi
+    2. Tính độ liên quan của từng entry (số term chung với keywords)
+    3. Duyệt theo (độ liên quan giảm dần, thứ tự ban đầu), lấy entry nếu còn vừa ngân sách
+    4. Trả về index đã chọn theo thứ tự ban đầu
+
+    Args:
+        question (str): Câu hỏi của người dùng (None/rỗng = chỉ theo thứ tự ưu tiên)
+        entries (list): [(text, keywords)] theo thứ tự ưu tiên mặc định
+        max_tokens (int): Ngân sách token
+
+    Returns:
+        list: Index của các entry được chọn (tăng dần)
+    """
+    # Bước 1: Term của câu hỏi
+    question_terms = set(tokenize(question or ''))
+
+    # Bước 2: Độ liên quan
+    ranked = sorted(
+        range(len(entries)),
+        key=lambda index: (-len(question_terms.intersection(tokenize(entries[index][1]))), index)
+    ) if question_terms else range(len(entries))
+
+    # Bước 3: Greedy trong ngân sách
+    selected = []
+    remaining = max_tokens
+    for index in ranked:
+        tokens = estimate_tokens(entries[index][0])
+        if tokens <= remaining:
+            selected.append(index)
+            remaining -= tokens
+
+    # Bước 4: Thứ tự ban đầu
+    return sorted(selected)
@@ -0,0 +1,186 @@
+"""
+File: utils/rate_limit.py
+
+Mục đích:
+Giới hạn số lần đăng nhập theo username và theo IP (chống credential stuffing) bằng
+sliding window counter, lưu trong shared memory dùng chung cho tất cả gunicorn workers.
+
+Cách hoạt động:
+- Bảng counter là một vùng mmap ẩn danh (MAP_SHARED) được tạo lúc import module. Với
+  preload_app=True, module được import trong gunicorn master trước khi fork nên mọi worker
+  dùng chung một bảng (chạy `python app.py` thì chỉ có một process, vẫn đúng).
+- Mỗi key (ví dụ 'user:alice', 'ip:1.2.3.4') chiếm đúng một slot cố định 32 bytes:
+  hash của key, số thứ tự window hiện tại, count window hiện tại, count window trước.
+  Số lần thử được ước tính = prev * (phần còn lại của window trước) + curr,
+  nên bộ nhớ là O(1) mỗi key thay vì lưu từng timestamp.
+- Slot tự hết hạn: slot có window cũ hơn window trước được coi là trống và được tái sử dụng.
+- Check chạy trước khi query database hoặc gọi bcrypt, nên request bị chặn gần như không tốn tài nguyên.
+
+Các hàm/class trong file này:
+- SlidingWindowLimiter: Bảng counter dùng chung giữa các process
+- login_rate_limit: Decorator giới hạn số lần đăng nhập (trả 429 khi vượt giới hạn)
+"""
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import time
+from functools import wraps
+from flask import request, jsonify
+from config import Config
+
+# key_hash (uint64), window (int64), curr (uint32), prev (uint32), padding
+_SLOT = struct.Struct('<QqII8x')
+_MAX_PROBES = 16
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding window counter dùng chung giữa các process (shared memory + lock)
+
+    Attributes:
+    - capacity: Số slot tối đa (mỗi key một slot)
+    - window: Độ dài window (giây)
+    """
+
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.window = window
+        self._buffer = mmap.mmap(-1, capacity * _SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    @staticmethod
+    def _hash_key(key):
+        """Hash key thành uint64 khác 0 (0 đánh dấu slot trống)"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') or 1
+
+    def _read(self, index):
+        return _SLOT.unpack_from(self._buffer, index * _SLOT.size)
+
+    def _write(self, index, key_hash, window, curr, prev):
+        _SLOT.pack_into(self._buffer, index * _SLOT.size, key_hash, window, curr, prev)
+
+    def _find_slot(self, key_hash, current_window):
+        """
+        Tìm slot của key (linear probing), hoặc slot trống/hết hạn để dùng cho key mới
+
+        Returns:
+            tuple: (index, curr, prev) - curr/prev đã được dịch theo window hiện tại
+        """
+        start = key_hash % self.capacity
+        reusable = None
+        oldest = None
+
+        for probe in range(_MAX_PROBES):
+            index = (start + probe) % self.capacity
+            slot_hash, slot_window, curr, prev = self._read(index)
+
+            if slot_hash == key_hash:
+                # Dịch counter theo số window đã trôi qua
+                if slot_window == current_window:
+                    return index, curr, prev
+                if slot_window == current_window - 1:
+                    return index, 0, curr
+                return index, 0, 0
+
+            expired = slot_hash == 0 or slot_window < current_window - 1
+            if expired and reusable is None:
+                reusable = index
+            if oldest is None or slot_window < oldest[1]:
+                oldest = (index, slot_window)
+
+        # Key mới: dùng slot trống/hết hạn, nếu bảng đầy thì ghi đè slot cũ nhất
+        return (reusable if reusable is not None else oldest[0]), 0, 0
+
+    def hit(self, rules, now=None):
+        """
+        Ghi nhận một lần thử cho tất cả rules nếu không rule nào vượt giới hạn
+
+        Args:
+            rules (list[tuple[str, int]]): Danh sách (key, limit)
+            now (float): Thời điểm hiện tại (default: time.time())
+
+        Returns:
+            tuple: (allowed bool, retry_after giây)
+        """
+        now = time.time() if now is None else now
+        current_window = int(now // self.window)
+        elapsed_fraction = (now % self.window) / self.window
+
+        with self._lock:
+            slots = []
+            retry_after = 0
+            for key, limit in rules:
+                key_hash = self._hash_key(key)
+                index, curr, prev = self._find_slot(key_hash, current_window)
+                estimated = prev * (1 - elapsed_fraction) + curr
+                if estimated >= limit:
+                    retry_after = max(retry_after, self._retry_after(curr, prev, limit, now))
+                slots.append((index, key_hash, curr, prev))
+
+            # Chỉ tăng counter khi tất cả rules đều cho phép (request bị chặn không được tính)
+            if retry_after:
+                return False, retry_after
+            for index, key_hash, curr, prev in slots:
+                self._write(index, key_hash, current_window, curr + 1, prev)
+            return True, 0
+
+    def _retry_after(self, curr, prev, limit, now):
+        """Số giây (làm tròn lên) đến khi ước tính giảm xuống dưới limit"""
+        window_start = (now // self.window) * self.window
+        if curr < limit and prev > 0:
+            # Chờ phần đóng góp của window trước giảm đủ: prev * (1 - t/window) + curr < limit
+            fraction = 1 - (limit - curr) / prev
+            wait = window_start + fraction * self.window - now
+        else:
+            # Window hiện tại đã đủ limit: chờ sang window sau, khi curr trở thành prev
+            fraction = 1 - limit / curr if curr else 0
+            wait = window_start + self.window + max(fraction, 0) * self.window - now
+        return max(1, math.ceil(wait))
+
+    def reset(self):
+        """Xóa toàn bộ counter"""
+        with self._lock:
+            self._buffer[:] = bytes(len(self._buffer))
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung
+LOGIN_LIMITER = SlidingWindowLimiter(
+    capacity=Config.LOGIN_RATE_LIMIT_SLOTS,
+    window=Config.LOGIN_RATE_LIMIT_WINDOW
+)
+
+
+def login_rate_limit(f):
+    """
+    Decorator giới hạn số lần đăng nhập theo username và theo IP
+
+    Chạy trước view function (trước mọi query database và bcrypt). Mọi lần thử
+    (kể cả thành công) đều được tính, request bị chặn thì không.
+    IP là IP client thật: khi chạy sau nginx (Config.TRUSTED_PROXY_COUNT=1) app.py bọc app bằng
+    ProxyFix nên request.remote_addr lấy từ X-Forwarded-For của nginx, không phải IP của nginx.
+    Mặc định (0) request.remote_addr là IP kết nối trực tiếp, X-Forwarded-For bị bỏ qua.
+
+    Returns:
+        - 429: Vượt giới hạn (kèm header Retry-After)
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        username = str(data.get('username', '')).strip().lower()
+
+        rules = [(f'ip:{request.remote_addr}', Config.LOGIN_MAX_ATTEMPTS_PER_IP)]
+        if username:
+            rules.append((f'user:{username}', Config.LOGIN_MAX_ATTEMPTS_PER_USERNAME))
+
+        allowed, retry_after = LOGIN_LIMITER.hit(rules)
+        if not allowed:
+            response = jsonify({
+                'error': f'Quá nhiều lần đăng nhập, vui lòng thử lại sau {retry_after} giây'
+            })
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        return f(*args, **kwargs)
+    return decorated_function
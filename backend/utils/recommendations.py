@@ -0,0 +1,198 @@
+"""
+File: utils/recommendations.py
+
+Mục đích:
+Gợi ý sách "thường được mua cùng" (item-to-item co-occurrence) từ bảng order_items.
+
+Cách hoạt động:
+- Batch job (script refresh_related_books.py chạy định kỳ bằng cron) dựng ma trận thưa
+  đơn hàng x sách (scipy.sparse, 1 nếu đơn có sách), nhân X^T * X để được ma trận
+  co-occurrence sách x sách (số đơn có cả hai sách), rồi lấy top-K hàng xóm của mỗi sách.
+- Điểm = cosine similarity co_orders / sqrt(orders_i * orders_j) để sách bán chạy không
+  xuất hiện trong gợi ý của mọi sách. Hòa điểm thì ưu tiên nhiều đơn mua cùng hơn, rồi id nhỏ hơn.
+- Kết quả lưu vào cột books.related_books, nên endpoint/chatbot chỉ đọc danh sách có sẵn
+  trên dòng sách (không aggregate order_items cho mỗi request).
+- Sách chưa có đủ dữ liệu mua cùng được bổ sung bằng sách cùng tác giả, rồi cùng danh mục.
+
+Các hàm trong file này:
+- compute_co_purchase_neighbors(pairs, top_k, min_co_orders): Tính top-K hàng xóm từ các cặp (order_id, book_id)
+- refresh_related_books(top_k, min_co_orders): Tính lại related_books cho tất cả sách
+- get_related_books(book, limit): Lấy sách liên quan của một sách
+"""
+from datetime import datetime
+from sqlalchemy import update, bindparam, or_
+from config import Config
+from models import db, Book, Order, OrderItem
+
+
+def compute_co_purchase_neighbors(pairs, top_k, min_co_orders=1):
+    """
+    Tính top-K sách thường được mua cùng cho mỗi sách
+
+    Flow:
+    1. Đánh số lại order_id/book_id thành index liên tục
+    2. Dựng ma trận thưa X (đơn hàng x sách, giá trị 0/1)
+    3. C = X^T * X: C[i, j] = số đơn có cả sách i và sách j, đường chéo = số đơn của sách i
+    4. Với mỗi sách: lọc hàng xóm có ít nhất min_co_orders đơn, tính cosine, lấy top-K
+
+    Args:
+        pairs (list): Danh sách (order_id, book_id)
+        top_k (int): Số hàng xóm tối đa mỗi sách
+        min_co_orders (int): Số đơn mua cùng tối thiểu
+
+    Returns:
+        dict: book_id -> [{'id', 'co_orders', 'score'}] sắp xếp theo score giảm dần
+              (chỉ chứa sách có ít nhất một hàng xóm)
+    """
+    # numpy/scipy chỉ cần cho batch job, không import trong web workers
+    import numpy as np
+    from scipy import sparse
+
+    if not pairs:
+        return {}
+
+    # Bước 1: Index liên tục cho order và book
+    order_ids, book_ids = np.array(pairs, dtype=np.int64).T
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    books, book_index = np.unique(book_ids, return_inverse=True)
+
+    # Bước 2: Ma trận đơn hàng x sách (nhiều dòng order_items cùng sách trong một đơn tính là 1)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(book_index), dtype=np.int32), (order_index, book_index)),
+        shape=(order_index.max() + 1, len(books))
+    )
+    matrix.data[:] = 1
+
+    # Bước 3: Ma trận co-occurrence
+    co_matrix = (matrix.T @ matrix).tocsr()
+    orders_per_book = co_matrix.diagonal().astype(np.float64)
+    co_matrix.setdiag(0)
+    co_matrix.eliminate_zeros()
+
+    # Bước 4: Top-K hàng xóm của từng sách
+    neighbors = {}
+    for row in range(len(books)):
+        start, end = co_matrix.indptr[row], co_matrix.indptr[row + 1]
+        columns = co_matrix.indices[start:end]
+        co_orders = co_matrix.data[start:end]
+        keep = co_orders >= min_co_orders
+        if not keep.any():
+            continue
+        columns, co_orders = columns[keep], co_orders[keep]
+
+        scores = co_orders / np.sqrt(orders_per_book[row] * orders_per_book[columns])
+        # lexsort: key cuối là key chính (score giảm dần, co_orders giảm dần, book_id tăng dần)
+        best = np.lexsort((books[columns], -co_orders, -scores))[:top_k]
+        neighbors[int(books[row])] = [
+            {
+                'id': int(books[columns[index]]),
+                'co_orders': int(co_orders[index]),
+                'score': round(float(scores[index]), 4)
+            }
+            for index in best
+        ]
+    return neighbors
+
+
+def refresh_related_books(top_k=None, min_co_orders=None):
+    """
+    Tính lại related_books cho tất cả sách
+
+    Flow:
+    1. Lấy các cặp (order_id, book_id) không trùng (bỏ qua đơn đã hủy)
+    2. Tính top-K hàng xóm (compute_co_purchase_neighbors)
+    3. Bulk update related_books cho tất cả sách (sách chưa có hàng xóm = [])
+    4. Commit
+
+    Args:
+        top_k (int): Số hàng xóm mỗi sách (default: Config.RECOMMENDATIONS_TOP_K)
+        min_co_orders (int): Số đơn mua cùng tối thiểu (default: Config.RECOMMENDATIONS_MIN_CO_ORDERS)
+
+    Returns:
+        int: Số sách đã cập nhật
+    """
+    top_k = top_k or Config.RECOMMENDATIONS_TOP_K
+    min_co_orders = min_co_orders or Config.RECOMMENDATIONS_MIN_CO_ORDERS
+    now = datetime.utcnow()
+
+    # Bước 1: Cặp (order, book)
+    pairs = (
+        db.session.query(OrderItem.order_id, OrderItem.book_id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(Order.status != 'cancelled')
+        .distinct()
+        .all()
+    )
+
+    # Bước 2: Top-K hàng xóm
+    neighbors = compute_co_purchase_neighbors(pairs, top_k, min_co_orders)
+
+    # Bước 3: Bulk update (giữ nguyên updated_at vì đây không phải thay đổi của admin)
+    book_ids = [row[0] for row in db.session.query(Book.id).all()]
+    rows = [
+        {'b_id': book_id, 'b_related': neighbors.get(book_id, [])}
+        for book_id in book_ids
+    ]
+    if rows:
+        table = Book.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('b_id'))
+            .values(
+                related_books=bindparam('b_related'),
+                related_books_updated_at=now,
+                updated_at=table.c.updated_at
+            ),
+            rows
+        )
+
+    # Bước 4: Commit
+    db.session.commit()
+    return len(rows)
+
+
+def get_related_books(book, limit=5):
+    """
+    Lấy sách liên quan của một sách
+
+    Flow:
+    1. Đọc danh sách hàng xóm có sẵn trên book.related_books (không aggregate order_items)
+    2. Load các sách đó bằng một query (bỏ qua sách đã bị xóa), giữ thứ tự theo score
+    3. Chưa đủ limit: bổ sung sách cùng tác giả, rồi cùng danh mục (một query)
+
+    Args:
+        book (Book): Sách gốc
+        limit (int): Số sách tối đa
+
+    Returns:
+        list: [{'book': Book, 'co_orders': int | None, 'score': float | None}]
+              (co_orders/score = None với sách bổ sung)
+    """
+    related = []
+
+    # Bước 1 & 2: Sách thường được mua cùng
+    entries = book.related_books or []
+    if entries:
+        books_by_id = {
+            related_book.id: related_book
+            for related_book in Book.query.filter(Book.id.in_([entry['id'] for entry in entries])).all()
+        }
+        related = [
+            {'book': books_by_id[entry['id']], 'co_orders': entry['co_orders'], 'score': entry['score']}
+            for entry in entries
+            if entry['id'] in books_by_id
+        ][:limit]
+
+    # Bước 3: Bổ sung sách cùng tác giả / cùng danh mục
+    if len(related) < limit:
+        exclude_ids = [book.id] + [item['book'].id for item in related]
+        fallback_books = Book.query.filter(
+            or_(Book.author == book.author, Book.category == book.category),
+            ~Book.id.in_(exclude_ids)
+        ).order_by(
+            (Book.author == book.author).desc(),
+            Book.id
+        ).limit(limit - len(related)).all()
+        related += [{'book': fallback_book, 'co_orders': None, 'score': None} for fallback_book in fallback_books]
+
+    return related
@@ -0,0 +1,93 @@
+"""
+File: utils/schema.py
+
+Mục đích:
+Bổ sung các phần schema mà db.create_all() không tự tạo cho bảng đã tồn tại.
+
+db.create_all() chỉ tạo bảng mới (kèm index của bảng đó). Với database đã chạy từ
+trước, các cột và index được khai báo thêm sau này trong models sẽ không được tạo.
+ensure_schema() bổ sung chúng một cách idempotent khi khởi động app.
+
+ensure_extensions() cài các extension PostgreSQL mà index trong models cần (gọi trước db.create_all()).
+
+Lưu ý: Chỉ hỗ trợ thêm mới (cột nullable hoặc có server_default). Đổi kiểu/xóa cột
+vẫn cần migrate thủ công.
+"""
+import logging
+from sqlalchemy import inspect, text
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Extension PostgreSQL dùng bởi index/query (pg_trgm: tìm kiếm gần đúng, xem utils.book_search)
+POSTGRES_EXTENSIONS = ('pg_trgm',)
+
+
+def ensure_extensions():
+    """
+    Cài các extension PostgreSQL cần thiết (gọi trước db.create_all() để index dùng được extension)
+
+    Không có quyền CREATE EXTENSION thì chỉ log warning: index phụ thuộc extension không được tạo
+    và tính năng liên quan dùng fallback.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for extension in POSTGRES_EXTENSIONS:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(f'CREATE EXTENSION IF NOT EXISTS {extension}'))
+        except Exception as e:
+            logger.warning(f"[SCHEMA] Cannot create extension {extension}: {str(e)}")
+
+
+def ensure_columns():
+    """
+    Thêm các cột khai báo trong models nhưng chưa có trong bảng đã tồn tại
+
+    Flow:
+    1. Đọc danh sách cột hiện có của từng bảng (inspector)
+    2. Với mỗi cột thiếu: ALTER TABLE ... ADD COLUMN (kiểu, DEFAULT, NOT NULL theo model)
+    3. Commit
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dialect = db.engine.dialect
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            # Bước 1: Cột hiện có
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+
+            # Bước 2: Thêm cột thiếu
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+                if column.server_default is not None:
+                    ddl += f' DEFAULT {column.server_default.arg}'
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                conn.execute(text(ddl))
+
+
+def ensure_indexes():
+    """
+    Tạo các index khai báo trong models nhưng chưa có trong database
+
+    Flow:
+    1. Duyệt tất cả bảng trong metadata
+    2. Với mỗi index: tạo nếu chưa tồn tại (checkfirst=True)
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def ensure_schema():
+    """Đảm bảo schema trong database khớp với models (gọi sau db.create_all())"""
+    ensure_columns()
+    ensure_indexes()
@@ -0,0 +1,440 @@
+"""
+File: utils/semantic_search.py
+
+Mục đích:
+Tìm sách theo mô tả ("sách về tuổi thơ buồn") thay vì theo tên sách, bằng vector TF-IDF của
+title, author, danh mục và description, tìm top-K theo cosine similarity (vectorized NumPy).
+
+Cách hoạt động:
+- Text được chuẩn hóa bằng fold_text (không dấu), bỏ stopword, lấy unigram + bigram (tiếng Việt
+  đơn âm tiết nên bigram giữ được từ ghép như "tuoi tho"). Mỗi term được hash (blake2b) vào một
+  trong SEMANTIC_SEARCH_DIMENSIONS cột (hashing trick, không cần lưu vocabulary), dấu +/- theo
+  một bit khác của hash để va chạm hash triệt tiêu thay vì cộng dồn. Title được tính trọng số gấp đôi.
+- Trọng số term = (1 + log tf) * idf, idf tính trên toàn catalog lúc build. Vector chuẩn hóa L2
+  nên cosine = tích vô hướng: điểm của mọi sách = một phép nhân ma trận x vector.
+- Index nằm trong một file (SEMANTIC_INDEX_PATH): header, idf, book id + updated_at của từng
+  dòng, ma trận float32 (capacity x dimensions). Mọi worker mmap cùng file (MAP_SHARED) nên
+  cả máy chỉ có một bản trong page cache.
+- Cập nhật tăng dần: khi catalog version thay đổi, worker so updated_at của sách với index
+  (một query 2 cột), embed lại sách mới/đã sửa và ghi đè dòng tương ứng ngay trong file
+  (dưới file lock), sách bị xóa được đánh dấu id = -1. Hết chỗ thì build lại toàn bộ ra file
+  mới rồi os.replace, các worker khác thấy inode đổi thì mmap lại. idf giữ nguyên giữa các lần
+  build toàn bộ (build_semantic_index.py chạy định kỳ để tính lại idf).
+
+Các hàm/class trong file này:
+- tokenize(text): Tách term đã chuẩn hóa (unigram + bigram, bỏ stopword)
+- SemanticIndex: Index mmap (embed, search)
+- build_semantic_index(path): Build lại toàn bộ index từ database (tính lại idf)
+- sync_semantic_index(index): Cập nhật tăng dần các sách đã thay đổi
+- get_semantic_index(): Index của process (tự build/sync/mmap lại khi cần)
+- semantic_search(query, limit): Top sách phù hợp với mô tả
+"""
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from sqlalchemy.orm import load_only
+from config import Config
+from models import db, Book
+from utils.book_matcher import fold_text
+from utils.catalog import catalog_version
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'BKSEMV01'
+# magic, dimensions, capacity, rows (số dòng đã dùng), documents (số sách lúc tính idf), built_at
+_HEADER = struct.Struct('<8sIIIId')
+_HEADER_SIZE = 64
+
+# Từ phổ biến trong câu hỏi/mô tả (đã bỏ dấu), không mang nội dung
+_STOPWORDS = {
+    'sach', 'cuon', 'quyen', 'bo', 'tap', 'cua', 'va', 'voi', 'la', 'co', 'khong', 'nao', 'nay',
+    'do', 'cho', 'toi', 'minh', 'ban', 'shop', 'hay', 've', 'mot', 'nhung', 'cac', 'nhat', 'gi',
+    'the', 'nhu', 'trong', 'tren', 'duoc', 'tim', 'muon', 'can', 'goi', 'y', 'oi', 'nhe', 'a',
+    'ah', 'em', 'anh', 'chi', 'ai', 'doc', 'mua', 'dang', 'se', 'da', 'thi', 'ma', 'khi', 'den',
+    'tu', 'o', 'nhieu', 'rat', 'cung', 'nguoi', 'of', 'and', 'an', 'to', 'in', 'for'
+}
+
+_BOOK_COLUMNS = (Book.id, Book.title, Book.author, Book.category, Book.description, Book.updated_at)
+
+
+def tokenize(value):
+    """
+    Tách term đã chuẩn hóa: unigram (bỏ stopword) + bigram của các từ liên tiếp còn lại
+
+    Args:
+        value (str): Text gốc
+
+    Returns:
+        list: Danh sách term, ví dụ "Sách về tuổi thơ buồn" -> ['tuoi', 'tho', 'buon', 'tuoi tho', 'tho buon']
+    """
+    words = [word for word in fold_text(value).split() if word not in _STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def _term_features(fields, dimensions):
+    """Vector TF (sublinear, có dấu) theo hashing trick: fields = [(text, weight)] -> {cột: giá trị}"""
+    term_counts = {}
+    for value, weight in fields:
+        for term in tokenize(value or ''):
+            term_counts[term] = term_counts.get(term, 0) + weight
+
+    features = {}
+    for term, count in term_counts.items():
+        encoded = term.encode('utf-8')
+        # blake2b thay vì crc32: crc32 % 2^k chỉ giữ bit thấp nên va chạm ở 2048 cột vẫn còn khi tăng số cột
+        digest = int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'little')
+        column = (digest >> 1) % dimensions
+        sign = 1.0 if digest & 1 else -1.0
+        features[column] = features.get(column, 0.0) + sign * (1 + math.log(count))
+    return features
+
+
+def _book_fields(book):
+    """Các trường của sách dùng để embed (title trọng số gấp đôi)"""
+    return [
+        (book.title, 2),
+        (book.author, 1),
+        (book.category.replace('_', ' ') if book.category else '', 1),
+        (book.description, 1)
+    ]
+
+
+def _timestamp(value):
+    """updated_at -> epoch (float) để so sánh sách đã thay đổi chưa"""
+    return value.timestamp() if value else 0.0
+
+
+def _layout(dimensions, capacity):
+    """Offset (bytes) của từng vùng trong file index, căn theo 64 bytes"""
+    def align(offset):
+        return (offset + 63) // 64 * 64
+
+    idf = _HEADER_SIZE
+    ids = align(idf + 4 * dimensions)
+    stamps = align(ids + 8 * capacity)
+    matrix = align(stamps + 8 * capacity)
+    return {'idf': idf, 'ids': ids, 'stamps': stamps, 'matrix': matrix, 'size': matrix + 4 * dimensions * capacity}
+
+
+@contextmanager
+def _file_lock(path):
+    """Lock độc quyền giữa các process (flock trên file .lock cạnh file index)"""
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SemanticIndex:
+    """
+    Index vector của sách, mmap từ file (dùng chung giữa các process)
+
+    Attributes:
+    - path: Đường dẫn file index
+    - dimensions: Số chiều vector
+    - capacity: Số dòng tối đa (build lại toàn bộ khi hết chỗ)
+    - documents: Số sách lúc tính idf
+    - built_at: Thời điểm build toàn bộ (epoch)
+    - inode: Inode của file lúc mmap (đổi khi file được build lại)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r+b') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0)
+
+        magic, self.dimensions, self.capacity, _, self.documents, self.built_at = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'Invalid semantic index file: {path}')
+        layout = _layout(self.dimensions, self.capacity)
+        if len(self._mmap) < layout['size']:
+            raise ValueError(f'Truncated semantic index file: {path}')
+
+        self.idf = np.frombuffer(self._mmap, np.float32, self.dimensions, layout['idf'])
+        self.ids = np.frombuffer(self._mmap, np.int64, self.capacity, layout['ids'])
+        self.stamps = np.frombuffer(self._mmap, np.float64, self.capacity, layout['stamps'])
+        self.matrix = np.frombuffer(
+            self._mmap, np.float32, self.capacity * self.dimensions, layout['matrix']
+        ).reshape(self.capacity, self.dimensions)
+
+    @property
+    def rows(self):
+        """Số dòng đã dùng (đọc từ header mỗi lần vì process khác có thể thêm dòng)"""
+        return _HEADER.unpack_from(self._mmap, 0)[3]
+
+    def _set_rows(self, rows):
+        header = list(_HEADER.unpack_from(self._mmap, 0))
+        header[3] = rows
+        _HEADER.pack_into(self._mmap, 0, *header)
+
+    def embed(self, fields):
+        """
+        Vector TF-IDF chuẩn hóa L2
+
+        Args:
+            fields (list): [(text, weight)]
+
+        Returns:
+            numpy.ndarray: Vector float32 (toàn 0 nếu không có term nào)
+        """
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for column, value in _term_features(fields, self.dimensions).items():
+            vector[column] = value
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, vector, limit):
+        """
+        Top-K sách có cosine similarity cao nhất với vector
+
+        Args:
+            vector (numpy.ndarray): Vector query (đã chuẩn hóa)
+            limit (int): Số kết quả tối đa
+
+        Returns:
+            list: [(book_id, score)] theo score giảm dần (chỉ score > 0)
+        """
+        rows = self.rows
+        if not rows or limit <= 0:
+            return []
+        scores = self.matrix[:rows] @ vector
+        scores[self.ids[:rows] < 0] = 0.0
+        k = min(limit, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[row]), float(scores[row])) for row in top if scores[row] > 0]
+
+
+def _query_books(book_ids=None):
+    """Load các cột cần để embed (không load các cột khác của sách)"""
+    query = Book.query.options(load_only(*_BOOK_COLUMNS))
+    if book_ids is not None:
+        query = query.filter(Book.id.in_(book_ids))
+    return query.order_by(Book.id).all()
+
+
+def _build_index(path, dimensions):
+    """
+    Build lại toàn bộ index từ database (ghi ra file tạm rồi os.replace, caller giữ file lock)
+
+    Flow:
+    1. Load tất cả sách, tính vector TF của từng sách
+    2. Tính idf = log((1 + N) / (1 + df)) + 1 theo từng cột
+    3. Ghi header, idf, ids, updated_at và ma trận TF-IDF (chuẩn hóa L2) ra file tạm
+    4. os.replace sang path (process đang mmap file cũ vẫn đọc được, lần sau sẽ mmap lại)
+    """
+    started = time.perf_counter()
+
+    # Bước 1: Vector TF
+    books = _query_books()
+    features = [_term_features(_book_fields(book), dimensions) for book in books]
+
+    # Bước 2: idf
+    document_frequency = np.zeros(dimensions, dtype=np.float64)
+    for book_features in features:
+        document_frequency[list(book_features)] += 1
+    idf = (np.log((1 + len(books)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    # Bước 3: Ghi file tạm (dư chỗ cho sách thêm mới trước lần build toàn bộ tiếp theo)
+    capacity = max(64, int(len(books) * 1.25) + 16)
+    layout = _layout(dimensions, capacity)
+    matrix = np.zeros((len(books), dimensions), dtype=np.float32)
+    for row, book_features in enumerate(features):
+        for column, value in book_features.items():
+            matrix[row, column] = value
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    ids = np.full(capacity, -1, dtype=np.int64)
+    ids[:len(books)] = [book.id for book in books]
+    stamps = np.zeros(capacity, dtype=np.float64)
+    stamps[:len(books)] = [_timestamp(book.updated_at) for book in books]
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.truncate(layout['size'])
+        f.write(_HEADER.pack(_MAGIC, dimensions, capacity, len(books), len(books), time.time()))
+        f.seek(layout['idf'])
+        f.write(idf.tobytes())
+        f.seek(layout['ids'])
+        f.write(ids.tobytes())
+        f.seek(layout['stamps'])
+        f.write(stamps.tobytes())
+        f.seek(layout['matrix'])
+        f.write(matrix.tobytes())
+
+    # Bước 4: Thay file
+    os.replace(temp_path, path)
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f"[SEMANTIC] Built index for {len(books)} books ({dimensions} dimensions) in {elapsed:.1f} ms")
+    return SemanticIndex(path)
+
+
+def build_semantic_index(path=None, dimensions=None):
+    """
+    Build lại toàn bộ index (tính lại idf), dùng cho script build_semantic_index.py
+
+    Args:
+        path (str): File index (default: Config.SEMANTIC_INDEX_PATH)
+        dimensions (int): Số chiều (default: Config.SEMANTIC_SEARCH_DIMENSIONS)
+
+    Returns:
+        SemanticIndex: Index mới
+    """
+    path = path or Config.SEMANTIC_INDEX_PATH
+    with _file_lock(path):
+        return _build_index(path, dimensions or Config.SEMANTIC_SEARCH_DIMENSIONS)
+
+
+def sync_semantic_index(index):
+    """
+    Cập nhật tăng dần: embed lại sách mới/đã sửa, đánh dấu sách đã xóa
+
+    Flow:
+    1. Lấy file lock, mmap lại nếu process khác đã build lại file
+    2. So (id, updated_at) của tất cả sách với index
+    3. Không đủ chỗ cho sách mới -> build lại toàn bộ
+    4. Sách đã xóa: id = -1, xóa vector. Sách mới/đã sửa: ghi vector vào dòng cũ hoặc dòng trống
+       (ghi id sau cùng để process khác không đọc dòng chưa ghi xong)
+
+    Args:
+        index (SemanticIndex): Index hiện tại
+
+    Returns:
+        SemanticIndex: Index sau khi cập nhật (có thể là object mới)
+    """
+    with _file_lock(index.path):
+        # Bước 1: File đã bị thay bởi process khác
+        if os.stat(index.path).st_ino != index.inode:
+            index = SemanticIndex(index.path)
+
+        # Bước 2: So sánh với database
+        current = {book_id: _timestamp(updated_at) for book_id, updated_at in db.session.query(Book.id, Book.updated_at)}
+        rows = index.rows
+        indexed = {int(book_id): row for row, book_id in enumerate(index.ids[:rows]) if book_id >= 0}
+        changed = [book_id for book_id, stamp in current.items()
+                   if book_id not in indexed or index.stamps[indexed[book_id]] != stamp]
+        deleted = [book_id for book_id in indexed if book_id not in current]
+        if not changed and not deleted:
+            return index
+
+        # Bước 3: Hết chỗ
+        free_rows = [row for row in range(rows) if index.ids[row] < 0] + [indexed[book_id] for book_id in deleted]
+        new_count = sum(1 for book_id in changed if book_id not in indexed)
+        if new_count > len(free_rows) + index.capacity - rows:
+            return _build_index(index.path, index.dimensions)
+
+        # Bước 4: Ghi các dòng thay đổi
+        for book_id in deleted:
+            row = indexed.pop(book_id)
+            index.ids[row] = -1
+            index.matrix[row] = 0
+        for book in _query_books(changed):
+            row = indexed.get(book.id)
+            if row is None:
+                if free_rows:
+                    row = free_rows.pop()
+                else:
+                    row = rows
+                    rows += 1
+                    index._set_rows(rows)
+            index.ids[row] = -1
+            index.matrix[row] = index.embed(_book_fields(book))
+            index.stamps[row] = current[book.id]
+            index.ids[row] = book.id
+
+        logger.info(f"[SEMANTIC] Synced index: {len(changed)} changed, {len(deleted)} deleted")
+        return index
+
+
+_state = {'index': None, 'version': None}
+_state_lock = threading.Lock()
+
+
+def _open_index(path):
+    """mmap file index, None nếu chưa có / không hợp lệ / khác số chiều trong Config"""
+    try:
+        index = SemanticIndex(path)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"[SEMANTIC] {str(e)}, rebuilding")
+        return None
+    return index if index.dimensions == Config.SEMANTIC_SEARCH_DIMENSIONS else None
+
+
+def get_semantic_index():
+    """
+    Lấy index của process
+
+    Flow:
+    1. Chưa mmap hoặc file đã được build lại (inode đổi) -> mmap file (build nếu chưa có/không hợp lệ)
+    2. Catalog version đổi từ lần sync trước -> sync tăng dần
+
+    Returns:
+        SemanticIndex: Index đã cập nhật
+    """
+    path = Config.SEMANTIC_INDEX_PATH
+    with _state_lock:
+        # Bước 1: mmap file
+        index = _state['index']
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if index is None or index.inode != inode:
+            index = _open_index(path)
+            if index is None:
+                # Kiểm tra lại sau khi có lock (process khác có thể vừa build xong)
+                with _file_lock(path):
+                    index = _open_index(path) or _build_index(path, Config.SEMANTIC_SEARCH_DIMENSIONS)
+            _state['index'] = index
+            _state['version'] = None
+
+        # Bước 2: Sync khi catalog thay đổi
+        version = catalog_version()
+        if _state['version'] != version:
+            index = sync_semantic_index(index)
+            _state['index'] = index
+            _state['version'] = version
+        return index
+
+
+def semantic_search(query, limit=10):
+    """
+    Tìm sách phù hợp với mô tả
+
+    Args:
+        query (str): Mô tả của khách hàng, ví dụ "sách về tuổi thơ buồn"
+        limit (int): Số sách tối đa
+
+    Returns:
+        list: [(Book, score)] theo score giảm dần (score >= SEMANTIC_SEARCH_MIN_SCORE)
+    """
+    index = get_semantic_index()
+    vector = index.embed([(query, 1)])
+    if not vector.any():
+        return []
+
+    hits = [(book_id, score) for book_id, score in index.search(vector, limit)
+            if score >= Config.SEMANTIC_SEARCH_MIN_SCORE]
+    if not hits:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_([book_id for book_id, _ in hits])).all()}
+    return [(books[book_id], round(score, 4)) for book_id, score in hits if book_id in books]
@@ -0,0 +1,239 @@
+"""
+File: utils/single_flight.py
+
+Mục đích:
+Gộp các request chatbot giống nhau đến cùng lúc (ví dụ banner quảng cáo một cuốn sách, nhiều
+khách hỏi về nó trong vài giây): chỉ một request build context và gọi Gemini, các request còn
+lại chờ và dùng chung kết quả.
+
+Cách hoạt động:
+- Key = câu hỏi đã chuẩn hóa (utils.answer_cache.normalize_question).
+- Trong một worker: request đầu tiên của key là leader, tự tính kết quả; các request cùng key
+  đến trong lúc đó là follower, chờ leader xong (tối đa CHATBOT_COALESCE_TIMEOUT giây) rồi dùng
+  kết quả của leader.
+- Giữa các workers (CHATBOT_COALESCE_SHARED): leader còn giữ flock trên file <hash>.lock trong
+  CHATBOT_COALESCE_DIR trong lúc tính, và ghi kết quả vào <hash>.json khi xong. Leader của worker
+  khác chờ lock; file kết quả được ghi sau lúc nó đến thì dùng kết quả đó, ngược lại tự tính
+  (lượt trước đã xong trước khi nó đến, hoặc leader trước bị lỗi).
+- Leader lỗi hoặc không có kết quả -> followers nhận result None (route tự fallback về FAQ).
+
+Các hàm/class trong file này:
+- Flight: Lượt gọi của một request (leader hay dùng chung kết quả)
+- SingleFlight: Điều phối leader/followers theo key, có metrics
+- CHATBOT_FLIGHTS: Instance dùng cho /api/chatbot và /api/chatbot/stream
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Chu kỳ kiểm tra khi chờ lock của worker khác, và chu kỳ xóa file lock/kết quả cũ (giây)
+_POLL_INTERVAL = 0.05
+_PRUNE_INTERVAL = 60
+
+
+class Flight:
+    """
+    Lượt gọi của một request
+
+    Attributes:
+    - leader: True nếu request phải tự tính kết quả và gán vào result
+    - result: Kết quả (của leader, hoặc dùng chung từ request khác; None = không có kết quả)
+    - shared: True nếu result lấy từ request khác (cùng worker hoặc worker khác)
+    """
+
+    def __init__(self, leader, result=None):
+        self.leader = leader
+        self.result = result
+        self.shared = not leader
+
+
+class _Call:
+    """Lượt gọi đang chạy của một key trong process (followers chờ done)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    Điều phối leader/followers theo key (trong process, và giữa các process nếu có shared_dir)
+
+    Attributes:
+    - timeout: Thời gian tối đa chờ leader (giây)
+    - shared_dir: Thư mục file lock/kết quả dùng chung giữa các process (None = chỉ trong process)
+    """
+
+    def __init__(self, timeout, shared_dir=None):
+        self.timeout = timeout
+        self.shared_dir = shared_dir
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._counters = {'leaders': 0, 'followers': 0, 'shared': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @contextmanager
+    def flight(self, key):
+        """
+        Tham gia lượt gọi của key
+
+        Flow:
+        1. Đã có request cùng key đang chạy trong process -> chờ, yield Flight với kết quả của nó
+        2. Ngược lại request này là leader của process
+        3. Dùng chung giữa các process: chờ flock của key, file kết quả ghi sau lúc đến -> dùng kết quả đó
+        4. Yield Flight(leader=True), caller tính kết quả và gán flight.result
+        5. Thoát: ghi kết quả cho process khác, nhả lock, đánh thức followers
+
+        Args:
+            key (str): Key của request (câu hỏi đã chuẩn hóa)
+
+        Yields:
+            Flight: leader=True -> caller tự tính result; ngược lại result đã có (có thể None)
+
+        Raises:
+            TimeoutError: Chờ request khác quá timeout
+        """
+        arrived = time.time()
+
+        # Bước 1: Request cùng key đang chạy trong process
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count('followers')
+            if not call.done.wait(self.timeout):
+                self._count('timeouts')
+                raise TimeoutError(f'Timed out waiting for in-flight request after {self.timeout}s')
+            yield Flight(leader=False, result=call.result)
+            return
+
+        # Bước 2: Leader của process
+        flight = Flight(leader=True)
+        lock_file = None
+        try:
+            # Bước 3: Request cùng key ở worker khác
+            if self.shared_dir:
+                lock_file, shared = self._acquire_shared(key, arrived)
+                if shared is not None:
+                    flight = Flight(leader=False, result=shared['result'])
+                    self._count('shared')
+            if flight.leader:
+                self._count('leaders')
+
+            # Bước 4: Caller tính kết quả
+            yield flight
+
+            # Bước 5: Ghi kết quả cho process khác
+            if lock_file and flight.leader:
+                self._write_shared(key, flight.result)
+        finally:
+            if lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            call.result = flight.result
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _path(self, key, suffix):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.shared_dir, f"{digest}{suffix}")
+
+    def _acquire_shared(self, key, arrived):
+        """
+        Chờ flock của key (worker khác đang tính thì chờ tới khi xong)
+
+        Returns:
+            tuple: (lock_file, None) nếu request này phải tự tính (đang giữ lock),
+                   (None, {'finished_at', 'result'}) nếu worker khác vừa tính xong
+        """
+        os.makedirs(self.shared_dir, exist_ok=True)
+        lock_file = open(self._path(key, '.lock'), 'a')
+        deadline = arrived + self.timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    lock_file.close()
+                    self._count('timeouts')
+                    raise TimeoutError(f'Timed out waiting for in-flight request in another worker after {self.timeout}s')
+                time.sleep(_POLL_INTERVAL)
+
+        # Kết quả của lượt gọi kết thúc sau khi request này đến -> dùng chung
+        try:
+            with open(self._path(key, '.json'), encoding='utf-8') as result_file:
+                shared = json.load(result_file)
+            if shared['finished_at'] >= arrived:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+                return None, shared
+        except (OSError, ValueError, KeyError):
+            pass
+        return lock_file, None
+
+    def _write_shared(self, key, result):
+        """Ghi kết quả cho worker khác (ghi file tạm rồi rename), thỉnh thoảng xóa file cũ"""
+        path = self._path(key, '.json')
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as result_file:
+                json.dump({'finished_at': time.time(), 'result': result}, result_file, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"[SINGLE_FLIGHT] Cannot share result: {str(e)}")
+            return
+        self._prune()
+
+    def _prune(self):
+        """Xóa file lock/kết quả không dùng tới từ lâu (mỗi process tối đa một lần mỗi _PRUNE_INTERVAL)"""
+        now = time.time()
+        if now - self._pruned_at < _PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        expired_before = now - max(_PRUNE_INTERVAL, self.timeout * 2)
+        try:
+            for entry in os.scandir(self.shared_dir):
+                if entry.stat().st_mtime < expired_before:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        Metrics của process hiện tại
+
+        Returns:
+            dict: leaders (lượt tự tính), followers (chờ request cùng worker),
+                  shared (dùng kết quả của worker khác), timeouts, in_flight
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+    def reset_stats(self):
+        """Đặt lại metrics (dùng cho benchmark)"""
+        with self._lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+
+
+CHATBOT_FLIGHTS = SingleFlight(
+    Config.CHATBOT_COALESCE_TIMEOUT,
+    shared_dir=Config.CHATBOT_COALESCE_DIR if Config.CHATBOT_COALESCE_SHARED else None
+)
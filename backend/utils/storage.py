@@ -2,89 +2,84 @@
 File: utils/storage.py
 
 Mục đích:
-Service để quản lý upload ảnh lên Cloudflare R2 storage
+Service để quản lý upload ảnh lên storage (Cloudflare R2, S3-compatible như MinIO, hoặc filesystem local)
 
 Cấu hình được đọc từ Config class (config.py) thay vì đọc trực tiếp từ environment variables.
-Tất cả R2 configuration được quản lý tập trung trong config.py.
+Config.STORAGE_BACKEND chọn nơi lưu file, các thao tác với storage nằm ở utils.storage_backends.
+
+upload_image() upload ảnh gốc cùng các bản resize WebP/JPEG (utils.images) và trả về srcset
+để Book/Banner lưu lại, trang web chọn kích thước phù hợp thay vì tải ảnh gốc.
+
+Upload trực tiếp (ảnh lớn, ví dụ banner): create_direct_upload() cấp presigned URL để browser
+upload thẳng lên bucket kèm upload token đã ký; complete_direct_upload(token) kiểm tra object
+rồi xếp job tạo các bản resize chạy nền và trả về ngay. Job ghi kết quả (srcset hoặc lỗi) vào
+manifest '<folder>/<uuid>.json' cạnh ảnh gốc, client poll direct_upload_status(token) để lấy
+srcset - worker nào cũng đọc được vì manifest nằm trên storage. Request không phải nhận/buffer
+file hay chờ resize.
+
+Khởi tạo lazy:
+- Import module không gọi mạng và không cần biến R2 (app boot/test offline không phụ thuộc R2).
+- Backend (và boto3 client của nó) được tạo ở lần dùng đầu tiên, mỗi process một client.
+- Kiểm tra bucket nằm ở health_check() (GET /api/admin/storage/health).
 """
-import boto3
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from werkzeug.utils import secure_filename
+import json
+import logging
+import threading
 import uuid
 from config import Config
+from utils.images import ImageProcessorBusy, get_image_processor
+from utils.storage_backends import IMMUTABLE_CACHE_CONTROL, get_storage_backend
+
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
+# Thư mục trong bucket được phép upload (folder do client gửi lên, không dùng trực tiếp làm tên object)
+UPLOAD_FOLDERS = {'books', 'banners'}
+
+logger = logging.getLogger(__name__)
+
+
+def content_type_for(ext):
+    """MIME type của ảnh theo extension ('jpg' -> 'image/jpeg')"""
+    return f"image/{'jpeg' if ext == 'jpg' else ext}"
+
 
 class StorageService:
     """
-    Service để quản lý upload ảnh lên Cloudflare R2
+    Service để quản lý upload ảnh lên storage backend
     
-    Tất cả cấu hình được đọc từ Config class (config.py):
-    - Config.R2_ACCOUNT_ID: Cloudflare Account ID
-    - Config.R2_ACCESS_KEY_ID: R2 Access Key ID
-    - Config.R2_SECRET_ACCESS_KEY: R2 Secret Access Key
-    - Config.R2_BUCKET_NAME: R2 Bucket name
-    - Config.R2_PUBLIC_DOMAIN: Custom domain cho public URLs (ví dụ: cdn.duyne.me)
+    Backend được chọn bởi Config.STORAGE_BACKEND (xem utils.storage_backends):
+    - 'r2': Cloudflare R2 (R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_DOMAIN)
+    - 's3': Endpoint S3-compatible, ví dụ MinIO (S3_ENDPOINT_URL, S3_BUCKET_NAME, ...)
+    - 'local': Thư mục LOCAL_STORAGE_DIR, serve qua /api/media
     """
     
-    def __init__(self):
-        """
-        Khởi tạo R2 client từ Config
-        
-        Tất cả cấu hình được đọc từ Config class thay vì đọc trực tiếp từ environment variables.
-        Điều này giúp tập trung quản lý cấu hình ở một nơi (config.py).
-        """
-        # Đọc cấu hình từ Config class (tập trung quản lý ở config.py)
-        self.account_id = Config.R2_ACCOUNT_ID
-        self.access_key_id = Config.R2_ACCESS_KEY_ID
-        self.secret_access_key = Config.R2_SECRET_ACCESS_KEY
-        self.bucket_name = Config.R2_BUCKET_NAME
-        self.public_domain = Config.R2_PUBLIC_DOMAIN
-        
-        # Validate required config values
-        if not all([self.account_id, self.access_key_id, self.secret_access_key, self.bucket_name, self.public_domain]):
-            raise ValueError(
-                'Missing required R2 configuration. '
-                'Please check environment variables: R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, '
-                'R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_DOMAIN'
-            )
-        
-        # Build R2 endpoint
-        endpoint_url = f'https://{self.account_id}.r2.cloudflarestorage.com'
+    @property
+    def backend(self):
+        """Storage backend của process (tạo lazy, không gọi network)"""
+        return get_storage_backend()
+    
+    def health_check(self, create_bucket=False):
+        """
+        Kiểm tra kết nối tới storage và bucket (thay cho việc kiểm tra lúc import)
         
-        # Tạo boto3 S3 client với R2 endpoint
-        self.client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key
-        )
+        Args:
+            create_bucket (bool): Tạo bucket/thư mục nếu chưa có (dùng khi setup lần đầu)
         
-        # Tạo bucket nếu chưa có
-        self._ensure_bucket_exists()
-    
-    def _ensure_bucket_exists(self):
-        """Đảm bảo bucket tồn tại"""
-        try:
-            # Kiểm tra bucket có tồn tại không
-            self.client.head_bucket(Bucket=self.bucket_name)
-        except ClientError as e:
-            error_code = e.response.get('Error', {}).get('Code', '')
-            if error_code == '404':
-                # Bucket không tồn tại, tạo mới
-                try:
-                    self.client.create_bucket(Bucket=self.bucket_name)
-                    print(f'✅ Đã tạo bucket: {self.bucket_name}')
-                except ClientError as create_error:
-                    print(f'❌ Lỗi khi tạo bucket: {create_error}')
-            else:
-                print(f'❌ Lỗi khi kiểm tra bucket: {e}')
+        Returns:
+            dict: {'ok': bool, 'backend', 'bucket', 'latency_ms', 'error' (nếu lỗi), 'created' (nếu vừa tạo)}
+        """
+        return self.backend.health_check(create_bucket=create_bucket)
     
     def upload_file(self, file, folder='books'):
         """
-        Upload file lên Cloudflare R2
+        Upload file lên storage
         
         Args:
             file: File object từ request
-            folder: Thư mục trong bucket (default: 'books')
+            folder: Thư mục trong bucket, một trong UPLOAD_FOLDERS (default: 'books')
         
         Returns:
             str: Public URL của file (sử dụng custom domain)
@@ -99,45 +94,342 @@ class StorageService:
             ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
             
             # Validate extension
-            allowed_extensions = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
-            if ext not in allowed_extensions:
-                raise ValueError(f'Định dạng file không được hỗ trợ. Chỉ chấp nhận: {", ".join(allowed_extensions)}')
+            if ext not in ALLOWED_EXTENSIONS:
+                raise ValueError(f'Định dạng file không được hỗ trợ. Chỉ chấp nhận: {", ".join(ALLOWED_EXTENSIONS)}')
             
             # Tạo tên file unique
             unique_filename = f"{uuid.uuid4()}.{ext}"
-            object_name = f"{folder}/{unique_filename}" if folder else unique_filename
+            object_name = f"{_upload_folder(folder)}/{unique_filename}"
             
-            # Upload file lên R2
+            # Upload file lên storage
             file.seek(0)  # Reset file pointer
-            self.client.upload_fileobj(
-                file,
-                self.bucket_name,
-                object_name,
-                ExtraArgs={'ContentType': f'image/{ext}'}
-            )
-            
-            # Tạo public URL sử dụng custom domain
-            url = f"https://{self.public_domain}/{object_name}"
+            self.backend.put_object(object_name, file, content_type_for(ext), IMMUTABLE_CACHE_CONTROL)
             
-            return url
+            # Tạo public URL (custom domain/CDN hoặc /api/media)
+            return self.backend.public_url(object_name)
             
-        except ClientError as e:
-            raise Exception(f'Lỗi khi upload lên R2: {str(e)}')
         except Exception as e:
             raise Exception(f'Lỗi khi upload file: {str(e)}')
     
+    def upload_image(self, file, folder='books'):
+        """
+        Upload ảnh gốc kèm các bản resize (thumbnail, card, detail - WebP + JPEG, đã bỏ EXIF)
+        
+        Flow:
+        1. Validate file và extension (giống upload_file)
+        2. Resize + upload ảnh gốc và các bản resize (xem _store_image)
+        
+        Args:
+            file: File object từ request
+            folder: Thư mục trong bucket, một trong UPLOAD_FOLDERS (default: 'books')
+        
+        Returns:
+            dict: {'url': URL ảnh gốc, 'srcset': {tên: {'width', 'height', 'webp', 'jpeg'},
+                   'original': {'width', 'height', 'url'}}}
+        
+        Raises:
+            ValueError: File không hợp lệ
+            ImageProcessorBusy: Hàng đợi xử lý ảnh đầy
+        """
+        # Bước 1: Validate
+        if not file or not file.filename:
+            raise ValueError('Không có file được upload')
+        ext = _image_extension(file.filename)
+        folder = _upload_folder(folder)
+        file.seek(0)
+        data = file.read()
+        
+        # Bước 2: Resize + upload
+        base_name = f"{folder}/{uuid.uuid4()}"
+        return self._store_image(base_name, ext, data, include_original=True)
+    
+    def _store_image(self, base_name, ext, data, include_original):
+        """
+        Resize ảnh và upload các bản resize (kèm ảnh gốc nếu include_original) lên storage
+        
+        Flow:
+        1. Resize + encode trên process pool (utils.images, không chặn thread của request)
+        2. Upload song song, cùng prefix base_name ('<folder>/<uuid>')
+        3. Có file upload lỗi -> xóa các file đã upload trong lượt này, raise
+        4. Trả về URL ảnh gốc và srcset
+        
+        Args:
+            base_name (str): Tên object không có extension
+            ext (str): Extension của ảnh gốc
+            data (bytes): Nội dung ảnh gốc
+            include_original (bool): Upload cả ảnh gốc (False khi ảnh gốc đã được upload trực tiếp)
+        
+        Returns:
+            dict: {'url', 'srcset'} (xem upload_image)
+        """
+        # Bước 1: Resize + encode
+        rendered = get_image_processor().render(data)
+        
+        # Bước 2: Upload song song
+        backend = self.backend
+        original_name = f"{base_name}.{ext}"
+        objects = [(original_name, data, content_type_for(ext))] if include_original else []
+        srcset = {}
+        for derivative in rendered['derivatives']:
+            entry = {'width': derivative['width'], 'height': derivative['height']}
+            for image_format in ('webp', 'jpeg'):
+                object_name = f"{base_name}-{derivative['name']}.{image_format}"
+                objects.append((object_name, derivative[image_format], f'image/{image_format}'))
+                entry[image_format] = backend.public_url(object_name)
+            srcset[derivative['name']] = entry
+        srcset['original'] = {
+            'width': rendered['width'],
+            'height': rendered['height'],
+            'url': backend.public_url(original_name)
+        }
+        
+        def put(item):
+            object_name, body, content_type = item
+            backend.put_object(object_name, body, content_type, IMMUTABLE_CACHE_CONTROL)
+            return object_name
+        
+        # Không vượt quá connection pool của client (các thread khác cũng dùng chung pool)
+        with ThreadPoolExecutor(max_workers=min(len(objects), Config.R2_MAX_POOL_CONNECTIONS)) as executor:
+            futures = [executor.submit(put, item) for item in objects]
+        uploaded = [future.result() for future in futures if not future.exception()]
+        errors = [future.exception() for future in futures if future.exception()]
+        
+        # Bước 3: Lỗi -> dọn các file đã upload
+        if errors:
+            for object_name in uploaded:
+                try:
+                    self.delete_file(object_name)
+                except Exception:
+                    pass
+            raise Exception(f'Lỗi khi upload lên storage: {str(errors[0])}')
+        
+        # Bước 4: URL + srcset
+        return {'url': srcset['original']['url'], 'srcset': srcset}
+    
+    def create_direct_upload(self, filename, content_type, size, folder='books'):
+        """
+        Cấp URL để browser upload ảnh thẳng lên bucket (file không đi qua API worker)
+        
+        Flow:
+        1. Validate folder (UPLOAD_FOLDERS), extension, Content-Type (khớp extension) và kích thước
+           (<= UPLOAD_DIRECT_MAX_SIZE)
+        2. Tạo tên object '<folder>/<uuid>.<ext>'
+        3. Ký upload token (key, content type, size) để complete_direct_upload kiểm tra
+        4. Backend ký presigned PUT URL / POST policy với đúng Content-Type và kích thước
+        
+        Args:
+            filename (str): Tên file gốc (lấy extension)
+            content_type (str): MIME type browser sẽ gửi
+            size (int): Kích thước file (byte)
+            folder (str): Thư mục trong bucket, một trong UPLOAD_FOLDERS (default: 'books')
+        
+        Returns:
+            dict: {'key', 'upload_token', 'expires_in', 'upload': {'method', 'url', 'headers' | 'fields'}}
+        
+        Raises:
+            ValueError: File không hợp lệ
+        """
+        # Bước 1: Validate
+        folder = _upload_folder(folder)
+        ext = _image_extension(filename)
+        if content_type != content_type_for(ext):
+            raise ValueError(f'Content-Type không khớp với định dạng file (cần {content_type_for(ext)})')
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError('Kích thước file không hợp lệ')
+        if size > Config.UPLOAD_DIRECT_MAX_SIZE:
+            raise ValueError(f'File quá lớn. Kích thước tối đa: {Config.UPLOAD_DIRECT_MAX_SIZE // (1024 * 1024)}MB')
+        
+        # Bước 2: Tên object
+        key = f"{folder}/{uuid.uuid4()}.{ext}"
+        
+        # Bước 3: Upload token
+        token = _upload_serializer().dumps({'key': key, 'content_type': content_type, 'size': size})
+        
+        # Bước 4: Presigned upload
+        expires_in = Config.UPLOAD_PRESIGN_EXPIRES
+        upload = self.backend.presigned_upload(
+            key, content_type, size, expires_in, token, method=Config.UPLOAD_PRESIGN_METHOD
+        )
+        return {'key': key, 'upload_token': token, 'expires_in': expires_in, 'upload': upload}
+    
+    def complete_direct_upload(self, token):
+        """
+        Hoàn tất upload trực tiếp: kiểm tra object trên bucket và xếp job tạo các bản resize
+        
+        Flow:
+        1. Kiểm tra upload token (chữ ký, hạn dùng)
+        2. HEAD object: phải tồn tại, đúng kích thước và Content-Type đã ký (sai -> xóa object)
+        3. Xóa manifest của lần complete trước (nếu có) và xếp job resize chạy nền
+           (_generate_direct_derivatives), không tải ảnh gốc trên thread của request
+        4. Trả về ngay, client poll direct_upload_status(token) để lấy srcset
+        
+        Args:
+            token (str): upload_token từ create_direct_upload
+        
+        Returns:
+            dict: {'key', 'url', 'status': 'processing'}
+        
+        Raises:
+            ValueError: Token không hợp lệ/hết hạn, chưa upload hoặc file không đúng thông tin đã ký
+            ImageProcessorBusy: Hàng đợi job resize của worker đầy (file vẫn trên bucket, gọi lại sau)
+        """
+        # Bước 1: Token
+        upload = load_upload_token(token)
+        key = upload['key']
+        
+        # Bước 2: Object đã upload
+        stored = self.backend.head_object(key)
+        if stored is None:
+            raise ValueError('File chưa được upload lên storage')
+        if stored['size'] != upload['size'] or (stored['content_type'] and stored['content_type'] != upload['content_type']):
+            self.delete_file(key)
+            raise ValueError('File đã upload không khớp với thông tin đã đăng ký')
+        
+        # Bước 3: Xếp job resize
+        self.backend.delete_object(_manifest_key(key))
+        _submit_derivative_job(self._generate_direct_derivatives, key)
+        
+        # Bước 4: Trả về ngay
+        return {'key': key, 'url': self.backend.public_url(key), 'status': 'processing'}
+    
+    def _generate_direct_derivatives(self, key):
+        """
+        Job nền: tải ảnh gốc đã upload trực tiếp, tạo các bản resize và ghi manifest
+        
+        Manifest (JSON, cạnh ảnh gốc):
+        - {'status': 'ready', 'url', 'srcset'}: Thành công
+        - {'status': 'failed', 'reason': 'invalid' | 'busy' | 'error', 'error'}: Lỗi. 'invalid' thì ảnh
+          gốc đã bị xóa, 'busy' thì ảnh gốc vẫn còn (gọi lại complete)
+        """
+        base_name, ext = key.rsplit('.', 1)
+        try:
+            manifest = dict(self._store_image(base_name, ext, self.backend.get_object(key), include_original=False),
+                            status='ready')
+        except ValueError as e:
+            # Không phải ảnh hợp lệ (hoặc quá lớn) -> không giữ lại trên bucket
+            self.delete_file(key)
+            manifest = {'status': 'failed', 'reason': 'invalid', 'error': str(e)}
+        except ImageProcessorBusy:
+            manifest = {'status': 'failed', 'reason': 'busy', 'error': 'Hệ thống đang bận, vui lòng thử lại sau'}
+        except Exception as e:
+            logger.exception('Tạo bản resize cho %s thất bại', key)
+            manifest = {'status': 'failed', 'reason': 'error', 'error': str(e)}
+        self.backend.put_object(_manifest_key(key), json.dumps(manifest).encode('utf-8'),
+                                'application/json', 'no-cache')
+    
+    def direct_upload_status(self, token):
+        """
+        Kết quả job resize của upload trực tiếp (đọc manifest trên storage)
+        
+        Args:
+            token (str): upload_token từ create_direct_upload
+        
+        Returns:
+            dict: {'status': 'processing'} khi job chưa xong, hoặc manifest
+                  (xem _generate_direct_derivatives)
+        
+        Raises:
+            ValueError: Token không hợp lệ/hết hạn
+        """
+        key = load_upload_token(token)['key']
+        manifest_key = _manifest_key(key)
+        if self.backend.head_object(manifest_key) is None:
+            return {'status': 'processing'}
+        return json.loads(self.backend.get_object(manifest_key))
+    
     def delete_file(self, object_name):
         """
-        Xóa file khỏi Cloudflare R2
+        Xóa file khỏi storage
         
         Args:
             object_name: Tên object trong bucket (ví dụ: 'books/filename.jpg')
         """
         try:
-            self.client.delete_object(Bucket=self.bucket_name, Key=object_name)
-        except ClientError as e:
+            self.backend.delete_object(object_name)
+        except Exception as e:
             raise Exception(f'Lỗi khi xóa file: {str(e)}')
 
-# Singleton instance
+def _image_extension(filename):
+    """Extension (chữ thường) của file ảnh, ValueError nếu không được hỗ trợ"""
+    filename = secure_filename(filename or '')
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f'Định dạng file không được hỗ trợ. Chỉ chấp nhận: {", ".join(ALLOWED_EXTENSIONS)}')
+    return ext
+
+
+def _upload_folder(folder):
+    """Thư mục upload đã kiểm tra, ValueError nếu không nằm trong UPLOAD_FOLDERS (chặn '../...')"""
+    if folder not in UPLOAD_FOLDERS:
+        raise ValueError(f'Thư mục upload không hợp lệ. Chỉ chấp nhận: {", ".join(sorted(UPLOAD_FOLDERS))}')
+    return folder
+
+
+def _manifest_key(key):
+    """Tên manifest kết quả resize của ảnh upload trực tiếp ('books/<uuid>.jpg' -> 'books/<uuid>.json')"""
+    return f"{key.rsplit('.', 1)[0]}.json"
+
+
+# Job resize của upload trực tiếp: executor của process (tạo lazy, sau khi gunicorn fork),
+# số job đang chạy + đang chờ bị giới hạn để ảnh gốc tải về không chiếm hết RAM của worker
+_derivative_jobs = {'executor': None, 'pending': None}
+_derivative_jobs_lock = threading.Lock()
+
+
+def _submit_derivative_job(func, key):
+    """
+    Xếp job resize chạy nền
+
+    Raises:
+        ImageProcessorBusy: Đã có UPLOAD_COMPLETE_MAX_PENDING job chưa xong trong worker này
+    """
+    with _derivative_jobs_lock:
+        if _derivative_jobs['executor'] is None:
+            _derivative_jobs['executor'] = ThreadPoolExecutor(
+                max_workers=Config.UPLOAD_COMPLETE_WORKERS, thread_name_prefix='direct-upload'
+            )
+            _derivative_jobs['pending'] = threading.BoundedSemaphore(Config.UPLOAD_COMPLETE_MAX_PENDING)
+    pending = _derivative_jobs['pending']
+    if not pending.acquire(blocking=False):
+        raise ImageProcessorBusy('Direct upload queue is full')
+
+    def run():
+        try:
+            func(key)
+        finally:
+            pending.release()
+
+    try:
+        _derivative_jobs['executor'].submit(run)
+    except Exception:
+        pending.release()
+        raise
+
+
+def _upload_serializer():
+    return URLSafeTimedSerializer(Config.SECRET_KEY, salt='direct-upload')
+
+
+def load_upload_token(token):
+    """
+    Đọc upload token của create_direct_upload
+    
+    Token còn hạn trong 2 x UPLOAD_PRESIGN_EXPIRES (URL upload hết hạn trước, phần còn lại để gọi complete).
+    
+    Returns:
+        dict: {'key', 'content_type', 'size'}
+    
+    Raises:
+        ValueError: Token sai chữ ký hoặc hết hạn
+    """
+    try:
+        return _upload_serializer().loads(token or '', max_age=Config.UPLOAD_PRESIGN_EXPIRES * 2)
+    except SignatureExpired:
+        raise ValueError('Phiên upload đã hết hạn, vui lòng upload lại')
+    except BadSignature:
+        raise ValueError('Upload token không hợp lệ')
+
+
+# Singleton instance (rẻ: chưa tạo client cho tới lần dùng đầu tiên)
 storage_service = StorageService()
 
@@ -0,0 +1,445 @@
+"""
+File: utils/storage_backends.py
+
+Mục đích:
+Tách StorageService (utils.storage) khỏi Cloudflare R2 bằng một interface storage backend, để
+upload ảnh chạy được (và benchmark/test được) mà không cần network.
+
+Cách hoạt động:
+- Config.STORAGE_BACKEND chọn backend:
+  - 'r2' (mặc định): Cloudflare R2 (R2_ACCOUNT_ID, R2_BUCKET_NAME, R2_PUBLIC_DOMAIN...)
+  - 's3': Endpoint S3-compatible bất kỳ, ví dụ MinIO chạy local (S3_ENDPOINT_URL, S3_BUCKET_NAME...)
+  - 'local': Ghi file vào LOCAL_STORAGE_DIR, serve qua GET /api/media/<key> (routes/media.py,
+    send_file -> sendfile() của gunicorn, không copy file qua Python)
+- S3StorageBackend: boto3 client tạo lazy ở lần dùng đầu tiên, mỗi process một client (sau khi
+  gunicorn fork worker), connection pool/retry/timeout từ Config (R2_MAX_POOL_CONNECTIONS...).
+- LocalStorageBackend: ghi file tạm rồi rename (không serve file ghi dở), key không được thoát
+  ra ngoài thư mục gốc.
+- Upload trực tiếp (presigned, xem StorageService.create_direct_upload): S3 backend ký PUT URL
+  (SigV4, ký cả Content-Type/Content-Length) hoặc POST policy (content-length-range) để browser
+  upload thẳng lên bucket; backend local nhận PUT qua /api/media/<key>?token=... (chỉ cho dev/test).
+
+Các hàm/class trong file này:
+- StorageBackend: Interface (put_object, get_object, head_object, delete_object, public_url,
+  presigned_upload, health_check)
+- S3StorageBackend: Backend S3-compatible (R2, MinIO, AWS S3)
+- LocalStorageBackend: Backend filesystem local
+- get_storage_backend(): Lấy backend của process (tạo lazy theo Config.STORAGE_BACKEND)
+- configure_storage_backend(name, **options): Tạo lại backend (dùng cho benchmark/script)
+"""
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from config import Config
+
+# Tên file là uuid (không bao giờ bị ghi đè) nên CDN/trình duyệt cache được vĩnh viễn
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Route nhận PUT upload trực tiếp của backend local (routes/media.py)
+MEDIA_UPLOAD_URL = '/api/media'
+
+# Biến môi trường cần có của từng backend S3-compatible (thông báo lỗi khi thiếu cấu hình)
+_REQUIRED_ENV = {
+    'r2': 'R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_DOMAIN',
+    's3': 'S3_ENDPOINT_URL (bỏ trống = AWS S3), S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY, S3_BUCKET_NAME'
+}
+
+
+class StorageBackend:
+    """
+    Interface của storage backend
+
+    Attributes:
+    - name: Tên backend ('r2', 's3', 'local')
+    """
+
+    name = 'storage'
+
+    def put_object(self, key, body, content_type, cache_control=None):
+        """
+        Lưu object
+
+        Args:
+            key (str): Tên object, ví dụ 'books/<uuid>.jpg'
+            body (bytes | file-like): Nội dung
+            content_type (str): MIME type
+            cache_control (str): Header Cache-Control khi serve (optional)
+        """
+        raise NotImplementedError
+
+    def get_object(self, key):
+        """Nội dung object (bytes)"""
+        raise NotImplementedError
+
+    def head_object(self, key):
+        """
+        Metadata của object
+
+        Returns:
+            dict | None: {'size', 'content_type'}, None nếu object không tồn tại
+        """
+        raise NotImplementedError
+
+    def delete_object(self, key):
+        """Xóa object (không lỗi nếu object không tồn tại)"""
+        raise NotImplementedError
+
+    def public_url(self, key):
+        """Public URL của object"""
+        raise NotImplementedError
+
+    def presigned_upload(self, key, content_type, size, expires_in, token, method='put'):
+        """
+        Thông tin để browser upload object trực tiếp (không qua API worker)
+
+        Args:
+            key (str): Tên object
+            content_type (str): MIME type bắt buộc
+            size (int): Kích thước file (byte) bắt buộc
+            expires_in (int): Thời hạn của URL (giây)
+            token (str): Upload token đã ký (backend local dùng để xác thực PUT)
+            method (str): 'put' (presigned URL) hoặc 'post' (form policy)
+
+        Returns:
+            dict: {'method': 'PUT', 'url', 'headers'} hoặc {'method': 'POST', 'url', 'fields'}
+        """
+        raise NotImplementedError
+
+    def health_check(self, create_bucket=False):
+        """
+        Kiểm tra backend dùng được không
+
+        Args:
+            create_bucket (bool): Tạo bucket/thư mục nếu chưa có
+
+        Returns:
+            dict: {'ok': bool, 'backend', 'bucket', 'latency_ms', 'error' (nếu lỗi), 'created' (nếu vừa tạo)}
+        """
+        raise NotImplementedError
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Backend S3-compatible (Cloudflare R2, MinIO, AWS S3) qua boto3
+
+    Attributes:
+    - endpoint_url: Endpoint S3 (None = AWS S3)
+    - bucket_name: Tên bucket
+    - public_base_url: Prefix của public URL (custom domain/CDN), URL = public_base_url/key
+    """
+
+    def __init__(self, name, endpoint_url, access_key_id, secret_access_key, bucket_name,
+                 public_base_url, region_name=None, addressing_style=None):
+        self.name = name
+        self.endpoint_url = endpoint_url
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.bucket_name = bucket_name
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self.region_name = region_name
+        self.addressing_style = addressing_style
+
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        boto3 S3 client của process hiện tại (tạo ở lần dùng đầu tiên)
+
+        Flow:
+        1. Đã có client tạo trong process này -> dùng lại (boto3 client thread-safe)
+        2. Validate cấu hình (thiếu -> RuntimeError, chỉ khi thực sự dùng storage)
+        3. Tạo client với connection pool, retry, timeout từ Config
+
+        Client tạo trước khi fork (ví dụ trong master của gunicorn) không được dùng lại ở worker,
+        vì connection pool không an toàn khi chia sẻ qua fork.
+        """
+        # Bước 1: Client của process này
+        if self._client is not None and self._client_pid == os.getpid():
+            return self._client
+        with self._client_lock:
+            if self._client is not None and self._client_pid == os.getpid():
+                return self._client
+
+            # Bước 2: Validate (R2 bắt buộc có endpoint từ account id)
+            required = [self.access_key_id, self.secret_access_key, self.bucket_name, self.public_base_url]
+            if self.name == 'r2':
+                required.append(self.endpoint_url)
+            if not all(required):
+                raise RuntimeError(
+                    f'Missing required {self.name.upper()} configuration. '
+                    f'Please check environment variables: {_REQUIRED_ENV.get(self.name, "")}'
+                )
+
+            # Bước 3: Tạo client
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=self.access_key_id,
+                aws_secret_access_key=self.secret_access_key,
+                region_name=self.region_name,
+                config=BotoConfig(
+                    # SigV4: presigned URL ký cả Content-Type/Content-Length (SigV2 thì không)
+                    signature_version='s3v4',
+                    max_pool_connections=Config.R2_MAX_POOL_CONNECTIONS,
+                    retries={'total_max_attempts': Config.R2_MAX_ATTEMPTS, 'mode': 'standard'},
+                    connect_timeout=Config.R2_CONNECT_TIMEOUT,
+                    read_timeout=Config.R2_READ_TIMEOUT,
+                    s3={'addressing_style': self.addressing_style} if self.addressing_style else None
+                )
+            )
+            self._client_pid = os.getpid()
+            return self._client
+
+    def put_object(self, key, body, content_type, cache_control=None):
+        extra = {'CacheControl': cache_control} if cache_control else {}
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=body, ContentType=content_type, **extra)
+
+    def get_object(self, key):
+        return self.client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+
+    def head_object(self, key):
+        try:
+            response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code', '') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {'size': response['ContentLength'], 'content_type': response.get('ContentType')}
+
+    def delete_object(self, key):
+        self.client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def public_url(self, key):
+        return f"{self.public_base_url}/{key}"
+
+    def presigned_upload(self, key, content_type, size, expires_in, token, method='put'):
+        if method == 'post':
+            # POST policy: S3/MinIO kiểm tra Content-Type và kích thước (R2 không hỗ trợ POST)
+            presigned = self.client.generate_presigned_post(
+                self.bucket_name, key,
+                Fields={'Content-Type': content_type, 'Cache-Control': IMMUTABLE_CACHE_CONTROL},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    {'Cache-Control': IMMUTABLE_CACHE_CONTROL},
+                    ['content-length-range', size, size]
+                ],
+                ExpiresIn=expires_in
+            )
+            return {'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields']}
+        # PUT: các header ký trong URL phải được gửi đúng giá trị (browser tự gửi Content-Length)
+        url = self.client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self.bucket_name,
+                'Key': key,
+                'ContentType': content_type,
+                'ContentLength': size,
+                'CacheControl': IMMUTABLE_CACHE_CONTROL
+            },
+            ExpiresIn=expires_in
+        )
+        return {
+            'method': 'PUT',
+            'url': url,
+            'headers': {'Content-Type': content_type, 'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+        }
+
+    def health_check(self, create_bucket=False):
+        """
+        HEAD bucket (tạo bucket nếu chưa có và create_bucket=True), đo thời gian
+        """
+        status = {'ok': False, 'backend': self.name, 'bucket': self.bucket_name}
+        started = time.perf_counter()
+        try:
+            self.client.head_bucket(Bucket=self.bucket_name)
+            status['ok'] = True
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', '')
+            status['error'] = f'Lỗi khi kiểm tra bucket: {str(e)}'
+
+            # Bucket không tồn tại, tạo mới
+            if error_code in ('404', 'NoSuchBucket') and create_bucket:
+                try:
+                    self.client.create_bucket(Bucket=self.bucket_name)
+                    status = {'ok': True, 'backend': self.name, 'bucket': self.bucket_name, 'created': True}
+                except ClientError as create_error:
+                    status['error'] = f'Lỗi khi tạo bucket: {str(create_error)}'
+        except (RuntimeError, BotoCoreError) as e:
+            # Thiếu cấu hình, không kết nối được, timeout
+            status['error'] = str(e)
+        status['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return status
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Backend filesystem local (dev, test offline, benchmark, server một máy)
+
+    Attributes:
+    - root: Thư mục gốc chứa file (key 'books/x.jpg' -> root/books/x.jpg)
+    - public_base_url: Prefix của public URL (mặc định route /api/media của backend)
+    """
+
+    name = 'local'
+
+    def __init__(self, root, public_base_url):
+        self.root = os.path.abspath(root)
+        self.public_base_url = public_base_url.rstrip('/')
+
+    def path(self, key):
+        """
+        Đường dẫn file của key
+
+        Raises:
+            ValueError: Key thoát ra ngoài thư mục gốc ('../', đường dẫn tuyệt đối)
+        """
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Tên object không hợp lệ: {key}')
+        return path
+
+    def put_object(self, key, body, content_type, cache_control=None):
+        # Content-Type/Cache-Control do route serve file quyết định (theo extension)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(body, 'read'):
+                    shutil.copyfileobj(body, temp_file)
+                else:
+                    temp_file.write(body)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_object(self, key):
+        with open(self.path(key), 'rb') as stored_file:
+            return stored_file.read()
+
+    def head_object(self, key):
+        try:
+            size = os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            return None
+        return {'size': size, 'content_type': mimetypes.guess_type(key)[0]}
+
+    def delete_object(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def public_url(self, key):
+        return f"{self.public_base_url}/{key}"
+
+    def presigned_upload(self, key, content_type, size, expires_in, token, method='put'):
+        # PUT /api/media/<key>?token=... (routes/media.py), file vẫn đi qua worker: chỉ dùng cho dev/test
+        return {
+            'method': 'PUT',
+            'url': f"{MEDIA_UPLOAD_URL}/{key}?{urlencode({'token': token})}",
+            'headers': {'Content-Type': content_type}
+        }
+
+    def health_check(self, create_bucket=False):
+        """
+        Thư mục gốc tồn tại và ghi được (tạo thư mục nếu chưa có và create_bucket=True)
+        """
+        status = {'ok': False, 'backend': self.name, 'bucket': self.root}
+        started = time.perf_counter()
+        if not os.path.isdir(self.root) and create_bucket:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                status['created'] = True
+            except OSError as e:
+                status['error'] = f'Lỗi khi tạo thư mục: {str(e)}'
+        if not os.path.isdir(self.root):
+            status.setdefault('error', f'Thư mục không tồn tại: {self.root}')
+        elif not os.access(self.root, os.W_OK):
+            status['error'] = f'Không có quyền ghi: {self.root}'
+        else:
+            status['ok'] = True
+        status['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return status
+
+
+def _create_backend(name, **options):
+    """Tạo backend theo tên (Config.STORAGE_BACKEND), options ghi đè cấu hình"""
+    if name == 'r2':
+        settings = {
+            'endpoint_url': f'https://{Config.R2_ACCOUNT_ID}.r2.cloudflarestorage.com' if Config.R2_ACCOUNT_ID else None,
+            'access_key_id': Config.R2_ACCESS_KEY_ID,
+            'secret_access_key': Config.R2_SECRET_ACCESS_KEY,
+            'bucket_name': Config.R2_BUCKET_NAME,
+            'public_base_url': f'https://{Config.R2_PUBLIC_DOMAIN}' if Config.R2_PUBLIC_DOMAIN else None,
+            'region_name': 'auto'
+        }
+        settings.update(options)
+        return S3StorageBackend('r2', **settings)
+    if name == 's3':
+        settings = {
+            'endpoint_url': Config.S3_ENDPOINT_URL,
+            'access_key_id': Config.S3_ACCESS_KEY_ID,
+            'secret_access_key': Config.S3_SECRET_ACCESS_KEY,
+            'bucket_name': Config.S3_BUCKET_NAME,
+            'public_base_url': Config.S3_PUBLIC_BASE_URL or (
+                f"{Config.S3_ENDPOINT_URL.rstrip('/')}/{Config.S3_BUCKET_NAME}"
+                if Config.S3_ENDPOINT_URL and Config.S3_BUCKET_NAME else None
+            ),
+            'region_name': Config.S3_REGION,
+            'addressing_style': Config.S3_ADDRESSING_STYLE
+        }
+        settings.update(options)
+        return S3StorageBackend('s3', **settings)
+    if name == 'local':
+        settings = {'root': Config.LOCAL_STORAGE_DIR, 'public_base_url': Config.LOCAL_STORAGE_PUBLIC_URL}
+        settings.update(options)
+        return LocalStorageBackend(**settings)
+    raise ValueError(f'Unknown storage backend: {name}')
+
+
+_backend = {'instance': None}
+_backend_lock = threading.Lock()
+
+
+def get_storage_backend():
+    """
+    Lấy storage backend của process (tạo lazy theo Config.STORAGE_BACKEND, không gọi network)
+
+    Returns:
+        StorageBackend: Backend
+    """
+    if _backend['instance'] is None:
+        with _backend_lock:
+            if _backend['instance'] is None:
+                _backend['instance'] = _create_backend(Config.STORAGE_BACKEND)
+    return _backend['instance']
+
+
+def configure_storage_backend(name, **options):
+    """
+    Tạo lại storage backend của process (dùng cho benchmark/script)
+
+    Args:
+        name (str): 'r2', 's3' hoặc 'local'
+        **options: Tham số của backend (mặc định lấy từ Config)
+
+    Returns:
+        StorageBackend: Backend mới
+    """
+    with _backend_lock:
+        _backend['instance'] = _create_backend(name, **options)
+    return _backend['instance']
@@ -0,0 +1,118 @@
+"""
+File: utils/user_cache.py
+
+Mục đích:
+Cache thông tin user (User.to_dict()) cho GET /api/me và các decorator kiểm tra quyền,
+để các request này không phải query bảng users mỗi lần (SPA gọi /me mỗi lần chuyển trang).
+
+Cách hoạt động:
+- Mỗi worker process có một cache LRU nhỏ: user_id -> (version, hết hạn, user dict)
+- Version của từng user nằm trong shared memory (mmap tạo lúc import, trước khi gunicorn
+  fork) nên dùng chung cho tất cả workers. Khi user bị cập nhật/khóa, invalidate_user()
+  tăng version -> entry ở mọi worker lập tức bị coi là cũ, request tiếp theo load lại
+  từ database. Nhờ vậy user bị khóa bị chặn ngay, không phải chờ hết TTL.
+- TTL chỉ là lưới an toàn cho các thay đổi không đi qua invalidate_user() (ví dụ sửa trực tiếp DB).
+
+Các hàm trong file này:
+- get_cached_user(user_id): Lấy user dict (từ cache hoặc database)
+- invalidate_user(user_id): Gọi sau khi commit thay đổi của user
+"""
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from collections import OrderedDict
+from models import db, User
+from config import Config
+
+_VERSION = struct.Struct('<Q')
+
+
+class SharedVersionTable:
+    """
+    Bảng version dùng chung giữa các process (mỗi slot một counter uint64)
+
+    user_id được map vào slot theo modulo. Hai user chung slot chỉ làm cache của nhau
+    bị invalidate thừa, không bao giờ dùng dữ liệu cũ.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._buffer = mmap.mmap(-1, slots * _VERSION.size)
+        self._lock = multiprocessing.Lock()
+
+    def _offset(self, user_id):
+        return (user_id % self.slots) * _VERSION.size
+
+    def version(self, user_id):
+        """Đọc version hiện tại (đọc 8 bytes aligned, không cần lock)"""
+        return _VERSION.unpack_from(self._buffer, self._offset(user_id))[0]
+
+    def bump(self, user_id):
+        """Tăng version của user"""
+        offset = self._offset(user_id)
+        with self._lock:
+            current = _VERSION.unpack_from(self._buffer, offset)[0]
+            _VERSION.pack_into(self._buffer, offset, current + 1)
+
+
+# Tạo lúc import (trước khi gunicorn fork) để tất cả workers dùng chung
+USER_VERSIONS = SharedVersionTable(Config.USER_CACHE_VERSION_SLOTS)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_cached_user(user_id):
+    """
+    Lấy thông tin user, dùng cache nếu còn hạn và đúng version
+
+    Flow:
+    1. Đọc version hiện tại của user từ shared memory
+    2. Nếu cache có entry cùng version và chưa hết hạn -> trả về
+    3. Ngược lại load từ database và lưu vào cache với version đã đọc ở bước 1
+       (nếu user bị cập nhật trong lúc load, version mới sẽ làm entry này bị bỏ qua)
+
+    Args:
+        user_id (int): ID của user
+
+    Returns:
+        dict | None: User.to_dict() hoặc None nếu user không tồn tại
+    """
+    # Bước 1: Version hiện tại
+    version = USER_VERSIONS.version(user_id)
+    now = time.monotonic()
+
+    # Bước 2: Kiểm tra cache
+    with _cache_lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] == version and entry[1] > now:
+            _cache.move_to_end(user_id)
+            return entry[2]
+
+    # Bước 3: Load từ database
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    user_dict = user.to_dict()
+
+    with _cache_lock:
+        _cache[user_id] = (version, now + Config.USER_CACHE_TTL, user_dict)
+        _cache.move_to_end(user_id)
+        while len(_cache) > Config.USER_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+    return user_dict
+
+
+def invalidate_user(user_id):
+    """
+    Đánh dấu cache của user là cũ trên tất cả workers (gọi sau khi commit)
+
+    Args:
+        user_id (int): ID của user vừa được cập nhật
+    """
+    USER_VERSIONS.bump(user_id)
+    with _cache_lock:
+        _cache.pop(user_id, None)
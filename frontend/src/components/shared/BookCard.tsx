@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { formatPrice } from '../../utils/formatters'
+import { buildSrcSet } from '../../utils/images'
 import { categoriesService } from '../../services/api'
 import type { Book } from '../../types'
 
@@ -14,6 +15,7 @@ interface BookCardProps {
 export const BookCard: React.FC<BookCardProps> = ({ book, compact = false, showSold = false, categorySlug }) => {
   const navigate = useNavigate()
   const [resolvedCategorySlug, setResolvedCategorySlug] = useState<string | undefined>(categorySlug)
+  const [imageFailed, setImageFailed] = useState(false)
 
   // Placeholder image (SVG data URL)
   const placeholderImage = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjMwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMjAwIiBoZWlnaHQ9IjMwMCIgZmlsbD0iI2U1ZTdlYiIvPjx0ZXh0IHg9IjUwJSIgeT0iNTAlIiBmb250LWZhbWlseT0iQXJpYWwiIGZvbnQtc2l6ZT0iMTgiIGZpbGw9IiM5Y2EzYWYiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj5ObyBJbWFnZTwvdGV4dD48L3N2Zz4='
@@ -34,10 +36,15 @@ export const BookCard: React.FC<BookCardProps> = ({ book, compact = false, showS
     }
   }, [categorySlug, book.category])
 
-  const handleImageError = (e: React.SyntheticEvent<HTMLImageElement>) => {
-    e.currentTarget.src = placeholderImage
+  const handleImageError = () => {
+    setImageFailed(true)
   }
 
+  // Bản resize (WebP, fallback JPEG) vừa với ô sách thay vì ảnh gốc
+  const webpSrcSet = imageFailed ? undefined : buildSrcSet(book.image_srcset, 'webp')
+  const jpegSrcSet = imageFailed ? undefined : buildSrcSet(book.image_srcset, 'jpeg')
+  const imageSizes = compact ? '(min-width: 1024px) 160px, 33vw' : '(min-width: 1024px) 240px, 50vw'
+
   const handleClick = (e: React.MouseEvent) => {
     e.preventDefault() // Prevent any default behavior
     e.stopPropagation() // Stop event bubbling
@@ -74,12 +81,18 @@ export const BookCard: React.FC<BookCardProps> = ({ book, compact = false, showS
     >
       <div className="bg-white rounded-lg overflow-hidden shadow-sm hover:shadow-md transition-all duration-300 hover:border-primary hover:border h-full flex flex-col">
         <div className="w-full aspect-[3/4] overflow-hidden flex-shrink-0">
-          <img
-            src={book.image_url || placeholderImage}
-            alt={book.title}
-            onError={handleImageError}
-            className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
-          />
+          <picture>
+            {webpSrcSet && <source type="image/webp" srcSet={webpSrcSet} sizes={imageSizes} />}
+            <img
+              src={imageFailed ? placeholderImage : book.image_url || placeholderImage}
+              srcSet={jpegSrcSet}
+              sizes={jpegSrcSet ? imageSizes : undefined}
+              alt={book.title}
+              loading="lazy"
+              onError={handleImageError}
+              className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
+            />
+          </picture>
         </div>
         <div className={`${compact ? 'px-2 py-1.5' : 'px-3 py-2'} bg-gray-50 border-t border-gray-100 flex-1 flex flex-col`}>
           <h3 className={`font-medium text-gray-900 ${compact ? 'text-xs' : 'text-sm'} text-center line-clamp-2 leading-tight mb-1`}>
@@ -52,18 +52,42 @@ export const Chatbot: React.FC = () => {
     setInputValue('')
     setLoading(true)
 
+    const botMessageId = (Date.now() + 1).toString()
+    let received = false
+
     try {
-      const answer = await chatbotService.sendMessage(userMessage.text)
-      
-      const botMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        text: answer,
-        isUser: false,
-        timestamp: new Date(),
+      // Hiển thị từng đoạn câu trả lời ngay khi nhận được
+      await chatbotService.streamMessage(userMessage.text, (text) => {
+        if (!received) {
+          received = true
+          setLoading(false)
+          setMessages((prev) => [
+            ...prev,
+            { id: botMessageId, text, isUser: false, timestamp: new Date() },
+          ])
+        } else {
+          setMessages((prev) =>
+            prev.map((message) =>
+              message.id === botMessageId ? { ...message, text: message.text + text } : message
+            )
+          )
+        }
+      })
+    } catch (error) {
+      if (received) return
+
+      // Stream không dùng được (proxy chặn SSE, ...) -> thử lại bằng request thường
+      try {
+        const answer = await chatbotService.sendMessage(userMessage.text)
+        setMessages((prev) => [
+          ...prev,
+          { id: botMessageId, text: answer, isUser: false, timestamp: new Date() },
+        ])
+        return
+      } catch {
+        // Hiển thị thông báo lỗi bên dưới
       }
 
-      setMessages((prev) => [...prev, botMessage])
-    } catch (error) {
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
         text: 'Xin lỗi, có lỗi xảy ra. Vui lòng thử lại sau.',
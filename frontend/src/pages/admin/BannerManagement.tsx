@@ -227,9 +227,9 @@ const BannerManagement: React.FC = () => {
         toast.error('Vui lòng chọn file ảnh')
         return
       }
-      // Validate file size (5MB)
-      if (file.size > 5 * 1024 * 1024) {
-        toast.error('File quá lớn. Kích thước tối đa: 5MB')
+      // Validate file size (20MB - upload thẳng lên storage, xem UPLOAD_DIRECT_MAX_SIZE)
+      if (file.size > 20 * 1024 * 1024) {
+        toast.error('File quá lớn. Kích thước tối đa: 20MB')
         return
       }
       setSelectedFile(file)
@@ -248,7 +248,7 @@ const BannerManagement: React.FC = () => {
     try {
       setUploading(true)
       const result = await bannersService.uploadImage(selectedFile)
-      setFormData({ ...formData, image_url: result.url })
+      setFormData({ ...formData, image_url: result.url, image_srcset: result.srcset ?? null })
       setSelectedFile(null)
       setImagePreview('')
       toast.success('Upload ảnh thành công')
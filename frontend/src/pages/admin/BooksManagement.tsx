@@ -290,7 +290,7 @@ const BooksManagement: React.FC = () => {
     try {
       setUploading(true)
       const result = await booksService.uploadImage(selectedFile)
-      setFormData({ ...formData, image_url: result.url })
+      setFormData({ ...formData, image_url: result.url, image_srcset: result.srcset ?? null })
       setSelectedFile(null)
       setImagePreview('')
       toast.success('Upload ảnh thành công')
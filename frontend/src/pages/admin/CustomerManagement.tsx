@@ -6,7 +6,8 @@ import { ConfirmDialog } from '../../components/ui/ConfirmDialog'
 import { Table, Pagination } from '../../components/ui/Table'
 import { adminService, authService } from '../../services/api'
 import { Plus, Edit2, ToggleLeft, ToggleRight, X } from 'lucide-react'
-import type { User } from '../../types'
+import type { User, CustomerListFilters } from '../../types'
+import { formatPrice } from '../../utils/formatters'
 import { useToast } from '../../components/ui/Toast'
 import { useAuth } from '../../contexts/AuthContext'
 
@@ -43,6 +44,7 @@ const CustomerManagement: React.FC = () => {
   const [editingUser, setEditingUser] = useState<User | null>(null)
   const [currentPage, setCurrentPage] = useState(1)
   const [totalPages, setTotalPages] = useState(1)
+  const [filters, setFilters] = useState<CustomerListFilters>({ sort_by: 'created_at', order: 'desc' })
   const [formData, setFormData] = useState<CustomerFormData>({
     username: '',
     password: '',
@@ -54,7 +56,7 @@ const CustomerManagement: React.FC = () => {
   const fetchUsers = async (page: number = 1) => {
     try {
       setLoading(true)
-      const data = await adminService.getUsers('customer', page, 20)
+      const data = await adminService.getUsers('customer', page, 20, filters)
       setUsers(data.users)
       setCurrentPage(data.page)
       setTotalPages(data.pages)
@@ -67,7 +69,12 @@ const CustomerManagement: React.FC = () => {
 
   useEffect(() => {
     fetchUsers(currentPage)
-  }, [currentPage])
+  }, [currentPage, filters])
+
+  const handleFilterChange = (changes: Partial<CustomerListFilters>) => {
+    setFilters({ ...filters, ...changes })
+    setCurrentPage(1)
+  }
 
   const handleOpenModal = (user?: User) => {
     if (user) {
@@ -150,22 +157,42 @@ const CustomerManagement: React.FC = () => {
     { 
       key: 'customer_code', 
       label: 'Mã KH',
-      width: '12%',
+      width: '7%',
       render: (user: User) => user.customer_code || '-'
     },
-    { key: 'username', label: 'Username', width: '15%' },
-    { key: 'email', label: 'Email', width: '20%' },
-    { key: 'full_name', label: 'Họ Tên', width: '18%' },
+    { key: 'username', label: 'Username', width: '11%' },
+    { key: 'email', label: 'Email', width: '16%' },
+    { key: 'full_name', label: 'Họ Tên', width: '13%' },
     {
       key: 'created_at',
       label: 'Ngày Đăng Ký',
-      width: '13%',
+      width: '9%',
       render: (user: User) => new Date(user.created_at).toLocaleDateString('vi-VN'),
     },
+    {
+      key: 'order_count',
+      label: 'Số Đơn',
+      width: '7%',
+      render: (user: User) => user.stats?.order_count ?? 0,
+    },
+    {
+      key: 'completed_revenue',
+      label: 'Tổng Chi Tiêu',
+      width: '11%',
+      render: (user: User) => formatPrice(user.stats?.completed_revenue ?? 0),
+    },
+    {
+      key: 'last_order_at',
+      label: 'Đơn Gần Nhất',
+      width: '9%',
+      render: (user: User) => user.stats?.last_order_at
+        ? new Date(user.stats.last_order_at).toLocaleDateString('vi-VN')
+        : '-',
+    },
     {
       key: 'is_active',
       label: 'Trạng Thái',
-      width: '12%',
+      width: '9%',
       render: (user: User) => (
         <span className={`px-2 py-1 rounded text-xs ${
           user.is_active ? 'bg-green-100 text-green-800' : 'bg-red-100 text-red-800'
@@ -177,7 +204,7 @@ const CustomerManagement: React.FC = () => {
     {
       key: 'actions',
       label: 'Hành Động',
-      width: '10%',
+      width: '8%',
       render: (user: User) => (
         <div className="flex gap-2">
           <button
@@ -205,6 +232,38 @@ const CustomerManagement: React.FC = () => {
         <Button onClick={() => handleOpenModal()} icon={<Plus size={20} />}>
           Thêm Khách Hàng
         </Button>
+
+        <div className="flex items-center gap-3">
+          <select
+            value={`${filters.sort_by}:${filters.order}`}
+            onChange={(e) => {
+              const [sort_by, order] = e.target.value.split(':')
+              handleFilterChange({
+                sort_by: sort_by as CustomerListFilters['sort_by'],
+                order: order as CustomerListFilters['order'],
+              })
+            }}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-primary"
+          >
+            <option value="created_at:desc">Mới đăng ký</option>
+            <option value="order_count:desc">Nhiều đơn nhất</option>
+            <option value="completed_revenue:desc">Chi tiêu cao nhất</option>
+            <option value="last_order_at:desc">Đặt hàng gần đây</option>
+            <option value="last_order_at:asc">Lâu chưa đặt hàng</option>
+          </select>
+          <select
+            value={filters.min_orders ?? ''}
+            onChange={(e) => handleFilterChange({
+              min_orders: e.target.value ? Number(e.target.value) : undefined,
+            })}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-primary"
+          >
+            <option value="">Tất cả khách hàng</option>
+            <option value="1">Đã có đơn hàng</option>
+            <option value="5">Từ 5 đơn trở lên</option>
+            <option value="10">Từ 10 đơn trở lên</option>
+          </select>
+        </div>
       </div>
 
       {loading ? (
@@ -2,12 +2,13 @@ import React, { useEffect, useState } from 'react'
 import { AdminLayout } from '../../components/layout/AdminLayout'
 import { StatCard } from '../../components/shared/StatCard'
 import { adminService } from '../../services/api'
-import type { Statistics } from '../../types'
+import type { AdminDashboard } from '../../types'
 import { useAuth } from '../../contexts/AuthContext'
+import { formatPrice, getStatusText, getStatusBadge } from '../../utils/formatters'
 
 const Dashboard: React.FC = () => {
   const { user: currentUser } = useAuth()
-  const [stats, setStats] = useState<Statistics | null>(null)
+  const [dashboard, setDashboard] = useState<AdminDashboard | null>(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
@@ -17,18 +18,18 @@ const Dashboard: React.FC = () => {
       return
     }
 
-    const fetchStatistics = async () => {
+    const fetchDashboard = async () => {
       try {
-        const data = await adminService.getStatistics()
-        setStats(data)
+        const data = await adminService.getDashboard()
+        setDashboard(data)
       } catch (error) {
-        console.error('Failed to fetch statistics:', error)
+        console.error('Failed to fetch dashboard:', error)
       } finally {
         setLoading(false)
       }
     }
 
-    fetchStatistics()
+    fetchDashboard()
   }, [currentUser])
 
   // Editor không có quyền xem thống kê
@@ -69,6 +70,8 @@ const Dashboard: React.FC = () => {
     )
   }
 
+  const stats = dashboard?.kpis
+
   return (
     <AdminLayout title="Trang Chủ">
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
@@ -97,6 +100,73 @@ const Dashboard: React.FC = () => {
           value={stats?.cancelled_orders || 0}
         />
       </div>
+
+      <div className="grid grid-cols-1 lg:grid-cols-2 gap-6 mt-6">
+        <div className="bg-white rounded-lg border-2 border-gray-200 p-6">
+          <h3 className="text-lg font-semibold text-gray-900 mb-4">Đơn hàng gần đây</h3>
+          {dashboard?.recent_orders.length ? (
+            <ul className="divide-y divide-gray-100">
+              {dashboard.recent_orders.map((order) => (
+                <li key={order.id} className="py-3 flex items-center justify-between gap-4">
+                  <div className="min-w-0">
+                    <p className="font-medium text-gray-900">#{order.id} - {order.user.full_name || order.user.username}</p>
+                    <p className="text-sm text-gray-500">{new Date(order.created_at).toLocaleString('vi-VN')}</p>
+                  </div>
+                  <div className="flex items-center gap-3 shrink-0">
+                    <span className="text-sm font-medium text-gray-900">{formatPrice(order.total_amount)}</span>
+                    <span className={getStatusBadge(order.status, 'sm')}>{getStatusText(order.status)}</span>
+                  </div>
+                </li>
+              ))}
+            </ul>
+          ) : (
+            <p className="text-gray-500">Chưa có đơn hàng</p>
+          )}
+        </div>
+
+        <div className="bg-white rounded-lg border-2 border-gray-200 p-6">
+          <h3 className="text-lg font-semibold text-gray-900 mb-4">Sách sắp hết hàng</h3>
+          {dashboard?.low_stock.length ? (
+            <ul className="divide-y divide-gray-100">
+              {dashboard.low_stock.map((book) => (
+                <li key={book.id} className="py-3 flex items-center justify-between gap-4">
+                  <div className="min-w-0">
+                    <p className="font-medium text-gray-900 truncate">{book.title}</p>
+                    <p className="text-sm text-gray-500">
+                      {book.book_code} - {book.author}
+                      {book.days_of_cover !== null && ` - đủ bán ~${book.days_of_cover} ngày`}
+                    </p>
+                  </div>
+                  <span className={`text-sm font-semibold shrink-0 ${book.stock <= 0 ? 'text-red-600' : 'text-yellow-600'}`}>
+                    Còn {book.stock}
+                  </span>
+                </li>
+              ))}
+            </ul>
+          ) : (
+            <p className="text-gray-500">Không có sách nào sắp hết hàng</p>
+          )}
+        </div>
+
+        <div className="bg-white rounded-lg border-2 border-gray-200 p-6 lg:col-span-2">
+          <h3 className="text-lg font-semibold text-gray-900 mb-4">Sách bán chạy</h3>
+          {dashboard?.top_sellers.length ? (
+            <ul className="divide-y divide-gray-100">
+              {dashboard.top_sellers.map((book, index) => (
+                <li key={book.id} className="py-3 flex items-center justify-between gap-4">
+                  <div className="min-w-0">
+                    <p className="font-medium text-gray-900 truncate">{index + 1}. {book.title}</p>
+                    <p className="text-sm text-gray-500">{book.author}</p>
+                  </div>
+                  <span className="text-sm font-medium text-gray-900 shrink-0">Đã bán {book.total_sold}</span>
+                </li>
+              ))}
+            </ul>
+          ) : (
+            <p className="text-gray-500">Chưa có dữ liệu bán hàng</p>
+          )}
+        </div>
+      </div>
     </AdminLayout>
   )
 }
@@ -4,12 +4,14 @@ import { PublicHeader } from '../../components/layout/PublicHeader'
 import { PublicFooter } from '../../components/layout/PublicFooter'
 import { Button } from '../../components/ui/Button'
 import { Breadcrumb } from '../../components/ui/Breadcrumb'
+import { BookCard } from '../../components/shared/BookCard'
 import { booksService, categoriesService } from '../../services/api'
 import { useAuth } from '../../contexts/AuthContext'
 import { useCart } from '../../contexts/CartContext'
 import { useToast } from '../../components/ui/Toast'
 import { Minus, Plus, ShoppingCart, CreditCard } from 'lucide-react'
 import { formatPrice } from '../../utils/formatters'
+import { buildSrcSet } from '../../utils/images'
 import type { Book, Category } from '../../types'
 
 // Placeholder image (SVG data URL)
@@ -21,6 +23,7 @@ const BookDetailPage: React.FC = () => {
   const [category, setCategory] = useState<Category | null>(null)
   const [quantity, setQuantity] = useState(1)
   const [loading, setLoading] = useState(true)
+  const [relatedBooks, setRelatedBooks] = useState<Book[]>([])
   const { user } = useAuth()
   const { addToCart } = useCart()
   const toast = useToast()
@@ -79,6 +82,18 @@ const BookDetailPage: React.FC = () => {
     fetchBook()
   }, [bookSlug, categorySlug])
 
+  useEffect(() => {
+    if (!book) return
+
+    // Sách thường được mua cùng (không chặn hiển thị trang nếu lỗi)
+    booksService.getRelatedBooks(book.id, 5)
+      .then((data) => setRelatedBooks(data.books))
+      .catch((error) => {
+        console.error('Failed to fetch related books:', error)
+        setRelatedBooks([])
+      })
+  }, [book])
+
   const handleAddToCart = async () => {
     if (!user) {
       navigate('/login')
@@ -141,14 +156,30 @@ const BookDetailPage: React.FC = () => {
             {/* Book Image */}
             <div className="flex items-center justify-center">
               <div className="bg-white rounded-lg shadow-md p-6 w-full max-w-md">
-                <img
-                  src={book.image_url || PLACEHOLDER_IMAGE}
-                  alt={book.title}
-                  onError={(e) => {
-                    e.currentTarget.src = PLACEHOLDER_IMAGE
-                  }}
-                  className="w-full object-contain rounded"
-                />
+                <picture>
+                  {book.image_srcset && (
+                    <source
+                      type="image/webp"
+                      srcSet={buildSrcSet(book.image_srcset, 'webp')}
+                      sizes="(min-width: 768px) 400px, 90vw"
+                    />
+                  )}
+                  <img
+                    src={book.image_url || PLACEHOLDER_IMAGE}
+                    srcSet={buildSrcSet(book.image_srcset, 'jpeg')}
+                    sizes="(min-width: 768px) 400px, 90vw"
+                    alt={book.title}
+                    onError={(e) => {
+                      // Bỏ srcset (cả <source> WebP) để trình duyệt dùng placeholder
+                      e.currentTarget.parentElement?.querySelectorAll('source').forEach((source) => {
+                        source.srcset = ''
+                      })
+                      e.currentTarget.srcset = ''
+                      e.currentTarget.src = PLACEHOLDER_IMAGE
+                    }}
+                    className="w-full object-contain rounded"
+                  />
+                </picture>
               </div>
             </div>
 
@@ -266,6 +297,18 @@ const BookDetailPage: React.FC = () => {
               </div>
             </div>
 
+            {relatedBooks.length > 0 && (
+              <div className="bg-white rounded-lg shadow-sm p-6">
+                <h2 className="text-gray-900 text-lg font-semibold border-b-2 border-primary pb-3 mb-4">
+                  THƯỜNG ĐƯỢC MUA CÙNG
+                </h2>
+                <div className="grid grid-cols-2 md:grid-cols-5 gap-6">
+                  {relatedBooks.map((relatedBook) => (
+                    <BookCard key={relatedBook.id} book={relatedBook} />
+                  ))}
+                </div>
+              </div>
+            )}
           </div>
         </div>
       </main>
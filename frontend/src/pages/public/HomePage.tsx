@@ -5,6 +5,7 @@ import { PublicFooter } from '../../components/layout/PublicFooter'
 import { BookCard } from '../../components/shared/BookCard'
 import { booksService, bannersService, categoriesService } from '../../services/api'
 import type { Book, Banner, Category } from '../../types'
+import { buildSrcSet } from '../../utils/images'
 import { ChevronLeft, ChevronRight } from 'lucide-react'
 
 const HomePage: React.FC = () => {
@@ -184,6 +185,8 @@ const HomePage: React.FC = () => {
                         <div className="relative w-full h-full">
                           <img 
                             src={banner.image_url} 
+                            srcSet={buildSrcSet(banner.image_srcset, 'jpeg', true)}
+                            sizes="100vw"
                             alt={banner.title}
                             className="w-full h-full object-cover"
                           />
@@ -290,6 +293,8 @@ const HomePage: React.FC = () => {
                   <div className="relative w-full h-full">
                     <img 
                       src={banner.image_url} 
+                      srcSet={buildSrcSet(banner.image_srcset, 'jpeg', true)}
+                      sizes="(min-width: 1024px) 33vw, 100vw"
                       alt={banner.title}
                       className="w-full h-full object-cover"
                     />
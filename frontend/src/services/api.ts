@@ -14,6 +14,10 @@ import type {
   Banner,
   BannerFormData,
   Category,
+  CustomerListFilters,
+  AdminDashboard,
+  UploadImageResult,
+  DirectUploadTicket,
 } from '../types'
 
 // Create axios instance
@@ -47,6 +51,44 @@ const handleError = (error: AxiosError) => {
   }
 }
 
+// Poll kết quả resize của upload trực tiếp (server tạo các bản resize ở background)
+const DIRECT_UPLOAD_POLL_INTERVAL_MS = 1000
+const DIRECT_UPLOAD_POLL_ATTEMPTS = 60
+
+// Upload ảnh trực tiếp lên bucket: presign -> PUT/POST file lên URL đã ký -> complete (xếp job resize)
+// -> poll status đến khi có srcset. File không đi qua API server (ảnh lớn như banner không giữ worker)
+const uploadImageDirect = async (file: File, folder: string): Promise<UploadImageResult> => {
+  const presignResponse = await api.post('/admin/upload/presign', {
+    filename: file.name,
+    content_type: file.type,
+    size: file.size,
+    folder,
+  })
+  const ticket: DirectUploadTicket = presignResponse.data
+
+  // Gửi thẳng lên storage (không dùng instance api: khác origin, không gửi cookie)
+  if (ticket.upload.method === 'POST') {
+    const formData = new FormData()
+    Object.entries(ticket.upload.fields || {}).forEach(([name, value]) => formData.append(name, value))
+    formData.append('file', file)
+    await axios.post(ticket.upload.url, formData)
+  } else {
+    await axios.put(ticket.upload.url, file, { headers: ticket.upload.headers })
+  }
+
+  await api.post('/admin/upload/complete', { upload_token: ticket.upload_token })
+
+  // 202 = đang resize, 200 = xong (url + srcset), lỗi (400/503/500) được axios throw
+  for (let attempt = 0; attempt < DIRECT_UPLOAD_POLL_ATTEMPTS; attempt++) {
+    await new Promise((resolve) => setTimeout(resolve, DIRECT_UPLOAD_POLL_INTERVAL_MS))
+    const statusResponse = await api.get('/admin/upload/status', { params: { upload_token: ticket.upload_token } })
+    if (statusResponse.status === 200) {
+      return statusResponse.data
+    }
+  }
+  throw new Error('Xử lý ảnh quá lâu, vui lòng thử lại')
+}
+
 // Auth Service
 export const authService = {
   async login(data: LoginRequest): Promise<User> {
@@ -174,22 +216,24 @@ export const booksService = {
     }
   },
 
-  async uploadImage(file: File): Promise<{ url: string }> {
+  async getRelatedBooks(id: number, limit: number = 5): Promise<{ books: Book[], count: number }> {
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      
-      const response = await api.post('/admin/upload', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      })
+      const response = await api.get(`/books/${id}/related`, { params: { limit } })
       return response.data
     } catch (error) {
       handleError(error as AxiosError)
       throw error
     }
   },
+
+  async uploadImage(file: File): Promise<UploadImageResult> {
+    try {
+      return await uploadImageDirect(file, 'books')
+    } catch (error) {
+      handleError(error as AxiosError)
+      throw error
+    }
+  },
 }
 
 // Cart Service
@@ -285,10 +329,11 @@ export const adminService = {
   async getUsers(
     role?: 'customer' | 'admin' | 'moderator' | 'editor',
     page?: number,
-    per_page?: number
+    per_page?: number,
+    filters?: CustomerListFilters
   ): Promise<{ users: User[], total: number, page: number, per_page: number, pages: number }> {
     try {
-      const params: any = {}
+      const params: any = { ...filters }
       if (role) params.role = role
       if (page) params.page = page
       if (per_page) params.per_page = per_page
@@ -388,6 +433,18 @@ export const adminService = {
       throw error
     }
   },
+
+  // KPIs, recent orders, low-stock books and top sellers in one request
+  async getDashboard(refresh: boolean = false): Promise<AdminDashboard> {
+    try {
+      const params = refresh ? { refresh: 'true' } : {}
+      const response = await api.get('/admin/dashboard', { params })
+      return response.data
+    } catch (error) {
+      handleError(error as AxiosError)
+      throw error
+    }
+  },
 }
 
 // Banners Service
@@ -479,17 +536,9 @@ export const bannersService = {
   },
 
   // Admin: Upload banner image
-  async uploadImage(file: File): Promise<{ url: string }> {
+  async uploadImage(file: File): Promise<UploadImageResult> {
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      
-      const response = await api.post('/admin/upload?folder=banners', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      })
-      return response.data
+      return await uploadImageDirect(file, 'banners')
     } catch (error) {
       handleError(error as AxiosError)
       throw error
@@ -588,6 +637,54 @@ export const chatbotService = {
       throw error
     }
   },
+
+  // Stream câu trả lời qua Server-Sent Events, gọi onToken với từng đoạn text.
+  // Dùng fetch vì EventSource không gửi được POST body.
+  async streamMessage(question: string, onToken: (text: string) => void): Promise<string> {
+    const response = await fetch('/api/chatbot/stream', {
+      method: 'POST',
+      credentials: 'include',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ question }),
+    })
+    if (!response.ok || !response.body) {
+      throw new Error(`Chatbot stream failed with status ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let answer = ''
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Mỗi event kết thúc bằng một dòng trống
+      let boundary = buffer.indexOf('\n\n')
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        boundary = buffer.indexOf('\n\n')
+
+        let eventName = 'message'
+        let data = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) eventName = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (eventName === 'token') {
+          const text = JSON.parse(data).text as string
+          answer += text
+          onToken(text)
+        } else if (eventName === 'error' && !answer) {
+          throw new Error(JSON.parse(data).error)
+        }
+      }
+    }
+    return answer
+  },
 }
 
 export default api
@@ -8,6 +8,21 @@ export interface User {
   is_active: boolean
   customer_code?: string
   created_at: string
+  stats?: CustomerStats
+}
+
+export interface CustomerStats {
+  order_count: number
+  completed_revenue: number
+  last_order_at: string | null
+}
+
+export interface CustomerListFilters {
+  sort_by?: 'created_at' | 'order_count' | 'completed_revenue' | 'last_order_at'
+  order?: 'asc' | 'desc'
+  min_orders?: number
+  min_revenue?: number
+  last_order_from?: string
 }
 
 export interface LoginRequest {
@@ -22,6 +37,41 @@ export interface RegisterRequest {
   full_name: string
 }
 
+// Image Types
+// Một kích thước ảnh đã resize khi upload (WebP + JPEG)
+export interface ImageDerivative {
+  width: number
+  height: number
+  webp: string
+  jpeg: string
+}
+
+// Các bản resize (tên theo IMAGE_DERIVATIVES của backend) + kích thước ảnh gốc
+export interface ImageSrcset {
+  thumbnail?: ImageDerivative
+  card?: ImageDerivative
+  detail?: ImageDerivative
+  original?: { width: number; height: number; url: string }
+}
+
+export interface UploadImageResult {
+  url: string
+  srcset?: ImageSrcset | null
+}
+
+// Thông tin upload trực tiếp lên bucket (POST /admin/upload/presign)
+export interface DirectUploadTicket {
+  key: string
+  upload_token: string
+  expires_in: number
+  upload: {
+    method: 'PUT' | 'POST'
+    url: string
+    headers?: Record<string, string>
+    fields?: Record<string, string>
+  }
+}
+
 // Book Types
 export interface Book {
   id: number
@@ -34,6 +84,7 @@ export interface Book {
   price: number
   stock: number
   image_url: string
+  image_srcset?: ImageSrcset | null
   publisher?: string
   publish_date?: string
   distributor?: string
@@ -41,6 +92,7 @@ export interface Book {
   pages?: number
   weight?: number
   sold?: number
+  co_orders?: number | null
   created_at: string
   updated_at: string
 }
@@ -53,6 +105,7 @@ export interface BookFormData {
   price: number
   stock: number
   image_url: string
+  image_srcset?: ImageSrcset | null
   publisher?: string
   publish_date?: string
   distributor?: string
@@ -125,6 +178,41 @@ export interface Statistics {
   top_books: TopBook[]
 }
 
+export interface DashboardKpis extends Omit<Statistics, 'top_books'> {
+  total_customers: number
+  total_books: number
+  out_of_stock_books: number
+}
+
+export interface DashboardRecentOrder {
+  id: number
+  total_amount: number
+  status: 'pending' | 'confirmed' | 'cancelled' | 'completed'
+  payment_status: 'pending' | 'paid'
+  created_at: string
+  user: Pick<User, 'id' | 'username' | 'full_name' | 'customer_code'>
+}
+
+export interface DashboardLowStockBook {
+  id: number
+  book_code: string
+  title: string
+  author: string
+  image_url?: string
+  stock: number
+  days_of_cover: number | null
+}
+
+export interface AdminDashboard {
+  kpis: DashboardKpis
+  recent_orders: DashboardRecentOrder[]
+  low_stock: DashboardLowStockBook[]
+  top_sellers: TopBook[]
+  timings_ms: Record<string, number>
+  generated_at: string
+  cached: boolean
+}
+
 // API Response Types
 export interface ApiResponse<T> {
   message?: string
@@ -147,6 +235,7 @@ export interface Banner {
   title: string
   description?: string
   image_url: string
+  image_srcset?: ImageSrcset | null
   link?: string
   bg_color: string
   text_color: string
@@ -161,6 +250,7 @@ export interface BannerFormData {
   title: string
   description?: string
   image_url: string
+  image_srcset?: ImageSrcset | null
   link?: string
   bg_color?: string
   text_color?: string
@@ -0,0 +1,31 @@
+/**
+ * Utility functions for responsive images
+ * (srcset từ các bản resize tạo khi upload - xem backend utils/images.py)
+ */
+import type { ImageDerivative, ImageSrcset } from '../types'
+
+const DERIVATIVE_NAMES = ['thumbnail', 'card', 'detail'] as const
+
+/**
+ * Build giá trị srcSet ("url 160w, url 360w, ...") cho một định dạng
+ * includeOriginal: thêm ảnh gốc làm kích thước lớn nhất (banner full width)
+ * Trả về undefined nếu ảnh chưa có bản resize (ảnh upload trước khi có pipeline)
+ */
+export const buildSrcSet = (
+  srcset: ImageSrcset | null | undefined,
+  format: 'webp' | 'jpeg',
+  includeOriginal = false
+): string | undefined => {
+  if (!srcset) return undefined
+  const derivatives = DERIVATIVE_NAMES
+    .map((name) => srcset[name])
+    .filter((derivative): derivative is ImageDerivative => !!derivative)
+  if (derivatives.length === 0) return undefined
+
+  const candidates = derivatives.map((derivative) => `${derivative[format]} ${derivative.width}w`)
+  const largest = derivatives[derivatives.length - 1]
+  if (includeOriginal && srcset.original && srcset.original.width > largest.width) {
+    candidates.push(`${srcset.original.url} ${srcset.original.width}w`)
+  }
+  return candidates.join(', ')
+}